@@ -12,8 +12,16 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from src.handlers.l1 import router as l1_router
 from src.handlers.l2 import router as l2_router
 from src.handlers.why import router as why_router
+from db import aio as db_aio
+from db import statements as db_statements
 from db.migrations_runner import apply_pending
+from packages.llm.src import http_client
+from src.services.event_retention import ensure_event_partitions, run_retention_loop
+from src.services.image_delivery import recover_image_jobs, start_image_workers, stop_image_workers
+from src.services.image_renditions import close_rendition_pool
 from src.services.theme_registry import registry
+from src.services.ui_delivery import flush_deliveries
+from src.services.usage_counters import flush_usage
 from src.services.whyqa import whyqa
 
 BOT_TOKEN = os.getenv("BOT_TOKEN", "").strip()
@@ -55,14 +63,13 @@ async def main() -> None:
         logger.exception("Failed to apply DB migrations")
         raise
     logger.info("db migrations applied")
+    ensure_event_partitions()
     registry.load_all()
     whyqa.load()
 
     bot = Bot(token=BOT_TOKEN)
     logger.info("tg-bot started")
     stop_event = asyncio.Event()
-    last_error_log_at = 0.0
-    retry_count = 0
 
     def _handle_sigterm() -> None:
         if stop_event.is_set():
@@ -77,6 +84,29 @@ async def main() -> None:
         except NotImplementedError:
             signal.signal(sig, lambda *_: _handle_sigterm())
 
+    retention_task = asyncio.create_task(run_retention_loop(stop_event))
+    await recover_image_jobs()
+    start_image_workers(bot)
+    try:
+        await _poll(bot, stop_event)
+    finally:
+        retention_task.cancel()
+        await asyncio.gather(retention_task, return_exceptions=True)
+        await stop_image_workers()
+        close_rendition_pool()
+        await flush_deliveries()
+        await flush_usage()
+        await http_client.aclose()
+        http_client.close()
+        await bot.session.close()
+        await db_aio.close_pool()
+        logger.info("tg-bot clients closed")
+        logger.info("db.statements slowest\n%s", db_statements.format_top_slowest())
+
+
+async def _poll(bot: Bot, stop_event: asyncio.Event) -> None:
+    last_error_log_at = 0.0
+    retry_count = 0
     backoff_steps = [1, 2, 5, 10]
     while True:
         try:
@@ -22,15 +22,16 @@ from src.keyboards.book import build_book_offer_keyboard
 from src.keyboards.why import build_why_keyboard
 from src.services.l3_runtime import apply_l3_turn
 from src.services.runtime_sessions import (
-    abort_session,
-    get_session,
-    get_session_by_sid8,
-    has_active,
-    is_step_current,
-    touch_last_step,
+    aabort_session,
+    aget_session,
+    aget_session_by_sid8,
+    ahas_active,
+    ais_step_current,
+    atouch_last_step,
 )
-from src.services.story_runtime import ensure_engine_state, render_current_step
+from src.services.story_runtime import aensure_engine_state, arender_current_step
 from src.services.ui_delivery import (
+    StepTextStream,
     acquire_step_event,
     content_hash,
     deliver_step_lock,
@@ -38,10 +39,9 @@ from src.services.ui_delivery import (
     _normalize_content,
 )
 from src.services.image_delivery import resolve_story_step_ui, schedule_image_delivery
-from db.repos import ui_events, users
-from db.conn import transaction
+from db.aio import transaction, ui_events, users
 from src.services.content_stub import build_content_step
-from db.repos import session_events
+from db.aio import session_events
 from src.services.theme_registry import registry
 from src.states import L3, L4, L5, UX
 from src.services.book_runtime import (
@@ -161,7 +161,7 @@ async def open_l1(message: Message, state: FSMContext, user_id: int | None = Non
 
     await state.set_state(UX.l1)
     try:
-        active = has_active(tg_id)
+        active = await ahas_active(tg_id)
     except Exception:
         logger.exception("Failed to load active session")
         active = False
@@ -1583,7 +1583,7 @@ async def _deliver_current_step(
     state: FSMContext,
     session: object,
 ) -> None:
-    step_view = render_current_step(session.__dict__, req_id=_req_id_from_update(message, None))
+    step_view = await arender_current_step(session.__dict__, req_id=_req_id_from_update(message, None))
     await deliver_step_view(
         message=message,
         step_view=step_view,
@@ -1618,7 +1618,7 @@ async def _continue_current(
         return
     kind = "resume_shown" if source == "resume_cmd" else "continue_shown"
     dedup_hash = content_hash(theme_id=None, text=f"{kind}:{session.step}")
-    acquire = acquire_step_event(
+    acquire = await acquire_step_event(
         session_id=session.id,
         step=session.step,
         kind=kind,
@@ -1632,7 +1632,7 @@ async def _continue_current(
             session.step,
         )
         return
-    step_view = render_current_step(session.__dict__, req_id=_req_id_from_update(message, None))
+    step_view = await arender_current_step(session.__dict__, req_id=_req_id_from_update(message, None))
     step_text = step_view.text
     sent_message = await message.answer("...", reply_markup=ReplyKeyboardRemove())
     step_message = sent_message
@@ -1653,12 +1653,12 @@ async def _continue_current(
             pass
         step_message = await message.answer(step_text, reply_markup=step_view.keyboard)
     try:
-        touch_last_step(session.tg_id, step_message.message_id, now_ts)
+        await atouch_last_step(session.tg_id, step_message.message_id, now_ts)
     except Exception as exc:
         await _handle_db_error(message, state, exc=exc)
         return
     try:
-        ui_events.mark_shown(acquire.event_id, step_message_id=step_message.message_id)
+        await ui_events.mark_shown(acquire.event_id, step_message_id=step_message.message_id)
     except Exception:
         pass
     scene_brief = step_view.image_prompt
@@ -1675,7 +1675,7 @@ async def _continue_current(
         story_step_ui,
     )
     try:
-        schedule_image_delivery(
+        await schedule_image_delivery(
             bot=message.bot,
             chat_id=step_message.chat.id,
             step_message_id=step_message.message_id,
@@ -1713,7 +1713,7 @@ async def do_continue(message: Message, state: FSMContext, user_id: int | None =
     tg_id = user_id if user_id is not None else message.from_user.id
 
     try:
-        session = get_session(tg_id)
+        session = await aget_session(tg_id)
     except Exception as exc:
         await _handle_db_error(message, state, exc=exc)
         return
@@ -1726,7 +1726,7 @@ async def do_continue(message: Message, state: FSMContext, user_id: int | None =
 
     if not _is_session_valid(session):
         try:
-            abort_session(tg_id)
+            await aabort_session(tg_id)
         except Exception as exc:
             await _handle_db_error(message, state, exc=exc)
             return
@@ -1743,7 +1743,7 @@ async def on_resume(message: Message, state: FSMContext) -> None:
         await message.answer("Я работаю только в личных сообщениях. Напиши мне в личку.")
         return
     try:
-        session = get_session(message.from_user.id)
+        session = await aget_session(message.from_user.id)
     except Exception as exc:
         await _handle_db_error(message, state, exc=exc)
         return
@@ -1764,7 +1764,7 @@ async def on_status(message: Message, state: FSMContext) -> None:
         return
 
     try:
-        session = get_session(message.from_user.id)
+        session = await aget_session(message.from_user.id)
     except Exception as exc:
         await _handle_db_error(message, state, exc=exc)
         return
@@ -1786,7 +1786,7 @@ async def on_status(message: Message, state: FSMContext) -> None:
         lines.append("max_steps: unknown")
         lines.append("theme: unknown")
         try:
-            abort_session(message.from_user.id)
+            await aabort_session(message.from_user.id)
         except Exception as exc:
             await _handle_db_error(message, state, exc=exc)
             return
@@ -1863,7 +1863,7 @@ async def on_dev_book_gen(message: Message, state: FSMContext) -> None:
         await message.answer("Dev tools недоступны.")
         return
     try:
-        session = get_session(message.from_user.id)
+        session = await aget_session(message.from_user.id)
     except Exception as exc:
         await _handle_db_error(message, state, exc=exc)
         return
@@ -2005,8 +2005,8 @@ async def on_settings_child_name_message(message: Message, state: FSMContext) ->
         await message.answer("Имя должно быть от 1 до 32 символов.")
         return
     try:
-        user = users.get_or_create_by_tg_id(message.from_user.id)
-        users.update_child_name(int(user["id"]), normalized)
+        user = await users.get_or_create_by_tg_id(message.from_user.id)
+        await users.update_child_name(int(user["id"]), normalized)
     except Exception as exc:
         await _handle_db_error(message, state, exc=exc)
         return
@@ -2061,7 +2061,7 @@ async def on_dev_book_test(callback: CallbackQuery) -> None:
 
     async def _run() -> None:
         try:
-            session = get_session(callback.from_user.id)
+            session = await aget_session(callback.from_user.id)
             if not session:
                 await callback.message.answer("Нет активной сессии. Сначала подключи /dev_use_session <sid8>.")
                 return
@@ -2071,7 +2071,7 @@ async def on_dev_book_test(callback: CallbackQuery) -> None:
                 await callback.message.answer(msg)
                 if not ok:
                     return
-            refreshed = get_session(callback.from_user.id)
+            refreshed = await aget_session(callback.from_user.id)
             if not refreshed:
                 await callback.message.answer("Не удалось получить активную сессию после dev_finish.")
                 return
@@ -2097,13 +2097,13 @@ async def on_book_buy(callback: CallbackQuery, state: FSMContext) -> None:
     if not callback.message or not callback.from_user:
         return
     try:
-        session = get_session(callback.from_user.id)
+        session = await aget_session(callback.from_user.id)
     except Exception as exc:
         await _handle_db_error(callback.message, state, exc=exc)
         return
     if not session:
         try:
-            session = _pick_book_source_session(callback.from_user.id)
+            session = await _pick_book_source_session(callback.from_user.id)
         except Exception as exc:
             await _handle_db_error(callback.message, state, exc=exc)
             return
@@ -2115,11 +2115,11 @@ async def on_book_buy(callback: CallbackQuery, state: FSMContext) -> None:
     await run_book_job(callback.message, session_row, theme_title=session_row.get("theme_id"))
 
 
-def _pick_book_source_session(tg_id: int):
+async def _pick_book_source_session(tg_id: int):
     """Fallback selection for book generation when active session is missing."""
-    with transaction() as conn:
-        with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
                 """
                 SELECT s.*,
                        COALESCE(COUNT(se.*) FILTER (WHERE se.step_result_json IS NOT NULL), 0) AS step_events,
@@ -2133,7 +2133,7 @@ def _pick_book_source_session(tg_id: int):
                 """,
                 (tg_id,),
             )
-            rows = [dict(row) for row in cur.fetchall()]
+            rows = [dict(row) for row in await cur.fetchall()]
 
     for row in rows:
         status = row.get("status")
@@ -2260,8 +2260,8 @@ def _locked_rows_from_markup(markup: object | None) -> list[list[dict]]:
     return rows
 
 
-def _locked_rows_from_content(session: object, step: int) -> list[list[dict]]:
-    state = ensure_engine_state(session.__dict__)
+async def _locked_rows_from_content(session: object, step: int) -> list[list[dict]]:
+    state = await aensure_engine_state(session.__dict__)
     if int(state.get("step0", 0)) != int(step):
         return []
     content = build_content_step(session.theme_id, state["step0"], state)
@@ -2300,7 +2300,7 @@ async def on_l3_choice(callback: CallbackQuery, state: FSMContext) -> None:
         return
     choice_id, sid8, st2 = payload
     try:
-        session = get_session_by_sid8(callback.from_user.id, sid8)
+        session = await aget_session_by_sid8(callback.from_user.id, sid8)
     except Exception as exc:
         await _handle_db_error(
             callback.message,
@@ -2360,7 +2360,7 @@ async def on_l3_choice(callback: CallbackQuery, state: FSMContext) -> None:
         await safe_callback_answer(callback, "Ход уже принят. Сообщение устарело.")
         await _deliver_current_step(callback.message, state, session)
         return
-    state_snapshot = ensure_engine_state(session.__dict__)
+    state_snapshot = await aensure_engine_state(session.__dict__)
     content_snapshot = build_content_step(session.theme_id, state_snapshot["step0"], state_snapshot)
     choice_label = None
     for choice in content_snapshot.get("choices", []):
@@ -2368,16 +2368,22 @@ async def on_l3_choice(callback: CallbackQuery, state: FSMContext) -> None:
             choice_label = choice["label"]
             break
     turn = {"kind": "choice", "choice_id": choice_id}
+    stream = StepTextStream(
+        callback.message,
+        prelude=f"Твой выбор: {choice_label}" if choice_label else None,
+    )
     try:
-        result = apply_l3_turn(
+        result = await apply_l3_turn(
             tg_id=callback.from_user.id,
             sid8=sid8,
             st2=st2,
             turn=turn,
             source_message_id=callback.message.message_id,
             req_id=_req_id_from_update(callback.message, callback),
+            on_text=stream.push,
         )
     except Exception as exc:
+        await stream.discard()
         await _handle_db_error(
             callback.message,
             state,
@@ -2389,6 +2395,8 @@ async def on_l3_choice(callback: CallbackQuery, state: FSMContext) -> None:
         )
         await safe_callback_answer(callback)
         return
+    if result is None or result.status != "accepted":
+        await stream.discard()
     if result is None:
         _log_l3_step(
             "stale",
@@ -2443,7 +2451,7 @@ async def on_l3_choice(callback: CallbackQuery, state: FSMContext) -> None:
         )
     locked_rows = _locked_rows_from_markup(callback.message.reply_markup)
     if not locked_rows:
-        locked_rows = _locked_rows_from_content(session, st2)
+        locked_rows = await _locked_rows_from_content(session, st2)
     locked_keyboard = (
         build_locked_keyboard(locked_rows, sid8, st2) if locked_rows else None
     )
@@ -2469,7 +2477,7 @@ async def on_l3_choice(callback: CallbackQuery, state: FSMContext) -> None:
         await state.set_state(L3.STEP)
         await safe_callback_answer(callback, "Ход уже принят. Сообщение устарело.")
         return
-    if choice_label:
+    if choice_label and stream.placeholder is None:
         await callback.message.answer(f"Твой выбор: {choice_label}")
     await deliver_step_view(
         message=callback.message,
@@ -2478,6 +2486,7 @@ async def on_l3_choice(callback: CallbackQuery, state: FSMContext) -> None:
         step=result.step,
         theme_id=result.theme_id,
         total_steps=session.max_steps,
+        placeholder=stream.placeholder,
     )
     await _maybe_send_book_offer(callback.message, result)
     await state.set_state(L3.STEP)
@@ -2493,7 +2502,7 @@ async def on_locked_step(callback: CallbackQuery, state: FSMContext) -> None:
     if payload and callback.from_user:
         sid8, step = payload
         try:
-            session = get_session_by_sid8(callback.from_user.id, sid8)
+            session = await aget_session_by_sid8(callback.from_user.id, sid8)
             if session:
                 session_id = session.id
         except Exception:
@@ -2508,7 +2517,7 @@ async def on_locked_step(callback: CallbackQuery, state: FSMContext) -> None:
     )
     if callback.message and payload and session_id and callback.from_user:
         try:
-            session = get_session_by_sid8(callback.from_user.id, payload[0])
+            session = await aget_session_by_sid8(callback.from_user.id, payload[0])
         except Exception:
             session = None
         if session:
@@ -2535,7 +2544,7 @@ async def on_l3_free_text(callback: CallbackQuery, state: FSMContext) -> None:
         return
     sid8, st2 = payload
     try:
-        session = get_session_by_sid8(callback.from_user.id, sid8)
+        session = await aget_session_by_sid8(callback.from_user.id, sid8)
     except Exception as exc:
         await _handle_db_error(
             callback.message,
@@ -2595,7 +2604,7 @@ async def on_l3_free_text(callback: CallbackQuery, state: FSMContext) -> None:
         await safe_callback_answer(callback, "Ход уже принят. Сообщение устарело.")
         await _deliver_current_step(callback.message, state, session)
         return
-    if not is_step_current(callback.from_user.id, sid8, st2):
+    if not await ais_step_current(callback.from_user.id, sid8, st2):
         _log_l3_step(
             "stale",
             "step_check_failed",
@@ -2607,7 +2616,7 @@ async def on_l3_free_text(callback: CallbackQuery, state: FSMContext) -> None:
         await safe_callback_answer(callback, "Ход уже принят. Сообщение устарело.")
         await _deliver_current_step(callback.message, state, session)
         return
-    if session_events.exists_for_step(session.id, st2):
+    if await session_events.exists_for_step(session.id, st2):
         _log_l3_step(
             "duplicate",
             "step_already_played",
@@ -2646,7 +2655,7 @@ async def on_l3_free_text_message(message: Message, state: FSMContext) -> None:
         )
         return
     try:
-        session = get_session_by_sid8(message.from_user.id, sid8)
+        session = await aget_session_by_sid8(message.from_user.id, sid8)
     except Exception as exc:
         await _handle_db_error(
             message,
@@ -2694,16 +2703,19 @@ async def on_l3_free_text_message(message: Message, state: FSMContext) -> None:
         await _deliver_current_step(message, state, session)
         return
     turn = {"kind": "free_text", "text": message.text}
+    stream = StepTextStream(message, prelude=f"Твой выбор: {message.text}")
     try:
-        result = apply_l3_turn(
+        result = await apply_l3_turn(
             tg_id=message.from_user.id,
             sid8=sid8,
             st2=int(st2),
             turn=turn,
             source_message_id=message.message_id,
             req_id=_req_id_from_update(message, None),
+            on_text=stream.push,
         )
     except Exception as exc:
+        await stream.discard()
         await _handle_db_error(
             message,
             state,
@@ -2714,6 +2726,8 @@ async def on_l3_free_text_message(message: Message, state: FSMContext) -> None:
             exc=exc,
         )
         return
+    if result is None or result.status != "accepted":
+        await stream.discard()
     if result is None:
         _log_l3_step(
             "stale",
@@ -2769,7 +2783,7 @@ async def on_l3_free_text_message(message: Message, state: FSMContext) -> None:
             req_id=_req_id_from_update(message, None),
         )
     if session.last_step_message_id:
-        locked_rows = _locked_rows_from_content(session, int(st2))
+        locked_rows = await _locked_rows_from_content(session, int(st2))
         locked_keyboard = (
             build_locked_keyboard(locked_rows, sid8, int(st2)) if locked_rows else None
         )
@@ -2794,7 +2808,8 @@ async def on_l3_free_text_message(message: Message, state: FSMContext) -> None:
         await _maybe_send_book_offer(message, result)
         await _clear_l3_free_text_state(state)
         return
-    await message.answer(f"Твой выбор: {message.text}")
+    if stream.placeholder is None:
+        await message.answer(f"Твой выбор: {message.text}")
     await deliver_step_view(
         message=message,
         step_view=result.step_view,
@@ -2802,6 +2817,7 @@ async def on_l3_free_text_message(message: Message, state: FSMContext) -> None:
         step=result.step,
         theme_id=result.theme_id,
         total_steps=session.max_steps,
+        placeholder=stream.placeholder,
     )
     await _maybe_send_book_offer(message, result)
     await state.set_state(L3.STEP)
@@ -2845,7 +2861,7 @@ async def on_go_continue(callback: CallbackQuery, state: FSMContext) -> None:
 @router.message(Command("start"), StateFilter("*"))
 async def on_start(message: Message, state: FSMContext) -> None:
     # /start = вход в "дом" бота (L1), не "начать сказку"
-    logger.info("TG.6.4.10 cmd=/start outcome=menu_shown active=%s state=%s", 1 if has_active(message.from_user.id) else 0, await state.get_state())
+    logger.info("TG.6.4.10 cmd=/start outcome=menu_shown active=%s state=%s", 1 if await ahas_active(message.from_user.id) else 0, await state.get_state())
     await open_l1(message, state)
 
 
@@ -2860,7 +2876,7 @@ async def _handle_l1_text(message: Message, state: FSMContext) -> None:
     if not message.text:
         await message.answer("Мне нужен текст или кнопки. Остальное я не ем.")
         try:
-            active = has_active(message.from_user.id)
+            active = await ahas_active(message.from_user.id)
         except Exception:
             logger.exception("Failed to load active session")
             active = False
@@ -2881,7 +2897,7 @@ async def _handle_l1_text(message: Message, state: FSMContext) -> None:
                     "Похоже, ты имел в виду:\n" + "\n".join(f"• {s}" for s in suggestions)
                 )
                 try:
-                    active = has_active(message.from_user.id)
+                    active = await ahas_active(message.from_user.id)
                 except Exception:
                     logger.exception("Failed to load active session")
                     active = False
@@ -2932,7 +2948,7 @@ async def _handle_l1_text(message: Message, state: FSMContext) -> None:
     # 2) Потом: "произвольный" неизвестный ввод
     await message.answer("Не понял. Используй кнопки меню или команды /start /help.")
     try:
-        active = has_active(message.from_user.id)
+        active = await ahas_active(message.from_user.id)
     except Exception:
         logger.exception("Failed to load active session")
         active = False
@@ -11,8 +11,8 @@ from aiogram.exceptions import TelegramBadRequest
 from src.keyboards.l1 import build_l1_keyboard
 from src.keyboards.l2 import build_l2_keyboard
 from src.keyboards.confirm import build_new_story_confirm_keyboard
-from src.services.runtime_sessions import get_session, has_active, start_session, touch_last_step
-from src.services.story_runtime import render_step
+from src.services.runtime_sessions import aget_session, ahas_active, astart_session, atouch_last_step
+from src.services.story_runtime import arender_step
 from src.services.theme_registry import registry
 from src.services.ui_delivery import _normalize_content
 from src.services.image_delivery import resolve_story_step_ui, schedule_image_delivery
@@ -81,7 +81,7 @@ async def on_menu(callback: CallbackQuery, state: FSMContext) -> None:
         return
     await state.set_state(UX.l1)
     try:
-        active = has_active(callback.from_user.id)
+        active = await ahas_active(callback.from_user.id)
     except Exception:
         await _handle_db_error(callback.message, state)
         return
@@ -128,7 +128,7 @@ async def on_theme(callback: CallbackQuery, state: FSMContext) -> None:
         await _render_l2(callback.message, 0, edit=True)
         return
     try:
-        active = has_active(callback.from_user.id)
+        active = await ahas_active(callback.from_user.id)
     except Exception:
         await _handle_db_error(callback.message, state)
         return
@@ -159,7 +159,7 @@ async def on_new_story_confirm(callback: CallbackQuery, state: FSMContext) -> No
         await _render_l2(callback.message, 0, edit=True)
         return
     try:
-        session = get_session(callback.from_user.id)
+        session = await aget_session(callback.from_user.id)
     except Exception:
         await _handle_db_error(callback.message, state)
         return
@@ -180,19 +180,19 @@ async def _start_theme_session(
 ) -> None:
     await state.update_data(theme_id=theme["id"], style_id=theme["style_default"])
     try:
-        start_session(tg_id, theme["id"], max_steps=8)
+        await astart_session(tg_id, theme["id"], max_steps=8)
     except Exception:
         await _handle_db_error(message, state)
         return
     try:
-        session = get_session(tg_id)
+        session = await aget_session(tg_id)
     except Exception:
         await _handle_db_error(message, state)
         return
     if not session:
         await _handle_db_error(message, state)
         return
-    step_view = render_step(session.__dict__, req_id=_req_id_from_update(message, None))
+    step_view = await arender_step(session.__dict__, req_id=_req_id_from_update(message, None))
     step_text = step_view.text
     sent_message = await message.answer("...", reply_markup=ReplyKeyboardRemove())
     step_message = sent_message
@@ -213,7 +213,7 @@ async def _start_theme_session(
             pass
         step_message = await message.answer(step_text, reply_markup=step_view.keyboard)
     try:
-        touch_last_step(tg_id, step_message.message_id, int(time()))
+        await atouch_last_step(tg_id, step_message.message_id, int(time()))
     except Exception:
         await _handle_db_error(message, state)
         return
@@ -231,7 +231,7 @@ async def _start_theme_session(
         story_step_ui,
     )
     try:
-        schedule_image_delivery(
+        await schedule_image_delivery(
             bot=message.bot,
             chat_id=step_message.chat.id,
             step_message_id=step_message.message_id,
@@ -6,7 +6,7 @@ from aiogram.types import Message
 
 from src.keyboards.why import build_why_keyboard
 from src.services.read_prefs import get_read_mode
-from src.services.why_text import answer_why_text
+from src.services.why_text import aanswer_why_text
 from src.states import L5
 
 router = Router(name="why")
@@ -20,6 +20,6 @@ async def on_why_text(message: Message, state: FSMContext) -> None:
         return
 
     read_mode = get_read_mode(message.from_user.id)
-    result = answer_why_text(message.text, read_mode)
+    result = await aanswer_why_text(message.text, read_mode)
     await message.answer(result.text, reply_markup=build_why_keyboard())
     await state.set_state(L5.WHY_TEXT)
@@ -13,9 +13,11 @@ from aiogram.types import BufferedInputFile
 
 from db.conn import transaction
 from db.repos import assets, book_jobs, session_images, sessions, users
-from packages.llm.src import generate as llm_generate
+from packages.llm.src import agenerate as llm_agenerate
 from packages.llm.src.openrouter_image_provider import generate_i2i, generate_t2i
+from src.services import image_renditions, telegram_files
 from src.services.image_delivery import _resolve_storage_path
+from src.services.reference_cache import ReferenceImage, get_reference_cache
 
 try:
     from reportlab.lib.pagesizes import A5
@@ -43,6 +45,7 @@ _BOOK_REWRITE_ENABLED_ENV = "SKAZKA_BOOK_REWRITE"
 _DEV_BOOK_SOURCE_SID8_ENV = "SKAZKA_DEV_BOOK_SOURCE_SID8"
 _DEV_FIXTURE_PATH = _CONTENT_ROOT / "fixtures" / "dev_book_8_steps.json"
 _job_locks: dict[int, asyncio.Lock] = {}
+_sample_asset: int | None = None
 
 
 def _session_lock(session_id: int) -> asyncio.Lock:
@@ -76,14 +79,43 @@ async def send_sample_pdf(message) -> None:
     if not _BOOK_SAMPLE_PATH.exists():
         await message.answer("Пока не нашёл образец PDF в контейнере. Попробуй позже 🙏")
         return
-    data = _BOOK_SAMPLE_PATH.read_bytes()
-    await message.answer_document(
-        document=BufferedInputFile(data, filename="book_sample.pdf"),
-        caption="Вот пример книжки ✨",
+    asset_id = _sample_asset_id()
+    await telegram_files.send_asset(
+        asset_id=asset_id,
+        asset_row=assets.get_by_id(asset_id) if asset_id is not None else None,
+        media="document",
+        send=lambda document: message.answer_document(document=document, caption="Вот пример книжки ✨"),
+        load=telegram_files.read_file(_BOOK_SAMPLE_PATH),
+        filename="book_sample.pdf",
     )
     logger.info("book.sample sent")
 
 
+def _sample_asset_id() -> int | None:
+    global _sample_asset
+    if _sample_asset is not None:
+        return _sample_asset
+    try:
+        data = _BOOK_SAMPLE_PATH.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        existing = assets.get_by_sha256(digest)
+        if existing:
+            _sample_asset = int(existing["id"])
+        else:
+            _sample_asset = assets.insert_asset(
+                kind="pdf",
+                storage_backend="fs",
+                storage_key=str(_BOOK_SAMPLE_PATH),
+                mime="application/pdf",
+                bytes=len(data),
+                sha256=digest,
+            )
+    except Exception:
+        logger.exception("book.sample outcome=asset_error")
+        return None
+    return _sample_asset
+
+
 async def run_dev_book_test_from_fixture(message, session_id: int) -> None:
     fixture = _load_dev_book_fixture()
     book_script = _build_book_script_from_fixture(fixture)
@@ -100,7 +132,7 @@ async def run_dev_layout_test(message, session_id: int) -> None:
 
 async def run_dev_rewrite_test(message, session_row: dict[str, Any], theme_title: str | None = None) -> None:
     book_input = build_book_input(session_row, theme_title=theme_title)
-    script = _run_rewrite_kimi(book_input)
+    script = await _run_rewrite_kimi(book_input)
     script_asset_id = _store_json_asset(session_row["id"], script)
     book_jobs.upsert_status(
         session_row["id"],
@@ -314,19 +346,20 @@ def _step_narration(step_payload: dict[str, Any]) -> str:
     return text if isinstance(text, str) else ""
 
 
-def _run_rewrite_kimi(book_input: dict[str, Any]) -> dict[str, Any]:
+async def _run_rewrite_kimi(book_input: dict[str, Any]) -> dict[str, Any]:
     prompt_key = _book_prompt_key()
     logger.info("book.rewrite started prompt_key=%s model=%s", prompt_key, _book_model_name())
     prompt = _load_book_rewrite_prompt()
     step_ctx = {
         "expected_type": "book_rewrite_v1",
+        "priority": "background",
         "story_request": {
             "prompt": prompt,
             "book_input": book_input,
             "format": "JSON {title,pages:[{page_no,heading,text,image_prompt}]}; exactly 8 pages",
         },
     }
-    result = llm_generate(step_ctx)
+    result = await llm_agenerate(step_ctx)
     parsed = result.parsed_json if isinstance(result.parsed_json, dict) else None
     if not parsed:
         parsed = _build_book_script_fallback(book_input)
@@ -427,7 +460,7 @@ async def run_book_job(message, session_row: dict[str, Any], theme_title: str |
                 raise ValueError(f"session incomplete: missing steps {missing}")
 
             if _rewrite_enabled():
-                script = _run_rewrite_kimi(book_input)
+                script = await _run_rewrite_kimi(book_input)
             else:
                 script = _build_book_script_fallback(book_input)
                 logger.info("book.rewrite skipped reason=disabled")
@@ -460,7 +493,7 @@ async def _generate_book_images(book_script: dict[str, Any], style_ref_asset_id:
         logger.info("book.images ok count=0 reason=disabled")
         return [None for _ in pages]
 
-    reference_payload: tuple[bytes, str] | None = _load_reference_payload(style_ref_asset_id)
+    reference_payload: ReferenceImage | None = _load_reference_payload(style_ref_asset_id)
 
     out: list[int | None] = []
     for idx, page in enumerate(pages, start=1):
@@ -469,8 +502,9 @@ async def _generate_book_images(book_script: dict[str, Any], style_ref_asset_id:
             if reference_payload is not None:
                 image_bytes, mime, width, height, sha256 = generate_i2i(
                     prompt,
-                    reference_bytes=reference_payload[0],
-                    reference_mime=reference_payload[1],
+                    reference_bytes=reference_payload.data,
+                    reference_mime=reference_payload.mime,
+                    reference_data_url=reference_payload.data_url(),
                 )
             else:
                 image_bytes, mime, width, height, sha256 = generate_t2i(prompt)
@@ -484,19 +518,50 @@ async def _generate_book_images(book_script: dict[str, Any], style_ref_asset_id:
             )
             out.append(asset_id)
             logger.info("book.image ok page=%s asset_id=%s", idx, asset_id)
+            await _store_print_rendition(asset_id, image_bytes)
         except Exception:
             if style_ref_asset_id is not None:
                 out.append(style_ref_asset_id)
                 logger.warning("book.image fallback page=%s source=style_ref asset_id=%s", idx, style_ref_asset_id)
+                if reference_payload is not None:
+                    await _store_print_rendition(style_ref_asset_id, reference_payload.data)
             else:
                 out.append(None)
                 logger.exception("book.image error page=%s", idx)
     return out
 
 
-def _load_reference_payload(asset_id: int | None) -> tuple[bytes, str] | None:
+async def _store_print_rendition(asset_id: int, image_bytes: bytes) -> int | None:
+    try:
+        existing = assets.get_rendition(asset_id, "print")
+        if existing:
+            return int(existing["id"])
+        rendered = (await image_renditions.arender(image_bytes, ("print",))).get("print")
+        if rendered is None:
+            return None
+        rendition_id, _ = _store_binary_asset(
+            "image",
+            rendered.data,
+            rendered.mime,
+            rendered.sha256,
+            width=rendered.width,
+            height=rendered.height,
+            original_asset_id=asset_id,
+            rendition="print",
+        )
+        return rendition_id
+    except Exception:
+        logger.exception("book.image rendition error asset_id=%s", asset_id)
+        return None
+
+
+def _load_reference_payload(asset_id: int | None) -> ReferenceImage | None:
     if asset_id is None:
         return None
+    cache = get_reference_cache()
+    cached = cache.get(asset_id)
+    if cached is not None:
+        return cached
     row = assets.get_by_id(asset_id)
     if not row:
         return None
@@ -505,7 +570,12 @@ def _load_reference_payload(asset_id: int | None) -> tuple[bytes, str] | None:
         return None
     if not _is_valid_image(path):
         return None
-    return path.read_bytes(), str(row.get("mime") or "image/png")
+    return cache.put(
+        asset_id=asset_id,
+        mime=str(row.get("mime") or "image/png"),
+        data=path.read_bytes(),
+        sha256=row.get("sha256") or None,
+    )
 
 
 def _resolve_asset_file_path(asset_row: dict[str, Any]) -> Path | None:
@@ -617,7 +687,7 @@ def _build_book_pdf_bytes(
 
         if asset_id and ImageReader is not None:
             try:
-                a = assets.get_by_id(int(asset_id))
+                a = assets.get_rendition(int(asset_id), "print") or assets.get_by_id(int(asset_id))
                 if a:
                     p = _resolve_asset_file_path(a)
                     if p is None:
@@ -738,8 +808,10 @@ def _store_binary_asset(
     *,
     width: int | None = None,
     height: int | None = None,
+    original_asset_id: int | None = None,
+    rendition: str | None = None,
 ) -> tuple[int, str]:
-    ext = "pdf" if kind == "pdf" else "json" if kind == "json" else "png"
+    ext = "pdf" if kind == "pdf" else "json" if kind == "json" else image_renditions.extension_for_mime(mime)
     storage_key = f"book/{sha256}.{ext}"
     path = _resolve_storage_path(storage_key)
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -757,6 +829,8 @@ def _store_binary_asset(
         sha256=sha256,
         width=width,
         height=height,
+        original_asset_id=original_asset_id,
+        rendition=rendition,
     )
     return asset_id, storage_key
 
@@ -767,10 +841,14 @@ async def _send_existing_pdf(message, asset_id: int) -> None:
         await message.answer("PDF уже был собран, но файл не найден. Запусти сборку ещё раз.")
         return
     path = _resolve_storage_path(row["storage_key"])
-    if not path.exists():
+    if telegram_files.cached_file_id(row, "document") is None and not path.exists():
         await message.answer("PDF уже был собран, но файл не найден. Запусти сборку ещё раз.")
         return
-    await message.answer_document(
-        document=BufferedInputFile(path.read_bytes(), filename=path.name),
-        caption="Готово! Вот твоя книжка 📘",
+    await telegram_files.send_asset(
+        asset_id=asset_id,
+        asset_row=row,
+        media="document",
+        send=lambda document: message.answer_document(document=document, caption="Готово! Вот твоя книжка 📘"),
+        load=telegram_files.read_file(path),
+        filename=path.name,
     )
@@ -9,6 +9,7 @@ from uuid import uuid4
 
 from psycopg.rows import dict_row
 
+from db import identity_cache
 from db.conn import transaction
 from db.repos import l3_turns, session_events, sessions, users
 from packages.engine.src.engine_v0_1 import init_state_v01
@@ -285,6 +286,7 @@ def fast_forward_to_final(tg_id: int) -> tuple[bool, str]:
                     meta_json={"dev_finish": True, "final_id": final_id},
                 )
             sessions.finish_with_final_in_tx(conn, int(row["id"]), final_id, {"dev_finish": True})
+        identity_cache.invalidate_session(int(row["id"]))
 
     return True, f"Финал проставлен. final_id={final_id}, step={final_step0 + 1}."
 
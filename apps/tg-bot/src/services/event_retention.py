@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+
+from db.repos import event_archive, event_partitions
+
+logger = logging.getLogger(__name__)
+
+
+def _resolve_int_env(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def retention_enabled() -> bool:
+    raw = os.getenv("EVENT_RETENTION_ENABLED", "1").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+def _partition_drop_enabled() -> bool:
+    raw = os.getenv("EVENT_PARTITION_DROP", "0").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+def ensure_event_partitions() -> list[str]:
+    created = event_partitions.ensure_partitions(
+        ahead=_resolve_int_env("EVENT_PARTITIONS_AHEAD", 2),
+        min_span=_resolve_int_env("EVENT_PARTITION_MIN_SPAN", 1000),
+    )
+    if created:
+        logger.info("db.partitions outcome=created names=%s", ",".join(created))
+    return created
+
+
+def maintain_event_partitions() -> None:
+    ensure_event_partitions()
+    detached = event_partitions.detach_expired(
+        retention_days=_resolve_int_env("EVENT_PARTITION_RETENTION_DAYS", 365),
+        drop=_partition_drop_enabled(),
+    )
+    if detached:
+        logger.info(
+            "db.partitions outcome=%s names=%s",
+            "dropped" if _partition_drop_enabled() else "detached",
+            ",".join(detached),
+        )
+
+
+async def run_retention_pass() -> int:
+    older_than_days = _resolve_int_env("EVENT_RETENTION_DAYS", 30)
+    batch_size = _resolve_int_env("EVENT_RETENTION_BATCH", 200)
+    max_batches = _resolve_int_env("EVENT_RETENTION_MAX_BATCHES", 50)
+    pause_s = _resolve_int_env("EVENT_RETENTION_PAUSE_MS", 200) / 1000
+    archived = 0
+    for _ in range(max_batches):
+        result = await asyncio.to_thread(
+            event_archive.archive_batch,
+            older_than_days=older_than_days,
+            batch_size=batch_size,
+        )
+        archived += result["archived"]
+        if result["archived"]:
+            logger.info(
+                "db.retention outcome=batch archived=%s raw_bytes=%s stored_bytes=%s",
+                result["archived"],
+                result["raw_bytes"],
+                result["stored_bytes"],
+            )
+        if result["archived"] < batch_size:
+            break
+        await asyncio.sleep(pause_s)
+    return archived
+
+
+async def run_retention_loop(stop_event: asyncio.Event) -> None:
+    interval_s = _resolve_int_env("EVENT_RETENTION_INTERVAL_S", 3600)
+    while not stop_event.is_set():
+        try:
+            await asyncio.to_thread(maintain_event_partitions)
+        except Exception:
+            logger.exception("db.partitions outcome=error")
+        if retention_enabled():
+            try:
+                archived = await run_retention_pass()
+                logger.info("db.retention outcome=pass archived=%s", archived)
+            except Exception:
+                logger.exception("db.retention outcome=error")
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=interval_s)
+        except asyncio.TimeoutError:
+            continue
@@ -4,18 +4,22 @@ import asyncio
 import hashlib
 import logging
 import os
+import socket
+import weakref
 from dataclasses import dataclass
+from typing import Any
 from pathlib import Path
 
 from aiogram import Bot
-from aiogram.types import BufferedInputFile
 
-from db.repos import assets, session_images
+from db.aio import assets, session_images
 from packages.llm.src.openrouter_image_provider import (
     MissingOpenRouterKeyError,
-    generate_i2i,
-    generate_t2i,
+    agenerate_i2i,
+    agenerate_t2i,
 )
+from src.services import image_renditions, telegram_files
+from src.services.reference_cache import get_reference_cache
 
 logger = logging.getLogger(__name__)
 
@@ -68,7 +72,45 @@ def _resolve_call_reason(*, enabled: bool, in_plan: bool, has_scene_brief: bool)
     return "eligible_for_image"
 
 
-def schedule_image_delivery(
+@dataclass
+class ImagePlan:
+    bot: Bot
+    chat_id: int
+    step_message_id: int
+    session_id: int
+    step_ui: int
+    story_step_ui: int
+    total_steps: int
+    prompt: str
+    theme_id: str | None
+    image_scene_brief: str | None
+    image_model: str
+
+    def job_payload(self) -> dict:
+        return {
+            "chat_id": self.chat_id,
+            "step_message_id": self.step_message_id,
+            "step_ui": self.step_ui,
+            "total_steps": self.total_steps,
+            "prompt": self.prompt,
+            "theme_id": self.theme_id,
+            "image_scene_brief": self.image_scene_brief,
+        }
+
+    def session_image_row(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "step_ui": self.story_step_ui,
+            "asset_id": None,
+            "role": "step_image",
+            "reference_asset_id": None,
+            "image_model": self.image_model,
+            "prompt": self.image_scene_brief.strip() if isinstance(self.image_scene_brief, str) else self.prompt,
+            "job_json": self.job_payload(),
+        }
+
+
+def plan_image_delivery(
     *,
     bot: Bot,
     chat_id: int,
@@ -81,14 +123,9 @@ def schedule_image_delivery(
     prompt: str,
     theme_id: str | None = None,
     image_scene_brief: str | None = None,
-) -> None:
+) -> ImagePlan | None:
     enabled = _step_images_enabled()
     has_image_scene_brief = isinstance(image_scene_brief, str) and image_scene_brief.strip() != ""
-    schedule = ImageSchedule(
-        story_step_ui=story_step_ui,
-        total_steps=total_steps,
-        has_image_scene_brief=has_image_scene_brief,
-    )
     in_plan = story_step_ui in image_steps(total_steps)
     reason = _resolve_call_reason(
         enabled=enabled,
@@ -113,38 +150,64 @@ def schedule_image_delivery(
             step_ui,
             story_step_ui,
         )
-        return
-    image_model = os.getenv("OPENROUTER_MODEL_IMAGE", "black-forest-labs/flux.2-pro").strip()
-    scheduled_id = session_images.insert_session_image(
+        return None
+    return ImagePlan(
+        bot=bot,
+        chat_id=chat_id,
+        step_message_id=step_message_id,
         session_id=session_id,
-        step_ui=story_step_ui,
-        asset_id=None,
-        role="step_image",
-        reference_asset_id=None,
-        image_model=image_model,
-        prompt=image_scene_brief.strip() if isinstance(image_scene_brief, str) else prompt,
+        step_ui=step_ui,
+        story_step_ui=story_step_ui,
+        total_steps=total_steps,
+        prompt=prompt,
+        theme_id=theme_id,
+        image_scene_brief=image_scene_brief,
+        image_model=os.getenv("OPENROUTER_MODEL_IMAGE", "black-forest-labs/flux.2-pro").strip(),
     )
+
+
+def start_image_delivery(plan: ImagePlan, scheduled_id: int | None) -> None:
     logger.warning(
         "TG.7.4.01 image_scheduled session_id=%s step_ui=%s story_step_ui=%s session_image_id=%s",
-        session_id,
-        step_ui,
-        story_step_ui,
+        plan.session_id,
+        plan.step_ui,
+        plan.story_step_ui,
         scheduled_id,
     )
-    asyncio.create_task(
-        _generate_and_send_image(
-            bot=bot,
-            chat_id=chat_id,
-            step_message_id=step_message_id,
-            session_id=session_id,
-            step_ui=step_ui,
-            story_step_ui=story_step_ui,
-            total_steps=total_steps,
-            prompt=prompt,
-            theme_id=theme_id,
-            image_scene_brief=image_scene_brief,
-        )
+    notify_image_workers()
+
+
+async def schedule_image_delivery(
+    *,
+    bot: Bot,
+    chat_id: int,
+    step_message_id: int,
+    session_id: int,
+    engine_step: int,
+    step_ui: int,
+    story_step_ui: int,
+    total_steps: int,
+    prompt: str,
+    theme_id: str | None = None,
+    image_scene_brief: str | None = None,
+) -> None:
+    plan = plan_image_delivery(
+        bot=bot,
+        chat_id=chat_id,
+        step_message_id=step_message_id,
+        session_id=session_id,
+        engine_step=engine_step,
+        step_ui=step_ui,
+        story_step_ui=story_step_ui,
+        total_steps=total_steps,
+        prompt=prompt,
+        theme_id=theme_id,
+        image_scene_brief=image_scene_brief,
     )
+    if plan is None:
+        return
+    scheduled_id = await session_images.insert_session_image(**plan.session_image_row())
+    start_image_delivery(plan, scheduled_id)
 
 
 async def _generate_and_send_image(
@@ -159,7 +222,8 @@ async def _generate_and_send_image(
     prompt: str,
     theme_id: str | None,
     image_scene_brief: str | None,
-) -> None:
+    attempt: int = 1,
+) -> str:
     has_image_scene_brief = isinstance(image_scene_brief, str) and image_scene_brief.strip() != ""
     schedule = ImageSchedule(
         story_step_ui=story_step_ui,
@@ -167,17 +231,16 @@ async def _generate_and_send_image(
         has_image_scene_brief=has_image_scene_brief,
     )
     if not schedule.needs_image:
-        return
+        return "not_needed"
 
     image_model = os.getenv("OPENROUTER_MODEL_IMAGE", "black-forest-labs/flux.2-pro").strip()
-    retries = _resolve_retries()
     reference_asset_id = None
     reference_payload = None
     image_mode = schedule.image_mode
     if schedule.image_mode != "t2i":
-        reference_asset_id = session_images.get_step_image_asset_id(session_id, step_ui=1)
+        reference_asset_id = await session_images.get_step_image_asset_id(session_id, step_ui=1)
         if reference_asset_id is not None:
-            reference_payload = _load_reference(reference_asset_id)
+            reference_payload = await _load_reference(reference_asset_id)
         if reference_payload is None:
             logger.warning(
                 "TG.7.4.01 image_outcome outcome=skipped reason=no_reference session_id=%s step_ui=%s story_step_ui=%s",
@@ -185,7 +248,7 @@ async def _generate_and_send_image(
                 step_ui,
                 story_step_ui,
             )
-            return
+            return "no_reference"
 
     prompt = _build_image_prompt(
         step_ui=story_step_ui,
@@ -193,108 +256,93 @@ async def _generate_and_send_image(
         theme_id=theme_id,
         image_scene_brief=image_scene_brief,
     )
-    for attempt in range(retries + 1):
+    logger.warning(
+        "TG.7.4.01 image_provider_called provider=openrouter mode=%s attempt=%s session_id=%s step_ui=%s story_step_ui=%s reference_asset_id=%s",
+        image_mode,
+        attempt,
+        session_id,
+        step_ui,
+        story_step_ui,
+        reference_asset_id,
+    )
+    try:
+        if image_mode == "t2i":
+            image_bytes, mime, width, height, sha256 = await agenerate_t2i(prompt)
+        else:
+            image_bytes, mime, width, height, sha256 = await agenerate_i2i(
+                prompt,
+                reference_payload.bytes,
+                reference_payload.mime,
+                reference_data_url=reference_payload.data_url,
+            )
+    except MissingOpenRouterKeyError:
         logger.warning(
-            "TG.7.4.01 image_provider_called provider=openrouter mode=%s attempt=%s session_id=%s step_ui=%s story_step_ui=%s reference_asset_id=%s",
-            image_mode,
-            attempt,
-            session_id,
-            step_ui,
-            story_step_ui,
-            reference_asset_id,
-        )
-        logger.info(
-            "TG.7.4.01 image_mode=%s attempt=%s session_id=%s step_ui=%s story_step_ui=%s reference_asset_id=%s",
-            schedule.image_mode,
-            attempt,
+            "TG.7.4.01 image_outcome outcome=error reason=missing_api_key session_id=%s step_ui=%s",
             session_id,
             step_ui,
-            story_step_ui,
-            reference_asset_id,
         )
-        try:
-            if image_mode == "t2i":
-                image_bytes, mime, width, height, sha256 = generate_t2i(prompt)
-            else:
-                image_bytes, mime, width, height, sha256 = generate_i2i(
-                    prompt,
-                    reference_payload.bytes,
-                    reference_payload.mime,
-                )
-            asset_id, storage_key = _store_asset(
-                image_bytes=image_bytes,
-                mime=mime,
-                width=width,
-                height=height,
-                sha256=sha256,
-            )
-            role = "step_image"
-            session_images.insert_session_image(
-                session_id=session_id,
-                step_ui=story_step_ui,
-                asset_id=asset_id,
-                role=role,
-                reference_asset_id=reference_asset_id,
-                image_model=image_model,
-                prompt=prompt,
-            )
-            await bot.send_photo(
-                chat_id=chat_id,
-                photo=BufferedInputFile(image_bytes, filename=storage_key),
-                caption="Иллюстрация",
-                reply_to_message_id=step_message_id,
-            )
-            logger.warning(
-                "TG.7.4.01 image_outcome outcome=ok reason=provider_success attempt=%s session_id=%s step_ui=%s asset_id=%s reference_asset_id=%s",
-                attempt,
-                session_id,
-                step_ui,
-                asset_id,
-                reference_asset_id,
-            )
-            logger.info(
-                "TG.7.4.01 image.step_image created session_id=%s step_ui=%s asset_id=%s ref=%s",
-                session_id,
-                step_ui,
-                asset_id,
-                "yes" if reference_asset_id else "no",
-            )
-            return
-        except MissingOpenRouterKeyError:
-            logger.warning(
-                "TG.7.4.01 image_outcome outcome=error reason=missing_api_key session_id=%s step_ui=%s",
-                session_id,
-                step_ui,
-            )
-            return
-        except Exception as exc:  # noqa: BLE001
-            reason = "simulated_failure" if "simulated image provider failure" in str(exc).lower() else "provider_error"
-            logger.warning(
-                "TG.7.4.01 image_outcome outcome=error reason=%s attempt=%s session_id=%s step_ui=%s",
-                reason,
-                attempt,
-                session_id,
-                step_ui,
-                exc_info=exc,
-            )
-            if attempt >= retries:
-                logger.warning(
-                    "TG.7.4.01 image_outcome outcome=error reason=provider_error_final session_id=%s step_ui=%s",
-                    session_id,
-                    step_ui,
-                    exc_info=exc,
-                )
-                return
+        return "missing_api_key"
+    asset_id, storage_key = await _store_asset(
+        image_bytes=image_bytes,
+        mime=mime,
+        width=width,
+        height=height,
+        sha256=sha256,
+    )
+    await session_images.insert_session_image(
+        session_id=session_id,
+        step_ui=story_step_ui,
+        asset_id=asset_id,
+        role="step_image",
+        reference_asset_id=reference_asset_id,
+        image_model=image_model,
+        prompt=prompt,
+    )
+    send_asset_id, send_key, send_bytes = await _telegram_rendition(
+        asset_id=asset_id,
+        storage_key=storage_key,
+        image_bytes=image_bytes,
+    )
+    await _send_existing_image(
+        bot=bot,
+        chat_id=chat_id,
+        step_message_id=step_message_id,
+        asset_id=send_asset_id,
+        asset_row=None,
+        load=telegram_files.in_memory(send_bytes),
+        storage_key=send_key,
+    )
+    logger.warning(
+        "TG.7.4.01 image_outcome outcome=ok reason=provider_success attempt=%s session_id=%s step_ui=%s asset_id=%s reference_asset_id=%s",
+        attempt,
+        session_id,
+        step_ui,
+        asset_id,
+        reference_asset_id,
+    )
+    logger.info(
+        "TG.7.4.01 image.step_image created session_id=%s step_ui=%s asset_id=%s ref=%s",
+        session_id,
+        step_ui,
+        asset_id,
+        "yes" if reference_asset_id else "no",
+    )
+    return "ok"
 
 
 @dataclass
 class ReferencePayload:
     bytes: bytes
     mime: str
+    data_url: str | None = None
 
 
-def _load_reference(asset_id: int) -> ReferencePayload | None:
-    asset_row = assets.get_by_id(asset_id)
+async def _load_reference(asset_id: int) -> ReferencePayload | None:
+    cache = get_reference_cache()
+    cached = cache.get(asset_id)
+    if cached is not None:
+        return ReferencePayload(bytes=cached.data, mime=cached.mime, data_url=cached.data_url())
+    asset_row = await assets.get_by_id(asset_id)
     if not asset_row:
         return None
     storage_key = asset_row.get("storage_key")
@@ -306,7 +354,13 @@ def _load_reference(asset_id: int) -> ReferencePayload | None:
     path = _resolve_storage_path(storage_key)
     if not path.exists():
         return None
-    return ReferencePayload(bytes=path.read_bytes(), mime=mime)
+    entry = cache.put(
+        asset_id=asset_id,
+        mime=mime,
+        data=await asyncio.to_thread(path.read_bytes),
+        sha256=asset_row.get("sha256") or None,
+    )
+    return ReferencePayload(bytes=entry.data, mime=entry.mime, data_url=await asyncio.to_thread(entry.data_url))
 
 
 async def _send_existing_image(
@@ -314,19 +368,28 @@ async def _send_existing_image(
     bot: Bot,
     chat_id: int,
     step_message_id: int,
-    image_bytes: bytes,
+    asset_id: int | None,
+    asset_row: dict | None,
+    load,
     storage_key: str,
 ) -> None:
-    await bot.send_photo(
-        chat_id=chat_id,
-        photo=BufferedInputFile(image_bytes, filename=storage_key),
-        caption="Иллюстрация",
-        reply_to_message_id=step_message_id,
+    await telegram_files.send_asset(
+        asset_id=asset_id,
+        asset_row=asset_row,
+        media="photo",
+        send=lambda photo: bot.send_photo(
+            chat_id=chat_id,
+            photo=photo,
+            caption="Иллюстрация",
+            reply_to_message_id=step_message_id,
+        ),
+        load=load,
+        filename=storage_key,
     )
 
 
-def _resolve_storage_key(asset_id: int) -> str:
-    asset_row = assets.get_by_id(asset_id)
+async def _resolve_storage_key(asset_id: int) -> str:
+    asset_row = await assets.get_by_id(asset_id)
     storage_key = asset_row.get("storage_key") if asset_row else None
     if isinstance(storage_key, str) and storage_key:
         return storage_key
@@ -370,7 +433,7 @@ async def _wait_for_reference(
     delay_s: float = 3.0,
 ) -> int | None:
     for idx in range(attempts):
-        reference_asset_id = session_images.get_step_image_asset_id(session_id, step_ui=1)
+        reference_asset_id = await session_images.get_step_image_asset_id(session_id, step_ui=1)
         if reference_asset_id is not None:
             return reference_asset_id
         if idx < attempts - 1:
@@ -378,16 +441,6 @@ async def _wait_for_reference(
     return None
 
 
-def _resolve_retries() -> int:
-    raw = os.getenv("IMAGE_RETRY", "1").strip()
-    if not raw:
-        return 1
-    try:
-        return max(0, int(raw))
-    except ValueError:
-        return 1
-
-
 def _resolve_assets_root() -> Path:
     root = os.getenv(_ASSETS_ROOT_ENV, _DEFAULT_ASSETS_ROOT).strip()
     if not root:
@@ -402,21 +455,20 @@ def _resolve_storage_path(storage_key: str) -> Path:
     return _resolve_assets_root() / storage_key
 
 
-def _store_asset(
+async def _store_asset(
     *,
     image_bytes: bytes,
     mime: str,
     width: int | None,
     height: int | None,
     sha256: str | None = None,
+    original_asset_id: int | None = None,
+    rendition: str | None = None,
 ) -> tuple[int, str]:
     digest = sha256 or hashlib.sha256(image_bytes).hexdigest()
-    storage_key = f"{_ASSETS_IMAGE_DIR}/{digest}.png"
-    path = _resolve_storage_path(storage_key)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    if not path.exists():
-        path.write_bytes(image_bytes)
-    asset_id = assets.insert_asset(
+    storage_key = f"{_ASSETS_IMAGE_DIR}/{digest}.{image_renditions.extension_for_mime(mime)}"
+    await asyncio.to_thread(_write_asset_file, _resolve_storage_path(storage_key), image_bytes)
+    asset_id = await assets.insert_asset(
         kind="image",
         storage_backend="fs",
         storage_key=storage_key,
@@ -425,5 +477,272 @@ def _store_asset(
         sha256=digest,
         width=width,
         height=height,
+        original_asset_id=original_asset_id,
+        rendition=rendition,
     )
     return asset_id, storage_key
+
+
+async def _telegram_rendition(*, asset_id: int, storage_key: str, image_bytes: bytes) -> tuple[int, str, bytes]:
+    try:
+        rendered = (await image_renditions.arender(image_bytes, ("telegram",))).get("telegram")
+        if rendered is None:
+            return asset_id, storage_key, image_bytes
+        rendition_id, rendition_key = await _store_asset(
+            image_bytes=rendered.data,
+            mime=rendered.mime,
+            width=rendered.width,
+            height=rendered.height,
+            sha256=rendered.sha256,
+            original_asset_id=asset_id,
+            rendition="telegram",
+        )
+        return rendition_id, rendition_key, rendered.data
+    except Exception:
+        logger.exception("image.rendition outcome=fallback rendition=telegram asset_id=%s", asset_id)
+        return asset_id, storage_key, image_bytes
+
+
+def _write_asset_file(path: Path, image_bytes: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if not path.exists():
+        path.write_bytes(image_bytes)
+
+
+def _resolve_int_env(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def _image_workers_enabled() -> bool:
+    raw = os.getenv("IMAGE_JOB_WORKERS_ENABLED", "1").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+def resolve_worker_id() -> str:
+    raw = os.getenv("IMAGE_JOB_WORKER_ID", "").strip()
+    return raw or f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def _send_stored_image(*, bot: Bot, asset_id: int, chat_id: int, step_message_id: int) -> bool:
+    rendition_row = await assets.get_rendition(asset_id, "telegram")
+    asset_row = rendition_row or await assets.get_by_id(asset_id)
+    if rendition_row:
+        asset_id = int(rendition_row["id"])
+    storage_key = asset_row.get("storage_key") if asset_row else None
+    if not isinstance(storage_key, str) or not storage_key:
+        return False
+    path = _resolve_storage_path(storage_key)
+    if telegram_files.cached_file_id(asset_row, "photo") is None and not path.exists():
+        return False
+    await _send_existing_image(
+        bot=bot,
+        chat_id=chat_id,
+        step_message_id=step_message_id,
+        asset_id=asset_id,
+        asset_row=asset_row,
+        load=telegram_files.read_file(path),
+        storage_key=storage_key,
+    )
+    return True
+
+
+class ImageJobWorker:
+    def __init__(self, bot: Bot, *, owner: str | None = None) -> None:
+        self.bot = bot
+        self.owner = owner or resolve_worker_id()
+        self.concurrency = _resolve_int_env("IMAGE_JOB_CONCURRENCY", 2)
+        self.poll_s = _resolve_int_env("IMAGE_JOB_POLL_MS", 1000) / 1000
+        self.lease_s = _resolve_int_env("IMAGE_JOB_LEASE_S", 300)
+        self.max_attempts = _resolve_int_env("IMAGE_JOB_MAX_ATTEMPTS", 2)
+        self.retry_delay_s = _resolve_int_env("IMAGE_JOB_RETRY_DELAY_S", 10)
+        self.reference_wait_s = _resolve_int_env("IMAGE_JOB_REFERENCE_WAIT_S", 5)
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self._active: set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            free = self.concurrency - len(self._active)
+            claimed: list[dict[str, Any]] = []
+            if free > 0:
+                try:
+                    claimed = await session_images.claim_jobs(self.owner, limit=free, lease_s=self.lease_s)
+                except Exception:
+                    logger.exception("image.jobs outcome=claim_error owner=%s", self.owner)
+            for job in claimed:
+                task = asyncio.create_task(self._run_job(job))
+                self._active.add(task)
+                task.add_done_callback(self._job_done)
+            if claimed and len(claimed) == free:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_s)
+            except asyncio.TimeoutError:
+                continue
+
+    async def stop(self) -> None:
+        tasks = [task for task in (self._task, *self._active) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        released = await session_images.release_jobs(self.owner, refund_attempt=True)
+        logger.info("image.jobs outcome=stopped owner=%s released=%s", self.owner, released)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "active": len(self._active),
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    def _job_done(self, task: asyncio.Task) -> None:
+        self._active.discard(task)
+        self._wakeup.set()
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("image.jobs outcome=error owner=%s", self.owner, exc_info=task.exception())
+
+    async def _run_job(self, job: dict[str, Any]) -> None:
+        job_id = int(job["id"])
+        session_id = int(job["session_id"])
+        attempt = int(job.get("attempts") or 1)
+        if attempt > self.max_attempts:
+            self.failed += 1
+            await session_images.fail_job(job_id, self.owner, reason="attempts_exhausted")
+            logger.warning(
+                "image.jobs outcome=failed reason=attempts_exhausted job_id=%s session_id=%s", job_id, session_id
+            )
+            return
+        try:
+            outcome = await self._process(job, attempt)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            state = await session_images.retry_job(
+                job_id,
+                self.owner,
+                error=f"{type(exc).__name__}: {exc}",
+                delay_s=self.retry_delay_s,
+                max_attempts=self.max_attempts,
+            )
+            if state == "failed":
+                self.failed += 1
+            else:
+                self.retried += 1
+            logger.warning(
+                "TG.7.4.01 image_outcome outcome=error reason=provider_error attempt=%s session_id=%s job_id=%s job_state=%s",
+                attempt,
+                session_id,
+                job_id,
+                state,
+                exc_info=exc,
+            )
+            return
+        if outcome == "ok":
+            self.completed += 1
+            if not await session_images.complete_job(job_id, self.owner):
+                logger.warning("image.jobs outcome=lease_lost job_id=%s session_id=%s", job_id, session_id)
+            return
+        if outcome == "no_reference":
+            reference_state = await session_images.get_step_image_job_state(session_id, 1)
+            if reference_state in {"pending", "running"}:
+                await session_images.defer_job(
+                    job_id, self.owner, delay_s=self.reference_wait_s, reason="waiting_for_reference"
+                )
+                logger.info("image.jobs outcome=deferred reason=waiting_for_reference job_id=%s", job_id)
+                return
+        self.failed += 1
+        await session_images.fail_job(job_id, self.owner, reason=outcome)
+        logger.warning("image.jobs outcome=failed reason=%s job_id=%s session_id=%s", outcome, job_id, session_id)
+
+    async def _process(self, job: dict[str, Any], attempt: int) -> str:
+        payload = job.get("job_json") or {}
+        chat_id = int(payload["chat_id"])
+        step_message_id = int(payload["step_message_id"])
+        if job.get("asset_id") is not None:
+            sent = await _send_stored_image(
+                bot=self.bot,
+                asset_id=int(job["asset_id"]),
+                chat_id=chat_id,
+                step_message_id=step_message_id,
+            )
+            return "ok" if sent else "asset_missing"
+        return await _generate_and_send_image(
+            bot=self.bot,
+            chat_id=chat_id,
+            step_message_id=step_message_id,
+            session_id=int(job["session_id"]),
+            step_ui=int(payload.get("step_ui") or job["step_ui"]),
+            story_step_ui=int(job["step_ui"]),
+            total_steps=int(payload["total_steps"]),
+            prompt=str(payload.get("prompt") or job.get("prompt") or ""),
+            theme_id=payload.get("theme_id"),
+            image_scene_brief=payload.get("image_scene_brief"),
+            attempt=attempt,
+        )
+
+
+_workers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ImageJobWorker]" = weakref.WeakKeyDictionary()
+
+
+def get_image_worker() -> ImageJobWorker | None:
+    return _workers.get(asyncio.get_running_loop())
+
+
+def notify_image_workers() -> None:
+    try:
+        worker = get_image_worker()
+    except RuntimeError:
+        return
+    if worker is not None:
+        worker.notify()
+
+
+async def recover_image_jobs() -> dict[str, int]:
+    released = await session_images.release_jobs(resolve_worker_id(), refund_attempt=False)
+    counts = await session_images.job_counts()
+    logger.info(
+        "image.jobs outcome=recovered released=%s pending=%s running=%s",
+        released,
+        counts.get("pending", 0),
+        counts.get("running", 0),
+    )
+    return {"released": released, **counts}
+
+
+def start_image_workers(bot: Bot) -> ImageJobWorker | None:
+    if not _image_workers_enabled():
+        logger.info("image.jobs outcome=disabled")
+        return None
+    loop = asyncio.get_running_loop()
+    worker = _workers.get(loop)
+    if worker is None:
+        worker = ImageJobWorker(bot)
+        _workers[loop] = worker
+    worker.start()
+    logger.info("image.jobs outcome=started owner=%s concurrency=%s", worker.owner, worker.concurrency)
+    return worker
+
+
+async def stop_image_workers() -> None:
+    worker = _workers.pop(asyncio.get_running_loop(), None)
+    if worker is not None:
+        await worker.stop()
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict, Iterable
+
+try:
+    from PIL import Image
+except Exception:  # pragma: no cover - optional runtime dependency
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+_EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/webp": "webp",
+    "image/gif": "gif",
+    "application/pdf": "pdf",
+    "application/json": "json",
+}
+
+
+def _resolve_int_env(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def extension_for_mime(mime: str | None) -> str:
+    return _EXTENSIONS.get((mime or "").split(";")[0].strip().lower(), "bin")
+
+
+@dataclass(frozen=True)
+class RenditionSpec:
+    name: str
+    format: str
+    max_side: int
+    quality: int
+
+    @property
+    def mime(self) -> str:
+        return "image/webp" if self.format == "WEBP" else "image/jpeg"
+
+
+@dataclass
+class Rendition:
+    name: str
+    data: bytes
+    mime: str
+    width: int
+    height: int
+    sha256: str
+
+
+def rendition_spec(name: str) -> RenditionSpec:
+    if name == "telegram":
+        raw = os.getenv("IMAGE_TELEGRAM_FORMAT", "jpeg").strip().lower()
+        return RenditionSpec(
+            name=name,
+            format="WEBP" if raw == "webp" else "JPEG",
+            max_side=_resolve_int_env("IMAGE_TELEGRAM_MAX_SIDE", 1280),
+            quality=min(_resolve_int_env("IMAGE_TELEGRAM_QUALITY", 85), 100),
+        )
+    if name == "print":
+        return RenditionSpec(
+            name=name,
+            format="JPEG",
+            max_side=_resolve_int_env("IMAGE_PRINT_MAX_SIDE", 2480),
+            quality=min(_resolve_int_env("IMAGE_PRINT_QUALITY", 90), 100),
+        )
+    raise ValueError("rendition must be telegram or print")
+
+
+def render(image_bytes: bytes, spec: RenditionSpec) -> Rendition | None:
+    if Image is None:
+        return None
+    with Image.open(BytesIO(image_bytes)) as source:
+        source.load()
+        img = source
+        if img.mode in ("RGBA", "LA", "P"):
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        if max(img.size) > spec.max_side:
+            img.thumbnail((spec.max_side, spec.max_side), Image.LANCZOS)
+        out = BytesIO()
+        if spec.format == "WEBP":
+            img.save(out, format="WEBP", quality=spec.quality, method=4)
+        else:
+            img.save(out, format="JPEG", quality=spec.quality, optimize=True, progressive=True)
+        width, height = img.size
+    data = out.getvalue()
+    if len(data) >= len(image_bytes):
+        return None
+    return Rendition(
+        name=spec.name,
+        data=data,
+        mime=spec.mime,
+        width=width,
+        height=height,
+        sha256=hashlib.sha256(data).hexdigest(),
+    )
+
+
+def _render_safely(image_bytes: bytes, name: str) -> Rendition | None:
+    try:
+        return render(image_bytes, rendition_spec(name))
+    except Exception:
+        logger.exception("image.rendition outcome=error rendition=%s", name)
+        return None
+
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=_resolve_int_env("IMAGE_RENDITION_WORKERS", 2),
+            thread_name_prefix="image-rendition",
+        )
+    return _executor
+
+
+async def arender(image_bytes: bytes, names: Iterable[str]) -> Dict[str, Rendition]:
+    loop = asyncio.get_running_loop()
+    names = list(names)
+    results = await asyncio.gather(
+        *(loop.run_in_executor(_get_executor(), _render_safely, image_bytes, name) for name in names)
+    )
+    out = {name: result for name, result in zip(names, results) if result is not None}
+    for rendition in out.values():
+        logger.info(
+            "image.rendition outcome=ok rendition=%s bytes_in=%s bytes_out=%s size=%sx%s",
+            rendition.name,
+            len(image_bytes),
+            len(rendition.data),
+            rendition.width,
+            rendition.height,
+        )
+    return out
+
+
+def close_rendition_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,26 +1,35 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
+import os
 from dataclasses import dataclass
 import copy
 from typing import Any, Dict, Literal
 
+from db import jsonb_patch
 from db.repos import l3_turns
 from packages.engine.src.engine_v0_1 import apply_turn, init_state_v01
+from src.services import speculation
 from src.services.content_stub import build_content_step
 from src.services.story_runtime import (
     StepView,
-    build_final_step_result,
+    abuild_final_step_result,
+    abuild_step_result,
+    abuild_turn_step_result,
+    arender_current_step,
     build_story_request,
-    build_step_result,
     expected_type_for_step,
-    render_current_step,
+    predict_next_state,
     step_result_to_view,
 )
-from packages.llm.src import generate as llm_generate
+from packages.llm.src import agenerate as llm_agenerate
+from packages.llm.src.streaming import TextCallback
 
 TurnStatus = Literal["accepted", "duplicate", "stale", "invalid"]
 
+_RESERVATION_POLL_S = 0.5
+
 
 @dataclass
 class L3TurnResult:
@@ -44,7 +53,16 @@ def _fingerprint(
     return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
-def apply_l3_turn(
+def _resolve_reservation_lease_s() -> float:
+    raw = os.getenv("L3_RESERVATION_LEASE_S", "150").strip()
+    try:
+        value = float(raw)
+    except ValueError:
+        return 150.0
+    return value if value > 0 else 150.0
+
+
+async def apply_l3_turn(
     *,
     tg_id: int,
     sid8: str,
@@ -52,6 +70,7 @@ def apply_l3_turn(
     turn: Dict[str, Any],
     source_message_id: int,
     req_id: str | None = None,
+    on_text: TextCallback | None = None,
 ) -> L3TurnResult | None:
     kind = turn.get("kind")
     if kind not in {"choice", "free_text"}:
@@ -82,167 +101,43 @@ def apply_l3_turn(
             step=st2,
             theme_id=None,
             final_id=None,
-            max_steps=int(result.session_row.get("max_steps", 0)) if result and result.session_row else None,
-        )
-    def _apply_in_tx(session_row: Dict[str, Any]) -> l3_turns.L3ApplyPayload:
-        params = session_row.get("params_json") or {}
-        if not isinstance(params, dict) or params.get("v") != "0.1":
-            state = init_state_v01(session_row.get("max_steps", 8))
-        else:
-            state = params
-        state_before = copy.deepcopy(state)
-        content = build_content_step(session_row["theme_id"], state["step0"], state)
-        llm_obj: Dict[str, Any] = {}
-        expected_type = expected_type_for_step(state_before["step0"], state_before["n"])
-        story_request = build_story_request(
-            theme_id=session_row.get("theme_id"),
-            state=state_before,
-            content=content,
-            recaps=[],
-            last_choice=None,
-            child_name=session_row.get("child_name"),
-        )
-        story_request["turn"] = {
-            "kind": turn.get("kind"),
-            "choice_id": turn.get("choice_id"),
-            "text": turn.get("text"),
-        }
-        llm_result = llm_generate(
-            {
-                "expected_type": expected_type,
-                "theme_id": session_row.get("theme_id"),
-                "step": state_before.get("step0"),
-                "total_steps": state_before.get("n"),
-                "allow_free_text": state_before.get("free_text_allowed_after"),
-                "engine_input": state_before,
-                "story_request": story_request,
-            }
-        )
-        if isinstance(llm_result.parsed_json, dict):
-            llm_obj = llm_result.parsed_json
-        if turn.get("kind") == "free_text":
-            classifier_result = llm_obj.get("classifier_result") if isinstance(llm_obj, dict) else None
-            turn["classifier_result"] = classifier_result if isinstance(classifier_result, dict) else None
-        new_state, step_log = apply_turn(state, turn, content)
-        turn_kind = turn.get("kind", "")
-        payload_value = turn.get("choice_id") or turn.get("text") or ""
-        fingerprint = _fingerprint(
-            session_row["id"], state["step0"], turn_kind, payload_value, source_message_id
-        )
-        llm_json = {
-            "engine_step_log": step_log,
-            "turn_fingerprint": fingerprint,
-            "turn": turn,
-        }
-        deltas_json = {
-            "applied_deltas": step_log["applied_deltas"],
-            "neutral_reason": step_log.get("neutral_reason"),
-            "milestone_vote_current": step_log.get("milestone_vote_current"),
-        }
-        if step_log["final_id"]:
-            step_result_json = build_final_step_result(
-                step_log["final_id"],
-                theme_id=session_row.get("theme_id"),
-                req_id=req_id,
-            )
-        else:
-            step_result_json = build_step_result(
-                {**session_row, "params_json": new_state},
-                state=new_state,
-                req_id=req_id,
-            )
-        if isinstance(step_result_json, dict):
-            step_result_json.setdefault("step_index", int(new_state.get("step0", 0)) + 1)
-            step_result_json.setdefault("narration_text", step_result_json.get("text") or "")
-            if isinstance(step_result_json.get("choices"), list):
-                normalized_choices = []
-                for ch in step_result_json.get("choices", []):
-                    if not isinstance(ch, dict):
-                        continue
-                    cid = ch.get("choice_id") or ch.get("id")
-                    label = ch.get("label") or ch.get("text")
-                    if isinstance(cid, str) and isinstance(label, str):
-                        normalized_choices.append({"id": cid, "text": label})
-                step_result_json["protocol_choices"] = normalized_choices
-            step_result_json["chosen_choice_id"] = turn.get("choice_id")
-            step_result_json["story_step_json"] = copy.deepcopy(step_result_json)
-        finish_status = None
-        final_id = step_log["final_id"]
-        final_meta = step_log["final_meta"] or {}
-        if final_id is None and isinstance(step_result_json, dict):
-            sr_final = step_result_json.get("final_id")
-            if isinstance(sr_final, str) and sr_final.strip():
-                final_id = sr_final.strip()
-        if final_id is None and new_state["step0"] >= new_state["n"] - 1:
-            final_id = f"final_step_{session_row['id']}_{new_state['step0'] + 1}"
-            finish_status = "FINISHED"
-            if isinstance(step_result_json, dict):
-                step_result_json["final_id"] = final_id
-                step_result_json.setdefault("choices", [])
-        if final_id and not finish_status:
-            finish_status = "FINISHED"
-        facts_json = session_row.get("facts_json") or {}
-        if not isinstance(facts_json, dict):
-            facts_json = {}
-        recaps = facts_json.get("recaps")
-        if not isinstance(recaps, list):
-            recaps = []
-        recap_short = None
-        if isinstance(step_result_json, dict):
-            recap_short = step_result_json.get("recap_short")
-        if isinstance(recap_short, str) and recap_short.strip():
-            recaps.append({"step": state_before["step0"], "recap": recap_short.strip()})
-        recaps = recaps[-5:]
-        facts_json["recaps"] = recaps
-        if turn.get("choice_id"):
-            facts_json["last_choice"] = {"choice_id": turn.get("choice_id")}
-        engine_snapshot = {
-            "step": state_before["step0"],
-            "choice_id": turn.get("choice_id"),
-            "state_before": state_before,
-            "state_after": new_state,
-            "milestone_id": step_log.get("milestone_id"),
-            "final_id": final_id,
-        }
-        history = facts_json.get("engine_history")
-        if not isinstance(history, list):
-            history = []
-        history.append(engine_snapshot)
-        facts_json["engine_history"] = history[-5:]
-        facts_json["last_engine_output"] = engine_snapshot
-        meta_json = {
-            "turn_fingerprint": fingerprint,
-            "source_message_id": source_message_id,
-            "req_id": req_id,
-            "engine_input": state_before,
-            "engine_output": facts_json.get("last_engine_output"),
-        }
-        return l3_turns.L3ApplyPayload(
-            new_state=new_state,
-            llm_json=llm_json,
-            deltas_json=deltas_json,
-            step_result_json=step_result_json,
-            meta_json=meta_json,
-            facts_json=facts_json,
-            finish_status=finish_status,
-            final_id=final_id,
-            final_meta=final_meta,
+            max_steps=None,
         )
 
     base_meta_json = {
         "req_id": req_id,
         "source_message_id": source_message_id,
     }
-    result = l3_turns.apply_l3_turn_atomic(
-        tg_id=tg_id,
-        sid8=sid8,
-        expected_step=st2,
-        step=st2,
-        user_input=turn.get("text"),
-        choice_id=turn.get("choice_id"),
-        base_meta_json=base_meta_json,
-        apply_fn=_apply_in_tx,
-    )
+    lease_s = _resolve_reservation_lease_s()
+    while True:
+        result = await asyncio.to_thread(
+            l3_turns.reserve_l3_turn,
+            tg_id=tg_id,
+            sid8=sid8,
+            expected_step=st2,
+            step=st2,
+            user_input=turn.get("text"),
+            choice_id=turn.get("choice_id"),
+            lease_s=lease_s,
+            base_meta_json=base_meta_json,
+        )
+        if result and result.outcome == "reserved":
+            reservation = result.reservation
+            try:
+                payload = await _build_turn_payload(
+                    reservation.session_row,
+                    turn,
+                    source_message_id=source_message_id,
+                    req_id=req_id,
+                    on_text=on_text,
+                )
+                result = await asyncio.to_thread(l3_turns.commit_l3_turn, reservation, payload)
+            except BaseException:
+                await asyncio.shield(asyncio.to_thread(l3_turns.release_l3_turn, reservation))
+                raise
+        if not result or result.outcome != "pending":
+            break
+        await asyncio.sleep(_RESERVATION_POLL_S)
     if not result:
         return None
     if result.outcome == "stale":
@@ -278,7 +173,7 @@ def apply_l3_turn(
                 step=st2,
             )
         else:
-            step_view = render_current_step(result.session_row, req_id=req_id)
+            step_view = await arender_current_step(result.session_row, req_id=req_id)
         final_id = step_view.final_id
         return L3TurnResult(
             status="duplicate",
@@ -304,3 +199,176 @@ def apply_l3_turn(
         final_id=payload.final_id or step_view.final_id,
         max_steps=int(result.session_row.get("max_steps", 0)) if result and result.session_row else None,
     )
+
+
+async def _build_turn_payload(
+    session_row: Dict[str, Any],
+    turn: Dict[str, Any],
+    *,
+    source_message_id: int,
+    req_id: str | None,
+    on_text: TextCallback | None = None,
+) -> l3_turns.L3ApplyPayload:
+    params = session_row.get("params_json") or {}
+    if not isinstance(params, dict) or params.get("v") != "0.1":
+        state = init_state_v01(session_row.get("max_steps", 8))
+    else:
+        state = params
+    state_before = copy.deepcopy(state)
+    content = build_content_step(session_row["theme_id"], state["step0"], state)
+    expected_type = expected_type_for_step(state_before["step0"], state_before["n"])
+    story_request = build_story_request(
+        theme_id=session_row.get("theme_id"),
+        state=state_before,
+        content=content,
+        recaps=[],
+        last_choice=None,
+        child_name=session_row.get("child_name"),
+    )
+    story_request["turn"] = {
+        "kind": turn.get("kind"),
+        "choice_id": turn.get("choice_id"),
+        "text": turn.get("text"),
+    }
+    classify_ctx = {
+        "expected_type": expected_type,
+        "theme_id": session_row.get("theme_id"),
+        "step": state_before.get("step0"),
+        "total_steps": state_before.get("n"),
+        "allow_free_text": state_before.get("free_text_allowed_after"),
+        "engine_input": state_before,
+        "story_request": story_request,
+    }
+    predicted_state = predict_next_state(state, turn, content)
+    merged_step_result: Dict[str, Any] | None = None
+    classifier_result: Dict[str, Any] | None = None
+    if predicted_state is not None and turn.get("kind") == "choice":
+        merged_step_result = await speculation.claim(session_row, turn.get("choice_id"))
+    if predicted_state is not None and merged_step_result is None:
+        turn_step = await abuild_turn_step_result(
+            {**session_row, "params_json": predicted_state},
+            predicted_state,
+            turn,
+            classify_ctx=classify_ctx if turn.get("kind") == "free_text" else None,
+            state_for=lambda resolved: apply_turn(
+                copy.deepcopy(state), {**turn, "classifier_result": resolved}, content
+            )[0],
+            req_id=req_id,
+            on_text=on_text,
+        )
+        classifier_result = turn_step.classifier_result
+        merged_step_result = turn_step.step_result
+    elif predicted_state is None:
+        llm_result = await llm_agenerate(classify_ctx)
+        llm_obj = llm_result.parsed_json if isinstance(llm_result.parsed_json, dict) else {}
+        classifier_result = llm_obj.get("classifier_result")
+    if turn.get("kind") == "free_text":
+        turn["classifier_result"] = classifier_result if isinstance(classifier_result, dict) else None
+    new_state, step_log = apply_turn(state, turn, content)
+    turn_kind = turn.get("kind", "")
+    payload_value = turn.get("choice_id") or turn.get("text") or ""
+    fingerprint = _fingerprint(
+        session_row["id"], state["step0"], turn_kind, payload_value, source_message_id
+    )
+    llm_json = {
+        "engine_step_log": step_log,
+        "turn_fingerprint": fingerprint,
+        "turn": turn,
+    }
+    deltas_json = {
+        "applied_deltas": step_log["applied_deltas"],
+        "neutral_reason": step_log.get("neutral_reason"),
+        "milestone_vote_current": step_log.get("milestone_vote_current"),
+    }
+    if step_log["final_id"]:
+        step_result_json = await abuild_final_step_result(
+            step_log["final_id"],
+            theme_id=session_row.get("theme_id"),
+            req_id=req_id,
+            on_text=on_text,
+        )
+    elif merged_step_result is not None:
+        step_result_json = merged_step_result
+    else:
+        step_result_json = await abuild_step_result(
+            {**session_row, "params_json": new_state},
+            state=new_state,
+            req_id=req_id,
+            on_text=on_text,
+        )
+    if isinstance(step_result_json, dict):
+        step_result_json.setdefault("step_index", int(new_state.get("step0", 0)) + 1)
+        step_result_json.setdefault("narration_text", step_result_json.get("text") or "")
+        if isinstance(step_result_json.get("choices"), list):
+            normalized_choices = []
+            for ch in step_result_json.get("choices", []):
+                if not isinstance(ch, dict):
+                    continue
+                cid = ch.get("choice_id") or ch.get("id")
+                label = ch.get("label") or ch.get("text")
+                if isinstance(cid, str) and isinstance(label, str):
+                    normalized_choices.append({"id": cid, "text": label})
+            step_result_json["protocol_choices"] = normalized_choices
+        step_result_json["chosen_choice_id"] = turn.get("choice_id")
+        step_result_json["story_step_json"] = copy.deepcopy(step_result_json)
+    finish_status = None
+    final_id = step_log["final_id"]
+    final_meta = step_log["final_meta"] or {}
+    if final_id is None and isinstance(step_result_json, dict):
+        sr_final = step_result_json.get("final_id")
+        if isinstance(sr_final, str) and sr_final.strip():
+            final_id = sr_final.strip()
+    if final_id is None and new_state["step0"] >= new_state["n"] - 1:
+        final_id = f"final_step_{session_row['id']}_{new_state['step0'] + 1}"
+        finish_status = "FINISHED"
+        if isinstance(step_result_json, dict):
+            step_result_json["final_id"] = final_id
+            step_result_json.setdefault("choices", [])
+    if final_id and not finish_status:
+        finish_status = "FINISHED"
+    facts_patch: list[jsonb_patch.JsonbOp] = []
+    recap_short = None
+    if isinstance(step_result_json, dict):
+        recap_short = step_result_json.get("recap_short")
+    if isinstance(recap_short, str) and recap_short.strip():
+        recap = {"step": state_before["step0"], "recap": recap_short.strip()}
+        facts_patch.append(jsonb_patch.append(["recaps"], recap, keep_last=5))
+    if turn.get("choice_id"):
+        facts_patch.append(jsonb_patch.set_path(["last_choice"], {"choice_id": turn.get("choice_id")}))
+    engine_snapshot = {
+        "step": state_before["step0"],
+        "choice_id": turn.get("choice_id"),
+        "state_before": state_before,
+        "state_after": new_state,
+        "milestone_id": step_log.get("milestone_id"),
+        "final_id": final_id,
+    }
+    facts_patch.append(jsonb_patch.append(["engine_history"], engine_snapshot, keep_last=5))
+    facts_patch.append(jsonb_patch.set_path(["last_engine_output"], engine_snapshot))
+    facts_json = session_row.get("facts_json") or {}
+    if not isinstance(facts_json, dict):
+        facts_json = {}
+    if not isinstance(facts_json.get("recaps"), list):
+        facts_patch.insert(0, jsonb_patch.set_path(["recaps"], []))
+    facts_json = jsonb_patch.apply(facts_json, facts_patch)
+    params_patch = jsonb_patch.diff(state_before, new_state) if state is params else None
+    meta_json = {
+        "turn_fingerprint": fingerprint,
+        "source_message_id": source_message_id,
+        "req_id": req_id,
+        "engine_input": state_before,
+        "engine_output": facts_json.get("last_engine_output"),
+    }
+    return l3_turns.L3ApplyPayload(
+        new_state=new_state,
+        llm_json=llm_json,
+        deltas_json=deltas_json,
+        step_result_json=step_result_json,
+        meta_json=meta_json,
+        facts_json=facts_json,
+        params_patch=params_patch,
+        facts_patch=facts_patch,
+        finish_status=finish_status,
+        final_id=final_id,
+        final_meta=final_meta,
+    )
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+
+
+def _resolve_int_env(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+class ReferenceImage:
+    def __init__(self, *, asset_id: int | None, sha256: str, mime: str, data: bytes) -> None:
+        self.asset_id = asset_id
+        self.sha256 = sha256
+        self.mime = mime
+        self.data = data
+        self._data_url: str | None = None
+        self._owner: ReferenceCache | None = None
+
+    @property
+    def size(self) -> int:
+        return len(self.data) + (len(self._data_url) if self._data_url is not None else 0)
+
+    def data_url(self) -> str:
+        if self._data_url is None:
+            encoded = base64.b64encode(self.data).decode("ascii")
+            data_url = f"data:{self.mime};base64,{encoded}"
+            owner = self._owner
+            if owner is not None:
+                owner._attach_data_url(self, data_url)
+            elif self._data_url is None:
+                self._data_url = data_url
+        return self._data_url
+
+
+class ReferenceCache:
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, ReferenceImage]" = OrderedDict()
+        self._by_asset: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, asset_id: int) -> ReferenceImage | None:
+        with self._lock:
+            sha256 = self._by_asset.get(asset_id)
+            return self._touch(sha256)
+
+    def get_by_sha256(self, sha256: str) -> ReferenceImage | None:
+        with self._lock:
+            return self._touch(sha256)
+
+    def put(self, *, asset_id: int | None, mime: str, data: bytes, sha256: str | None = None) -> ReferenceImage:
+        digest = sha256 or hashlib.sha256(data).hexdigest()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                entry = ReferenceImage(asset_id=asset_id, sha256=digest, mime=mime, data=data)
+                if entry.size > self.max_bytes:
+                    return entry
+                entry._owner = self
+                self._entries[digest] = entry
+                self.bytes += entry.size
+            else:
+                self._entries.move_to_end(digest)
+            if asset_id is not None:
+                self._by_asset[asset_id] = digest
+            self._evict(keep=digest)
+            return entry
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry in self._entries.values():
+                entry._owner = None
+            self._entries.clear()
+            self._by_asset.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def _touch(self, sha256: str | None) -> ReferenceImage | None:
+        entry = self._entries.get(sha256) if sha256 is not None else None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(sha256)
+        self.hits += 1
+        return entry
+
+    def _attach_data_url(self, entry: ReferenceImage, data_url: str) -> None:
+        with self._lock:
+            if entry._data_url is not None:
+                return
+            entry._data_url = data_url
+            if self._entries.get(entry.sha256) is entry:
+                self.bytes += len(data_url)
+                self._evict(keep=entry.sha256)
+
+    def _evict(self, *, keep: str) -> None:
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            sha256, entry = next(iter(self._entries.items()))
+            if sha256 == keep:
+                self._entries.move_to_end(sha256)
+                continue
+            del self._entries[sha256]
+            entry._owner = None
+            self.bytes -= entry.size
+            self.evictions += 1
+            for asset_id in [key for key, value in self._by_asset.items() if value == sha256]:
+                del self._by_asset[asset_id]
+
+
+_cache: ReferenceCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_reference_cache() -> ReferenceCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ReferenceCache(_resolve_int_env("IMAGE_REFERENCE_CACHE_MB", 64) * 1024 * 1024)
+        return _cache
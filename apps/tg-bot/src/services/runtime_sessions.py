@@ -4,6 +4,7 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Literal
 
+from db import aio
 from db.repos import sessions, users
 
 SessionStatus = Literal["ACTIVE", "FINISHED", "ABORTED"]
@@ -116,3 +117,65 @@ def touch_last_step(tg_id: int, message_id: int, sent_at: int) -> None:
     if not session:
         return
     sessions.update_last_step(session.id, message_id, sent_at)
+
+
+async def _aget_user_id(tg_id: int) -> int:
+    user = await aio.users.get_or_create_by_tg_id(tg_id)
+    return int(user["id"])
+
+
+async def aget_session(tg_id: int) -> Session | None:
+    user_id = await _aget_user_id(tg_id)
+    row = await aio.sessions.get_active(user_id)
+    return _row_to_session(row)
+
+
+async def aget_session_by_sid8(tg_id: int, sid8: str) -> Session | None:
+    row = await aio.sessions.get_by_tg_id_sid8(tg_id, sid8)
+    return _row_to_session(row)
+
+
+async def ais_step_current(tg_id: int, sid8: str, step: int) -> bool:
+    async with aio.transaction() as conn:
+        row = await aio.sessions.get_by_tg_id_sid8_for_update(conn, tg_id=tg_id, sid8=sid8)
+        if not row:
+            return False
+        return int(row.get("step", 0)) == int(step)
+
+
+async def ahas_active(tg_id: int) -> bool:
+    return await aget_session(tg_id) is not None
+
+
+async def astart_session(tg_id: int, theme_id: str | None, max_steps: int = 1) -> Session:
+    user_id = await _aget_user_id(tg_id)
+    row = await aio.sessions.create_new_active(user_id, theme_id, meta={"max_steps": max_steps})
+    session = _row_to_session(row)
+    if session is None:
+        raise RuntimeError("Failed to start session")
+    if not session.params_json or session.params_json.get("v") != "0.1":
+        from packages.engine.src.engine_v0_1 import init_state_v01
+
+        engine_state = init_state_v01(max_steps)
+        await aio.sessions.update_params_json(session.id, engine_state)
+        await aio.sessions.update_step(session.id, engine_state["step0"])
+    return session
+
+
+async def afinish_session(tg_id: int) -> None:
+    session = await aget_session(tg_id)
+    if session:
+        await aio.sessions.finish(session.id, status="FINISHED")
+
+
+async def aabort_session(tg_id: int) -> None:
+    session = await aget_session(tg_id)
+    if session:
+        await aio.sessions.finish(session.id, status="ABORTED")
+
+
+async def atouch_last_step(tg_id: int, message_id: int, sent_at: int) -> None:
+    session = await aget_session(tg_id)
+    if not session:
+        return
+    await aio.sessions.update_last_step(session.id, message_id, sent_at)
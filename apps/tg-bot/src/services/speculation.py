@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Tuple
+
+from db.aio import sessions
+from packages.engine.src.engine_v0_1 import apply_turn
+from packages.llm.src import scheduler
+from src.services.content_stub import build_content_step
+from src.services.story_runtime import (
+    TurnStepResult,
+    abuild_turn_step_result,
+    predict_next_state,
+)
+
+logger = logging.getLogger(__name__)
+
+SpeculationKey = Tuple[int, int, str, str]
+
+
+@dataclass
+class _Speculation:
+    user_id: int | None
+    task: asyncio.Task
+    created_at: float
+    handle: scheduler.PriorityHandle
+
+
+@dataclass
+class SpeculationStats:
+    scheduled: int = 0
+    hits: int = 0
+    inflight_hits: int = 0
+    misses: int = 0
+    wasted: int = 0
+    wasted_tokens: int = 0
+    used_tokens: int = 0
+    skipped_budget: int = 0
+    by_outcome: Dict[str, int] = field(default_factory=dict)
+
+
+_entries: Dict[SpeculationKey, _Speculation] = {}
+_stats = SpeculationStats()
+
+
+def is_enabled() -> bool:
+    return os.getenv("L3_SPECULATION_ENABLED", "").strip() == "1"
+
+
+def _resolve_int_env(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return default
+    return value if value >= 0 else default
+
+
+def _resolve_ttl_s() -> float:
+    raw = os.getenv("L3_SPECULATION_TTL_S", "600").strip()
+    try:
+        value = float(raw)
+    except ValueError:
+        return 600.0
+    return value if value > 0 else 600.0
+
+
+def state_hash(session_row: Dict[str, Any]) -> str:
+    snapshot = {
+        "params_json": session_row.get("params_json"),
+        "facts_json": session_row.get("facts_json"),
+        "theme_id": session_row.get("theme_id"),
+        "child_name": session_row.get("child_name"),
+    }
+    raw = json.dumps(snapshot, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _engine_state(session_row: Dict[str, Any]) -> Dict[str, Any] | None:
+    params = session_row.get("params_json")
+    if not isinstance(params, dict) or params.get("v") != "0.1":
+        return None
+    return params
+
+
+def _key(session_row: Dict[str, Any], choice_id: str) -> SpeculationKey:
+    state = _engine_state(session_row) or {}
+    return (
+        int(session_row["id"]),
+        int(state.get("step0", -1)),
+        choice_id,
+        state_hash(session_row),
+    )
+
+
+def _inflight_count(user_id: int | None = None) -> int:
+    return sum(
+        1
+        for entry in _entries.values()
+        if not entry.task.done() and (user_id is None or entry.user_id == user_id)
+    )
+
+
+def _total_tokens(turn_step: TurnStepResult | None) -> int:
+    usage = turn_step.usage if turn_step is not None else None
+    if not isinstance(usage, dict):
+        return 0
+    try:
+        return int(usage.get("total_tokens") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _discard(key: SpeculationKey, reason: str) -> None:
+    entry = _entries.pop(key, None)
+    if entry is None:
+        return
+    if entry.task.done():
+        if not entry.task.cancelled() and entry.task.exception() is None:
+            _stats.wasted_tokens += _total_tokens(entry.task.result())
+    else:
+        entry.task.cancel()
+    _stats.wasted += 1
+    _stats.by_outcome[reason] = _stats.by_outcome.get(reason, 0) + 1
+    logger.info(
+        "l3.speculation outcome=discarded reason=%s session_id=%s step0=%s choice_id=%s",
+        reason,
+        key[0],
+        key[1],
+        key[2],
+    )
+
+
+def _evict(session_id: int | None = None, keep: Tuple[int, str] | None = None) -> None:
+    now = time.monotonic()
+    ttl_s = _resolve_ttl_s()
+    for key, entry in list(_entries.items()):
+        if now - entry.created_at > ttl_s:
+            _discard(key, "expired")
+        elif session_id is not None and key[0] == session_id and (key[1], key[3]) != keep:
+            _discard(key, "superseded")
+
+
+async def _run(
+    session_row: Dict[str, Any],
+    choice_id: str,
+    handle: scheduler.PriorityHandle,
+) -> TurnStepResult | None:
+    scheduler.bind_priority(handle)
+    state = _engine_state(session_row)
+    if state is None:
+        return None
+    turn = {"kind": "choice", "choice_id": choice_id}
+    content = build_content_step(session_row["theme_id"], state["step0"], state)
+    predicted_state = predict_next_state(state, turn, content)
+    if predicted_state is None:
+        return None
+    return await abuild_turn_step_result(
+        {**session_row, "params_json": predicted_state},
+        predicted_state,
+        turn,
+        classify_ctx=None,
+        state_for=lambda resolved: apply_turn(copy.deepcopy(state), turn, content)[0],
+        priority="background",
+    )
+
+
+def schedule_for_session_row(session_row: Dict[str, Any]) -> int:
+    if not is_enabled():
+        return 0
+    state = _engine_state(session_row)
+    if state is None or session_row.get("status", "ACTIVE") != "ACTIVE":
+        return 0
+    session_id = int(session_row["id"])
+    current_hash = state_hash(session_row)
+    _evict(session_id=session_id, keep=(int(state["step0"]), current_hash))
+    content = build_content_step(session_row["theme_id"], state["step0"], state)
+    user_id = session_row.get("user_id")
+    max_global = _resolve_int_env("L3_SPECULATION_MAX_GLOBAL", 6)
+    max_per_user = _resolve_int_env("L3_SPECULATION_MAX_PER_USER", 3)
+    scheduled = 0
+    for choice in content.get("choices", []):
+        choice_id = choice.get("choice_id")
+        if not isinstance(choice_id, str):
+            continue
+        key = (session_id, int(state["step0"]), choice_id, current_hash)
+        if key in _entries:
+            continue
+        if predict_next_state(state, {"kind": "choice", "choice_id": choice_id}, content) is None:
+            continue
+        if _inflight_count() >= max_global or _inflight_count(user_id) >= max_per_user:
+            _stats.skipped_budget += 1
+            logger.info(
+                "l3.speculation outcome=skipped reason=budget session_id=%s step0=%s choice_id=%s",
+                session_id,
+                state["step0"],
+                choice_id,
+            )
+            continue
+        handle = scheduler.PriorityHandle("background")
+        task = asyncio.create_task(_run(copy.deepcopy(session_row), choice_id, handle))
+        _entries[key] = _Speculation(user_id=user_id, task=task, created_at=time.monotonic(), handle=handle)
+        _stats.scheduled += 1
+        scheduled += 1
+    if scheduled:
+        logger.info(
+            "l3.speculation outcome=scheduled session_id=%s step0=%s count=%s",
+            session_id,
+            state["step0"],
+            scheduled,
+        )
+    return scheduled
+
+
+async def schedule_for_session(session_id: int) -> int:
+    if not is_enabled():
+        return 0
+    try:
+        session_row = await sessions.get_by_id(session_id)
+    except Exception:
+        logger.exception("l3.speculation outcome=error reason=session_load session_id=%s", session_id)
+        return 0
+    if not session_row:
+        return 0
+    return schedule_for_session_row(session_row)
+
+
+async def claim(session_row: Dict[str, Any], choice_id: str | None) -> Dict[str, Any] | None:
+    if not _entries or not isinstance(choice_id, str):
+        return None
+    key = _key(session_row, choice_id)
+    entry = _entries.pop(key, None)
+    siblings = [other for other in _entries if other[0] == key[0]]
+    for other in siblings:
+        _discard(other, "not_chosen")
+    if entry is None and not siblings:
+        return None
+    if entry is None:
+        _stats.misses += 1
+        logger.info(
+            "l3.speculation outcome=miss session_id=%s step0=%s choice_id=%s",
+            key[0],
+            key[1],
+            choice_id,
+        )
+        return None
+    inflight = not entry.task.done()
+    if inflight:
+        scheduler.promote(entry.handle, "interactive")
+    try:
+        turn_step = await asyncio.shield(entry.task)
+    except asyncio.CancelledError:
+        if not entry.task.cancelled():
+            raise
+        turn_step = None
+    except Exception:
+        logger.exception(
+            "l3.speculation outcome=error session_id=%s step0=%s choice_id=%s",
+            key[0],
+            key[1],
+            choice_id,
+        )
+        turn_step = None
+    if turn_step is None:
+        _stats.misses += 1
+        return None
+    if inflight:
+        _stats.inflight_hits += 1
+    else:
+        _stats.hits += 1
+    _stats.used_tokens += _total_tokens(turn_step)
+    logger.info(
+        "l3.speculation outcome=hit inflight=%s session_id=%s step0=%s choice_id=%s",
+        "true" if inflight else "false",
+        key[0],
+        key[1],
+        choice_id,
+    )
+    return copy.deepcopy(turn_step.step_result)
+
+
+def speculation_stats() -> Dict[str, Any]:
+    claimed = _stats.hits + _stats.inflight_hits + _stats.misses
+    hit_rate = (_stats.hits + _stats.inflight_hits) / claimed if claimed else 0.0
+    return {
+        "scheduled": _stats.scheduled,
+        "hits": _stats.hits,
+        "inflight_hits": _stats.inflight_hits,
+        "misses": _stats.misses,
+        "hit_rate": round(hit_rate, 4),
+        "wasted": _stats.wasted,
+        "wasted_tokens": _stats.wasted_tokens,
+        "used_tokens": _stats.used_tokens,
+        "skipped_budget": _stats.skipped_budget,
+        "inflight": _inflight_count(),
+        "discarded_by_reason": dict(_stats.by_outcome),
+    }
+
+
+def reset() -> None:
+    global _stats
+    for key in list(_entries):
+        entry = _entries.pop(key)
+        if not entry.task.done():
+            entry.task.cancel()
+    _stats = SpeculationStats()
@@ -1,13 +1,22 @@
 from __future__ import annotations
 
+import copy
 from dataclasses import dataclass
 import logging
 from uuid import uuid4
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 
+from db import aio
 from db.repos import sessions
-from packages.engine.src.engine_v0_1 import init_state_v01
-from packages.llm.src import generate as llm_generate
+from packages.engine.src.engine_v0_1 import apply_turn, init_state_v01
+from packages.llm.src import (
+    LLMResult,
+    agenerate as llm_agenerate,
+    agenerate_story_turn as llm_agenerate_story_turn,
+    generate as llm_generate,
+)
+from packages.llm.src.scheduler import PriorityClass
+from packages.llm.src.streaming import TextCallback
 from src.keyboards.l3 import build_final_keyboard, build_l3_keyboard
 from src.services.content_stub import build_content_step
 
@@ -22,6 +31,14 @@ class StepView:
     image_prompt: Optional[str] = None
 
 
+@dataclass
+class TurnStepResult:
+    classifier_result: Optional[Dict]
+    step_result: Dict
+    usage: Optional[Dict]
+    merged: bool
+
+
 def build_final_step_result(
     final_id: str | None,
     *,
@@ -29,6 +46,35 @@ def build_final_step_result(
     req_id: str | None = None,
     child_name: str | None = None,
 ) -> Dict:
+    final_text, step_ctx = _prepare_final_request(
+        final_id, theme_id=theme_id, req_id=req_id, child_name=child_name
+    )
+    llm_result = llm_generate(step_ctx)
+    return _merge_final_result(final_text, final_id, llm_result, child_name)
+
+
+async def abuild_final_step_result(
+    final_id: str | None,
+    *,
+    theme_id: str | None = None,
+    req_id: str | None = None,
+    child_name: str | None = None,
+    on_text: TextCallback | None = None,
+) -> Dict:
+    final_text, step_ctx = _prepare_final_request(
+        final_id, theme_id=theme_id, req_id=req_id, child_name=child_name
+    )
+    llm_result = await llm_agenerate(step_ctx, on_text=on_text)
+    return _merge_final_result(final_text, final_id, llm_result, child_name)
+
+
+def _prepare_final_request(
+    final_id: str | None,
+    *,
+    theme_id: str | None,
+    req_id: str | None,
+    child_name: str | None,
+) -> tuple[str, Dict]:
     raw = (child_name or "").strip()
     child_name_for_story = raw if raw else "дружок"
     logger.info(
@@ -57,13 +103,20 @@ def build_final_step_result(
             "format": "Верни JSON формата {text}.",
         },
     }
-    llm_result = llm_generate(step_ctx)
+    return final_text, step_ctx
+
+
+def _merge_final_result(
+    final_text: str,
+    final_id: str | None,
+    llm_result: LLMResult,
+    child_name: str | None,
+) -> Dict:
     if llm_result.parsed_json:
         llm_text = llm_result.parsed_json.get("text")
         if isinstance(llm_text, str) and llm_text.strip():
             final_text = llm_text
     resolved_child_name = (child_name or "").strip()
-    child_name_for_story = resolved_child_name if resolved_child_name else "дружок"
     logger.info(
         "llm.story_request child_name_present=%s child_name_len=%s",
         "true" if bool(resolved_child_name) else "false",
@@ -92,6 +145,15 @@ def ensure_engine_state(session_row: Dict) -> Dict:
     return params
 
 
+async def aensure_engine_state(session_row: Dict) -> Dict:
+    params = session_row.get("params_json") or {}
+    if not isinstance(params, dict) or params.get("v") != "0.1":
+        state = init_state_v01(session_row.get("max_steps", 8))
+        await aio.sessions.update_params_json(session_row["id"], state)
+        return state
+    return params
+
+
 def build_step_result(
     session_row: Dict,
     state: Dict | None = None,
@@ -101,13 +163,106 @@ def build_step_result(
     state = state or ensure_engine_state(session_row)
     req_id = _ensure_req_id(req_id)
     if state["step0"] >= state["n"] - 1:
-        resolved_req_id = _ensure_req_id(req_id)
-        return build_final_step_result(
-            final_id=f"final_{resolved_req_id[:8]}",
-            theme_id=session_row.get("theme_id"),
-            req_id=resolved_req_id,
-            child_name=session_row.get("child_name"),
+        return build_final_step_result(**_final_kwargs(session_row, req_id))
+    step_result, keyboard_choices, step_ctx = _prepare_step_request(session_row, state, req_id)
+    llm_result = llm_generate(step_ctx)
+    return _merge_step_result(step_result, keyboard_choices, llm_result)
+
+
+async def abuild_step_result(
+    session_row: Dict,
+    state: Dict | None = None,
+    *,
+    req_id: str | None = None,
+    on_text: TextCallback | None = None,
+) -> Dict:
+    state = state or await aensure_engine_state(session_row)
+    req_id = _ensure_req_id(req_id)
+    if state["step0"] >= state["n"] - 1:
+        return await abuild_final_step_result(**_final_kwargs(session_row, req_id), on_text=on_text)
+    step_result, keyboard_choices, step_ctx = _prepare_step_request(session_row, state, req_id)
+    llm_result = await llm_agenerate(step_ctx, on_text=on_text)
+    return _merge_step_result(step_result, keyboard_choices, llm_result)
+
+
+async def abuild_turn_step_result(
+    session_row: Dict,
+    state: Dict,
+    turn: Dict,
+    *,
+    classify_ctx: Dict | None,
+    state_for: Callable[[Dict | None], Dict],
+    req_id: str | None = None,
+    on_text: TextCallback | None = None,
+    priority: PriorityClass | None = None,
+) -> TurnStepResult:
+    req_id = _ensure_req_id(req_id)
+    step_result, keyboard_choices, step_ctx = _prepare_step_request(session_row, state, req_id)
+    if priority is not None:
+        step_ctx["priority"] = priority
+    turn_ctx = {
+        **step_ctx,
+        "expected_type": "story_turn",
+        "story_request": {
+            **step_ctx["story_request"],
+            "expected_type": "story_turn",
+            "turn": {
+                "kind": turn.get("kind"),
+                "choice_id": turn.get("choice_id"),
+                "text": turn.get("text"),
+            },
+            "format": "Верни JSON формата {classifier_result, next_step{text, recap_short, choices[]}}.",
+        },
+    }
+
+    def _build_step_ctx(classifier_result: Dict | None) -> Dict:
+        resolved_state = state_for(classifier_result)
+        _, _, resolved_ctx = _prepare_step_request(
+            {**session_row, "params_json": resolved_state},
+            resolved_state,
+            req_id,
         )
+        if priority is not None:
+            resolved_ctx["priority"] = priority
+        return resolved_ctx
+
+    turn_result = await llm_agenerate_story_turn(
+        turn_ctx, classify_ctx, _build_step_ctx, on_text=on_text
+    )
+    logger.info("llm.story_turn merged=%s", "true" if turn_result.merged else "false")
+    return TurnStepResult(
+        classifier_result=turn_result.classifier_result,
+        step_result=_merge_step_result(step_result, keyboard_choices, turn_result.step_result),
+        usage=turn_result.step_result.usage,
+        merged=turn_result.merged,
+    )
+
+
+def predict_next_state(state: Dict, turn: Dict, content: Dict) -> Dict | None:
+    predicted_state, predicted_log = apply_turn(
+        copy.deepcopy(state), {**turn, "classifier_result": None}, content
+    )
+    if predicted_log["final_id"] is not None:
+        return None
+    if expected_type_for_step(predicted_state["step0"], predicted_state["n"]) != "story_step":
+        return None
+    return predicted_state
+
+
+def _final_kwargs(session_row: Dict, req_id: str) -> Dict:
+    return {
+        "final_id": f"final_{req_id[:8]}",
+        "theme_id": session_row.get("theme_id"),
+        "req_id": req_id,
+        "child_name": session_row.get("child_name"),
+    }
+
+
+def _prepare_step_request(
+    session_row: Dict,
+    state: Dict,
+    req_id: str,
+) -> tuple[Dict, list[dict], Dict]:
     content = build_content_step(session_row["theme_id"], state["step0"], state)
     facts_json = session_row.get("facts_json") or {}
     recaps = facts_json.get("recaps") if isinstance(facts_json, dict) else None
@@ -153,7 +308,14 @@ def build_step_result(
         "recaps_count": len(recaps),
         "story_request": story_request,
     }
-    llm_result = llm_generate(step_ctx)
+    return step_result, keyboard_choices, step_ctx
+
+
+def _merge_step_result(
+    step_result: Dict,
+    keyboard_choices: list[dict],
+    llm_result: LLMResult,
+) -> Dict:
     if llm_result.parsed_json:
         llm_text = llm_result.parsed_json.get("text")
         if isinstance(llm_text, str) and llm_text.strip():
@@ -323,3 +485,15 @@ def render_step(session_row: Dict, state: Dict | None = None, *, req_id: str | N
     state = state or ensure_engine_state(session_row)
     step_result = build_step_result(session_row, state=state, req_id=req_id)
     return step_result_to_view(step_result, sid8=session_row["sid8"], step=state["step0"])
+
+
+async def arender_current_step(session_row: Dict, req_id: str | None = None) -> StepView:
+    state = await aensure_engine_state(session_row)
+    step_result = await abuild_step_result(session_row, state=state, req_id=req_id)
+    return step_result_to_view(step_result, sid8=session_row["sid8"], step=state["step0"])
+
+
+async def arender_step(session_row: Dict, state: Dict | None = None, *, req_id: str | None = None) -> StepView:
+    state = state or await aensure_engine_state(session_row)
+    step_result = await abuild_step_result(session_row, state=state, req_id=req_id)
+    return step_result_to_view(step_result, sid8=session_row["sid8"], step=state["step0"])
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile
+
+from db.aio import assets
+
+logger = logging.getLogger(__name__)
+
+_MEDIA = ("photo", "document")
+
+_counters: Dict[str, int] = {"file_id_sent": 0, "file_id_rejected": 0, "uploaded": 0, "uploaded_bytes": 0}
+
+
+def file_ids(message: Any, media: str) -> tuple[str, str | None] | None:
+    if media == "photo":
+        sizes = getattr(message, "photo", None)
+        item = sizes[-1] if sizes else None
+    else:
+        item = getattr(message, "document", None)
+    file_id = getattr(item, "file_id", None)
+    if not isinstance(file_id, str) or not file_id:
+        return None
+    return file_id, getattr(item, "file_unique_id", None)
+
+
+def cached_file_id(asset_row: dict[str, Any] | None, media: str) -> str | None:
+    if not asset_row or asset_row.get("telegram_media") != media:
+        return None
+    file_id = asset_row.get("telegram_file_id")
+    return file_id if isinstance(file_id, str) and file_id else None
+
+
+def read_file(path: Path) -> Callable[[], Awaitable[bytes]]:
+    return lambda: asyncio.to_thread(path.read_bytes)
+
+
+def in_memory(data: bytes) -> Callable[[], Awaitable[bytes]]:
+    async def _load() -> bytes:
+        return data
+
+    return _load
+
+
+async def send_asset(
+    *,
+    asset_id: int | None,
+    asset_row: dict[str, Any] | None,
+    media: str,
+    send: Callable[[Any], Awaitable[Any]],
+    load: Callable[[], Awaitable[bytes]],
+    filename: str,
+) -> Any:
+    if media not in _MEDIA:
+        raise ValueError("media must be photo or document")
+    file_id = cached_file_id(asset_row, media)
+    if file_id is not None:
+        try:
+            message = await send(file_id)
+            _counters["file_id_sent"] += 1
+            logger.info("tg.file outcome=file_id media=%s asset_id=%s", media, asset_id)
+            return message
+        except TelegramBadRequest as exc:
+            _counters["file_id_rejected"] += 1
+            logger.warning("tg.file outcome=file_id_rejected media=%s asset_id=%s error=%s", media, asset_id, exc)
+    data = await load()
+    message = await send(BufferedInputFile(data, filename=filename))
+    _counters["uploaded"] += 1
+    _counters["uploaded_bytes"] += len(data)
+    logger.info("tg.file outcome=uploaded media=%s asset_id=%s bytes=%s", media, asset_id, len(data))
+    if asset_id is None:
+        return message
+    ids = file_ids(message, media)
+    try:
+        if ids is not None:
+            await assets.set_telegram_file(asset_id, media=media, file_id=ids[0], file_unique_id=ids[1])
+        elif file_id is not None:
+            await assets.clear_telegram_file(asset_id)
+    except Exception:
+        logger.exception("tg.file outcome=remember_error media=%s asset_id=%s", media, asset_id)
+    return message
+
+
+def file_stats() -> Dict[str, int]:
+    return dict(_counters)
+
+
+def reset_file_stats() -> None:
+    for key in _counters:
+        _counters[key] = 0
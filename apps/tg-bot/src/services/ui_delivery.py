@@ -1,22 +1,35 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import logging
+import os
 import re
+import weakref
 from dataclasses import dataclass
-from time import time
+from time import monotonic, time
 from typing import Literal
 
 from aiogram import Bot
 from aiogram.types import Message, ReplyKeyboardRemove
 
-from db.repos import sessions, ui_events
-from src.services.image_delivery import resolve_story_step_ui, schedule_image_delivery
+from db.aio import delivery, ui_events
+from db.aio.delivery import DeliveryWrite
+from src.services import speculation
+from src.services.image_delivery import (
+    notify_image_workers,
+    plan_image_delivery,
+    resolve_story_step_ui,
+    start_image_delivery,
+)
 from src.services.story_runtime import StepView
 
 logger = logging.getLogger(__name__)
 UiDecision = Literal["show", "skip"]
 
+_TG_TEXT_LIMIT = 4096
+_STREAM_CURSOR = " …"
+
 
 @dataclass
 class UiAcquireResult:
@@ -38,14 +51,14 @@ def content_hash(*, theme_id: str | None, text: str) -> str:
     return hashlib.sha256(base.encode("utf-8")).hexdigest()
 
 
-def acquire_step_event(
+async def acquire_step_event(
     *,
     session_id: int,
     step: int,
     kind: str,
     content_hash_value: str,
 ) -> UiAcquireResult:
-    outcome = ui_events.acquire_event(
+    outcome = await ui_events.acquire_event(
         session_id=session_id,
         step=step,
         kind=kind,
@@ -54,6 +67,190 @@ def acquire_step_event(
     return UiAcquireResult(decision=outcome["decision"], event_id=outcome.get("event_id"))
 
 
+def _stream_enabled() -> bool:
+    raw = os.getenv("TG_STREAM_ENABLED", "1").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+def _resolve_stream_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def _delivery_commit_mode() -> str:
+    raw = os.getenv("TG_DELIVERY_COMMIT", "inline").strip().lower()
+    return raw if raw in {"inline", "deferred"} else "inline"
+
+
+@dataclass
+class _QueuedWrite:
+    write: DeliveryWrite
+    attempts: int = 0
+
+
+class DeliveryFlusher:
+    def __init__(self) -> None:
+        self.interval_s = _resolve_stream_int("TG_DELIVERY_FLUSH_INTERVAL_MS", 50) / 1000
+        self.max_batch = _resolve_stream_int("TG_DELIVERY_FLUSH_BATCH", 50)
+        self.max_attempts = _resolve_stream_int("TG_DELIVERY_FLUSH_ATTEMPTS", 5)
+        self.max_backoff_s = _resolve_stream_int("TG_DELIVERY_FLUSH_MAX_BACKOFF_MS", 5000) / 1000
+        self.flushed = 0
+        self.failed = 0
+        self.dropped = 0
+        self._pending: list[_QueuedWrite] = []
+        self._task: asyncio.Task | None = None
+
+    def submit(self, write: DeliveryWrite) -> None:
+        self._pending.append(_QueuedWrite(write))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def drain(self) -> None:
+        while self._task is not None and not self._task.done():
+            await self._task
+
+    async def _run(self) -> None:
+        await asyncio.sleep(self.interval_s)
+        backoff_s = self.interval_s
+        while self._pending:
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            if await self._commit(batch):
+                backoff_s = self.interval_s
+                continue
+            await asyncio.sleep(backoff_s)
+            backoff_s = min(backoff_s * 2, self.max_backoff_s)
+
+    async def _commit(self, batch: list[_QueuedWrite]) -> bool:
+        try:
+            image_ids = await delivery.commit_deliveries([queued.write for queued in batch])
+        except Exception:
+            logger.exception("ui.delivery_flush outcome=error batch=%s", len(batch))
+        else:
+            self._committed(len(batch), image_ids)
+            return True
+        retry: list[_QueuedWrite] = []
+        for queued in batch:
+            if len(batch) > 1:
+                try:
+                    image_ids = await delivery.commit_deliveries([queued.write])
+                except Exception:
+                    logger.exception("ui.delivery_flush outcome=error session_id=%s", queued.write.session_id)
+                else:
+                    self._committed(1, image_ids)
+                    continue
+            queued.attempts += 1
+            self.failed += 1
+            if queued.attempts < self.max_attempts:
+                retry.append(queued)
+                continue
+            self.dropped += 1
+            logger.error(
+                "ui.delivery_flush outcome=dropped session_id=%s attempts=%s",
+                queued.write.session_id,
+                queued.attempts,
+            )
+        self._pending[:0] = retry
+        return not retry
+
+    def _committed(self, count: int, image_ids: list[int | None]) -> None:
+        self.flushed += count
+        images = sum(1 for image_id in image_ids if image_id is not None)
+        if images:
+            notify_image_workers()
+        logger.info("ui.delivery_flush outcome=ok batch=%s images=%s", count, images)
+
+
+_flushers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, DeliveryFlusher]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_delivery_flusher() -> DeliveryFlusher:
+    loop = asyncio.get_running_loop()
+    flusher = _flushers.get(loop)
+    if flusher is None:
+        flusher = DeliveryFlusher()
+        _flushers[loop] = flusher
+    return flusher
+
+
+async def flush_deliveries() -> None:
+    flusher = _flushers.get(asyncio.get_running_loop())
+    if flusher is not None:
+        await flusher.drain()
+
+
+class StepTextStream:
+    def __init__(self, message: Message, *, prelude: str | None = None) -> None:
+        self.message = message
+        self.prelude = prelude
+        self.placeholder: Message | None = None
+        self._prelude_message: Message | None = None
+        self._enabled = _stream_enabled()
+        self._interval_s = _resolve_stream_int("TG_STREAM_EDIT_INTERVAL_MS", 700) / 1000
+        self._min_chars = _resolve_stream_int("TG_STREAM_EDIT_MIN_CHARS", 120)
+        self._shown_len = 0
+        self._edited_at = 0.0
+        self.edits = 0
+
+    async def push(self, text: str) -> None:
+        if not self._enabled or not text.strip():
+            return
+        try:
+            if self.placeholder is None:
+                await self._open(text)
+                return
+            elapsed = monotonic() - self._edited_at
+            if elapsed < self._interval_s and len(text) - self._shown_len < self._min_chars:
+                return
+            await self.message.bot.edit_message_text(
+                _stream_preview(text),
+                chat_id=self.placeholder.chat.id,
+                message_id=self.placeholder.message_id,
+            )
+        except Exception:
+            logger.exception("TG.6.4.07 stream=edit_failed")
+            self._enabled = False
+            return
+        self._mark_shown(text)
+
+    async def discard(self) -> None:
+        for sent in (self.placeholder, self._prelude_message):
+            if sent is None:
+                continue
+            try:
+                await self.message.bot.delete_message(chat_id=sent.chat.id, message_id=sent.message_id)
+            except Exception:
+                pass
+        self.placeholder = None
+        self._prelude_message = None
+
+    async def _open(self, text: str) -> None:
+        if self.prelude:
+            self._prelude_message = await self.message.answer(self.prelude)
+        self.placeholder = await self.message.answer(
+            _stream_preview(text), reply_markup=ReplyKeyboardRemove()
+        )
+        self._mark_shown(text)
+        logger.info("TG.6.4.07 stream=opened msg_id=%s", self.placeholder.message_id)
+
+    def _mark_shown(self, text: str) -> None:
+        self._shown_len = len(text)
+        self._edited_at = monotonic()
+        self.edits += 1
+
+
+def _stream_preview(text: str) -> str:
+    return text[: _TG_TEXT_LIMIT - len(_STREAM_CURSOR)] + _STREAM_CURSOR
+
+
 async def deliver_step_view(
     *,
     message: Message,
@@ -63,19 +260,31 @@ async def deliver_step_view(
     theme_id: str | None,
     total_steps: int,
     kind: str = "recap_shown",
+    placeholder: Message | None = None,
 ) -> bool:
     content_hash_value = content_hash(theme_id=theme_id, text=step_view.text)
-    acquire = acquire_step_event(
+    acquire = await acquire_step_event(
         session_id=session_id,
         step=step,
         kind=kind,
         content_hash_value=content_hash_value,
     )
     if acquire.decision != "show" or acquire.event_id is None:
+        if placeholder is not None:
+            try:
+                await message.bot.delete_message(
+                    chat_id=placeholder.chat.id,
+                    message_id=placeholder.message_id,
+                )
+            except Exception:
+                pass
         return False
 
     try:
-        sent_message = await message.answer("...", reply_markup=ReplyKeyboardRemove())
+        if placeholder is not None:
+            sent_message = placeholder
+        else:
+            sent_message = await message.answer("...", reply_markup=ReplyKeyboardRemove())
         step_message = sent_message
         try:
             await message.bot.edit_message_text(
@@ -95,20 +304,11 @@ async def deliver_step_view(
             step_message = await message.answer(step_view.text, reply_markup=step_view.keyboard)
     except Exception:
         try:
-            ui_events.mark_failed(acquire.event_id)
+            await ui_events.mark_failed(acquire.event_id)
         except Exception:
             pass
         return False
 
-    try:
-        ui_events.mark_shown(acquire.event_id, step_message_id=step_message.message_id)
-    except Exception:
-        return True
-
-    try:
-        sessions.update_last_step(session_id, step_message.message_id, int(time()))
-    except Exception:
-        return True
     scene_brief = step_view.image_prompt
     if not scene_brief:
         normalized = _normalize_content(step_view.text)
@@ -120,7 +320,7 @@ async def deliver_step_view(
         story_step_ui,
         story_step_ui,
     )
-    schedule_image_delivery(
+    image_plan = plan_image_delivery(
         bot=message.bot,
         chat_id=step_message.chat.id,
         step_message_id=step_message.message_id,
@@ -133,12 +333,35 @@ async def deliver_step_view(
         theme_id=theme_id,
         image_scene_brief=scene_brief,
     )
+    write = DeliveryWrite(
+        session_id=session_id,
+        ui_event_id=acquire.event_id,
+        step_message_id=step_message.message_id,
+        sent_at=int(time()),
+        session_image=image_plan.session_image_row() if image_plan else None,
+    )
+    if _delivery_commit_mode() == "deferred":
+        get_delivery_flusher().submit(write)
+    else:
+        try:
+            scheduled_id = (await delivery.commit_deliveries([write]))[0]
+        except Exception:
+            logger.exception("ui.delivery_commit outcome=deferred session_id=%s", session_id)
+            get_delivery_flusher().submit(write)
+        else:
+            if image_plan is not None:
+                start_image_delivery(image_plan, scheduled_id)
+    if not step_view.final_id:
+        try:
+            await speculation.schedule_for_session(session_id)
+        except Exception:
+            logger.exception("l3.speculation outcome=error reason=schedule session_id=%s", session_id)
     logger.info("TG.6.4.07 delivery=sent msg_id=%s", step_message.message_id)
     return True
 
 
-def mark_delivery_failed(event_id: int) -> None:
-    ui_events.mark_failed(event_id)
+async def mark_delivery_failed(event_id: int) -> None:
+    await ui_events.mark_failed(event_id)
 
 
 async def deliver_step_lock(
@@ -152,7 +375,7 @@ async def deliver_step_lock(
     kind: str = "step_locked",
 ) -> bool:
     content_hash_value = content_hash(theme_id=None, text=str(message_id))
-    acquire = acquire_step_event(
+    acquire = await acquire_step_event(
         session_id=session_id,
         step=step,
         kind=kind,
@@ -168,12 +391,12 @@ async def deliver_step_lock(
         )
     except Exception:
         try:
-            ui_events.mark_failed(acquire.event_id)
+            await ui_events.mark_failed(acquire.event_id)
         except Exception:
             pass
         return False
     try:
-        ui_events.mark_shown(acquire.event_id, step_message_id=message_id)
+        await ui_events.mark_shown(acquire.event_id, step_message_id=message_id)
     except Exception:
         return True
     return True
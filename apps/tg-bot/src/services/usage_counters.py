@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import weakref
+from dataclasses import dataclass, field
+from datetime import datetime
+from time import monotonic
+from typing import Any, Dict
+
+from db.aio import usage_windows
+from db.repos.usage_windows import UsageDelta, window_bounds
+
+logger = logging.getLogger(__name__)
+
+_KINDS = ("messages_used", "sessions_started")
+
+
+def _resolve_int_env(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+class UsageBacklogFull(RuntimeError):
+    pass
+
+
+def _zero() -> Dict[str, int]:
+    return {kind: 0 for kind in _KINDS}
+
+
+@dataclass
+class _Window:
+    user_id: int
+    window_start: datetime
+    window_end: datetime
+    base: Dict[str, int] = field(default_factory=_zero)
+    inflight: Dict[str, int] = field(default_factory=_zero)
+    pending: Dict[str, int] = field(default_factory=_zero)
+
+    def total(self, kind: str) -> int:
+        return self.base[kind] + self.inflight[kind] + self.pending[kind]
+
+    def has_pending(self) -> bool:
+        return any(self.pending.values())
+
+
+class UsageAggregator:
+    def __init__(self) -> None:
+        self.window_sec = _resolve_int_env("TG_USAGE_WINDOW_S", 43200)
+        self.interval_s = _resolve_int_env("TG_USAGE_FLUSH_INTERVAL_MS", 2000) / 1000
+        self.max_pending = _resolve_int_env("TG_USAGE_MAX_PENDING", 200)
+        self.max_backoff_s = _resolve_int_env("TG_USAGE_MAX_BACKOFF_MS", 60000) / 1000
+        self.flushed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.pending_total = 0
+        self._backoff_s = 0.0
+        self._retry_at = 0.0
+        self._windows: Dict[tuple[int, datetime], _Window] = {}
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    async def record(self, user_id: int, kind: str, delta: int = 1) -> int:
+        if kind not in _KINDS:
+            raise ValueError("kind must be messages_used or sessions_started")
+        window = await self._window(user_id)
+        await self._make_room()
+        window.pending[kind] += delta
+        self.pending_total += delta
+        if self.pending_total >= self.max_pending and not self._flush_lock.locked() and not self._backing_off():
+            await self.flush()
+        elif self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+        return window.total(kind)
+
+    async def usage(self, user_id: int) -> Dict[str, Any]:
+        window = await self._window(user_id)
+        return {
+            "user_id": user_id,
+            "window_start": window.window_start,
+            "window_end": window.window_end,
+            **{kind: window.total(kind) for kind in _KINDS},
+        }
+
+    async def within_quota(self, user_id: int, kind: str, limit: int, delta: int = 1) -> bool:
+        usage = await self.usage(user_id)
+        return usage[kind] + delta <= limit
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            batch: list[UsageDelta] = []
+            flushing: list[_Window] = []
+            for window in self._windows.values():
+                if not window.has_pending():
+                    continue
+                window.inflight = window.pending
+                window.pending = _zero()
+                flushing.append(window)
+                batch.append(
+                    UsageDelta(
+                        user_id=window.user_id,
+                        window_start=window.window_start,
+                        window_end=window.window_end,
+                        **window.inflight,
+                    )
+                )
+            self.pending_total = sum(sum(window.pending.values()) for window in self._windows.values())
+            if not batch:
+                self._evict()
+                return
+            try:
+                rows = await usage_windows.add_deltas(batch)
+            except Exception:
+                for window in flushing:
+                    for kind in _KINDS:
+                        window.pending[kind] += window.inflight[kind]
+                    window.inflight = _zero()
+                self.pending_total = sum(sum(window.pending.values()) for window in self._windows.values())
+                self.failed += len(batch)
+                self._backoff_s = min(max(self._backoff_s * 2, self.interval_s), self.max_backoff_s)
+                self._retry_at = monotonic() + self._backoff_s
+                logger.exception(
+                    "usage.flush outcome=error batch=%s retry_in_s=%.1f", len(batch), self._backoff_s
+                )
+                return
+            self._backoff_s = 0.0
+            self._retry_at = 0.0
+            for window in flushing:
+                window.inflight = _zero()
+            for row in rows:
+                window = self._windows.get((int(row["user_id"]), row["window_start"]))
+                if window is not None:
+                    window.base = {kind: int(row[kind]) for kind in _KINDS}
+            self.flushed += len(batch)
+            self._evict()
+            logger.info("usage.flush outcome=ok batch=%s", len(batch))
+
+    async def drain(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "windows": len(self._windows),
+            "pending": self.pending_total,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "backoff_s": self._backoff_s,
+        }
+
+    async def _make_room(self) -> None:
+        while self.pending_total >= self.max_pending:
+            if self._backing_off():
+                self.rejected += 1
+                logger.warning("usage.record outcome=rejected pending=%s", self.pending_total)
+                raise UsageBacklogFull("usage backlog is full while flushes are failing")
+            if self._flush_lock.locked():
+                async with self._flush_lock:
+                    pass
+                continue
+            await self.flush()
+
+    def _backing_off(self) -> bool:
+        return monotonic() < self._retry_at
+
+    async def _window(self, user_id: int) -> _Window:
+        window_start, window_end = window_bounds(self.window_sec)
+        key = (user_id, window_start)
+        window = self._windows.get(key)
+        if window is not None:
+            return window
+        row = await usage_windows.read_window(user_id, window_start)
+        loaded = _Window(user_id=user_id, window_start=window_start, window_end=window_end)
+        if row:
+            loaded.base = {kind: int(row.get(kind) or 0) for kind in _KINDS}
+        return self._windows.setdefault(key, loaded)
+
+    async def _flush_later(self) -> None:
+        while True:
+            await asyncio.sleep(max(self.interval_s, self._retry_at - monotonic()))
+            await self.flush()
+            if not self.pending_total:
+                return
+
+    def _evict(self) -> None:
+        current_start, _ = window_bounds(self.window_sec)
+        for key, window in list(self._windows.items()):
+            if window.window_start < current_start and not window.has_pending():
+                del self._windows[key]
+
+
+_aggregators: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, UsageAggregator]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_usage_aggregator() -> UsageAggregator:
+    loop = asyncio.get_running_loop()
+    aggregator = _aggregators.get(loop)
+    if aggregator is None:
+        aggregator = UsageAggregator()
+        _aggregators[loop] = aggregator
+    return aggregator
+
+
+async def flush_usage() -> None:
+    aggregator = _aggregators.get(asyncio.get_running_loop())
+    if aggregator is not None:
+        await aggregator.drain()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import json
 import logging
@@ -11,8 +12,8 @@ from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
-import requests
-
+from packages.llm.src import http_client
+from packages.llm.src import scheduler as llm_scheduler
 from src.services.whyqa import WhyAnswer, whyqa
 
 logger = logging.getLogger(__name__)
@@ -45,6 +46,24 @@ class WhyTextResult:
 
 
 def answer_why_text(question: str, audience: str) -> WhyTextResult:
+    clamped, q_len, q_hash, qa_result = _answer_from_qa(question, audience)
+    if qa_result is not None:
+        return qa_result
+    return _finish_llm_answer(_call_llm(question=clamped), q_len=q_len, q_hash=q_hash)
+
+
+async def aanswer_why_text(question: str, audience: str) -> WhyTextResult:
+    clamped, q_len, q_hash, qa_result = _answer_from_qa(question, audience)
+    if qa_result is not None:
+        return qa_result
+    async with llm_scheduler.slot("background"):
+        llm_outcome = await asyncio.to_thread(_call_llm, question=clamped)
+    return _finish_llm_answer(llm_outcome, q_len=q_len, q_hash=q_hash)
+
+
+def _answer_from_qa(
+    question: str, audience: str
+) -> tuple[str, int, str, WhyTextResult | None]:
     normalized = _normalize_question(question)
     clamped = _clamp_question(normalized)
     q_len = len(clamped)
@@ -52,11 +71,6 @@ def answer_why_text(question: str, audience: str) -> WhyTextResult:
 
     logger.info("why.q_received mode=why_text len=%s hash=%s", q_len, q_hash)
 
-    qa_hit = False
-    qa_id: str | None = None
-    score = 0
-    answer_text = ""
-
     try:
         answer = whyqa.answer(clamped, audience)
     except Exception as exc:  # noqa: BLE001
@@ -64,26 +78,28 @@ def answer_why_text(question: str, audience: str) -> WhyTextResult:
         answer = None
 
     if isinstance(answer, WhyAnswer) and answer.matched:
-        qa_hit = True
-        qa_id = answer.matched_id
-        score = answer.score
-        answer_text = answer.text
-        logger.info("why.q_matched id=%s score=%s", qa_id, score)
+        logger.info("why.q_matched id=%s score=%s", answer.matched_id, answer.score)
         result = WhyTextResult(
-            text=answer_text,
+            text=answer.text,
             matched=True,
-            matched_id=qa_id,
-            score=score,
+            matched_id=answer.matched_id,
+            score=answer.score,
             llm_called=False,
             outcome="ok",
             q_len=q_len,
             q_hash=q_hash,
         )
-        _write_dump(result, qa_hit=qa_hit, model=None)
-        return result
+        _write_dump(result, qa_hit=True, model=None)
+        return clamped, q_len, q_hash, result
 
     logger.info("why.q_notfound")
-    llm_text, outcome, llm_called = _call_llm(question=clamped)
+    return clamped, q_len, q_hash, None
+
+
+def _finish_llm_answer(
+    llm_outcome: tuple[str | None, str, bool], *, q_len: int, q_hash: str
+) -> WhyTextResult:
+    llm_text, outcome, llm_called = llm_outcome
     if llm_text:
         answer_text = llm_text
     else:
@@ -98,7 +114,7 @@ def answer_why_text(question: str, audience: str) -> WhyTextResult:
         q_len=q_len,
         q_hash=q_hash,
     )
-    _write_dump(result, qa_hit=qa_hit, model=_OPENROUTER_MODEL if llm_called else None)
+    _write_dump(result, qa_hit=False, model=_OPENROUTER_MODEL if llm_called else None)
     return result
 
 
@@ -173,11 +189,11 @@ def _call_llm(*, question: str) -> tuple[str | None, str, bool]:
     last_error: Exception | None = None
     for attempt in range(attempts):
         try:
-            response = requests.post(
+            response = http_client.post(
                 _OPENROUTER_ENDPOINT,
                 headers=headers,
                 json=payload,
-                timeout=timeout_s,
+                timeout_s=timeout_s,
             )
             response.raise_for_status()
             content = _extract_content(response.json())
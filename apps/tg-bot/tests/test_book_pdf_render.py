@@ -37,6 +37,7 @@ def test_book_pdf_has_8_pages_and_image_xobject(tmp_path: Path, monkeypatch: pyt
         return {"id": asset_id, "storage_key": "book/test.png"}
 
     monkeypatch.setattr(br.assets, "get_by_id", fake_get_by_id)
+    monkeypatch.setattr(br.assets, "get_rendition", lambda _asset_id, _rendition: None)
     monkeypatch.setattr(br, "_resolve_asset_file_path", lambda _row: img)
 
     script = {
@@ -59,6 +60,7 @@ def test_book_pdf_skips_missing_asset_file_with_warning(monkeypatch: pytest.Monk
         return {"id": asset_id, "storage_key": "list-session", "sha256": "abc", "mime": "image/png"}
 
     monkeypatch.setattr(br.assets, "get_by_id", fake_get_by_id)
+    monkeypatch.setattr(br.assets, "get_rendition", lambda _asset_id, _rendition: None)
 
     script = {
         "title": "Тест",
@@ -83,6 +85,7 @@ def test_book_pdf_skips_invalid_image_file_without_exception_spam(tmp_path: Path
         return {"id": asset_id, "storage_key": "images/invalid.bin", "sha256": "deadbeef", "mime": "image/png"}
 
     monkeypatch.setattr(br.assets, "get_by_id", fake_get_by_id)
+    monkeypatch.setattr(br.assets, "get_rendition", lambda _asset_id, _rendition: None)
     monkeypatch.setattr(br, "_resolve_asset_file_path", lambda _row: bad)
 
     script = {
@@ -97,3 +100,28 @@ def test_book_pdf_skips_invalid_image_file_without_exception_spam(tmp_path: Path
     assert "book.pdf invalid image file" in caplog.text
     assert "book.pdf image draw failed" not in caplog.text
     assert _count_pages_with_images(pdf_bytes) < 8
+
+
+@pytest.mark.skipif(br.canvas is None, reason="reportlab unavailable")
+def test_book_pdf_prefers_print_rendition(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    pil = pytest.importorskip("PIL.Image")
+    img = tmp_path / "print.jpg"
+    pil.new("RGB", (8, 8), (120, 80, 200)).save(img, format="JPEG")
+    resolved = []
+
+    def fake_get_rendition(asset_id: int, rendition: str):
+        return {"id": 100 + asset_id, "storage_key": "book/print.jpg", "original_asset_id": asset_id}
+
+    def fake_resolve(row):
+        resolved.append(row["id"])
+        return img
+
+    monkeypatch.setattr(br.assets, "get_rendition", fake_get_rendition)
+    monkeypatch.setattr(br.assets, "get_by_id", lambda _asset_id: pytest.fail("original must not be loaded"))
+    monkeypatch.setattr(br, "_resolve_asset_file_path", fake_resolve)
+
+    script = {"title": "Тест", "pages": [{"page_no": 1, "heading": "Страница", "text": "Текст"}]}
+    pdf_bytes = br._build_book_pdf_bytes(script, child_name="Дружок", image_assets=[1])
+
+    assert resolved == [101]
+    assert _count_pages_with_images(pdf_bytes) == 1
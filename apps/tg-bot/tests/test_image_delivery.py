@@ -1,8 +1,21 @@
 import asyncio
+import base64
+import io
+import random
 
+import pytest
+
+from packages.llm.src import openrouter_image_provider
 from src.services import image_delivery
 
 
+def _async_value(value):
+    async def _fake(*_args, **_kwargs):
+        return value
+
+    return _fake
+
+
 class DummyBot:
     def __init__(self) -> None:
         self.sent = []
@@ -21,10 +34,10 @@ class DummyBot:
 def test_reference_image_created(monkeypatch):
     captured = {}
 
-    def fake_t2i(_prompt):
+    async def fake_t2i(_prompt):
         return (b"img", "image/png", 10, 10, "sha")
 
-    def fake_store_asset(*, image_bytes, mime, width, height, sha256=None):
+    async def fake_store_asset(*, image_bytes, mime, width, height, sha256=None):
         captured["stored"] = {
             "bytes": image_bytes,
             "mime": mime,
@@ -34,14 +47,13 @@ def test_reference_image_created(monkeypatch):
         }
         return 123, "images/ref.png"
 
-    def fake_insert_session_image(**kwargs):
+    async def fake_insert_session_image(**kwargs):
         captured["insert"] = kwargs
         return 1
 
-    monkeypatch.setattr(image_delivery, "_resolve_retries", lambda: 0)
-    monkeypatch.setattr(image_delivery, "generate_t2i", fake_t2i)
+    monkeypatch.setattr(image_delivery, "agenerate_t2i", fake_t2i)
     monkeypatch.setattr(image_delivery, "_store_asset", fake_store_asset)
-    monkeypatch.setattr(image_delivery.session_images, "get_step_image_asset_id", lambda _sid, step_ui: None)
+    monkeypatch.setattr(image_delivery.session_images, "get_step_image_asset_id", _async_value(None))
     monkeypatch.setattr(image_delivery.session_images, "insert_session_image", fake_insert_session_image)
 
     bot = DummyBot()
@@ -69,10 +81,11 @@ def test_reference_image_created(monkeypatch):
 def test_step_image_uses_reference(monkeypatch):
     captured = {}
 
-    def fake_i2i(_prompt, _bytes, _mime):
+    async def fake_i2i(_prompt, _bytes, _mime, *, reference_data_url=None):
+        captured["reference_data_url"] = reference_data_url
         return (b"img", "image/png", 10, 10, "sha")
 
-    def fake_store_asset(*, image_bytes, mime, width, height, sha256=None):
+    async def fake_store_asset(*, image_bytes, mime, width, height, sha256=None):
         captured["stored"] = {
             "bytes": image_bytes,
             "mime": mime,
@@ -82,16 +95,17 @@ def test_step_image_uses_reference(monkeypatch):
         }
         return 456, "images/step.png"
 
-    def fake_insert_session_image(**kwargs):
+    async def fake_insert_session_image(**kwargs):
         captured["insert"] = kwargs
         return 1
 
-    monkeypatch.setattr(image_delivery, "_resolve_retries", lambda: 0)
-    monkeypatch.setattr(image_delivery, "generate_i2i", fake_i2i)
+    monkeypatch.setattr(image_delivery, "agenerate_i2i", fake_i2i)
     monkeypatch.setattr(image_delivery, "_store_asset", fake_store_asset)
-    monkeypatch.setattr(image_delivery.session_images, "get_step_image_asset_id", lambda _sid, step_ui: 999)
+    monkeypatch.setattr(image_delivery.session_images, "get_step_image_asset_id", _async_value(999))
     monkeypatch.setattr(
-        image_delivery, "_load_reference", lambda _asset_id: image_delivery.ReferencePayload(b"r", "image/png")
+        image_delivery,
+        "_load_reference",
+        _async_value(image_delivery.ReferencePayload(b"r", "image/png", "data:image/png;base64,cg==")),
     )
     monkeypatch.setattr(image_delivery.session_images, "insert_session_image", fake_insert_session_image)
 
@@ -113,6 +127,7 @@ def test_step_image_uses_reference(monkeypatch):
 
     assert captured["insert"]["role"] == "step_image"
     assert captured["insert"]["reference_asset_id"] == 999
+    assert captured["reference_data_url"] == "data:image/png;base64,cg=="
     assert "иллюстрация" in captured["insert"]["prompt"]
     assert bot.sent
 
@@ -120,21 +135,20 @@ def test_step_image_uses_reference(monkeypatch):
 def test_step_image_without_reference(monkeypatch):
     captured = {"called": 0}
 
-    def fake_insert_session_image(**kwargs):
+    async def fake_insert_session_image(**kwargs):
         captured["insert"] = kwargs
         return 1
 
-    def fail_i2i(*_args, **_kwargs):
+    async def fail_i2i(*_args, **_kwargs):
         captured["called"] += 1
         raise AssertionError("i2i should not be called without reference")
 
-    monkeypatch.setattr(image_delivery, "_resolve_retries", lambda: 0)
-    monkeypatch.setattr(image_delivery, "generate_i2i", fail_i2i)
-    monkeypatch.setattr(image_delivery.session_images, "get_step_image_asset_id", lambda _sid, step_ui: None)
+    monkeypatch.setattr(image_delivery, "agenerate_i2i", fail_i2i)
+    monkeypatch.setattr(image_delivery.session_images, "get_step_image_asset_id", _async_value(None))
     monkeypatch.setattr(image_delivery.session_images, "insert_session_image", fake_insert_session_image)
 
     bot = DummyBot()
-    asyncio.run(
+    outcome = asyncio.run(
         image_delivery._generate_and_send_image(
             bot=bot,
             chat_id=1,
@@ -149,64 +163,357 @@ def test_step_image_without_reference(monkeypatch):
         )
     )
 
+    assert outcome == "no_reference"
     assert "insert" not in captured
     assert captured["called"] == 0
     assert not bot.sent
 
 
-def test_retry_on_provider_error(monkeypatch):
-    captured = {"attempts": 0}
+def test_image_steps_with_story_step_ui():
+    schedule = image_delivery.ImageSchedule(story_step_ui=1, total_steps=8, has_image_scene_brief=True)
+    assert schedule.needs_image is True
+    schedule = image_delivery.ImageSchedule(story_step_ui=2, total_steps=8, has_image_scene_brief=True)
+    assert schedule.needs_image is False
 
-    def flaky_t2i(_prompt):
-        captured["attempts"] += 1
-        if captured["attempts"] == 1:
-            raise RuntimeError("boom")
-        return (b"img", "image/png", 10, 10, "sha")
 
-    def fake_store_asset(*, image_bytes, mime, width, height, sha256=None):
-        return 321, "images/retry.png"
+def test_image_steps_plan_for_totals():
+    assert image_delivery.image_steps(8) == {1, 4, 8}
+    assert image_delivery.image_steps(10) == {1, 4, 8}
+    assert image_delivery.image_steps(12) == {1, 5, 9}
 
-    def fake_insert_session_image(**_kwargs):
-        return 1
 
-    monkeypatch.setattr(image_delivery, "_resolve_retries", lambda: 1)
-    monkeypatch.setattr(image_delivery, "generate_t2i", flaky_t2i)
-    monkeypatch.setattr(image_delivery, "_store_asset", fake_store_asset)
-    monkeypatch.setattr(image_delivery.session_images, "insert_session_image", fake_insert_session_image)
+def test_story_step_ui_mapping():
+    assert image_delivery.resolve_story_step_ui(0) == 1
+    assert image_delivery.resolve_story_step_ui(3) == 4
 
-    bot = DummyBot()
-    asyncio.run(
-        image_delivery._generate_and_send_image(
+
+class SlowImageResponse:
+    def __init__(self, delay_s):
+        self.delay_s = delay_s
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.delay_s)
+        return self
+
+    async def __aexit__(self, *_exc):
+        return False
+
+    def raise_for_status(self):
+        return None
+
+    async def json(self, content_type=None):
+        data = base64.b64encode(b"\x89PNG\r\n\x1a\nslow").decode("ascii")
+        return {"choices": [{"message": {"images": [{"image_url": {"url": f"data:image/png;base64,{data}"}}]}}]}
+
+
+class SlowImageSession:
+    def post(self, *_args, **_kwargs):
+        return SlowImageResponse(0.3)
+
+
+def test_slow_generation_keeps_loop_responsive(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("ASSETS_ROOT", str(tmp_path))
+    monkeypatch.setattr(openrouter_image_provider.http_client, "get_async_session", lambda: SlowImageSession())
+    monkeypatch.setattr(image_delivery.assets, "insert_asset", _async_value(77))
+    monkeypatch.setattr(image_delivery.session_images, "insert_session_image", _async_value(1))
+
+    async def scenario():
+        ticks = 0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not done.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker_task = asyncio.create_task(ticker())
+        bot = DummyBot()
+        await image_delivery._generate_and_send_image(
             bot=bot,
             chat_id=1,
             step_message_id=10,
             session_id=42,
             step_ui=1,
             story_step_ui=1,
-            total_steps=10,
+            total_steps=8,
             prompt="scene",
             theme_id=None,
-            image_scene_brief="Короткая сцена.",
+            image_scene_brief="Сцена.",
         )
-    )
+        done.set()
+        await ticker_task
+        return ticks, bot
 
-    assert captured["attempts"] == 2
+    ticks, bot = asyncio.run(scenario())
+
+    assert ticks >= 15
     assert bot.sent
+    assert any(tmp_path.rglob("*.png"))
+
+
+def _job(job_id=1, *, step_ui=1, attempts=1, asset_id=None):
+    return {
+        "id": job_id,
+        "session_id": 42,
+        "step_ui": step_ui,
+        "asset_id": asset_id,
+        "attempts": attempts,
+        "prompt": "Сцена.",
+        "job_json": {
+            "chat_id": 1,
+            "step_message_id": 10,
+            "step_ui": step_ui,
+            "total_steps": 8,
+            "prompt": "scene",
+            "theme_id": None,
+            "image_scene_brief": "Сцена.",
+        },
+    }
+
+
+class FakeJobQueue:
+    def __init__(self, jobs):
+        self.jobs = list(jobs)
+        self.claim_limits = []
+        self.calls = []
+
+    async def claim_jobs(self, owner, *, limit, lease_s):
+        self.claim_limits.append(limit)
+        claimed, self.jobs = self.jobs[:limit], self.jobs[limit:]
+        return claimed
+
+    async def complete_job(self, job_id, owner):
+        self.calls.append(("complete", job_id))
+        return True
+
+    async def retry_job(self, job_id, owner, *, error, delay_s, max_attempts):
+        self.calls.append(("retry", job_id, max_attempts))
+        return "pending"
+
+    async def defer_job(self, job_id, owner, *, delay_s, reason):
+        self.calls.append(("defer", job_id, reason))
+        return True
+
+    async def fail_job(self, job_id, owner, *, reason):
+        self.calls.append(("fail", job_id, reason))
+        return True
+
+    async def release_jobs(self, owner, *, refund_attempt):
+        self.calls.append(("release", refund_attempt))
+        return 0
+
+    def install(self, monkeypatch):
+        for name in ("claim_jobs", "complete_job", "retry_job", "defer_job", "fail_job", "release_jobs"):
+            monkeypatch.setattr(image_delivery.session_images, name, getattr(self, name))
+
+
+def _run_worker(bot, until, *, timeout_s=2.0):
+    async def scenario():
+        worker = image_delivery.ImageJobWorker(bot, owner="test-worker")
+        worker.poll_s = 0.01
+        worker.start()
+        deadline = asyncio.get_running_loop().time() + timeout_s
+        while not until() and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.01)
+        await worker.stop()
+        return worker
+
+    return asyncio.run(scenario())
+
+
+def test_worker_completes_claimed_job(monkeypatch):
+    queue = FakeJobQueue([_job()])
+    queue.install(monkeypatch)
+    monkeypatch.setattr(image_delivery, "agenerate_t2i", _async_value((b"img", "image/png", 10, 10, "sha")))
+    monkeypatch.setattr(image_delivery, "_store_asset", _async_value((5, "images/a.png")))
+    monkeypatch.setattr(image_delivery.session_images, "insert_session_image", _async_value(1))
 
+    bot = DummyBot()
+    worker = _run_worker(bot, lambda: ("complete", 1) in queue.calls)
 
-def test_image_steps_with_story_step_ui():
-    schedule = image_delivery.ImageSchedule(story_step_ui=1, total_steps=8, has_image_scene_brief=True)
-    assert schedule.needs_image is True
-    schedule = image_delivery.ImageSchedule(story_step_ui=2, total_steps=8, has_image_scene_brief=True)
-    assert schedule.needs_image is False
+    assert ("complete", 1) in queue.calls
+    assert bot.sent[0]["reply_to_message_id"] == 10
+    assert worker.stats()["completed"] == 1
+    assert queue.calls[-1] == ("release", True)
 
 
-def test_image_steps_plan_for_totals():
-    assert image_delivery.image_steps(8) == {1, 4, 8}
-    assert image_delivery.image_steps(10) == {1, 4, 8}
-    assert image_delivery.image_steps(12) == {1, 5, 9}
+def test_worker_retries_failed_attempt(monkeypatch):
+    queue = FakeJobQueue([_job()])
+    queue.install(monkeypatch)
 
+    async def failing_t2i(_prompt):
+        raise RuntimeError("boom")
 
-def test_story_step_ui_mapping():
-    assert image_delivery.resolve_story_step_ui(0) == 1
-    assert image_delivery.resolve_story_step_ui(3) == 4
+    monkeypatch.setenv("IMAGE_JOB_MAX_ATTEMPTS", "3")
+    monkeypatch.setattr(image_delivery, "agenerate_t2i", failing_t2i)
+
+    bot = DummyBot()
+    worker = _run_worker(bot, lambda: any(call[0] == "retry" for call in queue.calls))
+
+    assert ("retry", 1, 3) in queue.calls
+    assert worker.stats()["retried"] == 1
+    assert not bot.sent
+
+
+def test_worker_fails_job_past_max_attempts(monkeypatch):
+    queue = FakeJobQueue([_job(attempts=3)])
+    queue.install(monkeypatch)
+    monkeypatch.setenv("IMAGE_JOB_MAX_ATTEMPTS", "2")
+
+    async def unexpected_t2i(_prompt):
+        raise AssertionError("exhausted job must not call the provider")
+
+    monkeypatch.setattr(image_delivery, "agenerate_t2i", unexpected_t2i)
+
+    _run_worker(DummyBot(), lambda: any(call[0] == "fail" for call in queue.calls))
+
+    assert ("fail", 1, "attempts_exhausted") in queue.calls
+
+
+def test_worker_defers_until_reference_exists(monkeypatch):
+    queue = FakeJobQueue([_job(step_ui=4)])
+    queue.install(monkeypatch)
+    monkeypatch.setattr(image_delivery.session_images, "get_step_image_asset_id", _async_value(None))
+    monkeypatch.setattr(image_delivery.session_images, "get_step_image_job_state", _async_value("running"))
+
+    _run_worker(DummyBot(), lambda: any(call[0] == "defer" for call in queue.calls))
+
+    assert ("defer", 1, "waiting_for_reference") in queue.calls
+
+
+def test_worker_resends_stored_asset_without_generation(monkeypatch, tmp_path):
+    monkeypatch.setenv("ASSETS_ROOT", str(tmp_path))
+    (tmp_path / "images").mkdir()
+    (tmp_path / "images" / "stored.png").write_bytes(b"img")
+    queue = FakeJobQueue([_job(asset_id=9, attempts=2)])
+    queue.install(monkeypatch)
+    monkeypatch.setattr(image_delivery.assets, "get_rendition", _async_value(None))
+    monkeypatch.setattr(image_delivery.assets, "get_by_id", _async_value({"storage_key": "images/stored.png"}))
+
+    async def unexpected_t2i(_prompt):
+        raise AssertionError("stored asset must be resent, not regenerated")
+
+    monkeypatch.setattr(image_delivery, "agenerate_t2i", unexpected_t2i)
+
+    bot = DummyBot()
+    _run_worker(bot, lambda: ("complete", 1) in queue.calls)
+
+    assert bot.sent[0]["filename"] == "images/stored.png"
+
+
+def test_worker_pool_is_bounded(monkeypatch):
+    monkeypatch.setenv("IMAGE_JOB_CONCURRENCY", "2")
+    queue = FakeJobQueue([_job(job_id) for job_id in range(1, 6)])
+    queue.install(monkeypatch)
+    running = {"now": 0, "peak": 0}
+
+    async def slow_t2i(_prompt):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.05)
+        running["now"] -= 1
+        return (b"img", "image/png", 10, 10, "sha")
+
+    monkeypatch.setattr(image_delivery, "agenerate_t2i", slow_t2i)
+    monkeypatch.setattr(image_delivery, "_store_asset", _async_value((5, "images/a.png")))
+    monkeypatch.setattr(image_delivery.session_images, "insert_session_image", _async_value(1))
+
+    bot = DummyBot()
+    _run_worker(bot, lambda: sum(call[0] == "complete" for call in queue.calls) == 5)
+
+    assert running["peak"] == 2
+    assert max(queue.claim_limits) == 2
+    assert len(bot.sent) == 5
+
+
+def test_worker_resends_by_cached_file_id(monkeypatch, tmp_path):
+    monkeypatch.setenv("ASSETS_ROOT", str(tmp_path))
+    queue = FakeJobQueue([_job(asset_id=9, attempts=2)])
+    queue.install(monkeypatch)
+    monkeypatch.setattr(image_delivery.assets, "get_rendition", _async_value(None))
+    monkeypatch.setattr(
+        image_delivery.assets,
+        "get_by_id",
+        _async_value({"storage_key": "images/gone.png", "telegram_file_id": "file-9", "telegram_media": "photo"}),
+    )
+    photos = []
+
+    class FileIdBot:
+        async def send_photo(self, *, chat_id, photo, caption, reply_to_message_id):  # noqa: ANN001
+            photos.append(photo)
+
+    _run_worker(FileIdBot(), lambda: ("complete", 1) in queue.calls)
+
+    assert photos == ["file-9"]
+
+
+def test_reference_is_loaded_once_and_cached(monkeypatch, tmp_path):
+    monkeypatch.setenv("ASSETS_ROOT", str(tmp_path))
+    (tmp_path / "images").mkdir()
+    (tmp_path / "images" / "ref.png").write_bytes(b"ref-bytes")
+    cache = image_delivery.get_reference_cache()
+    cache.clear()
+    lookups = []
+
+    async def fake_get_by_id(asset_id):
+        lookups.append(asset_id)
+        return {"storage_key": "images/ref.png", "mime": "image/png", "sha256": "a" * 64}
+
+    monkeypatch.setattr(image_delivery.assets, "get_by_id", fake_get_by_id)
+
+    async def scenario():
+        return [await image_delivery._load_reference(555) for _ in range(3)]
+
+    payloads = asyncio.run(scenario())
+
+    assert lookups == [555]
+    assert payloads[0].data_url == "data:image/png;base64," + base64.b64encode(b"ref-bytes").decode("ascii")
+    assert payloads[2].bytes is payloads[0].bytes
+    assert cache.stats()["hits"] == 2
+    cache.clear()
+
+
+def test_fresh_image_is_sent_as_telegram_rendition(monkeypatch, tmp_path):
+    pil = pytest.importorskip("PIL.Image")
+    rng = random.Random(3)
+    img = pil.new("RGB", (300, 200))
+    img.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(300 * 200)])
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    source = buf.getvalue()
+    inserted = []
+
+    async def fake_insert_asset(**kwargs):
+        inserted.append(kwargs)
+        return len(inserted)
+
+    monkeypatch.setenv("ASSETS_ROOT", str(tmp_path))
+    monkeypatch.setattr(image_delivery, "agenerate_t2i", _async_value((source, "image/png", 300, 200, "f" * 64)))
+    monkeypatch.setattr(image_delivery.assets, "insert_asset", fake_insert_asset)
+    monkeypatch.setattr(image_delivery.session_images, "insert_session_image", _async_value(1))
+
+    bot = DummyBot()
+    outcome = asyncio.run(
+        image_delivery._generate_and_send_image(
+            bot=bot,
+            chat_id=1,
+            step_message_id=10,
+            session_id=42,
+            step_ui=1,
+            story_step_ui=1,
+            total_steps=8,
+            prompt="scene",
+            theme_id=None,
+            image_scene_brief="Сцена.",
+        )
+    )
+
+    assert outcome == "ok"
+    assert inserted[0]["storage_key"].endswith(".png")
+    assert inserted[1]["rendition"] == "telegram"
+    assert inserted[1]["original_asset_id"] == 1
+    assert inserted[1]["mime"] == "image/jpeg"
+    assert inserted[1]["bytes"] < len(source)
+    assert bot.sent[0]["filename"].endswith(".jpg")
@@ -0,0 +1,71 @@
+import asyncio
+import io
+import random
+
+import pytest
+
+from src.services import image_renditions
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _noisy_png(width, height, *, mode="RGB"):
+    rng = random.Random(7)
+    img = Image.new(mode, (width, height))
+    channels = len(mode)
+    img.putdata([tuple(rng.randrange(256) for _ in range(channels)) for _ in range(width * height)])
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_extension_follows_mime():
+    assert image_renditions.extension_for_mime("image/jpeg") == "jpg"
+    assert image_renditions.extension_for_mime("image/webp") == "webp"
+    assert image_renditions.extension_for_mime("image/png") == "png"
+    assert image_renditions.extension_for_mime("application/octet-stream") == "bin"
+
+
+def test_telegram_rendition_is_downscaled_jpeg(monkeypatch):
+    monkeypatch.setenv("IMAGE_TELEGRAM_MAX_SIDE", "64")
+    source = _noisy_png(200, 100)
+
+    rendition = image_renditions.render(source, image_renditions.rendition_spec("telegram"))
+
+    assert rendition.mime == "image/jpeg"
+    assert (rendition.width, rendition.height) == (64, 32)
+    assert len(rendition.data) < len(source)
+    with Image.open(io.BytesIO(rendition.data)) as img:
+        assert img.format == "JPEG"
+
+
+def test_webp_rendition_flattens_alpha(monkeypatch):
+    monkeypatch.setenv("IMAGE_TELEGRAM_FORMAT", "webp")
+    source = _noisy_png(120, 120, mode="RGBA")
+
+    rendition = image_renditions.render(source, image_renditions.rendition_spec("telegram"))
+
+    assert rendition.mime == "image/webp"
+    with Image.open(io.BytesIO(rendition.data)) as img:
+        assert img.mode == "RGB"
+
+
+def test_rendition_that_does_not_shrink_is_skipped():
+    img = Image.new("RGB", (4, 4), (255, 255, 255))
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+
+    assert image_renditions.render(out.getvalue(), image_renditions.rendition_spec("print")) is None
+
+
+def test_arender_runs_in_pool_and_drops_failures(monkeypatch):
+    monkeypatch.setenv("IMAGE_PRINT_MAX_SIDE", "100")
+    source = _noisy_png(300, 200)
+
+    renditions = asyncio.run(image_renditions.arender(source, ("telegram", "print")))
+    broken = asyncio.run(image_renditions.arender(b"not an image", ("telegram",)))
+    image_renditions.close_rendition_pool()
+
+    assert set(renditions) == {"telegram", "print"}
+    assert max(renditions["print"].width, renditions["print"].height) == 100
+    assert broken == {}
@@ -0,0 +1,295 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[3]
+APP_ROOT = ROOT / "apps" / "tg-bot"
+if str(APP_ROOT) not in sys.path:
+    sys.path.insert(0, str(APP_ROOT))
+
+from db.repos import l3_turns  # noqa: E402
+from packages.engine.src.engine_v0_1 import init_state_v01  # noqa: E402
+from packages.llm.src.mock_provider import MockProvider  # noqa: E402
+from src.services import l3_runtime  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _reset_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("LLM_PROVIDER", "mock")
+    monkeypatch.setenv("LLM_MOCK_MODE", "ok")
+    monkeypatch.setattr(l3_runtime, "_RESERVATION_POLL_S", 0)
+
+
+def _session_row() -> dict:
+    return {
+        "id": 7,
+        "sid8": "abcd1234",
+        "step": 0,
+        "max_steps": 4,
+        "theme_id": "test",
+        "params_json": init_state_v01(4),
+        "facts_json": {},
+    }
+
+
+def _reservation(session_row: dict) -> l3_turns.L3Reservation:
+    return l3_turns.L3Reservation(
+        tg_id=1,
+        sid8=session_row["sid8"],
+        expected_step=0,
+        step=0,
+        event_id=11,
+        reservation_id="r1",
+        session_row=session_row,
+    )
+
+
+def test_apply_l3_turn_generates_between_reserve_and_commit(monkeypatch):
+    calls = []
+    session_row = _session_row()
+
+    def fake_reserve(**kwargs):
+        calls.append("reserve")
+        return l3_turns.L3ApplyResult(
+            outcome="reserved",
+            session_row=session_row,
+            step=0,
+            event=None,
+            payload=None,
+            reservation=_reservation(session_row),
+        )
+
+    def fake_commit(reservation, payload):
+        calls.append("commit")
+        return l3_turns.L3ApplyResult(
+            outcome="accepted",
+            session_row=session_row,
+            step=int(payload.new_state["step0"]),
+            event=None,
+            payload=payload,
+        )
+
+    monkeypatch.setattr(l3_runtime.l3_turns, "reserve_l3_turn", fake_reserve)
+    monkeypatch.setattr(l3_runtime.l3_turns, "commit_l3_turn", fake_commit)
+
+    result = asyncio.run(
+        l3_runtime.apply_l3_turn(
+            tg_id=1,
+            sid8="abcd1234",
+            st2=0,
+            turn={"kind": "choice", "choice_id": "A"},
+            source_message_id=99,
+            req_id="req",
+        )
+    )
+
+    assert calls == ["reserve", "commit"]
+    assert result.status == "accepted"
+    assert result.step == 1
+    assert result.step_view.text
+
+
+def test_apply_l3_turn_waits_for_inflight_duplicate(monkeypatch):
+    session_row = _session_row()
+    stored = {"text": "stored step", "choices": [], "allow_free_text": False, "final_id": None}
+    outcomes = iter(["pending", "pending", "duplicate"])
+
+    def fake_reserve(**kwargs):
+        outcome = next(outcomes)
+        return l3_turns.L3ApplyResult(
+            outcome=outcome,
+            session_row={**session_row, "step": 1} if outcome == "duplicate" else session_row,
+            step=0,
+            event={"step_result_json": stored} if outcome == "duplicate" else None,
+            payload=None,
+        )
+
+    def fail_commit(*_args, **_kwargs):
+        raise AssertionError("duplicate must not commit")
+
+    monkeypatch.setattr(l3_runtime.l3_turns, "reserve_l3_turn", fake_reserve)
+    monkeypatch.setattr(l3_runtime.l3_turns, "commit_l3_turn", fail_commit)
+
+    result = asyncio.run(
+        l3_runtime.apply_l3_turn(
+            tg_id=1,
+            sid8="abcd1234",
+            st2=0,
+            turn={"kind": "choice", "choice_id": "A"},
+            source_message_id=99,
+        )
+    )
+
+    assert result.status == "duplicate"
+    assert result.step_view.text.startswith("stored step")
+
+
+def test_apply_l3_turn_releases_reservation_on_failure(monkeypatch):
+    session_row = _session_row()
+    released = []
+
+    def fake_reserve(**kwargs):
+        return l3_turns.L3ApplyResult(
+            outcome="reserved",
+            session_row=session_row,
+            step=0,
+            event=None,
+            payload=None,
+            reservation=_reservation(session_row),
+        )
+
+    async def broken_payload(*_args, **_kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(l3_runtime.l3_turns, "reserve_l3_turn", fake_reserve)
+    monkeypatch.setattr(l3_runtime.l3_turns, "release_l3_turn", released.append)
+    monkeypatch.setattr(l3_runtime, "_build_turn_payload", broken_payload)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(
+            l3_runtime.apply_l3_turn(
+                tg_id=1,
+                sid8="abcd1234",
+                st2=0,
+                turn={"kind": "choice", "choice_id": "A"},
+                source_message_id=99,
+            )
+        )
+
+    assert [reservation.reservation_id for reservation in released] == ["r1"]
+
+
+def test_apply_l3_turn_releases_reservation_when_commit_fails(monkeypatch):
+    session_row = _session_row()
+    released = []
+
+    def fake_reserve(**kwargs):
+        return l3_turns.L3ApplyResult(
+            outcome="reserved",
+            session_row=session_row,
+            step=0,
+            event=None,
+            payload=None,
+            reservation=_reservation(session_row),
+        )
+
+    def failing_commit(reservation, payload):
+        raise ValueError("status must be FINISHED or ABORTED")
+
+    monkeypatch.setattr(l3_runtime.l3_turns, "reserve_l3_turn", fake_reserve)
+    monkeypatch.setattr(l3_runtime.l3_turns, "commit_l3_turn", failing_commit)
+    monkeypatch.setattr(l3_runtime.l3_turns, "release_l3_turn", released.append)
+
+    with pytest.raises(ValueError):
+        asyncio.run(
+            l3_runtime.apply_l3_turn(
+                tg_id=1,
+                sid8="abcd1234",
+                st2=0,
+                turn={"kind": "choice", "choice_id": "A"},
+                source_message_id=99,
+            )
+        )
+
+    assert [reservation.reservation_id for reservation in released] == ["r1"]
+
+
+def test_apply_l3_turn_releases_off_loop_when_cancelled(monkeypatch):
+    session_row = _session_row()
+    threads = []
+    released = []
+
+    def fake_reserve(**kwargs):
+        threads.append(threading.get_ident())
+        return l3_turns.L3ApplyResult(
+            outcome="reserved",
+            session_row=session_row,
+            step=0,
+            event=None,
+            payload=None,
+            reservation=_reservation(session_row),
+        )
+
+    def fake_release(reservation):
+        threads.append(threading.get_ident())
+        released.append(reservation)
+        return True
+
+    async def slow_payload(*_args, **_kwargs):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(l3_runtime.l3_turns, "reserve_l3_turn", fake_reserve)
+    monkeypatch.setattr(l3_runtime.l3_turns, "release_l3_turn", fake_release)
+    monkeypatch.setattr(l3_runtime, "_build_turn_payload", slow_payload)
+
+    async def _run() -> int:
+        task = asyncio.create_task(
+            l3_runtime.apply_l3_turn(
+                tg_id=1,
+                sid8="abcd1234",
+                st2=0,
+                turn={"kind": "choice", "choice_id": "A"},
+                source_message_id=99,
+            )
+        )
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(_run())
+
+    assert [reservation.reservation_id for reservation in released] == ["r1"]
+    assert len(threads) == 2
+    assert loop_thread not in threads
+
+
+def test_apply_l3_turn_uses_single_story_turn_call(monkeypatch):
+    session_row = _session_row()
+    requested = []
+    original_generate = MockProvider.generate
+
+    def counting_generate(self, step_ctx):
+        requested.append(step_ctx.get("expected_type"))
+        return original_generate(self, step_ctx)
+
+    def fake_reserve(**kwargs):
+        return l3_turns.L3ApplyResult(
+            outcome="reserved",
+            session_row=session_row,
+            step=0,
+            event=None,
+            payload=None,
+            reservation=_reservation(session_row),
+        )
+
+    def fake_commit(reservation, payload):
+        return l3_turns.L3ApplyResult(
+            outcome="accepted",
+            session_row=session_row,
+            step=int(payload.new_state["step0"]),
+            event=None,
+            payload=payload,
+        )
+
+    monkeypatch.setattr(MockProvider, "generate", counting_generate)
+    monkeypatch.setattr(l3_runtime.l3_turns, "reserve_l3_turn", fake_reserve)
+    monkeypatch.setattr(l3_runtime.l3_turns, "commit_l3_turn", fake_commit)
+
+    result = asyncio.run(
+        l3_runtime.apply_l3_turn(
+            tg_id=1,
+            sid8="abcd1234",
+            st2=0,
+            turn={"kind": "free_text", "text": "Пойду к реке и позову друга"},
+            source_message_id=99,
+        )
+    )
+
+    assert requested == ["story_turn"]
+    assert result.status == "accepted"
+    assert result.step == 1
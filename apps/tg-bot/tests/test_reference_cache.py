@@ -0,0 +1,51 @@
+import base64
+
+from src.services.reference_cache import ReferenceCache
+
+
+def test_hit_miss_counters_and_lookup_by_sha256():
+    cache = ReferenceCache(1024)
+
+    assert cache.get(1) is None
+    entry = cache.put(asset_id=1, mime="image/png", data=b"abc")
+
+    assert cache.get(1) is entry
+    assert cache.get_by_sha256(entry.sha256) is entry
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_data_url_is_encoded_once_and_accounted():
+    cache = ReferenceCache(1024)
+    entry = cache.put(asset_id=1, mime="image/png", data=b"abc")
+
+    first = entry.data_url()
+
+    assert first == "data:image/png;base64," + base64.b64encode(b"abc").decode("ascii")
+    assert entry.data_url() is first
+    assert cache.stats()["bytes"] == 3 + len(first)
+
+
+def test_least_recently_used_entry_is_evicted_by_size():
+    cache = ReferenceCache(25)
+    cache.put(asset_id=1, mime="image/png", data=b"a" * 10)
+    cache.put(asset_id=2, mime="image/png", data=b"b" * 10)
+    cache.get(1)
+    cache.put(asset_id=3, mime="image/png", data=b"c" * 10)
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.get(3) is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 20
+
+
+def test_oversized_image_is_returned_but_not_cached():
+    cache = ReferenceCache(4)
+
+    entry = cache.put(asset_id=1, mime="image/png", data=b"too-large")
+
+    assert entry.data == b"too-large"
+    assert entry.data_url().startswith("data:image/png;base64,")
+    assert cache.get(1) is None
+    assert cache.stats()["bytes"] == 0
@@ -0,0 +1,186 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[3]
+APP_ROOT = ROOT / "apps" / "tg-bot"
+if str(APP_ROOT) not in sys.path:
+    sys.path.insert(0, str(APP_ROOT))
+
+from packages.engine.src.engine_v0_1 import init_state_v01  # noqa: E402
+from packages.llm.src import scheduler  # noqa: E402
+from packages.llm.src.mock_provider import MockProvider  # noqa: E402
+from src.services import speculation  # noqa: E402
+from src.services.story_runtime import abuild_turn_step_result  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _reset_env(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("LLM_PROVIDER", "mock")
+    monkeypatch.setenv("LLM_MOCK_MODE", "ok")
+    monkeypatch.setenv("L3_SPECULATION_ENABLED", "1")
+    speculation.reset()
+    yield
+    speculation.reset()
+
+
+def _session_row(session_id: int = 7, user_id: int = 1) -> dict:
+    return {
+        "id": session_id,
+        "user_id": user_id,
+        "sid8": "abcd1234",
+        "step": 0,
+        "max_steps": 4,
+        "status": "ACTIVE",
+        "theme_id": "test",
+        "params_json": init_state_v01(4),
+        "facts_json": {},
+    }
+
+
+def test_claim_returns_speculated_step_and_discards_siblings():
+    async def scenario():
+        session_row = _session_row()
+        assert speculation.schedule_for_session_row(session_row) == 3
+        await asyncio.sleep(0)
+        step_result = await speculation.claim(session_row, "B")
+        return step_result
+
+    step_result = asyncio.run(scenario())
+
+    assert isinstance(step_result, dict)
+    assert step_result.get("text")
+    stats = speculation.speculation_stats()
+    assert stats["hits"] + stats["inflight_hits"] == 1
+    assert stats["wasted"] == 2
+    assert stats["discarded_by_reason"] == {"not_chosen": 2}
+    assert stats["hit_rate"] == 1.0
+
+
+def test_claim_misses_when_state_changed():
+    async def scenario():
+        session_row = _session_row()
+        speculation.schedule_for_session_row(session_row)
+        changed = {**session_row, "facts_json": {"pet": "cat"}}
+        return await speculation.claim(changed, "A")
+
+    assert asyncio.run(scenario()) is None
+    stats = speculation.speculation_stats()
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.0
+
+
+def test_schedule_respects_per_user_budget(monkeypatch):
+    monkeypatch.setenv("L3_SPECULATION_MAX_PER_USER", "2")
+
+    async def scenario():
+        return speculation.schedule_for_session_row(_session_row())
+
+    assert asyncio.run(scenario()) == 2
+    assert speculation.speculation_stats()["skipped_budget"] == 1
+
+
+def test_schedule_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("L3_SPECULATION_ENABLED")
+
+    assert speculation.schedule_for_session_row(_session_row()) == 0
+    assert speculation.speculation_stats()["scheduled"] == 0
+
+
+def test_schedule_for_session_loads_row_async(monkeypatch):
+    loaded = []
+
+    async def fake_get_by_id(session_id):
+        loaded.append(session_id)
+        return _session_row(session_id=session_id)
+
+    monkeypatch.setattr(speculation.sessions, "get_by_id", fake_get_by_id)
+
+    async def scenario():
+        return await speculation.schedule_for_session(9)
+
+    assert asyncio.run(scenario()) == 3
+    assert loaded == [9]
+
+
+def test_live_turn_is_served_before_queued_prefetches(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_INFLIGHT", "1")
+    served = []
+    original_generate = MockProvider.generate
+
+    def recording_generate(self, step_ctx):
+        served.append(step_ctx.get("priority", "live"))
+        return original_generate(self, step_ctx)
+
+    monkeypatch.setattr(MockProvider, "generate", recording_generate)
+
+    async def scenario():
+        hold = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("interactive"):
+                await hold.wait()
+
+        holding = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        session_row = _session_row()
+        assert speculation.schedule_for_session_row(session_row) == 3
+        await asyncio.sleep(0.05)
+        turn = {"kind": "choice", "choice_id": "A"}
+        state = session_row["params_json"]
+        live = asyncio.create_task(
+            abuild_turn_step_result(
+                session_row,
+                state,
+                turn,
+                classify_ctx=None,
+                state_for=lambda resolved: state,
+            )
+        )
+        await asyncio.sleep(0.05)
+        queued = scheduler.scheduler_stats()["classes"]
+        hold.set()
+        await holding
+        await live
+        await asyncio.gather(*(entry.task for entry in speculation._entries.values()))
+        return queued
+
+    queued = asyncio.run(scenario())
+
+    assert queued["background"]["waiting"] == 3
+    assert queued["interactive"]["waiting"] == 1
+    assert served == ["live", "background", "background", "background"]
+
+
+def test_claim_promotes_queued_speculation_when_background_is_saturated(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_INFLIGHT", "2")
+    monkeypatch.setenv("LLM_BACKGROUND_MAX_INFLIGHT", "1")
+
+    async def scenario():
+        hold = asyncio.Event()
+
+        async def book_rewrite():
+            async with scheduler.slot("background"):
+                await hold.wait()
+
+        holding = asyncio.create_task(book_rewrite())
+        await asyncio.sleep(0)
+        session_row = _session_row()
+        assert speculation.schedule_for_session_row(session_row) == 3
+        await asyncio.sleep(0.05)
+        queued = scheduler.scheduler_stats()["classes"]["background"]["waiting"]
+        step_result = await asyncio.wait_for(speculation.claim(session_row, "B"), timeout=2)
+        stats = scheduler.scheduler_stats()
+        hold.set()
+        await holding
+        return queued, step_result, stats
+
+    queued, step_result, stats = asyncio.run(scenario())
+
+    assert queued == 3
+    assert isinstance(step_result, dict)
+    assert stats["classes"]["interactive"]["started"] == 1
+    assert stats["classes"]["background"]["waiting"] == 0
+    assert speculation.speculation_stats()["inflight_hits"] == 1
@@ -0,0 +1,103 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile
+
+from src.services import telegram_files
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats():
+    telegram_files.reset_file_stats()
+    yield
+    telegram_files.reset_file_stats()
+
+
+class FakeChat:
+    def __init__(self, *, reject_file_id=False):
+        self.reject_file_id = reject_file_id
+        self.sent = []
+
+    async def answer_document(self, *, document, caption):
+        self.sent.append(document)
+        if isinstance(document, str) and self.reject_file_id:
+            raise TelegramBadRequest(method=None, message="Bad Request: wrong file identifier/HTTP URL specified")
+        return SimpleNamespace(document=SimpleNamespace(file_id="new-file-id", file_unique_id="uniq"))
+
+
+def _remembered(monkeypatch):
+    remembered = []
+
+    async def fake_set(asset_id, *, media, file_id, file_unique_id):
+        remembered.append((asset_id, media, file_id, file_unique_id))
+
+    monkeypatch.setattr(telegram_files.assets, "set_telegram_file", fake_set)
+    return remembered
+
+
+def _send(chat, asset_row, loads):
+    async def load():
+        loads.append(1)
+        return b"%PDF-1.4"
+
+    return asyncio.run(
+        telegram_files.send_asset(
+            asset_id=7,
+            asset_row=asset_row,
+            media="document",
+            send=lambda document: chat.answer_document(document=document, caption="c"),
+            load=load,
+            filename="book.pdf",
+        )
+    )
+
+
+def test_first_send_uploads_and_remembers_file_id(monkeypatch):
+    remembered = _remembered(monkeypatch)
+    chat = FakeChat()
+    loads = []
+
+    _send(chat, {"id": 7, "telegram_file_id": None}, loads)
+
+    assert isinstance(chat.sent[0], BufferedInputFile)
+    assert loads == [1]
+    assert remembered == [(7, "document", "new-file-id", "uniq")]
+    assert telegram_files.file_stats()["uploaded_bytes"] == 8
+
+
+def test_repeat_send_uses_file_id_without_reading_bytes(monkeypatch):
+    remembered = _remembered(monkeypatch)
+    chat = FakeChat()
+    loads = []
+
+    _send(chat, {"id": 7, "telegram_file_id": "cached", "telegram_media": "document"}, loads)
+
+    assert chat.sent == ["cached"]
+    assert loads == []
+    assert remembered == []
+    assert telegram_files.file_stats()["file_id_sent"] == 1
+
+
+def test_file_id_of_other_media_is_not_reused(monkeypatch):
+    _remembered(monkeypatch)
+    chat = FakeChat()
+
+    _send(chat, {"id": 7, "telegram_file_id": "photo-id", "telegram_media": "photo"}, [])
+
+    assert isinstance(chat.sent[0], BufferedInputFile)
+
+
+def test_rejected_file_id_falls_back_to_bytes(monkeypatch):
+    remembered = _remembered(monkeypatch)
+    chat = FakeChat(reject_file_id=True)
+    loads = []
+
+    _send(chat, {"id": 7, "telegram_file_id": "stale", "telegram_media": "document"}, loads)
+
+    assert chat.sent[0] == "stale"
+    assert isinstance(chat.sent[1], BufferedInputFile)
+    assert loads == [1]
+    assert remembered == [(7, "document", "new-file-id", "uniq")]
+    assert telegram_files.file_stats()["file_id_rejected"] == 1
@@ -0,0 +1,262 @@
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[3]
+APP_ROOT = ROOT / "apps" / "tg-bot"
+if str(APP_ROOT) not in sys.path:
+    sys.path.insert(0, str(APP_ROOT))
+
+from src.services import ui_delivery  # noqa: E402
+from src.services.story_runtime import StepView  # noqa: E402
+
+
+class FakeBot:
+    def __init__(self):
+        self.edits = []
+        self.deleted = []
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, reply_markup=None):
+        self.edits.append((message_id, text, reply_markup))
+
+    async def delete_message(self, chat_id=None, message_id=None):
+        self.deleted.append(message_id)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.bot = FakeBot()
+        self.chat = SimpleNamespace(id=1)
+        self.sent = []
+
+    async def answer(self, text, reply_markup=None):
+        sent = SimpleNamespace(chat=self.chat, message_id=100 + len(self.sent), text=text)
+        self.sent.append(sent)
+        return sent
+
+
+@pytest.fixture(autouse=True)
+def _stream_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("TG_STREAM_ENABLED", "1")
+    monkeypatch.setenv("TG_STREAM_EDIT_INTERVAL_MS", "60000")
+    monkeypatch.setenv("TG_STREAM_EDIT_MIN_CHARS", "10")
+
+
+def test_step_text_stream_throttles_edits():
+    message = FakeMessage()
+    stream = ui_delivery.StepTextStream(message, prelude="Твой выбор: A")
+
+    async def scenario():
+        for text in ["Жили", "Жили-были", "Жили-были кот и пёс", "Жили-были кот и пёс!"]:
+            await stream.push(text)
+
+    asyncio.run(scenario())
+
+    assert [sent.text for sent in message.sent] == ["Твой выбор: A", "Жили …"]
+    assert stream.placeholder is message.sent[1]
+    assert [text for _, text, _ in message.bot.edits] == ["Жили-были кот и пёс …"]
+
+
+def test_step_text_stream_discard_removes_messages():
+    message = FakeMessage()
+    stream = ui_delivery.StepTextStream(message, prelude="Твой выбор: A")
+
+    async def scenario():
+        await stream.push("Жили")
+        await stream.discard()
+
+    asyncio.run(scenario())
+
+    assert message.bot.deleted == [101, 100]
+    assert stream.placeholder is None
+
+
+def test_deliver_step_view_reuses_stream_placeholder(monkeypatch):
+    message = FakeMessage()
+    placeholder = SimpleNamespace(chat=message.chat, message_id=55)
+    shown = []
+
+    async def fake_acquire(**_kwargs):
+        return ui_delivery.UiAcquireResult(decision="show", event_id=9)
+
+    async def fake_commit(writes):
+        shown.extend(write.step_message_id for write in writes)
+        return [None for _ in writes]
+
+    monkeypatch.setattr(ui_delivery, "acquire_step_event", fake_acquire)
+    monkeypatch.setattr(ui_delivery.delivery, "commit_deliveries", fake_commit)
+    monkeypatch.setattr(ui_delivery, "plan_image_delivery", lambda **_kwargs: None)
+
+    delivered = asyncio.run(
+        ui_delivery.deliver_step_view(
+            message=message,
+            step_view=StepView(text="Готовый шаг", keyboard="kb"),
+            session_id=7,
+            step=1,
+            theme_id="test",
+            total_steps=4,
+            placeholder=placeholder,
+        )
+    )
+
+    assert delivered is True
+    assert message.sent == []
+    assert message.bot.edits == [(55, "Готовый шаг", "kb")]
+    assert shown == [55]
+
+
+def test_deferred_delivery_commits_are_batched(monkeypatch):
+    monkeypatch.setenv("TG_DELIVERY_COMMIT", "deferred")
+    monkeypatch.setenv("TG_DELIVERY_FLUSH_INTERVAL_MS", "1")
+    message = FakeMessage()
+    batches = []
+
+    async def fake_acquire(**_kwargs):
+        return ui_delivery.UiAcquireResult(decision="show", event_id=9)
+
+    async def fake_commit(writes):
+        batches.append([write.session_id for write in writes])
+        return [None for _ in writes]
+
+    monkeypatch.setattr(ui_delivery, "acquire_step_event", fake_acquire)
+    monkeypatch.setattr(ui_delivery.delivery, "commit_deliveries", fake_commit)
+    monkeypatch.setattr(ui_delivery, "plan_image_delivery", lambda **_kwargs: None)
+
+    async def scenario():
+        for session_id in (1, 2):
+            delivered = await ui_delivery.deliver_step_view(
+                message=message,
+                step_view=StepView(text=f"Шаг {session_id}", keyboard="kb"),
+                session_id=session_id,
+                step=1,
+                theme_id="test",
+                total_steps=4,
+            )
+            assert delivered is True
+        assert batches == []
+        await ui_delivery.flush_deliveries()
+
+    asyncio.run(scenario())
+
+    assert batches == [[1, 2]]
+
+
+def _write(session_id: int, session_image: dict | None = None):
+    return ui_delivery.DeliveryWrite(
+        session_id=session_id,
+        ui_event_id=None,
+        step_message_id=session_id,
+        sent_at=0,
+        session_image=session_image,
+    )
+
+
+def test_delivery_flusher_requeues_failed_writes(monkeypatch):
+    monkeypatch.setenv("TG_DELIVERY_FLUSH_INTERVAL_MS", "1")
+    calls = []
+    outage = {"left": 1}
+
+    async def flaky_commit(writes):
+        calls.append([write.session_id for write in writes])
+        if outage["left"] > 0 or any(write.session_id == 2 for write in writes):
+            outage["left"] -= 1
+            raise RuntimeError("db down")
+        return [None for _ in writes]
+
+    monkeypatch.setattr(ui_delivery.delivery, "commit_deliveries", flaky_commit)
+
+    async def scenario():
+        flusher = ui_delivery.DeliveryFlusher()
+        flusher.max_attempts = 2
+        for session_id in (1, 2, 3):
+            flusher.submit(_write(session_id))
+        await flusher.drain()
+        return flusher
+
+    flusher = asyncio.run(scenario())
+
+    assert calls == [[1, 2, 3], [1], [2], [3], [2]]
+    assert flusher.flushed == 2
+    assert flusher.failed == 2
+    assert flusher.dropped == 1
+
+
+def test_deferred_delivery_notifies_image_workers_after_commit(monkeypatch):
+    monkeypatch.setenv("TG_DELIVERY_COMMIT", "deferred")
+    monkeypatch.setenv("TG_DELIVERY_FLUSH_INTERVAL_MS", "1")
+    message = FakeMessage()
+    events = []
+    plan = SimpleNamespace(session_image_row=lambda: {"session_id": 7})
+
+    async def fake_acquire(**_kwargs):
+        return ui_delivery.UiAcquireResult(decision="show", event_id=9)
+
+    async def fake_commit(writes):
+        events.append("commit")
+        return [41 for _ in writes]
+
+    monkeypatch.setattr(ui_delivery, "acquire_step_event", fake_acquire)
+    monkeypatch.setattr(ui_delivery.delivery, "commit_deliveries", fake_commit)
+    monkeypatch.setattr(ui_delivery, "plan_image_delivery", lambda **_kwargs: plan)
+    monkeypatch.setattr(ui_delivery, "start_image_delivery", lambda *_args: events.append("start"))
+    monkeypatch.setattr(ui_delivery, "notify_image_workers", lambda: events.append("notify"))
+
+    async def scenario():
+        await ui_delivery.deliver_step_view(
+            message=message,
+            step_view=StepView(text="Шаг", keyboard="kb", image_prompt="кот"),
+            session_id=7,
+            step=1,
+            theme_id="test",
+            total_steps=4,
+        )
+        assert events == []
+        await ui_delivery.flush_deliveries()
+
+    asyncio.run(scenario())
+
+    assert events == ["commit", "notify"]
+
+
+def test_failed_inline_commit_is_retried_by_the_flusher(monkeypatch):
+    monkeypatch.setenv("TG_DELIVERY_FLUSH_INTERVAL_MS", "1")
+    message = FakeMessage()
+    calls = []
+    scheduled = []
+
+    async def fake_acquire(**_kwargs):
+        return ui_delivery.UiAcquireResult(decision="show", event_id=9)
+
+    async def flaky_commit(writes):
+        calls.append([write.session_id for write in writes])
+        if len(calls) == 1:
+            raise RuntimeError("db down")
+        return [None for _ in writes]
+
+    async def fake_schedule(session_id):
+        scheduled.append(session_id)
+        return 0
+
+    monkeypatch.setattr(ui_delivery, "acquire_step_event", fake_acquire)
+    monkeypatch.setattr(ui_delivery.delivery, "commit_deliveries", flaky_commit)
+    monkeypatch.setattr(ui_delivery, "plan_image_delivery", lambda **_kwargs: None)
+    monkeypatch.setattr(ui_delivery.speculation, "schedule_for_session", fake_schedule)
+
+    async def scenario():
+        delivered = await ui_delivery.deliver_step_view(
+            message=message,
+            step_view=StepView(text="Шаг", keyboard="kb"),
+            session_id=7,
+            step=1,
+            theme_id="test",
+            total_steps=4,
+        )
+        await ui_delivery.flush_deliveries()
+        return delivered
+
+    assert asyncio.run(scenario()) is True
+    assert calls == [[7], [7]]
+    assert scheduled == [7]
@@ -0,0 +1,184 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[3]
+APP_ROOT = ROOT / "apps" / "tg-bot"
+if str(APP_ROOT) not in sys.path:
+    sys.path.insert(0, str(APP_ROOT))
+
+from src.services import usage_counters  # noqa: E402
+
+
+class FakeUsageWindows:
+    def __init__(self, stored=None, fail=False):
+        self.stored = dict(stored or {})
+        self.fail = fail
+        self.batches = []
+        self.reads = 0
+
+    async def read_window(self, user_id, window_start):
+        self.reads += 1
+        row = self.stored.get((user_id, window_start))
+        return dict(row) if row else None
+
+    async def add_deltas(self, deltas):
+        if self.fail:
+            raise RuntimeError("db down")
+        self.batches.append(list(deltas))
+        rows = []
+        for delta in deltas:
+            key = (delta.user_id, delta.window_start)
+            row = self.stored.setdefault(
+                key,
+                {"user_id": delta.user_id, "window_start": delta.window_start, "messages_used": 0, "sessions_started": 0},
+            )
+            row["messages_used"] += delta.messages_used
+            row["sessions_started"] += delta.sessions_started
+            rows.append(dict(row))
+        return rows
+
+
+@pytest.fixture(autouse=True)
+def _usage_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("TG_USAGE_FLUSH_INTERVAL_MS", "60000")
+    monkeypatch.setenv("TG_USAGE_MAX_PENDING", "5")
+
+
+def _window_key(user_id):
+    window_start, _ = usage_counters.window_bounds(43200)
+    return user_id, window_start
+
+
+def test_quota_answers_from_memory_and_flushes_one_batch(monkeypatch):
+    user_id, window_start = _window_key(1)
+    fake = FakeUsageWindows(
+        {(user_id, window_start): {"user_id": user_id, "window_start": window_start, "messages_used": 3, "sessions_started": 1}}
+    )
+    monkeypatch.setattr(usage_counters, "usage_windows", fake)
+
+    async def scenario():
+        aggregator = usage_counters.UsageAggregator()
+        await aggregator.record(1, "messages_used")
+        await aggregator.record(1, "messages_used")
+        await aggregator.record(2, "sessions_started")
+        assert await aggregator.within_quota(1, "messages_used", limit=6) is True
+        assert await aggregator.within_quota(1, "messages_used", limit=5) is False
+        assert fake.batches == []
+        await aggregator.drain()
+        return aggregator
+
+    aggregator = asyncio.run(scenario())
+
+    assert fake.reads == 2
+    assert len(fake.batches) == 1
+    assert sorted((d.user_id, d.messages_used, d.sessions_started) for d in fake.batches[0]) == [
+        (1, 2, 0),
+        (2, 0, 1),
+    ]
+    assert fake.stored[_window_key(1)]["messages_used"] == 5
+    assert aggregator.stats()["pending"] == 0
+
+
+def test_pending_bound_forces_flush(monkeypatch):
+    fake = FakeUsageWindows()
+    monkeypatch.setattr(usage_counters, "usage_windows", fake)
+
+    async def scenario():
+        aggregator = usage_counters.UsageAggregator()
+        for _ in range(5):
+            await aggregator.record(7, "messages_used")
+        return aggregator
+
+    aggregator = asyncio.run(scenario())
+
+    assert len(fake.batches) == 1
+    assert fake.batches[0][0].messages_used == 5
+    assert aggregator.pending_total == 0
+
+
+def test_failed_flush_keeps_deltas(monkeypatch):
+    fake = FakeUsageWindows(fail=True)
+    monkeypatch.setattr(usage_counters, "usage_windows", fake)
+
+    async def scenario():
+        aggregator = usage_counters.UsageAggregator()
+        await aggregator.record(3, "messages_used", delta=2)
+        await aggregator.flush()
+        usage = await aggregator.usage(3)
+        fake.fail = False
+        await aggregator.drain()
+        return aggregator, usage
+
+    aggregator, usage = asyncio.run(scenario())
+
+    assert usage["messages_used"] == 2
+    assert aggregator.failed == 1
+    assert fake.stored[_window_key(3)]["messages_used"] == 2
+
+
+def test_record_waits_for_inflight_flush_at_cap(monkeypatch):
+    fake = FakeUsageWindows()
+    monkeypatch.setattr(usage_counters, "usage_windows", fake)
+    release = asyncio.Event()
+    original_add = fake.add_deltas
+
+    async def slow_add(deltas):
+        await release.wait()
+        return await original_add(deltas)
+
+    fake.add_deltas = slow_add
+
+    async def scenario():
+        aggregator = usage_counters.UsageAggregator()
+        await aggregator.usage(7)
+        for _ in range(4):
+            await aggregator.record(7, "messages_used")
+        flushing = asyncio.create_task(aggregator.record(7, "messages_used"))
+        await asyncio.sleep(0)
+        blocked = [asyncio.create_task(aggregator.record(7, "messages_used")) for _ in range(10)]
+        await asyncio.sleep(0)
+        peak = aggregator.pending_total
+        assert sum(1 for task in blocked if not task.done()) == 5
+        release.set()
+        await flushing
+        await asyncio.gather(*blocked)
+        return aggregator, peak
+
+    aggregator, peak = asyncio.run(scenario())
+
+    assert peak == aggregator.max_pending
+    assert aggregator.pending_total <= aggregator.max_pending
+    assert fake.stored[_window_key(7)]["messages_used"] + aggregator.pending_total == 15
+
+
+def test_record_rejects_at_cap_while_flushes_fail(monkeypatch):
+    fake = FakeUsageWindows(fail=True)
+    calls = []
+    original_add = fake.add_deltas
+
+    async def counting_add(deltas):
+        calls.append(len(deltas))
+        return await original_add(deltas)
+
+    fake.add_deltas = counting_add
+    monkeypatch.setattr(usage_counters, "usage_windows", fake)
+
+    async def scenario():
+        aggregator = usage_counters.UsageAggregator()
+        for _ in range(5):
+            await aggregator.record(7, "messages_used")
+        with pytest.raises(usage_counters.UsageBacklogFull):
+            await aggregator.record(7, "messages_used")
+        with pytest.raises(usage_counters.UsageBacklogFull):
+            await aggregator.record(8, "sessions_started")
+        return aggregator
+
+    aggregator = asyncio.run(scenario())
+
+    assert calls == [1]
+    assert aggregator.pending_total == 5
+    assert aggregator.stats()["rejected"] == 2
+    assert aggregator.stats()["backoff_s"] == aggregator.interval_s
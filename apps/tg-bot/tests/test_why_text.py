@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import logging
 
 import pytest
 import requests
 
+from packages.llm.src import scheduler as llm_scheduler
 from src.services import why_text
 
 
@@ -36,7 +38,7 @@ def test_log_does_not_include_question(caplog: pytest.LogCaptureFixture, monkeyp
     def fake_post(*_args, **_kwargs):
         return DummyResponse({"choices": [{"message": {"content": "Ответ"}}]})
 
-    monkeypatch.setattr(why_text.requests, "post", fake_post)
+    monkeypatch.setattr(why_text.http_client, "post", fake_post)
     caplog.set_level(logging.INFO)
     question = "Секретный вопрос???"
     why_text.answer_why_text(question, "kid")
@@ -49,7 +51,7 @@ def test_qa_hit_skips_llm(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
     def fail_post(*_args, **_kwargs):
         raise AssertionError("LLM should not be called")
 
-    monkeypatch.setattr(why_text.requests, "post", fail_post)
+    monkeypatch.setattr(why_text.http_client, "post", fail_post)
     result = why_text.answer_why_text("Почему небо голубое?", "kid")
     assert result.matched is True
     assert result.llm_called is False
@@ -64,7 +66,7 @@ def test_qa_miss_calls_llm(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
         called["count"] += 1
         return DummyResponse({"choices": [{"message": {"content": "Ответ"}}]})
 
-    monkeypatch.setattr(why_text.requests, "post", fake_post)
+    monkeypatch.setattr(why_text.http_client, "post", fake_post)
     result = why_text.answer_why_text("Почему трава фиолетовая?", "kid")
     assert result.matched is False
     assert result.llm_called is True
@@ -80,8 +82,26 @@ def test_llm_timeout_retries_and_fallback(monkeypatch: pytest.MonkeyPatch, tmp_p
         calls["count"] += 1
         raise requests.exceptions.Timeout("timeout")
 
-    monkeypatch.setattr(why_text.requests, "post", fake_post)
+    monkeypatch.setattr(why_text.http_client, "post", fake_post)
     result = why_text.answer_why_text("Почему трава оранжевая?", "kid")
     assert calls["count"] == 2
     assert result.text == why_text._fallback_response()
     assert result.outcome == "fallback"
+
+
+def test_async_answer_runs_llm_in_background_slot(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("WHY_DUMP_PATH", str(tmp_path / "dump.jsonl"))
+
+    def fake_post(*_args, **_kwargs):
+        return DummyResponse({"choices": [{"message": {"content": "Ответ"}}]})
+
+    async def scenario():
+        result = await why_text.aanswer_why_text("Почему трава фиолетовая?", "kid")
+        return result, llm_scheduler.scheduler_stats()
+
+    monkeypatch.setattr(why_text.http_client, "post", fake_post)
+    result, stats = asyncio.run(scenario())
+    assert result.text == "Ответ"
+    assert stats["classes"]["background"]["started"] == 1
+    assert stats["inflight"] == 0
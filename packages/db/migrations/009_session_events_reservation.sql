@@ -0,0 +1,12 @@
+-- L3 two-phase turn commit: reservation lease on session_events
+-- outcome='reserved' marks a turn whose LLM generation is in flight.
+
+ALTER TABLE session_events
+  ADD COLUMN IF NOT EXISTS reservation_id text NULL;
+
+ALTER TABLE session_events
+  ADD COLUMN IF NOT EXISTS reserved_until timestamptz NULL;
+
+CREATE INDEX IF NOT EXISTS session_events_reserved_idx
+  ON session_events (reserved_until)
+  WHERE outcome = 'reserved';
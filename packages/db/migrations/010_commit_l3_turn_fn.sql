@@ -0,0 +1,49 @@
+-- L3 turn commit in one round trip: event payload + session state/step/facts
+-- and optional finish are applied by a single function call under the row lock
+-- already held by the caller.
+
+CREATE OR REPLACE FUNCTION commit_l3_turn(
+  p_session_id bigint,
+  p_event_id bigint,
+  p_llm_json jsonb,
+  p_deltas_json jsonb,
+  p_step_result_json jsonb,
+  p_meta_json jsonb,
+  p_params_json jsonb,
+  p_step int,
+  p_facts_json jsonb,
+  p_final_id text,
+  p_final_meta jsonb,
+  p_finish_status text
+) RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF p_finish_status IS NOT NULL AND p_finish_status NOT IN ('FINISHED', 'ABORTED') THEN
+    RAISE EXCEPTION 'status must be FINISHED or ABORTED';
+  END IF;
+
+  UPDATE session_events
+  SET llm_json = p_llm_json,
+      deltas_json = p_deltas_json,
+      outcome = 'accepted',
+      step_result_json = p_step_result_json,
+      meta_json = p_meta_json
+  WHERE id = p_event_id;
+
+  UPDATE sessions
+  SET params_json = p_params_json,
+      step = p_step,
+      facts_json = CASE
+        WHEN p_final_id IS NOT NULL THEN jsonb_build_object('final_meta', COALESCE(p_final_meta, '{}'::jsonb))
+        ELSE COALESCE(p_facts_json, facts_json)
+      END,
+      status = CASE
+        WHEN p_final_id IS NOT NULL THEN 'FINISHED'
+        ELSE COALESCE(p_finish_status, status)
+      END,
+      ending_id = COALESCE(p_final_id, ending_id),
+      updated_at = now()
+  WHERE id = p_session_id;
+END;
+$$;
@@ -0,0 +1,124 @@
+-- JSONB patch updates for sessions.params_json / facts_json: callers send a
+-- list of ops ({"op": "set"|"append"|"merge"|"delete", "path": [...], ...})
+-- instead of the whole document; commit_l3_turn accepts patches as well.
+
+CREATE OR REPLACE FUNCTION jsonb_append_capped(
+  doc jsonb,
+  path text[],
+  item jsonb,
+  keep_last int
+) RETURNS jsonb
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT jsonb_set(
+    COALESCE(doc, '{}'::jsonb),
+    path,
+    COALESCE(
+      (
+        SELECT jsonb_agg(kept.elem ORDER BY kept.idx)
+        FROM (
+          SELECT elem, idx
+          FROM jsonb_array_elements(
+            CASE
+              WHEN jsonb_typeof(doc #> path) = 'array' THEN doc #> path
+              ELSE '[]'::jsonb
+            END || jsonb_build_array(item)
+          ) WITH ORDINALITY AS items(elem, idx)
+          ORDER BY idx DESC
+          LIMIT CASE WHEN keep_last > 0 THEN keep_last END
+        ) AS kept
+      ),
+      '[]'::jsonb
+    ),
+    true
+  );
+$$;
+
+CREATE OR REPLACE FUNCTION jsonb_apply_patch(doc jsonb, patch jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+DECLARE
+  op jsonb;
+  op_path text[];
+BEGIN
+  doc := COALESCE(doc, '{}'::jsonb);
+  IF patch IS NULL THEN
+    RETURN doc;
+  END IF;
+  FOR op IN SELECT value FROM jsonb_array_elements(patch) LOOP
+    op_path := ARRAY(SELECT jsonb_array_elements_text(COALESCE(op -> 'path', '[]'::jsonb)));
+    CASE op ->> 'op'
+      WHEN 'set' THEN
+        doc := jsonb_set(doc, op_path, COALESCE(op -> 'value', 'null'::jsonb), true);
+      WHEN 'append' THEN
+        doc := jsonb_append_capped(doc, op_path, COALESCE(op -> 'value', 'null'::jsonb), (op ->> 'keep_last')::int);
+      WHEN 'merge' THEN
+        doc := doc || COALESCE(op -> 'value', '{}'::jsonb);
+      WHEN 'delete' THEN
+        doc := doc #- op_path;
+      ELSE
+        RAISE EXCEPTION 'unknown jsonb patch op %', op ->> 'op';
+    END CASE;
+  END LOOP;
+  RETURN doc;
+END;
+$$;
+
+DROP FUNCTION IF EXISTS commit_l3_turn(
+  bigint, bigint, jsonb, jsonb, jsonb, jsonb, jsonb, int, jsonb, text, jsonb, text
+);
+
+CREATE OR REPLACE FUNCTION commit_l3_turn(
+  p_session_id bigint,
+  p_event_id bigint,
+  p_llm_json jsonb,
+  p_deltas_json jsonb,
+  p_step_result_json jsonb,
+  p_meta_json jsonb,
+  p_params_json jsonb,
+  p_params_patch jsonb,
+  p_step int,
+  p_facts_json jsonb,
+  p_facts_patch jsonb,
+  p_final_id text,
+  p_final_meta jsonb,
+  p_finish_status text
+) RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF p_finish_status IS NOT NULL AND p_finish_status NOT IN ('FINISHED', 'ABORTED') THEN
+    RAISE EXCEPTION 'status must be FINISHED or ABORTED';
+  END IF;
+
+  UPDATE session_events
+  SET llm_json = p_llm_json,
+      deltas_json = p_deltas_json,
+      outcome = 'accepted',
+      step_result_json = p_step_result_json,
+      meta_json = p_meta_json
+  WHERE id = p_event_id;
+
+  UPDATE sessions
+  SET params_json = CASE
+        WHEN p_params_patch IS NOT NULL THEN jsonb_apply_patch(params_json, p_params_patch)
+        ELSE COALESCE(p_params_json, params_json)
+      END,
+      step = p_step,
+      facts_json = CASE
+        WHEN p_final_id IS NOT NULL THEN jsonb_build_object('final_meta', COALESCE(p_final_meta, '{}'::jsonb))
+        WHEN p_facts_patch IS NOT NULL THEN jsonb_apply_patch(facts_json, p_facts_patch)
+        ELSE COALESCE(p_facts_json, facts_json)
+      END,
+      status = CASE
+        WHEN p_final_id IS NOT NULL THEN 'FINISHED'
+        ELSE COALESCE(p_finish_status, status)
+      END,
+      ending_id = COALESCE(p_final_id, ending_id),
+      updated_at = now()
+  WHERE id = p_session_id;
+END;
+$$;
@@ -0,0 +1,27 @@
+-- Cold storage for heavy session_events payloads of closed sessions.
+-- llm_json, the full step_result_json and meta_json are moved into a
+-- zlib-compressed archive row; the hot row keeps what the book builder reads.
+
+ALTER TABLE session_events
+  ADD COLUMN IF NOT EXISTS archived_at timestamptz NULL;
+
+CREATE TABLE IF NOT EXISTS session_events_archive (
+  event_id bigint PRIMARY KEY,
+  session_id bigint NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+  step int NOT NULL,
+  codec text NOT NULL DEFAULT 'zlib',
+  raw_bytes int NOT NULL,
+  payload bytea NOT NULL,
+  archived_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS session_events_archive_session_id_idx
+  ON session_events_archive (session_id);
+
+CREATE INDEX IF NOT EXISTS session_events_unarchived_idx
+  ON session_events (session_id)
+  WHERE archived_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS sessions_closed_updated_at_idx
+  ON sessions (updated_at)
+  WHERE status IN ('FINISHED', 'ABORTED');
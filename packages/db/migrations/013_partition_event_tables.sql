@@ -0,0 +1,269 @@
+-- Range-partition session_events and ui_events.
+-- The partition key is session_id rather than created_at: unique constraints on a
+-- partitioned table must contain the partition key, and session ids grow with time,
+-- so (session_id, step) and (session_id, step, kind) stay globally enforced for
+-- ON CONFLICT while each partition covers roughly one month of sessions.
+
+CREATE TABLE IF NOT EXISTS event_partitions (
+  name text PRIMARY KEY,
+  parent text NOT NULL CHECK (parent IN ('session_events', 'ui_events')),
+  lo bigint NOT NULL,
+  hi bigint NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  detached_at timestamptz NULL,
+  dropped_at timestamptz NULL
+);
+
+CREATE INDEX IF NOT EXISTS event_partitions_parent_hi_idx
+  ON event_partitions (parent, hi);
+
+CREATE OR REPLACE FUNCTION create_event_partition(p_parent text, p_lo bigint, p_hi bigint)
+RETURNS text
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_name text := format('%s_p%s', p_parent, p_lo);
+BEGIN
+  EXECUTE format(
+    'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%s) TO (%s)',
+    v_name,
+    p_parent,
+    p_lo,
+    p_hi
+  );
+  INSERT INTO event_partitions (name, parent, lo, hi)
+  VALUES (v_name, p_parent, p_lo, p_hi)
+  ON CONFLICT (name) DO NOTHING;
+  RETURN v_name;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION ensure_event_partitions(p_ahead int DEFAULT 2, p_min_span bigint DEFAULT 1000)
+RETURNS SETOF text
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_parent text;
+  v_current bigint;
+  v_span bigint;
+  v_top bigint;
+BEGIN
+  v_current := COALESCE((SELECT max(id) FROM sessions), 0);
+  v_span := GREATEST(
+    p_min_span,
+    v_current - COALESCE(
+      (SELECT min(id) FROM sessions WHERE created_at > now() - interval '1 month'),
+      v_current
+    ) + 1
+  );
+  FOREACH v_parent IN ARRAY ARRAY['session_events', 'ui_events'] LOOP
+    PERFORM pg_advisory_xact_lock(hashtext('event_partitions:' || v_parent));
+    v_top := COALESCE((SELECT max(hi) FROM event_partitions WHERE parent = v_parent), 1);
+    WHILE v_top <= v_current
+      OR (
+        SELECT count(*)
+        FROM event_partitions
+        WHERE parent = v_parent AND lo > v_current
+      ) < p_ahead
+    LOOP
+      RETURN NEXT create_event_partition(v_parent, v_top, v_top + v_span);
+      v_top := v_top + v_span;
+    END LOOP;
+  END LOOP;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION detach_expired_event_partitions(p_retention interval, p_drop boolean DEFAULT false)
+RETURNS SETOF text
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_part record;
+BEGIN
+  FOR v_part IN
+    SELECT p.name, p.parent
+    FROM event_partitions p
+    WHERE p.detached_at IS NULL
+      AND p.hi <= (SELECT COALESCE(max(id), 0) FROM sessions)
+      AND NOT EXISTS (
+        SELECT 1
+        FROM sessions s
+        WHERE s.id >= p.lo
+          AND s.id < p.hi
+          AND (s.status NOT IN ('FINISHED', 'ABORTED') OR s.updated_at > now() - p_retention)
+      )
+    ORDER BY p.lo
+  LOOP
+    EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', v_part.parent, v_part.name);
+    UPDATE event_partitions SET detached_at = now() WHERE name = v_part.name;
+    IF p_drop THEN
+      EXECUTE format('DROP TABLE %I', v_part.name);
+      UPDATE event_partitions SET dropped_at = now() WHERE name = v_part.name;
+    END IF;
+    RETURN NEXT v_part.name;
+  END LOOP;
+END;
+$$;
+
+-- session_events
+
+ALTER TABLE session_events RENAME TO session_events_legacy;
+ALTER TABLE session_events_legacy DROP CONSTRAINT IF EXISTS session_events_pkey;
+ALTER TABLE session_events_legacy DROP CONSTRAINT IF EXISTS session_events_session_id_step_unique;
+ALTER TABLE session_events_legacy ALTER COLUMN id DROP IDENTITY IF EXISTS;
+DROP INDEX IF EXISTS session_events_session_id_idx;
+DROP INDEX IF EXISTS session_events_reserved_idx;
+DROP INDEX IF EXISTS session_events_unarchived_idx;
+
+CREATE SEQUENCE IF NOT EXISTS session_events_id_seq AS bigint;
+
+CREATE TABLE session_events (
+  id bigint NOT NULL DEFAULT nextval('session_events_id_seq'),
+  session_id bigint NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+  step int NOT NULL,
+  step0 int NULL,
+  user_input text NULL,
+  choice_id text NULL,
+  llm_json jsonb NULL,
+  deltas_json jsonb NULL,
+  outcome text NULL,
+  step_result_json jsonb NULL,
+  meta_json jsonb NULL,
+  reservation_id text NULL,
+  reserved_until timestamptz NULL,
+  archived_at timestamptz NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  CONSTRAINT session_events_pkey PRIMARY KEY (id, session_id),
+  CONSTRAINT session_events_session_id_step_unique UNIQUE (session_id, step)
+) PARTITION BY RANGE (session_id);
+
+ALTER SEQUENCE session_events_id_seq OWNED BY session_events.id;
+
+CREATE INDEX IF NOT EXISTS session_events_reserved_idx
+  ON session_events (reserved_until)
+  WHERE outcome = 'reserved';
+
+CREATE INDEX IF NOT EXISTS session_events_unarchived_idx
+  ON session_events (session_id)
+  WHERE archived_at IS NULL;
+
+-- ui_events
+
+ALTER TABLE ui_events RENAME TO ui_events_legacy;
+ALTER TABLE ui_events_legacy DROP CONSTRAINT IF EXISTS ui_events_pkey;
+ALTER TABLE ui_events_legacy DROP CONSTRAINT IF EXISTS ui_events_session_step_kind_unique;
+ALTER TABLE ui_events_legacy ALTER COLUMN id DROP IDENTITY IF EXISTS;
+DROP INDEX IF EXISTS ui_events_session_id_idx;
+DROP INDEX IF EXISTS ui_events_state_next_retry_at_idx;
+
+CREATE SEQUENCE IF NOT EXISTS ui_events_id_seq AS bigint;
+
+CREATE TABLE ui_events (
+  id bigint NOT NULL DEFAULT nextval('ui_events_id_seq'),
+  session_id bigint NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+  step int NOT NULL,
+  kind text NOT NULL,
+  content_hash text NOT NULL,
+  state text NOT NULL DEFAULT 'PENDING',
+  pending_since timestamptz NULL,
+  fail_count int NOT NULL DEFAULT 0,
+  next_retry_at timestamptz NULL,
+  step_message_id bigint NULL,
+  recap_message_id bigint NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  updated_at timestamptz NOT NULL DEFAULT now(),
+  CONSTRAINT ui_events_pkey PRIMARY KEY (id, session_id),
+  CONSTRAINT ui_events_session_step_kind_unique UNIQUE (session_id, step, kind)
+) PARTITION BY RANGE (session_id);
+
+ALTER SEQUENCE ui_events_id_seq OWNED BY ui_events.id;
+
+CREATE INDEX IF NOT EXISTS ui_events_state_next_retry_at_idx
+  ON ui_events (state, next_retry_at);
+
+-- partitions: one for all existing sessions, then the ones ahead
+
+SELECT create_event_partition('session_events', 1, COALESCE((SELECT max(id) FROM sessions), 0) + 1)
+WHERE EXISTS (SELECT 1 FROM sessions);
+SELECT create_event_partition('ui_events', 1, COALESCE((SELECT max(id) FROM sessions), 0) + 1)
+WHERE EXISTS (SELECT 1 FROM sessions);
+SELECT ensure_event_partitions();
+
+INSERT INTO session_events (
+  id, session_id, step, step0, user_input, choice_id, llm_json, deltas_json, outcome,
+  step_result_json, meta_json, reservation_id, reserved_until, archived_at, created_at
+)
+SELECT
+  id, session_id, step, step0, user_input, choice_id, llm_json, deltas_json, outcome,
+  step_result_json, meta_json, reservation_id, reserved_until, archived_at, created_at
+FROM session_events_legacy;
+
+INSERT INTO ui_events (
+  id, session_id, step, kind, content_hash, state, pending_since, fail_count,
+  next_retry_at, step_message_id, recap_message_id, created_at, updated_at
+)
+SELECT
+  id, session_id, step, kind, content_hash, state, pending_since, fail_count,
+  next_retry_at, step_message_id, recap_message_id, created_at, updated_at
+FROM ui_events_legacy;
+
+SELECT setval('session_events_id_seq', COALESCE((SELECT max(id) FROM session_events), 0) + 1, false);
+SELECT setval('ui_events_id_seq', COALESCE((SELECT max(id) FROM ui_events), 0) + 1, false);
+
+DROP TABLE session_events_legacy;
+DROP TABLE ui_events_legacy;
+
+-- prune to the session's partition on the per-turn event update
+
+CREATE OR REPLACE FUNCTION commit_l3_turn(
+  p_session_id bigint,
+  p_event_id bigint,
+  p_llm_json jsonb,
+  p_deltas_json jsonb,
+  p_step_result_json jsonb,
+  p_meta_json jsonb,
+  p_params_json jsonb,
+  p_params_patch jsonb,
+  p_step int,
+  p_facts_json jsonb,
+  p_facts_patch jsonb,
+  p_final_id text,
+  p_final_meta jsonb,
+  p_finish_status text
+) RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF p_finish_status IS NOT NULL AND p_finish_status NOT IN ('FINISHED', 'ABORTED') THEN
+    RAISE EXCEPTION 'status must be FINISHED or ABORTED';
+  END IF;
+
+  UPDATE session_events
+  SET llm_json = p_llm_json,
+      deltas_json = p_deltas_json,
+      outcome = 'accepted',
+      step_result_json = p_step_result_json,
+      meta_json = p_meta_json
+  WHERE id = p_event_id
+    AND session_id = p_session_id;
+
+  UPDATE sessions
+  SET params_json = CASE
+        WHEN p_params_patch IS NOT NULL THEN jsonb_apply_patch(params_json, p_params_patch)
+        ELSE COALESCE(p_params_json, params_json)
+      END,
+      step = p_step,
+      facts_json = CASE
+        WHEN p_final_id IS NOT NULL THEN jsonb_build_object('final_meta', COALESCE(p_final_meta, '{}'::jsonb))
+        WHEN p_facts_patch IS NOT NULL THEN jsonb_apply_patch(facts_json, p_facts_patch)
+        ELSE COALESCE(p_facts_json, facts_json)
+      END,
+      status = CASE
+        WHEN p_final_id IS NOT NULL THEN 'FINISHED'
+        ELSE COALESCE(p_finish_status, status)
+      END,
+      ending_id = COALESCE(p_final_id, ending_id),
+      updated_at = now()
+  WHERE id = p_session_id;
+END;
+$$;
@@ -0,0 +1,29 @@
+-- Durable image job queue on session_images.
+-- A row scheduled without an asset is a job: workers claim it with SKIP LOCKED,
+-- hold it under a lease (next_attempt_at doubles as the lease deadline while running)
+-- and count attempts so a crash or deploy never loses a pending illustration.
+
+ALTER TABLE session_images
+  ADD COLUMN IF NOT EXISTS job_state text NOT NULL DEFAULT 'done',
+  ADD COLUMN IF NOT EXISTS job_json jsonb NULL,
+  ADD COLUMN IF NOT EXISTS attempts int NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS lease_owner text NULL,
+  ADD COLUMN IF NOT EXISTS next_attempt_at timestamptz NULL,
+  ADD COLUMN IF NOT EXISTS last_error text NULL,
+  ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+ALTER TABLE session_images
+  DROP CONSTRAINT IF EXISTS ck_session_images_job_state;
+ALTER TABLE session_images
+  ADD CONSTRAINT ck_session_images_job_state
+  CHECK (job_state IN ('pending', 'running', 'done', 'failed'));
+
+-- rows scheduled before the queue carry no delivery target and cannot be replayed
+UPDATE session_images
+SET job_state = 'failed',
+    last_error = 'scheduled_before_job_queue'
+WHERE asset_id IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_session_images_jobs_due
+  ON session_images (next_attempt_at, id)
+  WHERE job_state IN ('pending', 'running');
@@ -0,0 +1,14 @@
+-- Remember the Telegram file_id of the first upload so repeat sends skip the bytes.
+-- file_ids are per bot and per media type, so the media the id was issued for is kept too.
+
+ALTER TABLE assets
+  ADD COLUMN IF NOT EXISTS telegram_file_id text NULL,
+  ADD COLUMN IF NOT EXISTS telegram_file_unique_id text NULL,
+  ADD COLUMN IF NOT EXISTS telegram_media text NULL,
+  ADD COLUMN IF NOT EXISTS telegram_file_at timestamptz NULL;
+
+ALTER TABLE assets
+  DROP CONSTRAINT IF EXISTS assets_telegram_media_check;
+ALTER TABLE assets
+  ADD CONSTRAINT assets_telegram_media_check
+  CHECK (telegram_media IS NULL OR telegram_media IN ('photo', 'document'));
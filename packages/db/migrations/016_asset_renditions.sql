@@ -0,0 +1,19 @@
+-- Derived renditions (Telegram-sized, print-sized) are assets of their own,
+-- linked to the provider original they were produced from.
+
+ALTER TABLE assets
+  ADD COLUMN IF NOT EXISTS original_asset_id bigint NULL REFERENCES assets(id) ON DELETE CASCADE,
+  ADD COLUMN IF NOT EXISTS rendition text NULL;
+
+ALTER TABLE assets
+  DROP CONSTRAINT IF EXISTS assets_rendition_check;
+ALTER TABLE assets
+  ADD CONSTRAINT assets_rendition_check
+  CHECK (
+    (rendition IS NULL AND original_asset_id IS NULL)
+    OR (rendition IN ('telegram', 'print') AND original_asset_id IS NOT NULL)
+  );
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_assets_original_rendition
+  ON assets (original_asset_id, rendition)
+  WHERE original_asset_id IS NOT NULL;
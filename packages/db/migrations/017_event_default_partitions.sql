@@ -0,0 +1,59 @@
+-- Default partitions for session_events and ui_events.
+-- A session id past the last range (a burst of sign-ups, or a missed
+-- ensure_event_partitions run) now lands in the default partition instead of
+-- failing the insert. create_event_partition moves those rows out of the default
+-- partition into the new range before attaching it.
+
+CREATE TABLE IF NOT EXISTS session_events_default PARTITION OF session_events DEFAULT;
+CREATE TABLE IF NOT EXISTS ui_events_default PARTITION OF ui_events DEFAULT;
+
+CREATE OR REPLACE FUNCTION create_event_partition(p_parent text, p_lo bigint, p_hi bigint)
+RETURNS text
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_name text := format('%s_p%s', p_parent, p_lo);
+  v_default text := format('%s_default', p_parent);
+  v_moved bigint := 0;
+BEGIN
+  IF to_regclass(v_name) IS NULL THEN
+    IF to_regclass(v_default) IS NOT NULL THEN
+      EXECUTE format('LOCK TABLE %I IN SHARE ROW EXCLUSIVE MODE', v_default);
+      EXECUTE format(
+        'CREATE TEMP TABLE event_partition_moved ON COMMIT DROP AS
+         SELECT * FROM %I WHERE session_id >= %s AND session_id < %s',
+        v_default,
+        p_lo,
+        p_hi
+      );
+      EXECUTE 'SELECT count(*) FROM event_partition_moved' INTO v_moved;
+      IF v_moved > 0 THEN
+        EXECUTE format(
+          'DELETE FROM %I WHERE session_id >= %s AND session_id < %s',
+          v_default,
+          p_lo,
+          p_hi
+        );
+      END IF;
+    END IF;
+    EXECUTE format(
+      'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%s) TO (%s)',
+      v_name,
+      p_parent,
+      p_lo,
+      p_hi
+    );
+    IF v_moved > 0 THEN
+      EXECUTE format('INSERT INTO %I SELECT * FROM event_partition_moved', p_parent);
+      RAISE NOTICE 'event partition % took % rows from %', v_name, v_moved, v_default;
+    END IF;
+    IF to_regclass('pg_temp.event_partition_moved') IS NOT NULL THEN
+      DROP TABLE pg_temp.event_partition_moved;
+    END IF;
+  END IF;
+  INSERT INTO event_partitions (name, parent, lo, hi)
+  VALUES (v_name, p_parent, p_lo, p_hi)
+  ON CONFLICT (name) DO NOTHING;
+  RETURN v_name;
+END;
+$$;
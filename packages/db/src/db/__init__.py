@@ -1,6 +1,6 @@
 """DB access helpers and repositories."""
 
-from db.conn import get_conn, get_pool, transaction
+from db.conn import get_conn, get_pool, pool_stats, transaction
 from db.repos import (
     confirm_requests,
     l3_turns,
@@ -15,6 +15,7 @@ from db.repos import (
 __all__ = [
     "get_conn",
     "get_pool",
+    "pool_stats",
     "transaction",
     "confirm_requests",
     "l3_turns",
@@ -0,0 +1,31 @@
+"""Async DB access helpers and repositories backed by AsyncConnectionPool."""
+
+from db.aio.conn import close_pool, get_conn, get_pool, pool_stats, transaction
+from db.aio import (
+    assets,
+    book_jobs,
+    delivery,
+    session_events,
+    session_images,
+    sessions,
+    ui_events,
+    usage_windows,
+    users,
+)
+
+__all__ = [
+    "close_pool",
+    "get_conn",
+    "get_pool",
+    "pool_stats",
+    "transaction",
+    "assets",
+    "book_jobs",
+    "delivery",
+    "session_events",
+    "session_images",
+    "sessions",
+    "ui_events",
+    "usage_windows",
+    "users",
+]
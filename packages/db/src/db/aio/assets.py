@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from psycopg.rows import dict_row
+
+from db.aio.conn import transaction
+
+
+async def insert_asset(
+    kind: str,
+    storage_backend: str,
+    storage_key: str,
+    mime: str,
+    bytes: int,
+    sha256: str,
+    width: int | None = None,
+    height: int | None = None,
+    original_asset_id: int | None = None,
+    rendition: str | None = None,
+) -> int:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                INSERT INTO assets (
+                    kind,
+                    storage_backend,
+                    storage_key,
+                    mime,
+                    bytes,
+                    sha256,
+                    width,
+                    height,
+                    original_asset_id,
+                    rendition
+                )
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id;
+                """,
+                (
+                    kind,
+                    storage_backend,
+                    storage_key,
+                    mime,
+                    bytes,
+                    sha256,
+                    width,
+                    height,
+                    original_asset_id,
+                    rendition,
+                ),
+            )
+            row = await cur.fetchone()
+            return int(row["id"])
+
+
+async def get_by_id(asset_id: int) -> dict | None:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT *
+                FROM assets
+                WHERE id = %s
+                LIMIT 1;
+                """,
+                (asset_id,),
+            )
+            row = await cur.fetchone()
+            return dict(row) if row else None
+
+
+async def get_by_sha256(sha256: str) -> dict | None:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT *
+                FROM assets
+                WHERE sha256 = %s
+                LIMIT 1;
+                """,
+                (sha256,),
+            )
+            row = await cur.fetchone()
+            return dict(row) if row else None
+
+
+async def get_rendition(original_asset_id: int, rendition: str) -> dict | None:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT *
+                FROM assets
+                WHERE original_asset_id = %s AND rendition = %s
+                LIMIT 1;
+                """,
+                (original_asset_id, rendition),
+            )
+            row = await cur.fetchone()
+            return dict(row) if row else None
+
+
+async def set_telegram_file(asset_id: int, *, media: str, file_id: str, file_unique_id: str | None) -> None:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE assets
+                SET telegram_file_id = %s,
+                    telegram_file_unique_id = %s,
+                    telegram_media = %s,
+                    telegram_file_at = now()
+                WHERE id = %s;
+                """,
+                (file_id, file_unique_id, media, asset_id),
+            )
+
+
+async def clear_telegram_file(asset_id: int) -> None:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE assets
+                SET telegram_file_id = NULL,
+                    telegram_file_unique_id = NULL,
+                    telegram_media = NULL,
+                    telegram_file_at = NULL
+                WHERE id = %s;
+                """,
+                (asset_id,),
+            )
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import Any, AsyncIterator
+
+from psycopg import AsyncConnection, OperationalError
+from psycopg_pool import AsyncConnectionPool
+
+from db.conn import DBUnavailable, WaitHistogram, _get_db_url, pool_check_enabled, pool_settings, stats_from
+
+logger = logging.getLogger(__name__)
+
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncConnectionPool]" = (
+    weakref.WeakKeyDictionary()
+)
+_wait_histogram = WaitHistogram()
+
+
+async def get_pool() -> AsyncConnectionPool:
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        settings = pool_settings()
+        pool = AsyncConnectionPool(
+            conninfo=_get_db_url(),
+            check=AsyncConnectionPool.check_connection if pool_check_enabled() else None,
+            name="db_aio",
+            open=False,
+            **settings,
+        )
+        _pools[loop] = pool
+        logger.info(
+            "db.aio_pool outcome=opened min_size=%s max_size=%s timeout_s=%s",
+            settings["min_size"],
+            settings["max_size"],
+            settings["timeout"],
+        )
+    await pool.open()
+    return pool
+
+
+def pool_stats() -> dict[str, Any]:
+    try:
+        pool = _pools.get(asyncio.get_running_loop())
+    except RuntimeError:
+        return {}
+    return stats_from(pool, _wait_histogram)
+
+
+@asynccontextmanager
+async def get_conn() -> AsyncIterator[AsyncConnection]:
+    requested_at = monotonic()
+    try:
+        pool = await get_pool()
+        async with pool.connection() as conn:
+            _wait_histogram.observe((monotonic() - requested_at) * 1000)
+            try:
+                yield conn
+            except OperationalError:
+                if conn.broken or conn.closed:
+                    logger.warning("db.aio_pool outcome=discard_broken_connection")
+                raise
+    except OperationalError as exc:
+        logger.exception("DB connection failed", exc_info=True)
+        raise DBUnavailable("DB connection failed") from exc
+
+
+@asynccontextmanager
+async def transaction() -> AsyncIterator[AsyncConnection]:
+    try:
+        async with get_conn() as conn:
+            async with conn.transaction():
+                yield conn
+    except OperationalError as exc:
+        logger.exception("DB transaction failed", exc_info=True)
+        raise DBUnavailable("DB transaction failed") from exc
+
+
+async def close_pool() -> None:
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+from db import identity_cache
+from db.aio import session_images, sessions, ui_events
+from db.aio.conn import transaction
+
+
+@dataclass
+class DeliveryWrite:
+    session_id: int
+    ui_event_id: int | None
+    step_message_id: int | None
+    sent_at: int | None
+    session_image: dict[str, Any] | None = None
+
+
+async def commit_deliveries(writes: list[DeliveryWrite]) -> list[int | None]:
+    if not writes:
+        return []
+    async with transaction() as conn:
+        async with conn.pipeline():
+            for write in writes:
+                if write.ui_event_id is not None:
+                    await ui_events.mark_shown_in_tx(
+                        conn,
+                        write.ui_event_id,
+                        step_message_id=write.step_message_id,
+                    )
+                await sessions.update_last_step_in_tx(
+                    conn,
+                    write.session_id,
+                    write.step_message_id,
+                    write.sent_at,
+                )
+            image_ids: list[int | None] = []
+            for write in writes:
+                if write.session_image is None:
+                    image_ids.append(None)
+                    continue
+                image_ids.append(
+                    await session_images.insert_session_image_in_tx(conn, **write.session_image)
+                )
+    for session_id in {write.session_id for write in writes}:
+        identity_cache.invalidate_session(session_id)
+    return image_ids
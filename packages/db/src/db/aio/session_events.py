@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+from typing import Any
+
+from psycopg import AsyncConnection
+from psycopg.rows import dict_row
+
+from db import statements
+from db.aio.conn import transaction
+from db.conn import to_json
+
+
+async def append_event(
+    session_id: int,
+    step: int,
+    step0: int | None,
+    user_input: str | None,
+    choice_id: str | None,
+    llm_json: dict[str, Any] | None,
+    deltas_json: dict[str, Any] | None,
+    *,
+    outcome: str | None = None,
+    step_result_json: dict[str, Any] | None = None,
+    meta_json: dict[str, Any] | None = None,
+) -> str:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                INSERT INTO session_events (
+                    session_id,
+                    step,
+                    step0,
+                    user_input,
+                    choice_id,
+                    llm_json,
+                    deltas_json,
+                    outcome,
+                    step_result_json,
+                    meta_json
+                )
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (session_id, step) DO NOTHING
+                RETURNING id;
+                """,
+                (
+                    session_id,
+                    step,
+                    step0,
+                    user_input,
+                    choice_id,
+                    to_json(llm_json),
+                    to_json(deltas_json),
+                    outcome,
+                    to_json(step_result_json),
+                    to_json(meta_json),
+                ),
+            )
+            row = await cur.fetchone()
+            return "inserted" if row else "duplicate"
+
+
+async def insert_event(
+    conn: AsyncConnection,
+    session_id: int,
+    step: int,
+    step0: int | None,
+    user_input: str | None,
+    choice_id: str | None,
+    llm_json: dict[str, Any] | None,
+    deltas_json: dict[str, Any] | None,
+    *,
+    outcome: str | None = None,
+    step_result_json: dict[str, Any] | None = None,
+    meta_json: dict[str, Any] | None = None,
+) -> int | None:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            """
+            INSERT INTO session_events (
+                session_id,
+                step,
+                step0,
+                user_input,
+                choice_id,
+                llm_json,
+                deltas_json,
+                outcome,
+                step_result_json,
+                meta_json
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (session_id, step) DO NOTHING
+            RETURNING id;
+            """,
+            (
+                session_id,
+                step,
+                step0,
+                user_input,
+                choice_id,
+                to_json(llm_json),
+                to_json(deltas_json),
+                outcome,
+                to_json(step_result_json),
+                to_json(meta_json),
+            ),
+        )
+        row = await cur.fetchone()
+        return int(row["id"]) if row else None
+
+
+async def update_event_payload(
+    conn: AsyncConnection,
+    event_id: int,
+    llm_json: dict[str, Any] | None,
+    deltas_json: dict[str, Any] | None,
+    *,
+    outcome: str | None = None,
+    step_result_json: dict[str, Any] | None = None,
+    meta_json: dict[str, Any] | None = None,
+) -> None:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE session_events
+            SET llm_json = %s,
+                deltas_json = %s,
+                outcome = %s,
+                step_result_json = %s,
+                meta_json = %s
+            WHERE id = %s;
+            """,
+            (
+                to_json(llm_json),
+                to_json(deltas_json),
+                outcome,
+                to_json(step_result_json),
+                to_json(meta_json),
+                event_id,
+            ),
+        )
+
+
+async def insert_reserved_event(
+    conn: AsyncConnection,
+    session_id: int,
+    step: int,
+    step0: int | None,
+    user_input: str | None,
+    choice_id: str | None,
+    *,
+    reservation_id: str,
+    lease_s: float,
+    meta_json: dict[str, Any] | None = None,
+) -> int | None:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            """
+            INSERT INTO session_events (
+                session_id,
+                step,
+                step0,
+                user_input,
+                choice_id,
+                outcome,
+                meta_json,
+                reservation_id,
+                reserved_until
+            )
+            VALUES (%s, %s, %s, %s, %s, 'reserved', %s, %s, now() + make_interval(secs => %s))
+            ON CONFLICT (session_id, step) DO NOTHING
+            RETURNING id;
+            """,
+            (
+                session_id,
+                step,
+                step0,
+                user_input,
+                choice_id,
+                to_json(meta_json),
+                reservation_id,
+                lease_s,
+            ),
+        )
+        row = await cur.fetchone()
+        return int(row["id"]) if row else None
+
+
+async def take_over_expired_reservation(
+    conn: AsyncConnection,
+    event_id: int,
+    *,
+    reservation_id: str,
+    lease_s: float,
+    user_input: str | None,
+    choice_id: str | None,
+    meta_json: dict[str, Any] | None = None,
+) -> bool:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE session_events
+            SET reservation_id = %s,
+                reserved_until = now() + make_interval(secs => %s),
+                user_input = %s,
+                choice_id = %s,
+                meta_json = %s
+            WHERE id = %s
+              AND outcome = 'reserved'
+              AND reserved_until < now()
+            RETURNING id;
+            """,
+            (
+                reservation_id,
+                lease_s,
+                user_input,
+                choice_id,
+                to_json(meta_json),
+                event_id,
+            ),
+        )
+        return await cur.fetchone() is not None
+
+
+async def get_reserved_for_update(
+    conn: AsyncConnection,
+    event_id: int,
+    reservation_id: str,
+) -> dict[str, Any] | None:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            """
+            SELECT *
+            FROM session_events
+            WHERE id = %s
+              AND reservation_id = %s
+              AND outcome = 'reserved'
+            FOR UPDATE;
+            """,
+            (event_id, reservation_id),
+        )
+        row = await cur.fetchone()
+        return dict(row) if row else None
+
+
+async def delete_reservation(
+    conn: AsyncConnection,
+    event_id: int,
+    reservation_id: str,
+) -> bool:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            DELETE FROM session_events
+            WHERE id = %s
+              AND reservation_id = %s
+              AND outcome = 'reserved'
+            RETURNING id;
+            """,
+            (event_id, reservation_id),
+        )
+        return await cur.fetchone() is not None
+
+
+async def get_by_step(
+    conn: AsyncConnection,
+    session_id: int,
+    step: int,
+) -> dict[str, Any] | None:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await statements.aexecute(cur, statements.SESSION_EVENT_BY_STEP, (session_id, step))
+        row = await cur.fetchone()
+        return dict(row) if row else None
+
+
+async def exists_for_step(session_id: int, step: int) -> bool:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT 1
+                FROM session_events
+                WHERE session_id = %s AND step = %s
+                LIMIT 1;
+                """,
+                (session_id, step),
+            )
+            return await cur.fetchone() is not None
+
+
+async def exists_for_fingerprint(session_id: int, fingerprint: str) -> bool:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT 1
+                FROM session_events
+                WHERE session_id = %s
+                  AND llm_json ->> 'turn_fingerprint' = %s
+                LIMIT 1;
+                """,
+                (session_id, fingerprint),
+            )
+            return await cur.fetchone() is not None
@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+from typing import Any
+
+from psycopg import AsyncConnection
+from psycopg.rows import dict_row
+
+from db.aio.conn import transaction
+from db.conn import to_json
+
+
+async def insert_session_image(
+    session_id: int,
+    step_ui: int,
+    asset_id: int | None,
+    role: str,
+    reference_asset_id: int | None,
+    image_model: str,
+    prompt: str,
+    job_json: dict[str, Any] | None = None,
+) -> int | None:
+    async with transaction() as conn:
+        return await insert_session_image_in_tx(
+            conn,
+            session_id=session_id,
+            step_ui=step_ui,
+            asset_id=asset_id,
+            role=role,
+            reference_asset_id=reference_asset_id,
+            image_model=image_model,
+            prompt=prompt,
+            job_json=job_json,
+        )
+
+
+async def insert_session_image_in_tx(
+    conn: AsyncConnection,
+    session_id: int,
+    step_ui: int,
+    asset_id: int | None,
+    role: str,
+    reference_asset_id: int | None,
+    image_model: str,
+    prompt: str,
+    job_json: dict[str, Any] | None = None,
+) -> int | None:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            """
+            INSERT INTO session_images (
+                session_id,
+                step_ui,
+                asset_id,
+                role,
+                reference_asset_id,
+                image_model,
+                prompt,
+                job_json,
+                job_state,
+                next_attempt_at
+            )
+            VALUES (
+                %s, %s, %s, %s, %s, %s, %s, %s,
+                CASE WHEN %s::jsonb IS NULL OR %s::bigint IS NOT NULL THEN 'done' ELSE 'pending' END,
+                now()
+            )
+            ON CONFLICT (session_id, step_ui, role) DO UPDATE
+            SET
+                asset_id = COALESCE(EXCLUDED.asset_id, session_images.asset_id),
+                reference_asset_id = COALESCE(EXCLUDED.reference_asset_id, session_images.reference_asset_id),
+                image_model = EXCLUDED.image_model,
+                prompt = EXCLUDED.prompt,
+                job_json = COALESCE(EXCLUDED.job_json, session_images.job_json),
+                job_state = CASE
+                    WHEN EXCLUDED.job_state = 'pending'
+                        AND session_images.asset_id IS NULL
+                        AND session_images.job_state <> 'running'
+                    THEN 'pending'
+                    ELSE session_images.job_state
+                END,
+                attempts = CASE
+                    WHEN EXCLUDED.job_state = 'pending'
+                        AND session_images.asset_id IS NULL
+                        AND session_images.job_state <> 'running'
+                    THEN 0
+                    ELSE session_images.attempts
+                END,
+                next_attempt_at = CASE
+                    WHEN EXCLUDED.job_state = 'pending'
+                        AND session_images.asset_id IS NULL
+                        AND session_images.job_state <> 'running'
+                    THEN now()
+                    ELSE session_images.next_attempt_at
+                END,
+                updated_at = now()
+            RETURNING id;
+            """,
+            (
+                session_id,
+                step_ui,
+                asset_id,
+                role,
+                reference_asset_id,
+                image_model,
+                prompt,
+                to_json(job_json),
+                to_json(job_json),
+                asset_id,
+            ),
+        )
+        row = await cur.fetchone()
+        return int(row["id"]) if row else None
+
+
+async def list_session_images(session_id: int) -> list[dict[str, Any]]:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT *
+                FROM session_images
+                WHERE session_id = %s
+                ORDER BY id;
+                """,
+                (session_id,),
+            )
+            return [dict(row) for row in await cur.fetchall()]
+
+
+async def get_reference_asset_id(session_id: int) -> int | None:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT asset_id
+                FROM session_images
+                WHERE session_id = %s AND role = 'reference'
+                ORDER BY id
+                LIMIT 1;
+                """,
+                (session_id,),
+            )
+            row = await cur.fetchone()
+            if not row:
+                return None
+            return int(row["asset_id"])
+
+
+async def get_step_image_asset_id(session_id: int, step_ui: int) -> int | None:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT asset_id
+                FROM session_images
+                WHERE session_id = %s AND role = 'step_image' AND step_ui = %s AND asset_id IS NOT NULL
+                ORDER BY id
+                LIMIT 1;
+                """,
+                (session_id, step_ui),
+            )
+            row = await cur.fetchone()
+            if not row:
+                return None
+            return int(row["asset_id"])
+
+
+async def get_step_image_job_state(session_id: int, step_ui: int) -> str | None:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT job_state
+                FROM session_images
+                WHERE session_id = %s AND role = 'step_image' AND step_ui = %s
+                LIMIT 1;
+                """,
+                (session_id, step_ui),
+            )
+            row = await cur.fetchone()
+            return str(row["job_state"]) if row else None
+
+
+async def claim_jobs(owner: str, *, limit: int, lease_s: int) -> list[dict[str, Any]]:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                WITH due AS (
+                    SELECT id
+                    FROM session_images
+                    WHERE job_state IN ('pending', 'running')
+                      AND next_attempt_at <= now()
+                    ORDER BY next_attempt_at, id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE session_images s
+                SET job_state = 'running',
+                    attempts = s.attempts + 1,
+                    lease_owner = %s,
+                    next_attempt_at = now() + make_interval(secs => %s),
+                    updated_at = now()
+                FROM due
+                WHERE s.id = due.id
+                RETURNING s.*;
+                """,
+                (limit, owner, lease_s),
+            )
+            return [dict(row) for row in await cur.fetchall()]
+
+
+async def complete_job(job_id: int, owner: str) -> bool:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE session_images
+                SET job_state = 'done',
+                    lease_owner = NULL,
+                    next_attempt_at = NULL,
+                    last_error = NULL,
+                    updated_at = now()
+                WHERE id = %s AND lease_owner = %s AND job_state = 'running';
+                """,
+                (job_id, owner),
+            )
+            return cur.rowcount == 1
+
+
+async def retry_job(
+    job_id: int,
+    owner: str,
+    *,
+    error: str,
+    delay_s: int,
+    max_attempts: int,
+) -> str | None:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                UPDATE session_images
+                SET job_state = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                    lease_owner = NULL,
+                    next_attempt_at = CASE
+                        WHEN attempts >= %s THEN NULL
+                        ELSE now() + make_interval(secs => %s * attempts)
+                    END,
+                    last_error = %s,
+                    updated_at = now()
+                WHERE id = %s AND lease_owner = %s AND job_state = 'running'
+                RETURNING job_state;
+                """,
+                (max_attempts, max_attempts, delay_s, error[:500], job_id, owner),
+            )
+            row = await cur.fetchone()
+            return str(row["job_state"]) if row else None
+
+
+async def defer_job(job_id: int, owner: str, *, delay_s: int, reason: str) -> bool:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE session_images
+                SET job_state = 'pending',
+                    attempts = GREATEST(attempts - 1, 0),
+                    lease_owner = NULL,
+                    next_attempt_at = now() + make_interval(secs => %s),
+                    last_error = %s,
+                    updated_at = now()
+                WHERE id = %s AND lease_owner = %s AND job_state = 'running';
+                """,
+                (delay_s, reason, job_id, owner),
+            )
+            return cur.rowcount == 1
+
+
+async def fail_job(job_id: int, owner: str, *, reason: str) -> bool:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE session_images
+                SET job_state = 'failed',
+                    lease_owner = NULL,
+                    next_attempt_at = NULL,
+                    last_error = %s,
+                    updated_at = now()
+                WHERE id = %s AND lease_owner = %s AND job_state = 'running';
+                """,
+                (reason, job_id, owner),
+            )
+            return cur.rowcount == 1
+
+
+async def release_jobs(owner: str, *, refund_attempt: bool) -> int:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE session_images
+                SET job_state = 'pending',
+                    attempts = CASE WHEN %s THEN GREATEST(attempts - 1, 0) ELSE attempts END,
+                    lease_owner = NULL,
+                    next_attempt_at = now(),
+                    updated_at = now()
+                WHERE job_state = 'running' AND lease_owner = %s;
+                """,
+                (refund_attempt, owner),
+            )
+            return cur.rowcount
+
+
+async def job_counts() -> dict[str, int]:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT job_state, count(*) AS n
+                FROM session_images
+                WHERE job_state IN ('pending', 'running')
+                GROUP BY job_state;
+                """
+            )
+            return {str(row["job_state"]): int(row["n"]) for row in await cur.fetchall()}
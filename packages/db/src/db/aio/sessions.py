@@ -0,0 +1,429 @@
+from __future__ import annotations
+
+import secrets
+import string
+from typing import Any
+
+from psycopg import AsyncConnection
+from psycopg.rows import dict_row
+
+from db.aio.conn import transaction
+from db import identity_cache, statements
+from db.conn import to_json
+from db.jsonb_patch import JsonbOp
+
+_ALLOWED_FINISH_STATUSES = {"FINISHED", "ABORTED"}
+_SID8_ALPHABET = string.ascii_lowercase + string.digits
+
+
+def _generate_sid8() -> str:
+    return "".join(secrets.choice(_SID8_ALPHABET) for _ in range(8))
+
+
+async def get_active(user_id: int) -> dict[str, Any] | None:
+    cached = identity_cache.get_active_session(user_id)
+    if not identity_cache.is_missing(cached):
+        return cached
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT *
+                FROM sessions
+                WHERE user_id = %s AND status = 'ACTIVE'
+                ORDER BY id DESC
+                LIMIT 1;
+                """,
+                (user_id,),
+            )
+            row = await cur.fetchone()
+    active = dict(row) if row else None
+    identity_cache.put_active_session(user_id, active)
+    return active
+
+
+async def get_by_id(session_id: int) -> dict[str, Any] | None:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT *
+                FROM sessions
+                WHERE id = %s
+                LIMIT 1;
+                """,
+                (session_id,),
+            )
+            row = await cur.fetchone()
+            return dict(row) if row else None
+
+
+async def get_by_tg_id_sid8(tg_id: int, sid8: str) -> dict[str, Any] | None:
+    cached = identity_cache.get_session_by_sid8(tg_id, sid8)
+    if not identity_cache.is_missing(cached):
+        return cached
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await statements.aexecute(cur, statements.SESSION_BY_TG_ID_SID8, (tg_id, sid8))
+            row = await cur.fetchone()
+    if not row:
+        return None
+    session = dict(row)
+    identity_cache.put_session_by_sid8(tg_id, sid8, session)
+    return session
+
+
+async def get_by_tg_id_sid8_for_update(
+    conn: AsyncConnection,
+    tg_id: int,
+    sid8: str,
+) -> dict[str, Any] | None:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await statements.aexecute(cur, statements.SESSION_BY_TG_ID_SID8_FOR_UPDATE, (tg_id, sid8))
+        row = await cur.fetchone()
+        return dict(row) if row else None
+
+
+async def create_new_active(
+    user_id: int,
+    theme_id: str | None = None,
+    player_name: str | None = None,
+    meta: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    payload = meta or {}
+    max_steps = payload.get("max_steps", 1)
+    if not isinstance(max_steps, int) or max_steps <= 0:
+        max_steps = 1
+
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT id, tg_id, display_name, child_name
+                FROM users
+                WHERE id = %s;
+                """,
+                (user_id,),
+            )
+            user_row = await cur.fetchone()
+            if not user_row:
+                raise ValueError(f"User {user_id} not found")
+
+            await cur.execute(
+                """
+                UPDATE sessions
+                SET status = 'ABORTED', updated_at = now()
+                WHERE user_id = %s AND status = 'ACTIVE';
+                """,
+                (user_id,),
+            )
+
+            resolved_player_name = player_name or user_row["display_name"]
+            session_row = None
+            while session_row is None:
+                sid8 = _generate_sid8()
+                await cur.execute(
+                    """
+                    INSERT INTO sessions (
+                        user_id,
+                        tg_id,
+                        sid8,
+                        status,
+                        theme_id,
+                        step,
+                        max_steps,
+                        player_name,
+                        params_json,
+                        facts_json,
+                        child_name
+                    )
+                    VALUES (%s, %s, %s, 'ACTIVE', %s, 0, %s, %s, %s, '{}'::jsonb, %s)
+                    ON CONFLICT (sid8) DO NOTHING
+                    RETURNING id, user_id, tg_id, sid8, status, theme_id, step, max_steps, player_name, child_name;
+                    """,
+                    (
+                        user_id,
+                        user_row["tg_id"],
+                        sid8,
+                        theme_id,
+                        max_steps,
+                        resolved_player_name,
+                        to_json(payload),
+                        user_row.get("child_name"),
+                    ),
+                )
+                session_row = await cur.fetchone()
+    identity_cache.invalidate_user_sessions(user_id)
+    return dict(session_row)
+
+
+
+async def activate_existing_session(user_id: int, tg_id: int, sid8: str) -> dict[str, Any] | None:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT *
+                FROM sessions
+                WHERE user_id = %s AND tg_id = %s AND sid8 = %s
+                LIMIT 1;
+                """,
+                (user_id, tg_id, sid8),
+            )
+            target = await cur.fetchone()
+            if not target:
+                return None
+            await cur.execute(
+                """
+                UPDATE sessions
+                SET status = 'ABORTED', updated_at = now()
+                WHERE user_id = %s AND status = 'ACTIVE' AND sid8 <> %s;
+                """,
+                (user_id, sid8),
+            )
+            await cur.execute(
+                """
+                UPDATE sessions
+                SET status = 'ACTIVE', updated_at = now()
+                WHERE user_id = %s AND tg_id = %s AND sid8 = %s
+                RETURNING *;
+                """,
+                (user_id, tg_id, sid8),
+            )
+            row = await cur.fetchone()
+    identity_cache.invalidate_user_sessions(user_id)
+    return dict(row) if row else None
+
+async def finish(session_id: int, status: str = "FINISHED") -> None:
+    if status not in _ALLOWED_FINISH_STATUSES:
+        raise ValueError("status must be FINISHED or ABORTED")
+
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE sessions
+                SET status = %s, updated_at = now()
+                WHERE id = %s;
+                """,
+                (status, session_id),
+            )
+    identity_cache.invalidate_session(session_id)
+
+
+async def finish_in_tx(conn: AsyncConnection, session_id: int, status: str = "FINISHED") -> None:
+    if status not in _ALLOWED_FINISH_STATUSES:
+        raise ValueError("status must be FINISHED or ABORTED")
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE sessions
+            SET status = %s, updated_at = now()
+            WHERE id = %s;
+            """,
+            (status, session_id),
+        )
+
+
+async def update_last_step(
+    session_id: int,
+    message_id: int | None,
+    sent_at: int | None,
+) -> None:
+    async with transaction() as conn:
+        await update_last_step_in_tx(conn, session_id, message_id, sent_at)
+    identity_cache.invalidate_session(session_id)
+
+
+async def update_last_step_in_tx(
+    conn: AsyncConnection,
+    session_id: int,
+    message_id: int | None,
+    sent_at: int | None,
+) -> None:
+    async with conn.cursor() as cur:
+        if sent_at is None:
+            await cur.execute(
+                """
+                UPDATE sessions
+                SET last_step_message_id = %s,
+                    last_step_sent_at = NULL,
+                    updated_at = now()
+                WHERE id = %s;
+                """,
+                (message_id, session_id),
+            )
+        else:
+            await cur.execute(
+                """
+                UPDATE sessions
+                SET last_step_message_id = %s,
+                    last_step_sent_at = to_timestamp(%s),
+                    updated_at = now()
+                WHERE id = %s;
+                """,
+                (message_id, sent_at, session_id),
+            )
+
+
+async def update_step(session_id: int, step: int) -> None:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE sessions
+                SET step = %s, updated_at = now()
+                WHERE id = %s;
+                """,
+                (step, session_id),
+            )
+    identity_cache.invalidate_session(session_id)
+
+
+async def update_step_in_tx(conn: AsyncConnection, session_id: int, step: int) -> None:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE sessions
+            SET step = %s, updated_at = now()
+            WHERE id = %s;
+            """,
+            (step, session_id),
+        )
+
+
+async def update_params_json(session_id: int, params_json: dict[str, Any]) -> None:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE sessions
+                SET params_json = %s, updated_at = now()
+                WHERE id = %s;
+                """,
+                (to_json(params_json), session_id),
+            )
+    identity_cache.invalidate_session(session_id)
+
+
+async def update_params_json_in_tx(
+    conn: AsyncConnection, session_id: int, params_json: dict[str, Any]
+) -> None:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE sessions
+            SET params_json = %s, updated_at = now()
+            WHERE id = %s;
+            """,
+            (to_json(params_json), session_id),
+        )
+
+
+async def update_facts_json(session_id: int, facts_json: dict[str, Any]) -> None:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE sessions
+                SET facts_json = %s, updated_at = now()
+                WHERE id = %s;
+                """,
+                (to_json(facts_json), session_id),
+            )
+    identity_cache.invalidate_session(session_id)
+
+
+async def update_facts_json_in_tx(
+    conn: AsyncConnection, session_id: int, facts_json: dict[str, Any]
+) -> None:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE sessions
+            SET facts_json = %s, updated_at = now()
+            WHERE id = %s;
+            """,
+            (to_json(facts_json), session_id),
+        )
+
+
+async def patch_params_json(session_id: int, ops: list[JsonbOp]) -> None:
+    async with transaction() as conn:
+        await patch_params_json_in_tx(conn, session_id, ops)
+    identity_cache.invalidate_session(session_id)
+
+
+async def patch_params_json_in_tx(
+    conn: AsyncConnection, session_id: int, ops: list[JsonbOp]
+) -> None:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE sessions
+            SET params_json = jsonb_apply_patch(params_json, %s::jsonb), updated_at = now()
+            WHERE id = %s;
+            """,
+            (to_json(ops), session_id),
+        )
+
+
+async def patch_facts_json(session_id: int, ops: list[JsonbOp]) -> None:
+    async with transaction() as conn:
+        await patch_facts_json_in_tx(conn, session_id, ops)
+    identity_cache.invalidate_session(session_id)
+
+
+async def patch_facts_json_in_tx(
+    conn: AsyncConnection, session_id: int, ops: list[JsonbOp]
+) -> None:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE sessions
+            SET facts_json = jsonb_apply_patch(facts_json, %s::jsonb), updated_at = now()
+            WHERE id = %s;
+            """,
+            (to_json(ops), session_id),
+        )
+
+
+async def finish_with_final(
+    session_id: int,
+    final_id: str,
+    final_meta: dict[str, Any],
+) -> None:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE sessions
+                SET status = 'FINISHED',
+                    ending_id = %s,
+                    facts_json = %s,
+                    updated_at = now()
+                WHERE id = %s;
+                """,
+                (final_id, to_json({"final_meta": final_meta}), session_id),
+            )
+    identity_cache.invalidate_session(session_id)
+
+
+async def finish_with_final_in_tx(
+    conn: AsyncConnection,
+    session_id: int,
+    final_id: str,
+    final_meta: dict[str, Any],
+) -> None:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE sessions
+            SET status = 'FINISHED',
+                ending_id = %s,
+                facts_json = %s,
+                updated_at = now()
+            WHERE id = %s;
+            """,
+            (final_id, to_json({"final_meta": final_meta}), session_id),
+        )
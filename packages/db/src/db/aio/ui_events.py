@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from psycopg import AsyncConnection
+from psycopg.rows import dict_row
+
+from db import statements
+from db.aio.conn import transaction
+
+
+async def insert_idempotent(
+    session_id: int,
+    step: int,
+    kind: str,
+    content_hash: str,
+    payload: dict[str, Any] | None = None,
+) -> str:
+    del payload
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                INSERT INTO ui_events (
+                    session_id,
+                    step,
+                    kind,
+                    content_hash,
+                    state,
+                    pending_since
+                )
+                VALUES (%s, %s, %s, %s, 'PENDING', now())
+                ON CONFLICT (session_id, step, kind)
+                DO UPDATE SET content_hash = EXCLUDED.content_hash,
+                              state = 'PENDING',
+                              fail_count = 0,
+                              next_retry_at = NULL,
+                              pending_since = now(),
+                              updated_at = now()
+                RETURNING id;
+                """,
+                (session_id, step, kind, content_hash),
+            )
+            row = await cur.fetchone()
+            return "inserted" if row else "duplicate"
+
+
+def _backoff_seconds(fail_count: int) -> int:
+    if fail_count <= 1:
+        return 10
+    if fail_count == 2:
+        return 30
+    return 120
+
+
+async def acquire_event(
+    *,
+    session_id: int,
+    step: int,
+    kind: str,
+    content_hash: str,
+) -> dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await statements.aexecute(cur, statements.UI_EVENT_FOR_UPDATE, (session_id, step, kind))
+            row = await cur.fetchone()
+            if not row:
+                await statements.aexecute(cur, statements.UI_EVENT_INSERT_PENDING, (session_id, step, kind, content_hash))
+                inserted = await cur.fetchone()
+                return {"decision": "show", "event_id": int(inserted["id"])}
+
+            state = row["state"]
+            pending_since = row.get("pending_since")
+            fail_count = int(row.get("fail_count") or 0)
+            next_retry_at = row.get("next_retry_at")
+
+            if state == "SHOWN":
+                return {"decision": "skip", "event_id": int(row["id"])}
+
+            if state == "PENDING":
+                if pending_since and (now - pending_since) < timedelta(seconds=30):
+                    return {"decision": "skip", "event_id": int(row["id"])}
+                fail_count += 1
+                retry_at = now + timedelta(seconds=_backoff_seconds(fail_count))
+                await cur.execute(
+                    """
+                    UPDATE ui_events
+                    SET state = 'FAILED',
+                        pending_since = NULL,
+                        fail_count = %s,
+                        next_retry_at = %s,
+                        content_hash = %s,
+                        updated_at = now()
+                    WHERE id = %s AND session_id = %s;
+                    """,
+                    (fail_count, retry_at, content_hash, row["id"], session_id),
+                )
+                state = "FAILED"
+                next_retry_at = retry_at
+
+            if state == "FAILED":
+                if next_retry_at and next_retry_at > now:
+                    return {"decision": "skip", "event_id": int(row["id"])}
+                await cur.execute(
+                    """
+                    UPDATE ui_events
+                    SET state = 'PENDING',
+                        pending_since = now(),
+                        next_retry_at = NULL,
+                        content_hash = %s,
+                        updated_at = now()
+                    WHERE id = %s AND session_id = %s;
+                    """,
+                    (content_hash, row["id"], session_id),
+                )
+                return {"decision": "show", "event_id": int(row["id"])}
+
+            return {"decision": "skip", "event_id": int(row["id"])}
+
+
+async def mark_shown(event_id: int, step_message_id: int | None = None) -> None:
+    async with transaction() as conn:
+        await mark_shown_in_tx(conn, event_id, step_message_id=step_message_id)
+
+
+async def mark_shown_in_tx(
+    conn: AsyncConnection,
+    event_id: int,
+    step_message_id: int | None = None,
+) -> None:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE ui_events
+            SET state = 'SHOWN',
+                step_message_id = %s,
+                updated_at = now()
+            WHERE id = %s;
+            """,
+            (step_message_id, event_id),
+        )
+
+
+async def mark_failed(event_id: int) -> None:
+    now = datetime.now(timezone.utc)
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT fail_count
+                FROM ui_events
+                WHERE id = %s
+                FOR UPDATE;
+                """,
+                (event_id,),
+            )
+            row = await cur.fetchone()
+            if not row:
+                return
+            fail_count = int(row.get("fail_count") or 0) + 1
+            retry_at = now + timedelta(seconds=_backoff_seconds(fail_count))
+            await cur.execute(
+                """
+                UPDATE ui_events
+                SET state = 'FAILED',
+                    fail_count = %s,
+                    next_retry_at = %s,
+                    updated_at = now()
+                WHERE id = %s;
+                """,
+                (fail_count, retry_at, event_id),
+            )
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from psycopg.rows import dict_row
+
+from db.aio.conn import transaction
+from db.repos.usage_windows import UsageDelta, window_bounds
+
+_ALLOWED_KINDS = {
+    "messages_used": "messages_used",
+    "sessions_started": "sessions_started",
+}
+
+
+async def upsert_counter(
+    user_id: int,
+    kind: str,
+    window_sec: int = 43200,
+    delta: int = 1,
+) -> dict[str, Any]:
+    if kind not in _ALLOWED_KINDS:
+        raise ValueError("kind must be messages_used or sessions_started")
+    column = _ALLOWED_KINDS[kind]
+    window_start, window_end = window_bounds(window_sec)
+
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                f"""
+                INSERT INTO usage_windows (
+                    user_id,
+                    window_start,
+                    window_end,
+                    {column}
+                )
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user_id, window_start) DO UPDATE
+                SET {column} = usage_windows.{column} + EXCLUDED.{column},
+                    updated_at = now()
+                RETURNING *;
+                """,
+                (user_id, window_start, window_end, delta),
+            )
+            row = await cur.fetchone()
+            return dict(row)
+
+
+async def add_deltas(deltas: list[UsageDelta]) -> list[dict[str, Any]]:
+    if not deltas:
+        return []
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                INSERT INTO usage_windows (
+                    user_id,
+                    window_start,
+                    window_end,
+                    messages_used,
+                    sessions_started
+                )
+                SELECT *
+                FROM unnest(
+                    %s::bigint[],
+                    %s::timestamptz[],
+                    %s::timestamptz[],
+                    %s::int[],
+                    %s::int[]
+                )
+                ON CONFLICT (user_id, window_start) DO UPDATE
+                SET messages_used = usage_windows.messages_used + EXCLUDED.messages_used,
+                    sessions_started = usage_windows.sessions_started + EXCLUDED.sessions_started,
+                    updated_at = now()
+                RETURNING *;
+                """,
+                (
+                    [delta.user_id for delta in deltas],
+                    [delta.window_start for delta in deltas],
+                    [delta.window_end for delta in deltas],
+                    [delta.messages_used for delta in deltas],
+                    [delta.sessions_started for delta in deltas],
+                ),
+            )
+            return [dict(row) for row in await cur.fetchall()]
+
+
+async def read_window(user_id: int, window_start: datetime) -> dict[str, Any] | None:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT *
+                FROM usage_windows
+                WHERE user_id = %s AND window_start = %s;
+                """,
+                (user_id, window_start),
+            )
+            row = await cur.fetchone()
+            return dict(row) if row else None
+
+
+async def read_counters(user_id: int, window_sec: int = 43200) -> dict[str, Any]:
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT *
+                FROM usage_windows
+                WHERE user_id = %s
+                  AND now() >= window_start
+                  AND now() < window_end
+                ORDER BY window_start DESC
+                LIMIT 1;
+                """,
+                (user_id,),
+            )
+            row = await cur.fetchone()
+            if row:
+                return dict(row)
+
+    return {
+        "user_id": user_id,
+        "window_start": None,
+        "window_end": None,
+        "messages_used": 0,
+        "sessions_started": 0,
+        "blocked_until": None,
+        "window_sec": window_sec,
+    }
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import Any
+
+from psycopg.rows import dict_row
+
+from db import identity_cache
+from db.aio.conn import transaction
+
+
+async def get_or_create_by_tg_id(
+    tg_id: int,
+    tg_username: str | None = None,
+    display_name: str | None = None,
+) -> dict[str, Any]:
+    if tg_username is None and display_name is None:
+        cached = identity_cache.get_user(tg_id)
+        if cached is not None:
+            return cached
+    resolved_display_name = display_name or tg_username or f"user_{tg_id}"
+
+    async with transaction() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                INSERT INTO users (tg_id, display_name, tg_username)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (tg_id)
+                DO UPDATE SET
+                    tg_username = COALESCE(EXCLUDED.tg_username, users.tg_username),
+                    updated_at = now()
+                RETURNING id, tg_id, display_name, child_name;
+                """,
+                (tg_id, resolved_display_name, tg_username),
+            )
+            row = await cur.fetchone()
+            if row is None:
+                raise RuntimeError("Failed to fetch user row")
+    user = dict(row)
+    identity_cache.put_user(user)
+    return user
+
+
+async def update_child_name(user_id: int, child_name: str | None) -> None:
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE users
+                SET child_name = %s,
+                    updated_at = now()
+                WHERE id = %s;
+                """,
+                (child_name, user_id),
+            )
+    identity_cache.invalidate_user(user_id)
@@ -2,15 +2,19 @@ from __future__ import annotations
 
 import logging
 import os
+import threading
 from contextlib import contextmanager
-from typing import Iterator
+from time import monotonic
+from typing import Any, Iterator
 
 from psycopg import Connection, OperationalError
 from psycopg.types.json import Json
 from psycopg_pool import ConnectionPool
 
 _DB_URL_ENV = "DB_URL"
+_WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
 _pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
 logger = logging.getLogger(__name__)
 
 
@@ -18,6 +22,34 @@ class DBUnavailable(RuntimeError):
     pass
 
 
+class WaitHistogram:
+    def __init__(self) -> None:
+        self._counts = [0] * (len(_WAIT_BUCKETS_MS) + 1)
+        self._lock = threading.Lock()
+
+    def observe(self, wait_ms: float) -> None:
+        index = len(_WAIT_BUCKETS_MS)
+        for position, bound in enumerate(_WAIT_BUCKETS_MS):
+            if wait_ms <= bound:
+                index = position
+                break
+        with self._lock:
+            self._counts[index] += 1
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            counts = list(self._counts)
+        labels = [f"le_{bound}" for bound in _WAIT_BUCKETS_MS] + [f"gt_{_WAIT_BUCKETS_MS[-1]}"]
+        return dict(zip(labels, counts))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = [0] * (len(_WAIT_BUCKETS_MS) + 1)
+
+
+_wait_histogram = WaitHistogram()
+
+
 def _get_db_url() -> str:
     db_url = os.getenv(_DB_URL_ENV)
     if not db_url:
@@ -25,13 +57,93 @@ def _get_db_url() -> str:
     return db_url
 
 
+def _resolve_int_env(name: str, default: int, *, minimum: int = 1) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return default
+    return value if value >= minimum else default
+
+
+def _resolve_float_env(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def pool_settings() -> dict[str, Any]:
+    min_size = _resolve_int_env("DB_POOL_MIN_SIZE", 1, minimum=0)
+    max_size = max(_resolve_int_env("DB_POOL_MAX_SIZE", 5), min_size, 1)
+    return {
+        "min_size": min_size,
+        "max_size": max_size,
+        "timeout": _resolve_float_env("DB_POOL_TIMEOUT_S", 30.0),
+        "max_waiting": _resolve_int_env("DB_POOL_MAX_WAITING", 0, minimum=0),
+        "max_idle": _resolve_float_env("DB_POOL_MAX_IDLE_S", 600.0),
+        "max_lifetime": _resolve_float_env("DB_POOL_MAX_LIFETIME_S", 3600.0),
+        "reconnect_timeout": _resolve_float_env("DB_POOL_RECONNECT_TIMEOUT_S", 300.0),
+    }
+
+
+def pool_check_enabled() -> bool:
+    raw = os.getenv("DB_POOL_CHECK", "1").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
 def get_pool() -> ConnectionPool:
     global _pool
     if _pool is None:
-        _pool = ConnectionPool(conninfo=_get_db_url(), min_size=1, max_size=5, open=True)
+        with _pool_lock:
+            if _pool is None:
+                settings = pool_settings()
+                _pool = ConnectionPool(
+                    conninfo=_get_db_url(),
+                    check=ConnectionPool.check_connection if pool_check_enabled() else None,
+                    name="db",
+                    open=True,
+                    **settings,
+                )
+                logger.info(
+                    "db.pool outcome=opened min_size=%s max_size=%s timeout_s=%s",
+                    settings["min_size"],
+                    settings["max_size"],
+                    settings["timeout"],
+                )
     return _pool
 
 
+def stats_from(pool: ConnectionPool | Any | None, histogram: WaitHistogram) -> dict[str, Any]:
+    if pool is None:
+        return {}
+    raw = pool.get_stats()
+    size = int(raw.get("pool_size", 0))
+    available = int(raw.get("pool_available", 0))
+    return {
+        "min_size": raw.get("pool_min", 0),
+        "max_size": raw.get("pool_max", 0),
+        "size": size,
+        "available": available,
+        "in_use": max(size - available, 0),
+        "waiting": raw.get("requests_waiting", 0),
+        "requests": raw.get("requests_num", 0),
+        "timeouts": raw.get("requests_errors", 0),
+        "connections_lost": raw.get("connections_lost", 0),
+        "wait_ms_histogram": histogram.snapshot(),
+    }
+
+
+def pool_stats() -> dict[str, Any]:
+    return stats_from(_pool, _wait_histogram)
+
+
 def to_json(value: object | None) -> Json | None:
     if value is None:
         return None
@@ -42,12 +154,18 @@ def to_json(value: object | None) -> Json | None:
 
 @contextmanager
 def get_conn() -> Iterator[Connection]:
+    requested_at = monotonic()
     try:
         with get_pool().connection() as conn:
-            yield conn
+            _wait_histogram.observe((monotonic() - requested_at) * 1000)
+            try:
+                yield conn
+            except OperationalError:
+                if conn.broken or conn.closed:
+                    logger.warning("db.pool outcome=discard_broken_connection")
+                raise
     except OperationalError as exc:
         logger.exception("DB connection failed", exc_info=True)
-        _reset_pool()
         raise DBUnavailable("DB connection failed") from exc
 
 
@@ -59,12 +177,12 @@ def transaction() -> Iterator[Connection]:
                 yield conn
     except OperationalError as exc:
         logger.exception("DB transaction failed", exc_info=True)
-        _reset_pool()
         raise DBUnavailable("DB transaction failed") from exc
 
 
-def _reset_pool() -> None:
+def close_pool() -> None:
     global _pool
-    if _pool is not None:
-        _pool.close()
-        _pool = None
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
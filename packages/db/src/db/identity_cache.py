@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Hashable
+
+_MISSING = object()
+
+
+def _resolve_float_env(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        return default
+    return value if value >= 0 else default
+
+
+def cache_enabled() -> bool:
+    raw = os.getenv("DB_IDENTITY_CACHE_ENABLED", "1").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+class TTLCache:
+    def __init__(self, *, max_size: int, ttl_s: float) -> None:
+        self.max_size = max(1, max_size)
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or monotonic() - entry[0] > self.ttl_s:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (monotonic(), copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard_where(self, predicate) -> None:
+        with self._lock:
+            stale = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_users = TTLCache(
+    max_size=int(_resolve_float_env("DB_USER_CACHE_SIZE", 10000)),
+    ttl_s=_resolve_float_env("DB_USER_CACHE_TTL_S", 600.0),
+)
+_sessions = TTLCache(
+    max_size=int(_resolve_float_env("DB_SESSION_CACHE_SIZE", 5000)),
+    ttl_s=_resolve_float_env("DB_SESSION_CACHE_TTL_S", 2.0),
+)
+
+
+def get_user(tg_id: int) -> dict[str, Any] | None:
+    if not cache_enabled():
+        return None
+    row = _users.get(tg_id)
+    return None if row is _MISSING else row
+
+
+def put_user(row: dict[str, Any]) -> None:
+    if cache_enabled():
+        _users.put(int(row["tg_id"]), row)
+
+
+def invalidate_user(user_id: int) -> None:
+    _users.discard_where(lambda _key, row: int(row["id"]) == int(user_id))
+
+
+def get_active_session(user_id: int) -> Any:
+    if not cache_enabled():
+        return _MISSING
+    return _sessions.get(("active", user_id))
+
+
+def put_active_session(user_id: int, row: dict[str, Any] | None) -> None:
+    if cache_enabled():
+        _sessions.put(("active", user_id), row)
+
+
+def get_session_by_sid8(tg_id: int, sid8: str) -> Any:
+    if not cache_enabled():
+        return _MISSING
+    return _sessions.get(("sid8", tg_id, sid8))
+
+
+def put_session_by_sid8(tg_id: int, sid8: str, row: dict[str, Any] | None) -> None:
+    if cache_enabled():
+        _sessions.put(("sid8", tg_id, sid8), row)
+
+
+def is_missing(value: Any) -> bool:
+    return value is _MISSING
+
+
+def invalidate_session(session_id: int) -> None:
+    _sessions.discard_where(lambda _key, row: row is not None and int(row["id"]) == int(session_id))
+
+
+def invalidate_user_sessions(user_id: int) -> None:
+    _sessions.discard_where(
+        lambda key, row: key == ("active", user_id)
+        or (row is not None and int(row.get("user_id", -1)) == int(user_id))
+    )
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    return {"users": _users.stats(), "sessions": _sessions.stats()}
+
+
+def reset() -> None:
+    _users.clear()
+    _sessions.clear()
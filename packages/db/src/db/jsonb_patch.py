@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import copy
+from typing import Any, Iterable
+
+JsonbOp = dict[str, Any]
+
+
+def set_path(path: Iterable[str], value: Any) -> JsonbOp:
+    return {"op": "set", "path": list(path), "value": value}
+
+
+def append(path: Iterable[str], value: Any, *, keep_last: int | None = None) -> JsonbOp:
+    op: JsonbOp = {"op": "append", "path": list(path), "value": value}
+    if keep_last is not None:
+        op["keep_last"] = keep_last
+    return op
+
+
+def merge(value: dict[str, Any]) -> JsonbOp:
+    return {"op": "merge", "value": value}
+
+
+def delete(path: Iterable[str]) -> JsonbOp:
+    return {"op": "delete", "path": list(path)}
+
+
+def diff(before: dict[str, Any], after: dict[str, Any], path: tuple[str, ...] = ()) -> list[JsonbOp]:
+    ops: list[JsonbOp] = [delete([*path, key]) for key in before if key not in after]
+    for key, value in after.items():
+        previous = before.get(key)
+        if key in before and previous == value:
+            continue
+        if isinstance(previous, dict) and isinstance(value, dict):
+            ops.extend(diff(previous, value, (*path, key)))
+        else:
+            ops.append(set_path([*path, key], value))
+    return ops
+
+
+def apply(doc: dict[str, Any] | None, ops: Iterable[JsonbOp]) -> dict[str, Any]:
+    result = copy.deepcopy(doc) if isinstance(doc, dict) else {}
+    for op in ops:
+        kind = op["op"]
+        if kind == "merge":
+            result.update(copy.deepcopy(op["value"]))
+            continue
+        *parents, leaf = op["path"]
+        target = result
+        for key in parents:
+            target = target.get(key) if isinstance(target, dict) else None
+            if not isinstance(target, dict):
+                break
+        if not isinstance(target, dict):
+            continue
+        if kind == "set":
+            target[leaf] = copy.deepcopy(op["value"])
+        elif kind == "append":
+            items = target.get(leaf)
+            items = list(items) if isinstance(items, list) else []
+            items.append(copy.deepcopy(op["value"]))
+            keep_last = op.get("keep_last")
+            if isinstance(keep_last, int) and keep_last > 0:
+                items = items[-keep_last:]
+            target[leaf] = items
+        elif kind == "delete":
+            target.pop(leaf, None)
+        else:
+            raise ValueError(f"unknown jsonb patch op {kind}")
+    return result
@@ -2,6 +2,8 @@ from db.repos import (
     assets,
     book_jobs,
     confirm_requests,
+    event_archive,
+    event_partitions,
     l3_turns,
     payments,
     session_images,
@@ -16,6 +18,8 @@ __all__ = [
     "assets",
     "book_jobs",
     "confirm_requests",
+    "event_archive",
+    "event_partitions",
     "l3_turns",
     "payments",
     "session_images",
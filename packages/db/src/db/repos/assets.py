@@ -14,6 +14,8 @@ def insert_asset(
     sha256: str,
     width: int | None = None,
     height: int | None = None,
+    original_asset_id: int | None = None,
+    rendition: str | None = None,
 ) -> int:
     with transaction() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
@@ -27,9 +29,11 @@ def insert_asset(
                     bytes,
                     sha256,
                     width,
-                    height
+                    height,
+                    original_asset_id,
+                    rendition
                 )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING id;
                 """,
                 (
@@ -41,6 +45,8 @@ def insert_asset(
                     sha256,
                     width,
                     height,
+                    original_asset_id,
+                    rendition,
                 ),
             )
             row = cur.fetchone()
@@ -77,3 +83,19 @@ def get_by_sha256(sha256: str) -> dict | None:
             )
             row = cur.fetchone()
             return dict(row) if row else None
+
+
+def get_rendition(original_asset_id: int, rendition: str) -> dict | None:
+    with transaction() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT *
+                FROM assets
+                WHERE original_asset_id = %s AND rendition = %s
+                LIMIT 1;
+                """,
+                (original_asset_id, rendition),
+            )
+            row = cur.fetchone()
+            return dict(row) if row else None
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import json
+import zlib
+from typing import Any
+
+from psycopg.rows import dict_row
+
+from db.conn import to_json, transaction
+
+_CODEC = "zlib"
+_COLD_META_KEYS = ("engine_input", "engine_output")
+
+
+def hot_step_result(step_result_json: Any) -> Any:
+    if not isinstance(step_result_json, dict):
+        return step_result_json
+    hot = {key: value for key, value in step_result_json.items() if key != "story_step_json"}
+    nested = step_result_json.get("story_step_json")
+    if isinstance(nested, dict) and nested != hot:
+        hot["story_step_json"] = nested
+    return hot
+
+
+def hot_meta(meta_json: Any) -> Any:
+    if not isinstance(meta_json, dict):
+        return meta_json
+    return {key: value for key, value in meta_json.items() if key not in _COLD_META_KEYS}
+
+
+def encode_payload(payload: dict[str, Any]) -> tuple[bytes, int]:
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return zlib.compress(raw, 6), len(raw)
+
+
+def decode_payload(codec: str, payload: bytes) -> dict[str, Any]:
+    if codec != _CODEC:
+        raise ValueError(f"unsupported archive codec {codec}")
+    return json.loads(zlib.decompress(bytes(payload)).decode("utf-8"))
+
+
+def archive_batch(*, older_than_days: int, batch_size: int) -> dict[str, int]:
+    with transaction() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT e.id, e.session_id, e.step, e.llm_json, e.step_result_json, e.meta_json
+                FROM session_events e
+                JOIN sessions s ON s.id = e.session_id
+                WHERE e.archived_at IS NULL
+                  AND s.status IN ('FINISHED', 'ABORTED')
+                  AND s.updated_at < now() - make_interval(days => %s)
+                ORDER BY e.id
+                LIMIT %s
+                FOR UPDATE OF e SKIP LOCKED;
+                """,
+                (older_than_days, batch_size),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                return {"archived": 0, "raw_bytes": 0, "stored_bytes": 0}
+            archive_rows = []
+            hot_rows = []
+            raw_total = 0
+            stored_total = 0
+            for row in rows:
+                payload, raw_bytes = encode_payload(
+                    {
+                        "llm_json": row["llm_json"],
+                        "step_result_json": row["step_result_json"],
+                        "meta_json": row["meta_json"],
+                    }
+                )
+                raw_total += raw_bytes
+                stored_total += len(payload)
+                archive_rows.append((row["id"], row["session_id"], row["step"], _CODEC, raw_bytes, payload))
+                hot_rows.append(
+                    (
+                        to_json(hot_step_result(row["step_result_json"])),
+                        to_json(hot_meta(row["meta_json"])),
+                        row["id"],
+                        row["session_id"],
+                    )
+                )
+            cur.executemany(
+                """
+                INSERT INTO session_events_archive (event_id, session_id, step, codec, raw_bytes, payload)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (event_id) DO NOTHING;
+                """,
+                archive_rows,
+            )
+            cur.executemany(
+                """
+                UPDATE session_events
+                SET llm_json = NULL,
+                    step_result_json = %s,
+                    meta_json = %s,
+                    archived_at = now()
+                WHERE id = %s AND session_id = %s;
+                """,
+                hot_rows,
+            )
+    return {"archived": len(rows), "raw_bytes": raw_total, "stored_bytes": stored_total}
+
+
+def load_archived(event_id: int) -> dict[str, Any] | None:
+    with transaction() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT codec, payload
+                FROM session_events_archive
+                WHERE event_id = %s;
+                """,
+                (event_id,),
+            )
+            row = cur.fetchone()
+    if not row:
+        return None
+    return decode_payload(row["codec"], row["payload"])
+
+
+def list_archived(session_id: int) -> list[dict[str, Any]]:
+    with transaction() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT event_id, step, codec, payload
+                FROM session_events_archive
+                WHERE session_id = %s
+                ORDER BY step ASC;
+                """,
+                (session_id,),
+            )
+            rows = cur.fetchall()
+    return [
+        {"event_id": row["event_id"], "step": row["step"], **decode_payload(row["codec"], row["payload"])}
+        for row in rows
+    ]
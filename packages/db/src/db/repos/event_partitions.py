@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from typing import Any
+
+from psycopg.rows import dict_row
+
+from db.conn import transaction
+
+
+def ensure_partitions(*, ahead: int = 2, min_span: int = 1000) -> list[str]:
+    with transaction() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT ensure_event_partitions(%s, %s);",
+                (ahead, min_span),
+            )
+            return [row[0] for row in cur.fetchall()]
+
+
+def detach_expired(*, retention_days: int, drop: bool = False) -> list[str]:
+    with transaction() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT detach_expired_event_partitions(make_interval(days => %s), %s);",
+                (retention_days, drop),
+            )
+            return [row[0] for row in cur.fetchall()]
+
+
+def list_partitions(parent: str | None = None) -> list[dict[str, Any]]:
+    with transaction() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT name, parent, lo, hi, created_at, detached_at, dropped_at
+                FROM event_partitions
+                WHERE %s::text IS NULL OR parent = %s
+                ORDER BY parent, lo;
+                """,
+                (parent, parent),
+            )
+            return [dict(row) for row in cur.fetchall()]
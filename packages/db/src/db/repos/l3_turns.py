@@ -2,11 +2,16 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from typing import Any, Callable, Literal
+from uuid import uuid4
 
-from db.conn import transaction
+from psycopg import Connection
+
+from db import identity_cache
+from db.conn import to_json, transaction
+from db.jsonb_patch import JsonbOp
 from db.repos import session_events, sessions
 
-L3Outcome = Literal["accepted", "duplicate", "stale", "invalid"]
+L3Outcome = Literal["accepted", "duplicate", "stale", "invalid", "reserved", "pending"]
 
 
 @dataclass
@@ -17,6 +22,8 @@ class L3ApplyPayload:
     step_result_json: dict[str, Any] | None
     meta_json: dict[str, Any] | None
     facts_json: dict[str, Any] = field(default_factory=dict)
+    params_patch: list[JsonbOp] | None = None
+    facts_patch: list[JsonbOp] | None = None
     finish_status: str | None = None
     final_id: str | None = None
     final_meta: dict[str, Any] | None = None
@@ -29,6 +36,19 @@ class L3ApplyResult:
     step: int
     event: dict[str, Any] | None
     payload: L3ApplyPayload | None
+    reservation: L3Reservation | None = None
+
+
+@dataclass
+class L3Reservation:
+    tg_id: int
+    sid8: str
+    expected_step: int
+    step: int
+    event_id: int
+    reservation_id: str
+    session_row: dict[str, Any]
+    base_meta_json: dict[str, Any] | None = None
 
 
 def apply_l3_turn_atomic(
@@ -47,30 +67,9 @@ def apply_l3_turn_atomic(
         session_row = sessions.get_by_tg_id_sid8_for_update(conn, tg_id=tg_id, sid8=sid8)
         if not session_row:
             return None
-        current_step = int(session_row["step"])
-        if current_step != expected_step:
-            existing_event = None
-            if current_step > expected_step:
-                existing_event = session_events.get_by_step(
-                    conn,
-                    session_id=session_row["id"],
-                    step=step,
-                )
-            if existing_event:
-                return L3ApplyResult(
-                    outcome="duplicate",
-                    session_row=session_row,
-                    step=step,
-                    event=existing_event,
-                    payload=None,
-                )
-            return L3ApplyResult(
-                outcome="stale",
-                session_row=session_row,
-                step=current_step,
-                event=None,
-                payload=None,
-            )
+        mismatch = _check_step(conn, session_row, expected_step, step)
+        if mismatch is not None:
+            return mismatch
 
         if is_valid is not None and not is_valid(session_row):
             return L3ApplyResult(
@@ -94,68 +93,284 @@ def apply_l3_turn_atomic(
             step_result_json=None,
             meta_json=base_meta_json,
         )
+        if event_id is None:
+            return _mark_duplicate(conn, session_row, step, base_meta_json)
+
+        payload = apply_fn(session_row)
+        result = _commit_payload(conn, session_row, event_id, base_meta_json, payload)
+    identity_cache.invalidate_session(session_row["id"])
+    return result
+
+
+def reserve_l3_turn(
+    *,
+    tg_id: int,
+    sid8: str,
+    expected_step: int,
+    step: int,
+    user_input: str | None,
+    choice_id: str | None,
+    lease_s: float,
+    base_meta_json: dict[str, Any] | None = None,
+    is_valid: Callable[[dict[str, Any]], bool] | None = None,
+) -> L3ApplyResult | None:
+    with transaction() as conn:
+        session_row = sessions.get_by_tg_id_sid8_for_update(conn, tg_id=tg_id, sid8=sid8)
+        if not session_row:
+            return None
+        mismatch = _check_step(conn, session_row, expected_step, step)
+        if mismatch is not None:
+            return mismatch
+
+        if is_valid is not None and not is_valid(session_row):
+            return L3ApplyResult(
+                outcome="invalid",
+                session_row=session_row,
+                step=int(session_row["step"]),
+                event=None,
+                payload=None,
+            )
+
+        reservation_id = uuid4().hex
+        event_id = session_events.insert_reserved_event(
+            conn,
+            session_id=session_row["id"],
+            step=step,
+            step0=step,
+            user_input=user_input,
+            choice_id=choice_id,
+            reservation_id=reservation_id,
+            lease_s=lease_s,
+            meta_json=base_meta_json,
+        )
         if event_id is None:
             existing_event = session_events.get_by_step(
                 conn,
                 session_id=session_row["id"],
                 step=step,
             )
-            if existing_event:
-                meta_json = existing_event.get("meta_json") or {}
-                if not isinstance(meta_json, dict):
-                    meta_json = {}
-                if base_meta_json:
-                    meta_json = {**meta_json, **base_meta_json}
-                meta_json["last_outcome"] = "duplicate"
-                session_events.update_event_payload(
-                    conn,
-                    event_id=existing_event["id"],
-                    llm_json=existing_event.get("llm_json"),
-                    deltas_json=existing_event.get("deltas_json"),
-                    outcome="duplicate",
-                    step_result_json=existing_event.get("step_result_json"),
-                    meta_json=meta_json,
+            if not existing_event or existing_event.get("outcome") != "reserved":
+                return _mark_duplicate(conn, session_row, step, base_meta_json)
+            taken_over = session_events.take_over_expired_reservation(
+                conn,
+                existing_event["id"],
+                reservation_id=reservation_id,
+                lease_s=lease_s,
+                user_input=user_input,
+                choice_id=choice_id,
+                meta_json=base_meta_json,
+            )
+            if not taken_over:
+                return L3ApplyResult(
+                    outcome="pending",
+                    session_row=session_row,
+                    step=step,
+                    event=existing_event,
+                    payload=None,
                 )
+            event_id = int(existing_event["id"])
+
+        return L3ApplyResult(
+            outcome="reserved",
+            session_row=session_row,
+            step=step,
+            event=None,
+            payload=None,
+            reservation=L3Reservation(
+                tg_id=tg_id,
+                sid8=sid8,
+                expected_step=expected_step,
+                step=step,
+                event_id=event_id,
+                reservation_id=reservation_id,
+                session_row=session_row,
+                base_meta_json=base_meta_json,
+            ),
+        )
+
+
+def commit_l3_turn(
+    reservation: L3Reservation,
+    payload: L3ApplyPayload,
+) -> L3ApplyResult | None:
+    with transaction() as conn:
+        session_row = sessions.get_by_tg_id_sid8_for_update(
+            conn,
+            tg_id=reservation.tg_id,
+            sid8=reservation.sid8,
+        )
+        if not session_row:
+            return None
+        if int(session_row["step"]) != reservation.expected_step:
+            session_events.delete_reservation(conn, reservation.event_id, reservation.reservation_id)
+        mismatch = _check_step(conn, session_row, reservation.expected_step, reservation.step)
+        if mismatch is not None:
+            return mismatch
+        event = session_events.get_reserved_for_update(
+            conn,
+            reservation.event_id,
+            reservation.reservation_id,
+        )
+        if event is None:
             return L3ApplyResult(
-                outcome="duplicate",
+                outcome="pending",
                 session_row=session_row,
-                step=step,
-                event=existing_event,
+                step=reservation.step,
+                event=None,
                 payload=None,
             )
+        result = _commit_payload(
+            conn,
+            session_row,
+            reservation.event_id,
+            reservation.base_meta_json,
+            payload,
+        )
+    identity_cache.invalidate_session(session_row["id"])
+    return result
 
-        payload = apply_fn(session_row)
-        merged_meta_json = base_meta_json or {}
-        if payload.meta_json:
-            merged_meta_json = {**merged_meta_json, **payload.meta_json}
-        session_events.update_event_payload(
+
+def release_l3_turn(reservation: L3Reservation) -> bool:
+    with transaction() as conn:
+        return session_events.delete_reservation(
             conn,
-            event_id=event_id,
-            llm_json=payload.llm_json,
-            deltas_json=payload.deltas_json,
-            outcome="accepted",
-            step_result_json=payload.step_result_json,
-            meta_json=merged_meta_json,
+            reservation.event_id,
+            reservation.reservation_id,
         )
-        sessions.update_params_json_in_tx(conn, session_row["id"], payload.new_state)
-        sessions.update_step_in_tx(conn, session_row["id"], payload.new_state["step0"])
-        if payload.facts_json is not None:
-            sessions.update_facts_json_in_tx(conn, session_row["id"], payload.facts_json)
 
-        if payload.final_id:
-            sessions.finish_with_final_in_tx(
-                conn,
-                session_row["id"],
-                payload.final_id,
-                payload.final_meta or {},
-            )
-        elif payload.finish_status:
-            sessions.finish_in_tx(conn, session_row["id"], status=payload.finish_status)
 
+def _check_step(
+    conn: Connection,
+    session_row: dict[str, Any],
+    expected_step: int,
+    step: int,
+) -> L3ApplyResult | None:
+    current_step = int(session_row["step"])
+    if current_step == expected_step:
+        return None
+    existing_event = None
+    if current_step > expected_step:
+        existing_event = session_events.get_by_step(
+            conn,
+            session_id=session_row["id"],
+            step=step,
+        )
+    if existing_event:
         return L3ApplyResult(
-            outcome="accepted",
+            outcome="duplicate",
             session_row=session_row,
-            step=int(payload.new_state["step0"]),
-            event=None,
-            payload=payload,
+            step=step,
+            event=existing_event,
+            payload=None,
+        )
+    return L3ApplyResult(
+        outcome="stale",
+        session_row=session_row,
+        step=current_step,
+        event=None,
+        payload=None,
+    )
+
+
+def _mark_duplicate(
+    conn: Connection,
+    session_row: dict[str, Any],
+    step: int,
+    base_meta_json: dict[str, Any] | None,
+) -> L3ApplyResult:
+    existing_event = session_events.get_by_step(
+        conn,
+        session_id=session_row["id"],
+        step=step,
+    )
+    if existing_event and existing_event.get("outcome") != "reserved":
+        meta_json = existing_event.get("meta_json") or {}
+        if not isinstance(meta_json, dict):
+            meta_json = {}
+        if base_meta_json:
+            meta_json = {**meta_json, **base_meta_json}
+        meta_json["last_outcome"] = "duplicate"
+        session_events.update_event_payload(
+            conn,
+            event_id=existing_event["id"],
+            llm_json=existing_event.get("llm_json"),
+            deltas_json=existing_event.get("deltas_json"),
+            outcome="duplicate",
+            step_result_json=existing_event.get("step_result_json"),
+            meta_json=meta_json,
+        )
+    return L3ApplyResult(
+        outcome="duplicate",
+        session_row=session_row,
+        step=step,
+        event=existing_event,
+        payload=None,
+    )
+
+
+def _commit_payload(
+    conn: Connection,
+    session_row: dict[str, Any],
+    event_id: int,
+    base_meta_json: dict[str, Any] | None,
+    payload: L3ApplyPayload,
+) -> L3ApplyResult:
+    merged_meta_json = base_meta_json or {}
+    if payload.meta_json:
+        merged_meta_json = {**merged_meta_json, **payload.meta_json}
+    _commit_turn(conn, session_row["id"], event_id, merged_meta_json, payload)
+    return L3ApplyResult(
+        outcome="accepted",
+        session_row=session_row,
+        step=int(payload.new_state["step0"]),
+        event=None,
+        payload=payload,
+    )
+
+
+def _commit_turn(
+    conn: Connection,
+    session_id: int,
+    event_id: int,
+    meta_json: dict[str, Any],
+    payload: L3ApplyPayload,
+) -> None:
+    if payload.finish_status and payload.finish_status not in {"FINISHED", "ABORTED"}:
+        raise ValueError("status must be FINISHED or ABORTED")
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT commit_l3_turn(
+                %s::bigint,
+                %s::bigint,
+                %s::jsonb,
+                %s::jsonb,
+                %s::jsonb,
+                %s::jsonb,
+                %s::jsonb,
+                %s::jsonb,
+                %s::int,
+                %s::jsonb,
+                %s::jsonb,
+                %s::text,
+                %s::jsonb,
+                %s::text
+            );
+            """,
+            (
+                session_id,
+                event_id,
+                to_json(payload.llm_json),
+                to_json(payload.deltas_json),
+                to_json(payload.step_result_json),
+                to_json(meta_json),
+                None if payload.params_patch is not None else to_json(payload.new_state),
+                to_json(payload.params_patch),
+                payload.new_state["step0"],
+                None if payload.facts_patch is not None else to_json(payload.facts_json),
+                to_json(payload.facts_patch),
+                payload.final_id or None,
+                to_json(payload.final_meta),
+                None if payload.final_id else payload.finish_status or None,
+            ),
         )
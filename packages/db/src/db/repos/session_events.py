@@ -5,6 +5,7 @@ from typing import Any
 from psycopg import Connection
 from psycopg.rows import dict_row
 
+from db import statements
 from db.conn import to_json, transaction
 
 
@@ -140,25 +141,138 @@ def update_event_payload(
         )
 
 
-def get_by_step(
+def insert_reserved_event(
     conn: Connection,
     session_id: int,
     step: int,
+    step0: int | None,
+    user_input: str | None,
+    choice_id: str | None,
+    *,
+    reservation_id: str,
+    lease_s: float,
+    meta_json: dict[str, Any] | None = None,
+) -> int | None:
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(
+            """
+            INSERT INTO session_events (
+                session_id,
+                step,
+                step0,
+                user_input,
+                choice_id,
+                outcome,
+                meta_json,
+                reservation_id,
+                reserved_until
+            )
+            VALUES (%s, %s, %s, %s, %s, 'reserved', %s, %s, now() + make_interval(secs => %s))
+            ON CONFLICT (session_id, step) DO NOTHING
+            RETURNING id;
+            """,
+            (
+                session_id,
+                step,
+                step0,
+                user_input,
+                choice_id,
+                to_json(meta_json),
+                reservation_id,
+                lease_s,
+            ),
+        )
+        row = cur.fetchone()
+        return int(row["id"]) if row else None
+
+
+def take_over_expired_reservation(
+    conn: Connection,
+    event_id: int,
+    *,
+    reservation_id: str,
+    lease_s: float,
+    user_input: str | None,
+    choice_id: str | None,
+    meta_json: dict[str, Any] | None = None,
+) -> bool:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE session_events
+            SET reservation_id = %s,
+                reserved_until = now() + make_interval(secs => %s),
+                user_input = %s,
+                choice_id = %s,
+                meta_json = %s
+            WHERE id = %s
+              AND outcome = 'reserved'
+              AND reserved_until < now()
+            RETURNING id;
+            """,
+            (
+                reservation_id,
+                lease_s,
+                user_input,
+                choice_id,
+                to_json(meta_json),
+                event_id,
+            ),
+        )
+        return cur.fetchone() is not None
+
+
+def get_reserved_for_update(
+    conn: Connection,
+    event_id: int,
+    reservation_id: str,
 ) -> dict[str, Any] | None:
     with conn.cursor(row_factory=dict_row) as cur:
         cur.execute(
             """
             SELECT *
             FROM session_events
-            WHERE session_id = %s AND step = %s
-            LIMIT 1;
+            WHERE id = %s
+              AND reservation_id = %s
+              AND outcome = 'reserved'
+            FOR UPDATE;
             """,
-            (session_id, step),
+            (event_id, reservation_id),
         )
         row = cur.fetchone()
         return dict(row) if row else None
 
 
+def delete_reservation(
+    conn: Connection,
+    event_id: int,
+    reservation_id: str,
+) -> bool:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM session_events
+            WHERE id = %s
+              AND reservation_id = %s
+              AND outcome = 'reserved'
+            RETURNING id;
+            """,
+            (event_id, reservation_id),
+        )
+        return cur.fetchone() is not None
+
+
+def get_by_step(
+    conn: Connection,
+    session_id: int,
+    step: int,
+) -> dict[str, Any] | None:
+    with conn.cursor(row_factory=dict_row) as cur:
+        statements.execute(cur, statements.SESSION_EVENT_BY_STEP, (session_id, step))
+        row = cur.fetchone()
+        return dict(row) if row else None
+
+
 def exists_for_step(session_id: int, step: int) -> bool:
     with transaction() as conn:
         with conn.cursor() as cur:
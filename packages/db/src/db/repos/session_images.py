@@ -93,7 +93,7 @@ def get_step_image_asset_id(session_id: int, step_ui: int) -> int | None:
                 """
                 SELECT asset_id
                 FROM session_images
-                WHERE session_id = %s AND role = 'step_image' AND step_ui = %s
+                WHERE session_id = %s AND role = 'step_image' AND step_ui = %s AND asset_id IS NOT NULL
                 ORDER BY id
                 LIMIT 1;
                 """,
@@ -7,7 +7,9 @@ from typing import Any
 from psycopg import Connection
 from psycopg.rows import dict_row
 
+from db import identity_cache, statements
 from db.conn import to_json, transaction
+from db.jsonb_patch import JsonbOp
 
 _ALLOWED_FINISH_STATUSES = {"FINISHED", "ABORTED"}
 _SID8_ALPHABET = string.ascii_lowercase + string.digits
@@ -18,6 +20,9 @@ def _generate_sid8() -> str:
 
 
 def get_active(user_id: int) -> dict[str, Any] | None:
+    cached = identity_cache.get_active_session(user_id)
+    if not identity_cache.is_missing(cached):
+        return cached
     with transaction() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
             cur.execute(
@@ -31,40 +36,49 @@ def get_active(user_id: int) -> dict[str, Any] | None:
                 (user_id,),
             )
             row = cur.fetchone()
-            return dict(row) if row else None
+    active = dict(row) if row else None
+    identity_cache.put_active_session(user_id, active)
+    return active
 
 
-def get_by_tg_id_sid8(tg_id: int, sid8: str) -> dict[str, Any] | None:
+def get_by_id(session_id: int) -> dict[str, Any] | None:
     with transaction() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
             cur.execute(
                 """
                 SELECT *
                 FROM sessions
-                WHERE tg_id = %s AND sid8 = %s
+                WHERE id = %s
                 LIMIT 1;
                 """,
-                (tg_id, sid8),
+                (session_id,),
             )
             row = cur.fetchone()
             return dict(row) if row else None
 
 
+def get_by_tg_id_sid8(tg_id: int, sid8: str) -> dict[str, Any] | None:
+    cached = identity_cache.get_session_by_sid8(tg_id, sid8)
+    if not identity_cache.is_missing(cached):
+        return cached
+    with transaction() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            statements.execute(cur, statements.SESSION_BY_TG_ID_SID8, (tg_id, sid8))
+            row = cur.fetchone()
+    if not row:
+        return None
+    session = dict(row)
+    identity_cache.put_session_by_sid8(tg_id, sid8, session)
+    return session
+
+
 def get_by_tg_id_sid8_for_update(
     conn: Connection,
     tg_id: int,
     sid8: str,
 ) -> dict[str, Any] | None:
     with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(
-            """
-            SELECT *
-            FROM sessions
-            WHERE tg_id = %s AND sid8 = %s
-            FOR UPDATE;
-            """,
-            (tg_id, sid8),
-        )
+        statements.execute(cur, statements.SESSION_BY_TG_ID_SID8_FOR_UPDATE, (tg_id, sid8))
         row = cur.fetchone()
         return dict(row) if row else None
 
@@ -138,7 +152,8 @@ def create_new_active(
                     ),
                 )
                 session_row = cur.fetchone()
-            return dict(session_row)
+    identity_cache.invalidate_user_sessions(user_id)
+    return dict(session_row)
 
 
 
@@ -175,7 +190,8 @@ def activate_existing_session(user_id: int, tg_id: int, sid8: str) -> dict[str,
                 (user_id, tg_id, sid8),
             )
             row = cur.fetchone()
-            return dict(row) if row else None
+    identity_cache.invalidate_user_sessions(user_id)
+    return dict(row) if row else None
 
 def finish(session_id: int, status: str = "FINISHED") -> None:
     if status not in _ALLOWED_FINISH_STATUSES:
@@ -191,6 +207,7 @@ def finish(session_id: int, status: str = "FINISHED") -> None:
                 """,
                 (status, session_id),
             )
+    identity_cache.invalidate_session(session_id)
 
 
 def finish_in_tx(conn: Connection, session_id: int, status: str = "FINISHED") -> None:
@@ -236,6 +253,7 @@ def update_last_step(
                     """,
                     (message_id, sent_at, session_id),
                 )
+    identity_cache.invalidate_session(session_id)
 
 
 def update_step(session_id: int, step: int) -> None:
@@ -249,6 +267,7 @@ def update_step(session_id: int, step: int) -> None:
                 """,
                 (step, session_id),
             )
+    identity_cache.invalidate_session(session_id)
 
 
 def update_step_in_tx(conn: Connection, session_id: int, step: int) -> None:
@@ -274,6 +293,7 @@ def update_params_json(session_id: int, params_json: dict[str, Any]) -> None:
                 """,
                 (to_json(params_json), session_id),
             )
+    identity_cache.invalidate_session(session_id)
 
 
 def update_params_json_in_tx(
@@ -301,6 +321,7 @@ def update_facts_json(session_id: int, facts_json: dict[str, Any]) -> None:
                 """,
                 (to_json(facts_json), session_id),
             )
+    identity_cache.invalidate_session(session_id)
 
 
 def update_facts_json_in_tx(
@@ -317,6 +338,46 @@ def update_facts_json_in_tx(
         )
 
 
+def patch_params_json(session_id: int, ops: list[JsonbOp]) -> None:
+    with transaction() as conn:
+        patch_params_json_in_tx(conn, session_id, ops)
+    identity_cache.invalidate_session(session_id)
+
+
+def patch_params_json_in_tx(
+    conn: Connection, session_id: int, ops: list[JsonbOp]
+) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE sessions
+            SET params_json = jsonb_apply_patch(params_json, %s::jsonb), updated_at = now()
+            WHERE id = %s;
+            """,
+            (to_json(ops), session_id),
+        )
+
+
+def patch_facts_json(session_id: int, ops: list[JsonbOp]) -> None:
+    with transaction() as conn:
+        patch_facts_json_in_tx(conn, session_id, ops)
+    identity_cache.invalidate_session(session_id)
+
+
+def patch_facts_json_in_tx(
+    conn: Connection, session_id: int, ops: list[JsonbOp]
+) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE sessions
+            SET facts_json = jsonb_apply_patch(facts_json, %s::jsonb), updated_at = now()
+            WHERE id = %s;
+            """,
+            (to_json(ops), session_id),
+        )
+
+
 def finish_with_final(
     session_id: int,
     final_id: str,
@@ -335,6 +396,7 @@ def finish_with_final(
                 """,
                 (final_id, to_json({"final_meta": final_meta}), session_id),
             )
+    identity_cache.invalidate_session(session_id)
 
 
 def finish_with_final_in_tx(
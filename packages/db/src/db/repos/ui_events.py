@@ -5,6 +5,7 @@ from typing import Any
 
 from psycopg.rows import dict_row
 
+from db import statements
 from db.conn import transaction
 
 
@@ -62,34 +63,10 @@ def acquire_event(
     now = datetime.now(timezone.utc)
     with transaction() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
-                """
-                SELECT *
-                FROM ui_events
-                WHERE session_id = %s
-                  AND step = %s
-                  AND kind = %s
-                FOR UPDATE;
-                """,
-                (session_id, step, kind),
-            )
+            statements.execute(cur, statements.UI_EVENT_FOR_UPDATE, (session_id, step, kind))
             row = cur.fetchone()
             if not row:
-                cur.execute(
-                    """
-                    INSERT INTO ui_events (
-                        session_id,
-                        step,
-                        kind,
-                        content_hash,
-                        state,
-                        pending_since
-                    )
-                    VALUES (%s, %s, %s, %s, 'PENDING', now())
-                    RETURNING id;
-                    """,
-                    (session_id, step, kind, content_hash),
-                )
+                statements.execute(cur, statements.UI_EVENT_INSERT_PENDING, (session_id, step, kind, content_hash))
                 inserted = cur.fetchone()
                 return {"decision": "show", "event_id": int(inserted["id"])}
 
@@ -115,9 +92,9 @@ def acquire_event(
                         next_retry_at = %s,
                         content_hash = %s,
                         updated_at = now()
-                    WHERE id = %s;
+                    WHERE id = %s AND session_id = %s;
                     """,
-                    (fail_count, retry_at, content_hash, row["id"]),
+                    (fail_count, retry_at, content_hash, row["id"], session_id),
                 )
                 state = "FAILED"
                 next_retry_at = retry_at
@@ -133,9 +110,9 @@ def acquire_event(
                         next_retry_at = NULL,
                         content_hash = %s,
                         updated_at = now()
-                    WHERE id = %s;
+                    WHERE id = %s AND session_id = %s;
                     """,
-                    (content_hash, row["id"]),
+                    (content_hash, row["id"], session_id),
                 )
                 return {"decision": "show", "event_id": int(row["id"])}
 
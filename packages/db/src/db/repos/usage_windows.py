@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from typing import Any
 
 from psycopg.rows import dict_row
@@ -12,6 +14,22 @@ _ALLOWED_KINDS = {
 }
 
 
+@dataclass
+class UsageDelta:
+    user_id: int
+    window_start: datetime
+    window_end: datetime
+    messages_used: int = 0
+    sessions_started: int = 0
+
+
+def window_bounds(window_sec: int = 43200, at: datetime | None = None) -> tuple[datetime, datetime]:
+    moment = at or datetime.now(timezone.utc)
+    start_epoch = int(moment.timestamp()) // window_sec * window_sec
+    window_start = datetime.fromtimestamp(start_epoch, tz=timezone.utc)
+    return window_start, window_start + timedelta(seconds=window_sec)
+
+
 def upsert_counter(
     user_id: int,
     kind: str,
@@ -21,51 +39,82 @@ def upsert_counter(
     if kind not in _ALLOWED_KINDS:
         raise ValueError("kind must be messages_used or sessions_started")
     column = _ALLOWED_KINDS[kind]
+    window_start, window_end = window_bounds(window_sec)
 
     with transaction() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
             cur.execute(
-                """
-                SELECT *
-                FROM usage_windows
-                WHERE user_id = %s
-                  AND now() >= window_start
-                  AND now() < window_end
-                ORDER BY window_start DESC
-                LIMIT 1
-                FOR UPDATE;
+                f"""
+                INSERT INTO usage_windows (
+                    user_id,
+                    window_start,
+                    window_end,
+                    {column}
+                )
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user_id, window_start) DO UPDATE
+                SET {column} = usage_windows.{column} + EXCLUDED.{column},
+                    updated_at = now()
+                RETURNING *;
                 """,
-                (user_id,),
+                (user_id, window_start, window_end, delta),
             )
             row = cur.fetchone()
-            if row:
-                cur.execute(
-                    f"""
-                    UPDATE usage_windows
-                    SET {column} = {column} + %s, updated_at = now()
-                    WHERE id = %s
-                    RETURNING *;
-                    """,
-                    (delta, row["id"]),
-                )
-                updated = cur.fetchone()
-                return dict(updated)
+            return dict(row)
+
 
+def add_deltas(deltas: list[UsageDelta]) -> list[dict[str, Any]]:
+    if not deltas:
+        return []
+    with transaction() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
             cur.execute(
-                f"""
+                """
                 INSERT INTO usage_windows (
                     user_id,
                     window_start,
                     window_end,
-                    {column}
+                    messages_used,
+                    sessions_started
                 )
-                VALUES (%s, now(), now() + (%s * interval '1 second'), %s)
+                SELECT *
+                FROM unnest(
+                    %s::bigint[],
+                    %s::timestamptz[],
+                    %s::timestamptz[],
+                    %s::int[],
+                    %s::int[]
+                )
+                ON CONFLICT (user_id, window_start) DO UPDATE
+                SET messages_used = usage_windows.messages_used + EXCLUDED.messages_used,
+                    sessions_started = usage_windows.sessions_started + EXCLUDED.sessions_started,
+                    updated_at = now()
                 RETURNING *;
                 """,
-                (user_id, window_sec, delta),
+                (
+                    [delta.user_id for delta in deltas],
+                    [delta.window_start for delta in deltas],
+                    [delta.window_end for delta in deltas],
+                    [delta.messages_used for delta in deltas],
+                    [delta.sessions_started for delta in deltas],
+                ),
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+
+def read_window(user_id: int, window_start: datetime) -> dict[str, Any] | None:
+    with transaction() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT *
+                FROM usage_windows
+                WHERE user_id = %s AND window_start = %s;
+                """,
+                (user_id, window_start),
             )
-            inserted = cur.fetchone()
-            return dict(inserted)
+            row = cur.fetchone()
+            return dict(row) if row else None
 
 
 def read_counters(user_id: int, window_sec: int = 43200) -> dict[str, Any]:
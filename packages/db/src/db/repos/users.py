@@ -4,6 +4,7 @@ from typing import Any
 
 from psycopg.rows import dict_row
 
+from db import identity_cache
 from db.conn import transaction
 
 
@@ -12,6 +13,10 @@ def get_or_create_by_tg_id(
     tg_username: str | None = None,
     display_name: str | None = None,
 ) -> dict[str, Any]:
+    if tg_username is None and display_name is None:
+        cached = identity_cache.get_user(tg_id)
+        if cached is not None:
+            return cached
     resolved_display_name = display_name or tg_username or f"user_{tg_id}"
 
     with transaction() as conn:
@@ -31,7 +36,9 @@ def get_or_create_by_tg_id(
             row = cur.fetchone()
             if row is None:
                 raise RuntimeError("Failed to fetch user row")
-            return dict(row)
+    user = dict(row)
+    identity_cache.put_user(user)
+    return user
 
 
 def update_child_name(user_id: int, child_name: str | None) -> None:
@@ -46,3 +53,4 @@ def update_child_name(user_id: int, child_name: str | None) -> None:
                 """,
                 (child_name, user_id),
             )
+    identity_cache.invalidate_user(user_id)
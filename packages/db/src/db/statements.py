@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any, Sequence
+
+from psycopg import AsyncCursor, Cursor
+
+
+@dataclass(frozen=True)
+class Statement:
+    name: str
+    sql: str
+
+
+class StatementStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float, *, ok: bool) -> None:
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if not ok:
+            self.errors += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+_catalog: dict[str, Statement] = {}
+_stats: dict[str, StatementStats] = {}
+_lock = threading.Lock()
+
+
+def register(name: str, sql: str) -> Statement:
+    statement = Statement(name=name, sql=sql)
+    with _lock:
+        existing = _catalog.get(name)
+        if existing is not None and existing.sql != sql:
+            raise ValueError(f"statement {name} is already registered with different SQL")
+        _catalog[name] = statement
+        _stats.setdefault(name, StatementStats())
+    return statement
+
+
+def prepare_enabled() -> bool:
+    raw = os.getenv("DB_PREPARE_HOT_STATEMENTS", "1").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+def _observe(statement: Statement, started: float, *, ok: bool) -> None:
+    elapsed_ms = (perf_counter() - started) * 1000
+    with _lock:
+        _stats.setdefault(statement.name, StatementStats()).observe(elapsed_ms, ok=ok)
+
+
+def execute(cur: Cursor[Any], statement: Statement, params: Sequence[Any]) -> Cursor[Any]:
+    started = perf_counter()
+    ok = False
+    try:
+        cur.execute(statement.sql, params, prepare=prepare_enabled() or None)
+        ok = True
+    finally:
+        _observe(statement, started, ok=ok)
+    return cur
+
+
+async def aexecute(
+    cur: AsyncCursor[Any], statement: Statement, params: Sequence[Any]
+) -> AsyncCursor[Any]:
+    started = perf_counter()
+    ok = False
+    try:
+        await cur.execute(statement.sql, params, prepare=prepare_enabled() or None)
+        ok = True
+    finally:
+        _observe(statement, started, ok=ok)
+    return cur
+
+
+def catalog() -> dict[str, str]:
+    with _lock:
+        return {name: statement.sql for name, statement in _catalog.items()}
+
+
+def statement_stats() -> dict[str, dict[str, Any]]:
+    with _lock:
+        return {name: stats.snapshot() for name, stats in _stats.items()}
+
+
+def top_slowest(n: int = 10, *, key: str = "avg_ms") -> list[dict[str, Any]]:
+    rows = [{"name": name, **snapshot} for name, snapshot in statement_stats().items() if snapshot["calls"]]
+    rows.sort(key=lambda row: row[key], reverse=True)
+    return rows[:n]
+
+
+def format_top_slowest(n: int = 10, *, key: str = "avg_ms") -> str:
+    rows = top_slowest(n, key=key)
+    if not rows:
+        return "no statements executed"
+    width = max(len(row["name"]) for row in rows)
+    lines = [f"{'statement':<{width}}  {'calls':>8}  {'avg_ms':>9}  {'max_ms':>9}  {'total_ms':>11}  errors"]
+    for row in rows:
+        lines.append(
+            f"{row['name']:<{width}}  {row['calls']:>8}  {row['avg_ms']:>9.3f}  "
+            f"{row['max_ms']:>9.3f}  {row['total_ms']:>11.3f}  {row['errors']}"
+        )
+    return "\n".join(lines)
+
+
+def reset_stats() -> None:
+    with _lock:
+        for name in _stats:
+            _stats[name] = StatementStats()
+
+
+SESSION_BY_TG_ID_SID8 = register(
+    "sessions.by_tg_id_sid8",
+    """
+    SELECT *
+    FROM sessions
+    WHERE tg_id = %s AND sid8 = %s
+    LIMIT 1;
+    """,
+)
+
+SESSION_BY_TG_ID_SID8_FOR_UPDATE = register(
+    "sessions.by_tg_id_sid8_for_update",
+    """
+    SELECT *
+    FROM sessions
+    WHERE tg_id = %s AND sid8 = %s
+    FOR UPDATE;
+    """,
+)
+
+UI_EVENT_FOR_UPDATE = register(
+    "ui_events.acquire_select",
+    """
+    SELECT *
+    FROM ui_events
+    WHERE session_id = %s
+      AND step = %s
+      AND kind = %s
+    FOR UPDATE;
+    """,
+)
+
+UI_EVENT_INSERT_PENDING = register(
+    "ui_events.acquire_insert",
+    """
+    INSERT INTO ui_events (
+        session_id,
+        step,
+        kind,
+        content_hash,
+        state,
+        pending_since
+    )
+    VALUES (%s, %s, %s, %s, 'PENDING', now())
+    RETURNING id;
+    """,
+)
+
+SESSION_EVENT_BY_STEP = register(
+    "session_events.by_step",
+    """
+    SELECT *
+    FROM session_events
+    WHERE session_id = %s AND step = %s
+    LIMIT 1;
+    """,
+)
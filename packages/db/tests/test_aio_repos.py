@@ -0,0 +1,40 @@
+import asyncio
+import os
+from time import time_ns
+
+import pytest
+
+from db import aio
+from db.repos import sessions, users
+
+
+def test_aio_repos_match_sync_rows() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    tg_id = int(time_ns() % 1_000_000_000)
+
+    async def scenario():
+        try:
+            user = await aio.users.get_or_create_by_tg_id(tg_id, display_name="aio_test")
+            created = await aio.sessions.create_new_active(
+                user_id=user["id"],
+                theme_id="test",
+                meta={"max_steps": 2},
+            )
+            await aio.sessions.update_step(created["id"], 1)
+            active = await aio.sessions.get_active(user["id"])
+            inserted = await aio.session_events.append_event(
+                created["id"], 1, 0, None, "c1", None, None, outcome="ok"
+            )
+            exists = await aio.session_events.exists_for_step(created["id"], 1)
+            return user, created, active, inserted, exists
+        finally:
+            await aio.close_pool()
+
+    user, created, active, inserted, exists = asyncio.run(scenario())
+
+    assert users.get_or_create_by_tg_id(tg_id)["id"] == user["id"]
+    assert active["id"] == created["id"]
+    assert sessions.get_by_id(created["id"])["step"] == 1
+    assert inserted == "inserted"
+    assert exists is True
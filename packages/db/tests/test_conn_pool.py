@@ -0,0 +1,64 @@
+from db import conn
+
+
+class FakePool:
+    def get_stats(self):
+        return {
+            "pool_min": 2,
+            "pool_max": 10,
+            "pool_size": 6,
+            "pool_available": 2,
+            "requests_waiting": 3,
+            "requests_num": 40,
+            "connections_lost": 1,
+        }
+
+
+def test_pool_settings_from_env(monkeypatch) -> None:
+    monkeypatch.setenv("DB_POOL_MIN_SIZE", "2")
+    monkeypatch.setenv("DB_POOL_MAX_SIZE", "12")
+    monkeypatch.setenv("DB_POOL_TIMEOUT_S", "4.5")
+    monkeypatch.setenv("DB_POOL_MAX_IDLE_S", "120")
+    monkeypatch.setenv("DB_POOL_MAX_LIFETIME_S", "bad")
+
+    settings = conn.pool_settings()
+
+    assert settings["min_size"] == 2
+    assert settings["max_size"] == 12
+    assert settings["timeout"] == 4.5
+    assert settings["max_idle"] == 120.0
+    assert settings["max_lifetime"] == 3600.0
+
+
+def test_pool_max_size_never_below_min(monkeypatch) -> None:
+    monkeypatch.setenv("DB_POOL_MIN_SIZE", "8")
+    monkeypatch.setenv("DB_POOL_MAX_SIZE", "3")
+
+    assert conn.pool_settings()["max_size"] == 8
+
+
+def test_wait_histogram_buckets() -> None:
+    histogram = conn.WaitHistogram()
+    for wait_ms in (0.2, 3, 3, 70, 9000):
+        histogram.observe(wait_ms)
+
+    snapshot = histogram.snapshot()
+
+    assert snapshot["le_1"] == 1
+    assert snapshot["le_5"] == 2
+    assert snapshot["le_100"] == 1
+    assert snapshot["gt_5000"] == 1
+    assert sum(snapshot.values()) == 5
+
+
+def test_stats_from_reports_in_use_and_waiting() -> None:
+    histogram = conn.WaitHistogram()
+    histogram.observe(12)
+
+    stats = conn.stats_from(FakePool(), histogram)
+
+    assert stats["in_use"] == 4
+    assert stats["waiting"] == 3
+    assert stats["connections_lost"] == 1
+    assert stats["wait_ms_histogram"]["le_25"] == 1
+    assert conn.stats_from(None, histogram) == {}
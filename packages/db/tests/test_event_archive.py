@@ -0,0 +1,93 @@
+import os
+from time import time_ns
+
+import pytest
+
+from db.conn import get_conn, transaction
+from db.repos import event_archive, session_events, sessions, users
+
+
+def _step_result() -> dict:
+    step = {
+        "text": "Шаг 1",
+        "narration_text": "Шаг 1",
+        "choices": [{"choice_id": "a", "label": "A"}],
+        "protocol_choices": [{"id": "a", "text": "A"}],
+        "chosen_choice_id": "a",
+    }
+    return {**step, "story_step_json": dict(step)}
+
+
+def test_hot_step_result_drops_duplicated_story_step():
+    hot = event_archive.hot_step_result(_step_result())
+
+    assert "story_step_json" not in hot
+    assert hot["protocol_choices"] == [{"id": "a", "text": "A"}]
+
+
+def test_hot_step_result_keeps_distinct_story_step():
+    step_result = {"text": "x", "choices": [], "story_step_json": {"text": "other", "choices": []}}
+
+    assert event_archive.hot_step_result(step_result) == step_result
+
+
+def test_hot_meta_drops_engine_snapshots():
+    meta = {"req_id": "r", "engine_input": {"step0": 0}, "engine_output": {"step0": 1}}
+
+    assert event_archive.hot_meta(meta) == {"req_id": "r"}
+
+
+def test_payload_round_trip_compresses():
+    payload = {"llm_json": {"engine_step_log": {"applied_deltas": ["x"] * 200}}, "meta_json": None}
+
+    encoded, raw_bytes = event_archive.encode_payload(payload)
+
+    assert len(encoded) < raw_bytes
+    assert event_archive.decode_payload("zlib", encoded) == payload
+
+
+def test_archive_batch_moves_closed_session_payloads() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    tg_id = int(time_ns() % 1_000_000_000)
+    user = users.get_or_create_by_tg_id(tg_id, display_name="archive_test")
+    session_row = sessions.create_new_active(
+        user_id=user["id"],
+        theme_id="test",
+        player_name="tester",
+        meta={"max_steps": 2, "v": "0.1"},
+    )
+    llm_json = {"engine_step_log": {"applied_deltas": []}, "turn": {"kind": "choice"}}
+    meta_json = {"req_id": "r", "engine_input": {"step0": 0}}
+    session_events.append_event(
+        session_row["id"],
+        0,
+        0,
+        None,
+        "a",
+        llm_json,
+        {"applied_deltas": []},
+        outcome="accepted",
+        step_result_json=_step_result(),
+        meta_json=meta_json,
+    )
+    sessions.finish(session_row["id"])
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE sessions SET updated_at = now() - interval '40 days' WHERE id = %s;",
+            (session_row["id"],),
+        )
+
+    while event_archive.archive_batch(older_than_days=30, batch_size=500)["archived"]:
+        pass
+
+    with get_conn() as conn:
+        event = session_events.get_by_step(conn, session_id=session_row["id"], step=0)
+    assert event["archived_at"] is not None
+    assert event["llm_json"] is None
+    assert "story_step_json" not in event["step_result_json"]
+    assert event["meta_json"] == {"req_id": "r"}
+    archived = event_archive.load_archived(event["id"])
+    assert archived["llm_json"] == llm_json
+    assert archived["step_result_json"] == _step_result()
+    assert archived["meta_json"] == meta_json
@@ -0,0 +1,74 @@
+import os
+from time import time_ns
+
+import pytest
+
+from db.conn import get_conn, transaction
+from db.repos import event_partitions, session_events, sessions, ui_events, users
+
+
+def _new_session(display_name: str) -> dict:
+    tg_id = int(time_ns() % 1_000_000_000)
+    user = users.get_or_create_by_tg_id(tg_id, display_name=display_name)
+    return sessions.create_new_active(
+        user_id=user["id"],
+        theme_id="test",
+        player_name="tester",
+        meta={"max_steps": 2, "v": "0.1"},
+    )
+
+
+def test_partitions_cover_new_sessions_ahead() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    session_row = _new_session("partition_test")
+
+    event_partitions.ensure_partitions(ahead=2, min_span=1000)
+
+    for parent in ("session_events", "ui_events"):
+        attached = [row for row in event_partitions.list_partitions(parent) if row["detached_at"] is None]
+        assert any(row["lo"] <= session_row["id"] < row["hi"] for row in attached)
+        assert len([row for row in attached if row["lo"] > session_row["id"]]) >= 2
+
+
+def test_uniqueness_survives_partitioning() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    session_row = _new_session("partition_unique_test")
+
+    with transaction() as conn:
+        first = session_events.insert_event(conn, session_row["id"], 0, 0, None, "a", None, None)
+        second = session_events.insert_event(conn, session_row["id"], 0, 0, None, "b", None, None)
+    shown = ui_events.acquire_event(session_id=session_row["id"], step=0, kind="step", content_hash="h")
+    again = ui_events.acquire_event(session_id=session_row["id"], step=0, kind="step", content_hash="h")
+
+    assert first is not None
+    assert second is None
+    assert shown["decision"] == "show"
+    assert again["event_id"] == shown["event_id"]
+
+
+def test_default_partition_catches_sessions_past_the_top_range() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    session_row = _new_session("partition_default_test")
+
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT max(hi) FROM event_partitions WHERE parent = 'session_events';")
+            top = int(cur.fetchone()[0])
+            cur.execute(
+                """
+                INSERT INTO sessions (id, user_id, tg_id, sid8, status, theme_id, max_steps, player_name)
+                SELECT %s, user_id, tg_id, 'p' || substr(sid8, 2), 'FINISHED', theme_id, max_steps, player_name
+                FROM sessions WHERE id = %s;
+                """,
+                (top, session_row["id"]),
+            )
+            assert session_events.insert_event(conn, top, 0, 0, None, "a", None, None) is not None
+            cur.execute("SELECT tableoid::regclass::text FROM session_events WHERE session_id = %s;", (top,))
+            assert cur.fetchone()[0] == "session_events_default"
+            cur.execute("SELECT create_event_partition('session_events', %s, %s);", (top, top + 1000))
+            cur.execute("SELECT tableoid::regclass::text FROM session_events WHERE session_id = %s;", (top,))
+            assert cur.fetchone()[0] == f"session_events_p{top}"
+        conn.rollback()
@@ -0,0 +1,130 @@
+from contextlib import contextmanager
+
+import pytest
+
+from db import identity_cache
+from db.repos import sessions, users
+
+
+class FakeCursor:
+    def __init__(self, rows, calls):
+        self._rows = rows
+        self._calls = calls
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self._calls.append(" ".join(sql.split())[:40])
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+
+class FakeConn:
+    def __init__(self, rows, calls):
+        self._rows = rows
+        self._calls = calls
+
+    def cursor(self, row_factory=None):
+        return FakeCursor(self._rows, self._calls)
+
+
+def _fake_transaction(rows, calls):
+    @contextmanager
+    def transaction():
+        yield FakeConn(rows, calls)
+
+    return transaction
+
+
+@pytest.fixture(autouse=True)
+def _reset_cache():
+    identity_cache.reset()
+    yield
+    identity_cache.reset()
+
+
+def test_user_lookup_is_served_from_cache(monkeypatch):
+    calls = []
+    rows = [{"id": 7, "tg_id": 100, "display_name": "user_100", "child_name": None}]
+    monkeypatch.setattr(users, "transaction", _fake_transaction(rows, calls))
+
+    first = users.get_or_create_by_tg_id(100)
+    first["child_name"] = "mutated"
+    second = users.get_or_create_by_tg_id(100)
+
+    assert len(calls) == 1
+    assert second == {"id": 7, "tg_id": 100, "display_name": "user_100", "child_name": None}
+
+
+def test_child_name_update_invalidates_user(monkeypatch):
+    calls = []
+    rows = [
+        {"id": 7, "tg_id": 100, "display_name": "user_100", "child_name": None},
+        {"id": 7, "tg_id": 100, "display_name": "user_100", "child_name": "Маша"},
+    ]
+    monkeypatch.setattr(users, "transaction", _fake_transaction(rows, calls))
+
+    users.get_or_create_by_tg_id(100)
+    users.update_child_name(7, "Маша")
+
+    assert users.get_or_create_by_tg_id(100)["child_name"] == "Маша"
+    assert len(calls) == 3
+
+
+def test_active_session_cache_invalidated_on_write(monkeypatch):
+    calls = []
+    rows = [
+        {"id": 11, "user_id": 7, "step": 0},
+        {"id": 11, "user_id": 7, "step": 1},
+    ]
+    monkeypatch.setattr(sessions, "transaction", _fake_transaction(rows, calls))
+
+    assert sessions.get_active(7)["step"] == 0
+    assert sessions.get_active(7)["step"] == 0
+    sessions.update_step(11, 1)
+
+    assert sessions.get_active(7)["step"] == 1
+    assert len(calls) == 3
+
+
+def test_missing_active_session_is_cached_until_create(monkeypatch):
+    monkeypatch.setattr(sessions, "transaction", _fake_transaction([], []))
+
+    assert sessions.get_active(7) is None
+    assert identity_cache.get_active_session(7) is None
+    identity_cache.invalidate_user_sessions(7)
+    assert identity_cache.is_missing(identity_cache.get_active_session(7))
+
+
+def test_session_cache_expires(monkeypatch):
+    monkeypatch.setattr(identity_cache._sessions, "ttl_s", 0.0)
+    identity_cache.put_session_by_sid8(100, "abcd1234", {"id": 1, "user_id": 7})
+
+    assert identity_cache.is_missing(identity_cache.get_session_by_sid8(100, "abcd1234"))
+
+
+def test_session_invalidated_only_after_commit(monkeypatch):
+    cached_at_commit = []
+
+    @contextmanager
+    def transaction():
+        yield FakeConn([], [])
+        cached_at_commit.append(
+            not identity_cache.is_missing(identity_cache.get_session_by_sid8(100, "abcd1234"))
+        )
+
+    identity_cache.put_session_by_sid8(100, "abcd1234", {"id": 1, "user_id": 7})
+    monkeypatch.setattr(sessions, "transaction", transaction)
+
+    sessions.update_step_in_tx(FakeConn([], []), 1, 2)
+    assert not identity_cache.is_missing(identity_cache.get_session_by_sid8(100, "abcd1234"))
+
+    sessions.patch_params_json(1, [])
+
+    assert cached_at_commit == [True]
+    assert identity_cache.is_missing(identity_cache.get_session_by_sid8(100, "abcd1234"))
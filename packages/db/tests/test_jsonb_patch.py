@@ -0,0 +1,109 @@
+import os
+from time import time_ns
+
+import pytest
+
+from db import jsonb_patch
+from db.repos import l3_turns, sessions, users
+
+
+def test_apply_appends_and_trims_to_keep_last() -> None:
+    doc = {"recaps": [{"step": i} for i in range(5)], "other": 1}
+
+    patched = jsonb_patch.apply(doc, [jsonb_patch.append(["recaps"], {"step": 5}, keep_last=5)])
+
+    assert [item["step"] for item in patched["recaps"]] == [1, 2, 3, 4, 5]
+    assert patched["other"] == 1
+    assert len(doc["recaps"]) == 5
+
+
+def test_apply_set_merge_delete() -> None:
+    ops = [
+        jsonb_patch.set_path(["last_choice"], {"choice_id": "a"}),
+        jsonb_patch.merge({"flag": True}),
+        jsonb_patch.delete(["stale"]),
+        jsonb_patch.append(["engine_history"], {"step": 0}),
+    ]
+
+    patched = jsonb_patch.apply({"stale": 1}, ops)
+
+    assert patched == {"last_choice": {"choice_id": "a"}, "flag": True, "engine_history": [{"step": 0}]}
+
+
+def test_diff_emits_only_changed_leaves() -> None:
+    before = {"v": "0.1", "step0": 1, "traits": {"brave": 1, "kind": 0}, "gone": True}
+    after = {"v": "0.1", "step0": 2, "traits": {"brave": 2, "kind": 0}}
+
+    ops = jsonb_patch.diff(before, after)
+
+    assert ops == [
+        jsonb_patch.delete(["gone"]),
+        jsonb_patch.set_path(["step0"], 2),
+        jsonb_patch.set_path(["traits", "brave"], 2),
+    ]
+    assert jsonb_patch.apply(before, ops) == after
+
+
+def test_patch_facts_json_applies_server_side() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    tg_id = int(time_ns() % 1_000_000_000)
+    user = users.get_or_create_by_tg_id(tg_id, display_name="jsonb_patch_test")
+    session_row = sessions.create_new_active(
+        user_id=user["id"],
+        theme_id="test",
+        player_name="tester",
+        meta={"max_steps": 3, "v": "0.1"},
+    )
+    facts = {"recaps": [{"step": i} for i in range(5)], "keep": "me"}
+    sessions.update_facts_json(session_row["id"], facts)
+    ops = [
+        jsonb_patch.append(["recaps"], {"step": 5}, keep_last=5),
+        jsonb_patch.set_path(["last_choice"], {"choice_id": "b"}),
+    ]
+
+    sessions.patch_facts_json(session_row["id"], ops)
+
+    refreshed = sessions.get_by_id(session_row["id"])
+    assert refreshed["facts_json"] == jsonb_patch.apply(facts, ops)
+
+
+def test_commit_l3_turn_applies_patches() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    tg_id = int(time_ns() % 1_000_000_000)
+    user = users.get_or_create_by_tg_id(tg_id, display_name="jsonb_patch_turn_test")
+    session_row = sessions.create_new_active(
+        user_id=user["id"],
+        theme_id="test",
+        player_name="tester",
+        meta={"max_steps": 3, "v": "0.1"},
+    )
+    sessions.update_facts_json(session_row["id"], {"recaps": [{"step": 0}], "keep": "me"})
+    state_before = {"v": "0.1", "step0": 0, "n": 3, "free_text_allowed_after": 0}
+    sessions.update_params_json(session_row["id"], state_before)
+    new_state = {**state_before, "step0": 1}
+
+    result = l3_turns.apply_l3_turn_atomic(
+        tg_id=tg_id,
+        sid8=session_row["sid8"],
+        expected_step=0,
+        step=0,
+        user_input=None,
+        choice_id="A",
+        base_meta_json={"source": "test"},
+        apply_fn=lambda _row: l3_turns.L3ApplyPayload(
+            new_state=new_state,
+            llm_json={"engine_step_log": {"applied_deltas": []}},
+            deltas_json={"applied_deltas": []},
+            step_result_json={"text": "step", "choices": [], "final_id": None},
+            meta_json={"turn_fingerprint": "patch"},
+            params_patch=jsonb_patch.diff(state_before, new_state),
+            facts_patch=[jsonb_patch.append(["recaps"], {"step": 1}, keep_last=5)],
+        ),
+    )
+    assert result and result.outcome == "accepted"
+
+    refreshed = sessions.get_by_id(session_row["id"])
+    assert refreshed["params_json"] == new_state
+    assert refreshed["facts_json"] == {"recaps": [{"step": 0}, {"step": 1}], "keep": "me"}
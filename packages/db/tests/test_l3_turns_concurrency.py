@@ -85,3 +85,162 @@ def test_apply_l3_turn_atomic_duplicate_under_concurrency() -> None:
                 (session_row["id"], expected_step),
             )
             assert cur.fetchone()[0] == 1
+
+
+def test_reserve_commit_l3_turn_reports_pending_then_duplicate() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    tg_id = int(time_ns() % 1_000_000_000)
+    user = users.get_or_create_by_tg_id(tg_id, display_name="reservation_test")
+    session_row = sessions.create_new_active(
+        user_id=user["id"],
+        theme_id="test",
+        player_name="tester",
+        meta={"max_steps": 2, "v": "0.1"},
+    )
+    sid8 = session_row["sid8"]
+    step_result_json = {"text": "step", "choices": [], "allow_free_text": False, "final_id": None}
+
+    def reserve() -> l3_turns.L3ApplyResult | None:
+        return l3_turns.reserve_l3_turn(
+            tg_id=tg_id,
+            sid8=sid8,
+            expected_step=0,
+            step=0,
+            user_input=None,
+            choice_id="A",
+            lease_s=60,
+        )
+
+    first = reserve()
+    assert first and first.outcome == "reserved"
+    second = reserve()
+    assert second and second.outcome == "pending"
+
+    committed = l3_turns.commit_l3_turn(
+        first.reservation,
+        l3_turns.L3ApplyPayload(
+            new_state={"v": "0.1", "step0": 1, "n": 2, "free_text_allowed_after": 0},
+            llm_json={"engine_step_log": {"applied_deltas": []}},
+            deltas_json={"applied_deltas": []},
+            step_result_json=step_result_json,
+            meta_json={"turn_fingerprint": "test"},
+        ),
+    )
+    assert committed and committed.outcome == "accepted"
+
+    third = reserve()
+    assert third and third.outcome == "duplicate"
+    assert third.event["step_result_json"] == step_result_json
+
+    with get_conn() as conn:
+        event = session_events.get_by_step(conn, session_id=session_row["id"], step=0)
+    assert event["outcome"] == "accepted"
+
+
+def test_release_l3_turn_frees_the_step() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    tg_id = int(time_ns() % 1_000_000_000)
+    user = users.get_or_create_by_tg_id(tg_id, display_name="reservation_release_test")
+    session_row = sessions.create_new_active(
+        user_id=user["id"],
+        theme_id="test",
+        player_name="tester",
+        meta={"max_steps": 2, "v": "0.1"},
+    )
+    kwargs = {
+        "tg_id": tg_id,
+        "sid8": session_row["sid8"],
+        "expected_step": 0,
+        "step": 0,
+        "user_input": None,
+        "choice_id": "A",
+        "lease_s": 60,
+    }
+    first = l3_turns.reserve_l3_turn(**kwargs)
+    assert first and first.outcome == "reserved"
+    assert l3_turns.release_l3_turn(first.reservation) is True
+    retry = l3_turns.reserve_l3_turn(**kwargs)
+    assert retry and retry.outcome == "reserved"
+
+
+def test_commit_l3_turn_drops_reservation_when_step_moved() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    tg_id = int(time_ns() % 1_000_000_000)
+    user = users.get_or_create_by_tg_id(tg_id, display_name="reservation_stale_test")
+    session_row = sessions.create_new_active(
+        user_id=user["id"],
+        theme_id="test",
+        player_name="tester",
+        meta={"max_steps": 3, "v": "0.1"},
+    )
+    reserved = l3_turns.reserve_l3_turn(
+        tg_id=tg_id,
+        sid8=session_row["sid8"],
+        expected_step=0,
+        step=0,
+        user_input=None,
+        choice_id="A",
+        lease_s=60,
+    )
+    assert reserved and reserved.outcome == "reserved"
+    sessions.update_step(session_row["id"], 1)
+
+    result = l3_turns.commit_l3_turn(
+        reserved.reservation,
+        l3_turns.L3ApplyPayload(
+            new_state={"v": "0.1", "step0": 1, "n": 3, "free_text_allowed_after": 0},
+            llm_json=None,
+            deltas_json=None,
+            step_result_json={"text": "step", "choices": []},
+            meta_json=None,
+        ),
+    )
+
+    assert result and result.outcome == "stale"
+    with get_conn() as conn:
+        assert session_events.get_by_step(conn, session_id=session_row["id"], step=0) is None
+
+
+def test_commit_l3_turn_final_applies_in_one_call() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    tg_id = int(time_ns() % 1_000_000_000)
+    user = users.get_or_create_by_tg_id(tg_id, display_name="final_commit_test")
+    session_row = sessions.create_new_active(
+        user_id=user["id"],
+        theme_id="test",
+        player_name="tester",
+        meta={"max_steps": 1, "v": "0.1"},
+    )
+    result = l3_turns.apply_l3_turn_atomic(
+        tg_id=tg_id,
+        sid8=session_row["sid8"],
+        expected_step=0,
+        step=0,
+        user_input=None,
+        choice_id="A",
+        base_meta_json={"source": "test"},
+        apply_fn=lambda _row: l3_turns.L3ApplyPayload(
+            new_state={"v": "0.1", "step0": 1, "n": 1, "free_text_allowed_after": 0},
+            llm_json={"engine_step_log": {"applied_deltas": []}},
+            deltas_json={"applied_deltas": []},
+            step_result_json={"text": "end", "final_id": "good"},
+            meta_json={"turn_fingerprint": "final"},
+            final_id="good",
+            final_meta={"title": "end"},
+        ),
+    )
+    assert result and result.outcome == "accepted"
+
+    refreshed = sessions.get_by_id(session_row["id"])
+    assert refreshed["status"] == "FINISHED"
+    assert refreshed["step"] == 1
+    assert refreshed["ending_id"] == "good"
+    assert refreshed["facts_json"] == {"final_meta": {"title": "end"}}
+    with get_conn() as conn:
+        event = session_events.get_by_step(conn, session_id=session_row["id"], step=0)
+    assert event["outcome"] == "accepted"
+    assert event["meta_json"] == {"source": "test", "turn_fingerprint": "final"}
@@ -0,0 +1,69 @@
+import asyncio
+import os
+from time import time_ns
+
+import pytest
+
+from db import aio
+from db.repos import sessions, users
+
+
+def _create_session() -> dict:
+    tg_id = int(time_ns() % 1_000_000_000)
+    user = users.get_or_create_by_tg_id(tg_id, display_name="image_jobs_test")
+    return sessions.create_new_active(
+        user_id=user["id"],
+        theme_id="test",
+        player_name="tester",
+        meta={"max_steps": 8, "v": "0.2"},
+    )
+
+
+def test_claim_lease_retry_and_recover() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    session_row = _create_session()
+    job_json = {"chat_id": 1, "step_message_id": 10, "step_ui": 1, "total_steps": 8}
+
+    async def scenario():
+        try:
+            job_id = await aio.session_images.insert_session_image(
+                session_id=session_row["id"],
+                step_ui=1,
+                asset_id=None,
+                role="step_image",
+                reference_asset_id=None,
+                image_model="model",
+                prompt="prompt",
+                job_json=job_json,
+            )
+            first = await aio.session_images.claim_jobs("worker-a", limit=100, lease_s=60)
+            second = await aio.session_images.claim_jobs("worker-b", limit=100, lease_s=60)
+            state = await aio.session_images.retry_job(
+                job_id, "worker-a", error="boom", delay_s=0, max_attempts=2
+            )
+            reclaimed = await aio.session_images.claim_jobs("worker-b", limit=100, lease_s=60)
+            stale_complete = await aio.session_images.complete_job(job_id, "worker-a")
+            released = await aio.session_images.release_jobs("worker-b", refund_attempt=False)
+            final = await aio.session_images.claim_jobs("worker-c", limit=100, lease_s=60)
+            completed = await aio.session_images.complete_job(job_id, "worker-c")
+            rows = await aio.session_images.list_session_images(session_row["id"])
+            return job_id, first, second, state, reclaimed, stale_complete, released, final, completed, rows
+        finally:
+            await aio.close_pool()
+
+    job_id, first, second, state, reclaimed, stale_complete, released, final, completed, rows = asyncio.run(
+        scenario()
+    )
+
+    assert [job["id"] for job in first if job["session_id"] == session_row["id"]] == [job_id]
+    assert all(job["id"] != job_id for job in second)
+    assert state == "pending"
+    mine = [job for job in reclaimed if job["id"] == job_id]
+    assert mine and mine[0]["attempts"] == 2
+    assert stale_complete is False
+    assert released >= 1
+    assert any(job["id"] == job_id and job["attempts"] == 3 for job in final)
+    assert completed is True
+    assert rows[0]["job_state"] == "done"
+    assert rows[0]["job_json"]["chat_id"] == 1
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from db import statements
+
+
+class FakeCursor:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = []
+
+    def execute(self, sql, params, prepare=None):
+        self.calls.append((sql, params, prepare))
+        if self.fail:
+            raise RuntimeError("boom")
+        return self
+
+
+class FakeAsyncCursor(FakeCursor):
+    async def execute(self, sql, params, prepare=None):
+        return FakeCursor.execute(self, sql, params, prepare)
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats():
+    statements.reset_stats()
+    yield
+    statements.reset_stats()
+
+
+def test_hot_statements_are_cataloged():
+    names = set(statements.catalog())
+
+    assert {
+        "sessions.by_tg_id_sid8",
+        "sessions.by_tg_id_sid8_for_update",
+        "ui_events.acquire_select",
+        "ui_events.acquire_insert",
+        "session_events.by_step",
+    } <= names
+
+
+def test_execute_prepares_and_counts(monkeypatch):
+    cur = FakeCursor()
+
+    statements.execute(cur, statements.SESSION_EVENT_BY_STEP, (1, 2))
+    monkeypatch.setenv("DB_PREPARE_HOT_STATEMENTS", "0")
+    asyncio.run(statements.aexecute(FakeAsyncCursor(), statements.SESSION_EVENT_BY_STEP, (1, 3)))
+
+    assert cur.calls == [(statements.SESSION_EVENT_BY_STEP.sql, (1, 2), True)]
+    assert statements.statement_stats()["session_events.by_step"]["calls"] == 2
+
+
+def test_errors_are_counted_and_reraised():
+    with pytest.raises(RuntimeError):
+        statements.execute(FakeCursor(fail=True), statements.UI_EVENT_FOR_UPDATE, (1, 0, "step"))
+
+    assert statements.statement_stats()["ui_events.acquire_select"]["errors"] == 1
+
+
+def test_top_slowest_orders_by_average(monkeypatch):
+    ticks = iter([0.0, 0.001, 0.0, 0.050, 0.0, 0.010])
+    monkeypatch.setattr(statements, "perf_counter", lambda: next(ticks))
+
+    statements.execute(FakeCursor(), statements.SESSION_BY_TG_ID_SID8, (1, "a"))
+    statements.execute(FakeCursor(), statements.SESSION_BY_TG_ID_SID8_FOR_UPDATE, (1, "a"))
+    statements.execute(FakeCursor(), statements.SESSION_EVENT_BY_STEP, (1, 0))
+
+    top = statements.top_slowest(2)
+    assert [row["name"] for row in top] == ["sessions.by_tg_id_sid8_for_update", "session_events.by_step"]
+    assert "sessions.by_tg_id_sid8_for_update" in statements.format_top_slowest(2)
+
+
+def test_register_rejects_conflicting_sql():
+    with pytest.raises(ValueError):
+        statements.register("session_events.by_step", "SELECT 1;")
@@ -0,0 +1,24 @@
+import os
+from time import time_ns
+
+import pytest
+
+from db.repos import usage_windows, users
+
+
+def test_add_deltas_upserts_on_user_window() -> None:
+    if not os.getenv("DB_URL"):
+        pytest.skip("DB_URL not set")
+    user = users.get_or_create_by_tg_id(int(time_ns() % 1_000_000_000), display_name="usage_test")
+    window_start, window_end = usage_windows.window_bounds(43200)
+    delta = usage_windows.UsageDelta(user["id"], window_start, window_end, messages_used=2)
+
+    usage_windows.add_deltas([delta])
+    rows = usage_windows.add_deltas([delta])
+    single = usage_windows.upsert_counter(user["id"], "sessions_started")
+
+    assert rows[0]["messages_used"] == 4
+    assert single["window_start"] == window_start
+    assert single["messages_used"] == 4
+    assert single["sessions_started"] == 1
+    assert usage_windows.read_window(user["id"], window_start)["id"] == single["id"]
@@ -1,3 +1,17 @@
-from packages.llm.src.adapter import LLMResult, generate
+from packages.llm.src.adapter import (
+    LLMResult,
+    StoryTurnResult,
+    agenerate,
+    agenerate_story_turn,
+    generate,
+)
+from packages.llm.src.circuit_breaker import breaker_states
 
-__all__ = ["LLMResult", "generate"]
+__all__ = [
+    "LLMResult",
+    "StoryTurnResult",
+    "agenerate",
+    "agenerate_story_turn",
+    "breaker_states",
+    "generate",
+]
@@ -1,24 +1,32 @@
 from __future__ import annotations
 
+import asyncio
+import copy
 import json
 import logging
 import os
 import re
+import time
 import traceback
 from datetime import datetime, timezone
-from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from urllib import error as url_error
 
+import aiohttp
 import requests
 
+from packages.llm.src import circuit_breaker, latency, model_router, scheduler
 from packages.llm.src.fallbacks import build_fallback
 from packages.llm.src.mock_provider import MockProvider
 from packages.llm.src.openrouter_provider import OpenRouterProvider
+from packages.llm.src.streaming import StreamTextExtractor, TextCallback
 from packages.llm.src.validator import validate_response
 
 logger = logging.getLogger(__name__)
 
+_MIN_ATTEMPT_S = 1.0
+
 
 @dataclass
 class LLMResult:
@@ -30,6 +38,7 @@ class LLMResult:
     skipped: bool
     error_class: Optional[str]
     error_reason: Optional[str]
+    attempts: List[Dict[str, Any]] = field(default_factory=list)
 
 
 def _normalize_provider() -> str:
@@ -60,12 +69,41 @@ def _normalize_mock_mode() -> str:
         "schema_invalid",
         "timeout",
         "type_mismatch",
+        "turn_partial",
     }:
         logger.warning("llm.adapter unknown mock_mode=%s fallback=ok", raw)
         return "ok"
     return raw
 
 
+def _resolve_float_env(name: str, default: float | None) -> float | None:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def _resolve_deadline_at() -> float:
+    return time.monotonic() + (_resolve_float_env("LLM_DEADLINE_S", 45.0) or 45.0)
+
+
+def _hedge_delay_s(provider_name: str, expected_type: str) -> float | None:
+    if os.getenv("LLM_HEDGE_ENABLED", "0").strip().lower() not in {"1", "true", "yes", "on"}:
+        return None
+    fixed = _resolve_float_env("LLM_HEDGE_DELAY_S", None)
+    if fixed is not None:
+        return fixed
+    return latency.percentile(
+        (provider_name, expected_type),
+        _resolve_float_env("LLM_HEDGE_PERCENTILE", 90.0) or 90.0,
+        min_samples=int(_resolve_float_env("LLM_HEDGE_MIN_SAMPLES", 20) or 20),
+    )
+
+
 def _safe_filename_component(value: str, fallback: str) -> str:
     cleaned = re.sub(r"[^A-Za-z0-9_.-]+", "-", value.strip())
     cleaned = cleaned.strip("-_.")
@@ -74,29 +112,149 @@ def _safe_filename_component(value: str, fallback: str) -> str:
 
 def generate(step_ctx: Dict[str, Any]) -> LLMResult:
     expected_type = str(step_ctx.get("expected_type") or "")
+    provider_name, provider, skipped = _resolve_provider(expected_type)
+    if skipped is not None:
+        return skipped
+    return _generate_with_provider(
+        provider_name=provider_name,
+        provider=provider,
+        expected_type=expected_type,
+        step_ctx=step_ctx,
+    )
+
+
+async def agenerate(
+    step_ctx: Dict[str, Any],
+    on_text: TextCallback | None = None,
+    *,
+    deadline_at: float | None = None,
+) -> LLMResult:
+    expected_type = str(step_ctx.get("expected_type") or "")
+    provider_name, provider, skipped = _resolve_provider(expected_type)
+    if skipped is not None:
+        return skipped
+    return await _agenerate_with_provider(
+        provider_name=provider_name,
+        provider=provider,
+        expected_type=expected_type,
+        step_ctx=step_ctx,
+        on_text=on_text,
+        deadline_at=deadline_at,
+    )
+
+
+@dataclass
+class StoryTurnResult:
+    classifier_result: Optional[Dict[str, Any]]
+    step_result: LLMResult
+    merged: bool
+
+
+async def agenerate_story_turn(
+    turn_ctx: Dict[str, Any],
+    classify_ctx: Optional[Dict[str, Any]],
+    build_step_ctx: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]],
+    on_text: TextCallback | None = None,
+) -> StoryTurnResult:
+    provider_name, provider, skipped = _resolve_provider("story_turn")
+    deadline_at = _resolve_deadline_at()
+    merged_parsed: Dict[str, Any] = {}
+    merged_usage: Dict[str, Any] | None = None
+    if skipped is None:
+        merged = await _agenerate_with_provider(
+            provider_name=provider_name,
+            provider=provider,
+            expected_type="story_turn",
+            step_ctx=turn_ctx,
+            max_attempts=1,
+            on_text=on_text,
+            deadline_at=deadline_at,
+        )
+        merged_usage = merged.usage
+        if not merged.used_fallback and isinstance(merged.parsed_json, dict):
+            merged_parsed = merged.parsed_json
+        else:
+            merged_parsed = _salvage_story_turn(merged.raw_text)
+    has_classifier = "classifier_result" in merged_parsed and (
+        merged_parsed["classifier_result"] is None
+        or isinstance(merged_parsed["classifier_result"], dict)
+    )
+    classifier_result = merged_parsed.get("classifier_result") if has_classifier else None
+    step_result: Optional[LLMResult] = None
+    next_step = merged_parsed.get("next_step")
+    if isinstance(next_step, dict):
+        next_step_text = json.dumps(next_step, ensure_ascii=False)
+        parsed_step, _, _ = validate_response(next_step_text, "story_step")
+        if parsed_step is not None:
+            step_result = LLMResult(
+                expected_type="story_step",
+                raw_text=next_step_text,
+                parsed_json=parsed_step,
+                usage=merged_usage,
+                used_fallback=False,
+                skipped=False,
+                error_class=None,
+                error_reason=None,
+            )
+    needs_classifier = classify_ctx is not None and not has_classifier
+    if not needs_classifier and step_result is not None:
+        return StoryTurnResult(
+            classifier_result=classifier_result,
+            step_result=step_result,
+            merged=True,
+        )
+
+    logger.info(
+        "llm.adapter expected=story_turn outcome=partial classifier=%s next_step=%s",
+        "true" if has_classifier else "false",
+        "true" if step_result is not None else "false",
+    )
+    if needs_classifier:
+        classify_result = await agenerate(classify_ctx, deadline_at=deadline_at)
+        parsed = classify_result.parsed_json
+        candidate = parsed.get("classifier_result") if isinstance(parsed, dict) else None
+        classifier_result = candidate if isinstance(candidate, dict) else None
+    if step_result is None:
+        step_result = await agenerate(
+            build_step_ctx(classifier_result), on_text=on_text, deadline_at=deadline_at
+        )
+    return StoryTurnResult(
+        classifier_result=classifier_result,
+        step_result=step_result,
+        merged=False,
+    )
+
+
+def _salvage_story_turn(raw_text: str) -> Dict[str, Any]:
+    try:
+        parsed = json.loads(raw_text)
+    except (TypeError, json.JSONDecodeError):
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def _skipped_result(expected_type: str, error_reason: str | None = None) -> LLMResult:
+    return LLMResult(
+        expected_type=expected_type,
+        raw_text="",
+        parsed_json=None,
+        usage=None,
+        used_fallback=False,
+        skipped=True,
+        error_class=None,
+        error_reason=error_reason,
+    )
+
+
+def _resolve_provider(expected_type: str) -> Tuple[str, Any, Optional[LLMResult]]:
     provider = _normalize_provider()
     if provider == "off":
         logger.info("llm.adapter provider=off skipped=true")
-        return LLMResult(
-            expected_type=expected_type,
-            raw_text="",
-            parsed_json=None,
-            usage=None,
-            used_fallback=False,
-            skipped=True,
-            error_class=None,
-            error_reason=None,
-        )
+        return provider, None, _skipped_result(expected_type)
 
     if provider == "mock":
         mock_mode = _normalize_mock_mode()
-        mock_provider = MockProvider(mode=mock_mode)
-        return _generate_with_provider(
-            provider_name="mock",
-            provider=mock_provider,
-            expected_type=expected_type,
-            step_ctx=step_ctx,
-        )
+        return "mock", MockProvider(mode=mock_mode), None
     if provider == "openrouter":
         from packages.llm.src.openrouter_provider import (
             MissingOpenRouterKeyError,
@@ -107,33 +265,10 @@ def generate(step_ctx: Dict[str, Any]) -> LLMResult:
             openrouter_provider = OpenRouterProvider.from_env()
         except MissingOpenRouterKeyError:
             logger.info("llm.adapter provider=openrouter skipped=true reason=missing_key")
-            return LLMResult(
-                expected_type=expected_type,
-                raw_text="",
-                parsed_json=None,
-                usage=None,
-                used_fallback=False,
-                skipped=True,
-                error_class=None,
-                error_reason="missing_key",
-            )
-        return _generate_with_provider(
-            provider_name="openrouter",
-            provider=openrouter_provider,
-            expected_type=expected_type,
-            step_ctx=step_ctx,
-        )
+            return provider, None, _skipped_result(expected_type, "missing_key")
+        return "openrouter", openrouter_provider, None
     logger.warning("llm.adapter unknown provider=%s fallback=off", provider)
-    return LLMResult(
-        expected_type=expected_type,
-        raw_text="",
-        parsed_json=None,
-        usage=None,
-        used_fallback=False,
-        skipped=True,
-        error_class=None,
-        error_reason=None,
-    )
+    return provider, None, _skipped_result(expected_type)
 
 
 def _generate_with_provider(
@@ -142,146 +277,424 @@ def _generate_with_provider(
     provider: Any,
     expected_type: str,
     step_ctx: Dict[str, Any],
+    max_attempts: int = 2,
 ) -> LLMResult:
-    last_error_class: Optional[str] = None
-    last_error_reason: Optional[str] = None
-    last_raw_text = ""
-    last_usage: Dict[str, Any] | None = None
-    last_finish_reason: str | None = None
-    last_native_finish_reason: str | None = None
-    last_request_payload: Dict[str, Any] | None = None
-    last_response_payload: Dict[str, Any] | None = None
-    last_error_detail: str | None = None
-    last_traceback: str | None = None
-
-    attempt = 1
-    while True:
+    attempts = _AttemptTracker(provider_name, provider, expected_type, step_ctx)
+    deadline_at = _resolve_deadline_at()
+    if not attempts.select_model():
+        return attempts.finish(attempts.fallback())
+    for attempt in range(1, max_attempts + 1):
+        remaining = deadline_at - time.monotonic()
+        if remaining < _MIN_ATTEMPT_S:
+            attempts.record_deadline(attempt)
+            break
+        if not attempts.admit(attempt):
+            break
+        started = time.monotonic()
         try:
-            last_raw_text = provider.generate(step_ctx)
-            last_request_payload = getattr(provider, "last_request_payload", None)
-            last_response_payload = getattr(provider, "last_response_payload", None)
-            last_usage = getattr(provider, "last_usage", None)
-            last_finish_reason = getattr(provider, "last_finish_reason", None)
-            last_native_finish_reason = getattr(provider, "last_native_finish_reason", None)
+            raw_text = provider.generate(attempts.attempt_ctx(remaining))
         except Exception as exc:  # noqa: BLE001
-            last_error_class = type(exc).__name__
-            last_error_detail = str(exc)
-            last_traceback = traceback.format_exc()
-            if isinstance(exc, TimeoutError):
-                last_error_reason = "timeout"
-            elif isinstance(exc, url_error.HTTPError):
-                last_error_reason = f"provider_http_{exc.code}"
-            elif isinstance(exc, requests.exceptions.HTTPError):
-                status_code = getattr(exc.response, "status_code", None)
-                if status_code is None:
-                    last_error_reason = "provider_http_unknown"
-                else:
-                    last_error_reason = f"provider_http_{status_code}"
-            else:
-                last_error_reason = "exception"
-            logger.exception(
-                "llm.adapter provider=%s expected=%s attempt=%s outcome=error",
-                provider_name,
-                expected_type,
-                attempt,
-            )
-            if attempt == 1:
-                attempt = 2
-                continue
+            attempts.record_error(exc, attempt, started=started)
+            continue
+        result = attempts.record_response(raw_text, attempt, started=started)
+        if result is not None:
+            return attempts.finish(result)
+    return attempts.finish(attempts.fallback())
+
+
+async def _agenerate_with_provider(
+    *,
+    provider_name: str,
+    provider: Any,
+    expected_type: str,
+    step_ctx: Dict[str, Any],
+    max_attempts: int = 2,
+    on_text: TextCallback | None = None,
+    deadline_at: float | None = None,
+) -> LLMResult:
+    attempts = _AttemptTracker(provider_name, provider, expected_type, step_ctx)
+    if deadline_at is None:
+        deadline_at = _resolve_deadline_at()
+    if not attempts.select_model():
+        return attempts.finish(attempts.fallback())
+    for attempt in range(1, max_attempts + 1):
+        remaining = deadline_at - time.monotonic()
+        if remaining < _MIN_ATTEMPT_S:
+            attempts.record_deadline(attempt)
+            break
+        if not attempts.admit(attempt):
             break
+        result = await _arun_attempt(attempts, attempt, remaining, on_text)
+        if result is not None:
+            return attempts.finish(result)
+    return attempts.finish(attempts.fallback())
+
+
+async def _arun_attempt(
+    attempts: "_AttemptTracker",
+    attempt: int,
+    remaining: float,
+    on_text: TextCallback | None,
+) -> Optional[LLMResult]:
+    primary = asyncio.create_task(
+        attempts.acall(attempts.provider, attempt, remaining, on_text=on_text)
+    )
+    hedge_delay = _hedge_delay_s(attempts.provider_name, attempts.expected_type)
+    if hedge_delay is None or hedge_delay >= remaining:
+        return await primary
+    done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+    if done:
+        return primary.result()
+    if not attempts.admit(attempt, hedge=True):
+        return await primary
+    logger.info(
+        "llm.adapter provider=%s expected=%s attempt=%s hedge=started delay_s=%.3f",
+        attempts.provider_name,
+        attempts.expected_type,
+        attempt,
+        hedge_delay,
+    )
+    hedge = asyncio.create_task(
+        attempts.acall(copy.copy(attempts.provider), attempt, remaining - hedge_delay, hedge=True)
+    )
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result is not None:
+                    return result
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def _text_forwarder(on_text: TextCallback) -> TextCallback:
+    extractor = StreamTextExtractor()
+
+    async def _forward(delta: str) -> None:
+        if extractor.feed(delta):
+            await on_text(extractor.text)
+
+    return _forward
+
+
+def _error_reason_for(exc: Exception) -> str:
+    if isinstance(exc, TimeoutError):
+        return "timeout"
+    if isinstance(exc, url_error.HTTPError):
+        return f"provider_http_{exc.code}"
+    if isinstance(exc, requests.exceptions.HTTPError):
+        status_code = getattr(exc.response, "status_code", None)
+        if status_code is None:
+            return "provider_http_unknown"
+        return f"provider_http_{status_code}"
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return f"provider_http_{exc.status}"
+    return "exception"
+
+
+class _AttemptTracker:
+    def __init__(
+        self,
+        provider_name: str,
+        provider: Any,
+        expected_type: str,
+        step_ctx: Dict[str, Any],
+    ) -> None:
+        self.provider_name = provider_name
+        self.provider = provider
+        self.expected_type = expected_type
+        self.step_ctx = dict(step_ctx)
+        self.error_class: Optional[str] = None
+        self.error_reason: Optional[str] = None
+        self.raw_text = ""
+        self.usage: Dict[str, Any] | None = None
+        self.finish_reason: str | None = None
+        self.native_finish_reason: str | None = None
+        self.request_payload: Dict[str, Any] | None = None
+        self.response_payload: Dict[str, Any] | None = None
+        self.error_detail: str | None = None
+        self.traceback: str | None = None
+        self.started_at = time.monotonic()
+        self.timings: List[Dict[str, Any]] = []
+        self.model: str | None = None
+        self.breaker: circuit_breaker.CircuitBreaker | None = None
+        self.routing: Dict[str, Any] | None = None
+
+    def select_model(self) -> bool:
+        self.step_ctx.pop("model", None)
+        model_candidates = getattr(self.provider, "model_candidates", None)
+        if model_candidates is None:
+            return True
+        candidates = model_candidates(self.expected_type)
+        self.routing = getattr(self.provider, "last_routing", None)
+        breakers_enabled = circuit_breaker.breaker_enabled()
+        for model in candidates:
+            breaker = (
+                circuit_breaker.get_breaker(self.provider_name, model) if breakers_enabled else None
+            )
+            if breaker is None or breaker.available():
+                self.model = model
+                self.breaker = breaker
+                self.step_ctx["model"] = model
+                if model != candidates[0]:
+                    logger.info(
+                        "llm.breaker provider=%s expected=%s model=%s outcome=secondary",
+                        self.provider_name,
+                        self.expected_type,
+                        model,
+                    )
+                return True
+        self._record_short_circuit(1)
+        return False
+
+    def admit(self, attempt: int, *, hedge: bool = False) -> bool:
+        if self.breaker is None or self.breaker.allow():
+            return True
+        self._record_short_circuit(attempt, hedge=hedge)
+        return False
+
+    def attempt_ctx(self, timeout_s: float) -> Dict[str, Any]:
+        return {**self.step_ctx, "timeout_s": timeout_s}
+
+    def _record_short_circuit(self, attempt: int, *, hedge: bool = False) -> None:
+        if self.error_reason is None and not hedge:
+            self.error_class = "circuit_open"
+            self.error_reason = "circuit_open"
+        logger.info(
+            "llm.adapter provider=%s expected=%s attempt=%s hedge=%s outcome=circuit_open",
+            self.provider_name,
+            self.expected_type,
+            attempt,
+            "true" if hedge else "false",
+        )
+        self._record_timing(attempt, None, "circuit_open", hedge=hedge)
+
+    async def acall(
+        self,
+        provider: Any,
+        attempt: int,
+        timeout_s: float,
+        *,
+        hedge: bool = False,
+        on_text: TextCallback | None = None,
+    ) -> Optional[LLMResult]:
+        started = time.monotonic()
+        step_ctx = self.attempt_ctx(timeout_s)
+        try:
+            raw_text = await asyncio.wait_for(
+                self._scheduled_call(provider, step_ctx, on_text), timeout=timeout_s
+            )
+        except asyncio.CancelledError:
+            self._record_timing(attempt, started, "cancelled", hedge=hedge)
+            if self.breaker is not None:
+                self.breaker.release()
+            raise
+        except Exception as exc:  # noqa: BLE001
+            self.record_error(exc, attempt, started=started, hedge=hedge)
+            return None
+        return self.record_response(
+            raw_text, attempt, started=started, provider=provider, hedge=hedge
+        )
+
+    async def _scheduled_call(
+        self,
+        provider: Any,
+        step_ctx: Dict[str, Any],
+        on_text: TextCallback | None,
+    ) -> str:
+        async with scheduler.slot(scheduler.priority_for(step_ctx)):
+            if on_text is not None and hasattr(provider, "astream"):
+                return await provider.astream(step_ctx, _text_forwarder(on_text))
+            return await provider.agenerate(step_ctx)
+
+    def record_error(
+        self,
+        exc: Exception,
+        attempt: int,
+        *,
+        started: float | None = None,
+        hedge: bool = False,
+    ) -> None:
+        self.error_class = type(exc).__name__
+        self.error_detail = str(exc)
+        self.traceback = traceback.format_exc()
+        self.error_reason = _error_reason_for(exc)
+        logger.exception(
+            "llm.adapter provider=%s expected=%s attempt=%s outcome=error",
+            self.provider_name,
+            self.expected_type,
+            attempt,
+        )
+        self._record_timing(attempt, started, self.error_reason, hedge=hedge)
+        if self.breaker is not None:
+            self.breaker.record_failure(self.error_reason)
+        self._record_route(started, ok=False)
+
+    def record_deadline(self, attempt: int) -> None:
+        if self.error_reason is None:
+            self.error_class = "deadline_exceeded"
+            self.error_reason = "timeout"
+        logger.info(
+            "llm.adapter provider=%s expected=%s attempt=%s outcome=deadline_exceeded",
+            self.provider_name,
+            self.expected_type,
+            attempt,
+        )
+        self._record_timing(attempt, None, "deadline_exceeded")
+
+    def record_response(
+        self,
+        raw_text: str,
+        attempt: int,
+        *,
+        started: float | None = None,
+        provider: Any = None,
+        hedge: bool = False,
+    ) -> Optional[LLMResult]:
+        provider = provider if provider is not None else self.provider
+        self.raw_text = raw_text
+        self.request_payload = getattr(provider, "last_request_payload", None)
+        self.response_payload = getattr(provider, "last_response_payload", None)
+        self.usage = getattr(provider, "last_usage", None)
+        self.finish_reason = getattr(provider, "last_finish_reason", None)
+        self.native_finish_reason = getattr(provider, "last_native_finish_reason", None)
 
         parsed_json, error_reason, validation_detail = validate_response(
-            last_raw_text, expected_type
+            raw_text, self.expected_type
         )
         if error_reason:
-            last_error_class = "validation_error"
-            last_error_reason = error_reason
-            last_error_detail = json.dumps(validation_detail, ensure_ascii=False)
-            last_traceback = None
+            self.error_class = "validation_error"
+            self.error_reason = error_reason
+            self.error_detail = json.dumps(validation_detail, ensure_ascii=False)
+            self.traceback = None
             logger.info(
                 "llm.validator expected=%s outcome=%s",
-                expected_type,
+                self.expected_type,
                 error_reason,
             )
             logger.info(
                 "llm.adapter provider=%s expected=%s attempt=%s outcome=error",
-                provider_name,
-                expected_type,
+                self.provider_name,
+                self.expected_type,
                 attempt,
             )
-            if attempt == 1:
-                attempt = 2
-                continue
-            break
+            self._record_timing(attempt, started, error_reason, hedge=hedge)
+            if self.breaker is not None:
+                self.breaker.record_failure(error_reason)
+            self._record_route(started, ok=False)
+            return None
 
         logger.info(
             "llm.adapter provider=%s expected=%s attempt=%s outcome=ok",
-            provider_name,
-            expected_type,
+            self.provider_name,
+            self.expected_type,
             attempt,
         )
-        _dump_debug(
-            step_ctx=step_ctx,
-            provider_name=provider_name,
-            expected_type=expected_type,
-            raw_text=last_raw_text,
-            usage=last_usage,
-            error_reason=None,
-            error_detail=None,
-            error_traceback=None,
-            finish_reason=last_finish_reason,
-            native_finish_reason=last_native_finish_reason,
-            request=last_request_payload,
-            response=last_response_payload,
-            parsed_json=parsed_json,
-            engine_input=step_ctx.get("engine_input"),
-            engine_output=step_ctx.get("engine_output"),
-        )
+        self._record_timing(attempt, started, "ok", hedge=hedge)
+        if started is not None:
+            elapsed_s = time.monotonic() - started
+            latency.record((self.provider_name, self.expected_type), elapsed_s)
+            if self.breaker is not None:
+                self.breaker.record_success(elapsed_s)
+            self._record_route(started, ok=True)
+        self._dump(parsed_json=parsed_json, error_reason=None, error_detail=None, error_traceback=None)
         return LLMResult(
-            expected_type=expected_type,
-            raw_text=last_raw_text,
+            expected_type=self.expected_type,
+            raw_text=raw_text,
             parsed_json=parsed_json,
-            usage=last_usage,
+            usage=self.usage,
             used_fallback=False,
             skipped=False,
             error_class=None,
             error_reason=None,
         )
 
-    fallback_json = build_fallback(expected_type)
-    _dump_debug(
-        step_ctx=step_ctx,
-        provider_name=provider_name,
-        expected_type=expected_type,
-        raw_text=last_raw_text,
-        usage=last_usage,
-        error_reason=last_error_reason,
-        error_detail=last_error_detail,
-        error_traceback=last_traceback,
-        finish_reason=last_finish_reason,
-        native_finish_reason=last_native_finish_reason,
-        request=last_request_payload,
-        response=last_response_payload,
-        parsed_json=fallback_json,
-        engine_input=step_ctx.get("engine_input"),
-        engine_output=step_ctx.get("engine_output"),
-    )
-    reason = last_error_reason or "unknown"
-    logger.info(
-        "llm.fallback expected=%s reason=%s",
-        expected_type,
-        reason,
-    )
-    return LLMResult(
-        expected_type=expected_type,
-        raw_text=last_raw_text,
-        parsed_json=fallback_json,
-        usage=last_usage,
-        used_fallback=True,
-        skipped=False,
-        error_class=last_error_class,
-        error_reason=last_error_reason,
-    )
+    def _record_route(self, started: float | None, *, ok: bool) -> None:
+        if self.model is None or started is None:
+            return
+        model_router.record(self.expected_type, self.model, time.monotonic() - started, ok=ok)
+
+    def finish(self, result: LLMResult) -> LLMResult:
+        result.attempts = list(self.timings)
+        return result
+
+    def _record_timing(
+        self,
+        attempt: int,
+        started: float | None,
+        outcome: str | None,
+        *,
+        hedge: bool = False,
+    ) -> None:
+        now = time.monotonic()
+        start = started if started is not None else now
+        self.timings.append(
+            {
+                "attempt": attempt,
+                "hedge": hedge,
+                "start_ms": int((start - self.started_at) * 1000),
+                "elapsed_ms": int((now - start) * 1000),
+                "outcome": outcome or "error",
+            }
+        )
+
+    def fallback(self) -> LLMResult:
+        fallback_json = build_fallback(self.expected_type)
+        self._dump(
+            parsed_json=fallback_json,
+            error_reason=self.error_reason,
+            error_detail=self.error_detail,
+            error_traceback=self.traceback,
+        )
+        reason = self.error_reason or "unknown"
+        logger.info(
+            "llm.fallback expected=%s reason=%s",
+            self.expected_type,
+            reason,
+        )
+        return LLMResult(
+            expected_type=self.expected_type,
+            raw_text=self.raw_text,
+            parsed_json=fallback_json,
+            usage=self.usage,
+            used_fallback=True,
+            skipped=False,
+            error_class=self.error_class,
+            error_reason=self.error_reason,
+        )
+
+    def _dump(
+        self,
+        *,
+        parsed_json: Dict[str, Any] | None,
+        error_reason: str | None,
+        error_detail: str | None,
+        error_traceback: str | None,
+    ) -> None:
+        _dump_debug(
+            step_ctx=self.step_ctx,
+            provider_name=self.provider_name,
+            expected_type=self.expected_type,
+            raw_text=self.raw_text,
+            usage=self.usage,
+            error_reason=error_reason,
+            error_detail=error_detail,
+            error_traceback=error_traceback,
+            finish_reason=self.finish_reason,
+            native_finish_reason=self.native_finish_reason,
+            request=self.request_payload,
+            response=self.response_payload,
+            parsed_json=parsed_json,
+            engine_input=self.step_ctx.get("engine_input"),
+            engine_output=self.step_ctx.get("engine_output"),
+            routing={**self.routing, "chosen": self.model} if self.routing else None,
+        )
 
 
 def _dump_debug(
@@ -301,6 +714,7 @@ def _dump_debug(
     parsed_json: Dict[str, Any] | None = None,
     engine_input: Dict[str, Any] | None = None,
     engine_output: Dict[str, Any] | None = None,
+    routing: Dict[str, Any] | None = None,
 ) -> None:
     dump_dir = os.getenv("LLM_DEBUG_DUMP_DIR", "").strip()
     if not dump_dir:
@@ -327,6 +741,7 @@ def _dump_debug(
             "prompt_path": step_ctx.get("prompt_path"),
             "request": request,
             "response": response,
+            "routing": routing,
             "engine_input": engine_input,
             "engine_output": engine_output,
             "error_reason": error_reason,
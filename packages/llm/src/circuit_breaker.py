@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Literal, Tuple
+
+logger = logging.getLogger(__name__)
+
+BreakerState = Literal["closed", "open", "half_open"]
+BreakerKey = Tuple[str, str]
+
+
+def _resolve_float_env(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def breaker_enabled() -> bool:
+    raw = os.getenv("OPENROUTER_BREAKER_ENABLED", "1").strip().lower()
+    return raw in {"1", "true", "yes", "on"}
+
+
+class CircuitBreaker:
+    def __init__(self, key: BreakerKey) -> None:
+        self.key = key
+        self.window = int(_resolve_float_env("OPENROUTER_BREAKER_WINDOW", 20))
+        self.min_requests = int(_resolve_float_env("OPENROUTER_BREAKER_MIN_REQUESTS", 5))
+        self.failure_rate = _resolve_float_env("OPENROUTER_BREAKER_FAILURE_RATE", 0.5)
+        self.slow_s = _resolve_float_env("OPENROUTER_BREAKER_SLOW_S", 20.0)
+        self.open_s = _resolve_float_env("OPENROUTER_BREAKER_OPEN_S", 30.0)
+        self.half_open_probes = int(_resolve_float_env("OPENROUTER_BREAKER_HALF_OPEN_PROBES", 1))
+        self.state: BreakerState = "closed"
+        self.opened_at: float | None = None
+        self.probes_inflight = 0
+        self.short_circuits = 0
+        self._outcomes: Deque[bool] = deque(maxlen=self.window)
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self.state == "open":
+                return False
+            if self.state == "half_open":
+                return self.probes_inflight < self.half_open_probes
+            return True
+
+    def allow(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and self.probes_inflight < self.half_open_probes:
+                self.probes_inflight += 1
+                return True
+            self.short_circuits += 1
+            return False
+
+    def record_success(self, latency_s: float) -> None:
+        if latency_s >= self.slow_s:
+            self.record_failure("slow")
+            return
+        with self._lock:
+            if self.state == "half_open":
+                self._transition("closed", "probe_ok")
+                self._outcomes.clear()
+                self.probes_inflight = 0
+                return
+            self._outcomes.append(True)
+
+    def record_failure(self, reason: str | None = None) -> None:
+        with self._lock:
+            if self.state == "half_open":
+                self.probes_inflight = 0
+                self._open(reason or "probe_failed")
+                return
+            self._outcomes.append(False)
+            total = len(self._outcomes)
+            failures = total - sum(self._outcomes)
+            if self.state == "closed" and total >= self.min_requests and failures / total >= self.failure_rate:
+                self._open(reason or "failure_rate")
+
+    def release(self) -> None:
+        with self._lock:
+            if self.state == "half_open" and self.probes_inflight > 0:
+                self.probes_inflight -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            total = len(self._outcomes)
+            failures = total - sum(self._outcomes)
+            return {
+                "provider": self.key[0],
+                "model": self.key[1],
+                "state": self.state,
+                "requests": total,
+                "failure_rate": round(failures / total, 4) if total else 0.0,
+                "short_circuits": self.short_circuits,
+                "opened_at": self.opened_at,
+            }
+
+    def _open(self, reason: str) -> None:
+        self.opened_at = time.monotonic()
+        self._transition("open", reason)
+
+    def _maybe_half_open(self) -> None:
+        if self.state == "open" and self.opened_at is not None:
+            if time.monotonic() - self.opened_at >= self.open_s:
+                self.probes_inflight = 0
+                self._transition("half_open", "cooldown_elapsed")
+
+    def _transition(self, state: BreakerState, reason: str) -> None:
+        if state == self.state:
+            return
+        logger.warning(
+            "llm.breaker provider=%s model=%s state=%s->%s reason=%s",
+            self.key[0],
+            self.key[1],
+            self.state,
+            state,
+            reason,
+        )
+        self.state = state
+
+
+_breakers: Dict[BreakerKey, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider_name: str, model: str) -> CircuitBreaker:
+    key = (provider_name, model)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(key)
+            _breakers[key] = breaker
+        return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {f"{breaker.key[0]}:{breaker.key[1]}": breaker.snapshot() for breaker in breakers}
+
+
+def reset() -> None:
+    with _breakers_lock:
+        _breakers.clear()
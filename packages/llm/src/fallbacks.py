@@ -9,6 +9,11 @@ def build_fallback(expected_type: str) -> Dict[str, Any]:
             "text": "История временно недоступна. Спасибо, что были с нами!",
             "memory": None,
         }
+    if expected_type == "story_turn":
+        return {
+            "classifier_result": None,
+            "next_step": build_fallback("story_step"),
+        }
     return {
         "text": "Сцена временно недоступна. Выберите действие ниже.",
         "recap_short": "Шаг временно недоступен, история продолжится дальше.",
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Tuple
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = (
+    weakref.WeakKeyDictionary()
+)
+_sync_session: requests.Session | None = None
+_sync_lock = threading.Lock()
+
+
+def _resolve_int_env(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def _resolve_float_env(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def sync_timeout(total_s: float) -> Tuple[float, float]:
+    connect_s = _resolve_float_env("LLM_HTTP_CONNECT_TIMEOUT_S", 5.0)
+    return min(connect_s, total_s), total_s
+
+
+def async_timeout(total_s: float) -> aiohttp.ClientTimeout:
+    connect_s = _resolve_float_env("LLM_HTTP_CONNECT_TIMEOUT_S", 5.0)
+    return aiohttp.ClientTimeout(total=total_s, sock_connect=min(connect_s, total_s))
+
+
+def _build_sync_session() -> requests.Session:
+    adapter = HTTPAdapter(
+        pool_connections=_resolve_int_env("LLM_HTTP_POOL_HOSTS", 4),
+        pool_maxsize=_resolve_int_env("LLM_HTTP_POOL_SIZE", 20),
+        max_retries=0,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_sync_session() -> requests.Session:
+    global _sync_session
+    with _sync_lock:
+        if _sync_session is None:
+            _sync_session = _build_sync_session()
+            logger.info("llm.http_client sync_session_open")
+        return _sync_session
+
+
+def post(url: str, *, timeout_s: float, **kwargs: Any) -> requests.Response:
+    return get_sync_session().post(url, timeout=sync_timeout(timeout_s), **kwargs)
+
+
+def close() -> None:
+    global _sync_session
+    with _sync_lock:
+        session, _sync_session = _sync_session, None
+    if session is not None:
+        session.close()
+        logger.info("llm.http_client sync_session_closed")
+
+
+def _build_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=_resolve_int_env("LLM_HTTP_POOL_SIZE", 20),
+        keepalive_timeout=_resolve_float_env("LLM_HTTP_KEEPALIVE_S", 30.0),
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+def get_async_session() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = _build_session()
+        _sessions[loop] = session
+        logger.info("llm.http_client session_open")
+    return session
+
+
+async def aclose() -> None:
+    loop = asyncio.get_running_loop()
+    session = _sessions.pop(loop, None)
+    if session is not None and not session.closed:
+        await session.close()
+        logger.info("llm.http_client session_closed")
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Deque, Dict, Hashable, Optional
+
+_WINDOW = 200
+
+_samples: Dict[Hashable, Deque[float]] = {}
+
+
+def record(key: Hashable, seconds: float) -> None:
+    window = _samples.get(key)
+    if window is None:
+        window = deque(maxlen=_WINDOW)
+        _samples[key] = window
+    window.append(seconds)
+
+
+def percentile(key: Hashable, pct: float, *, min_samples: int = 1) -> Optional[float]:
+    window = _samples.get(key)
+    if not window or len(window) < min_samples:
+        return None
+    ordered = sorted(window)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def sample_count(key: Hashable) -> int:
+    window = _samples.get(key)
+    return len(window) if window else 0
+
+
+def reset() -> None:
+    _samples.clear()
@@ -3,6 +3,8 @@ from __future__ import annotations
 import json
 from typing import Any, Dict
 
+from packages.llm.src.streaming import TextCallback
+
 
 class MockProvider:
     def __init__(self, mode: str = "ok") -> None:
@@ -24,6 +26,12 @@ class MockProvider:
         mode = self._resolve_mode()
         expected_type = step_ctx.get("expected_type")
 
+        if expected_type == "story_turn" and (
+            mode in {"ok", "turn_partial"} or mode.startswith("ok_step_")
+        ):
+            return self._build_turn_payload(step_ctx, mode)
+        if mode == "turn_partial":
+            mode = "ok"
         if mode == "timeout":
             raise TimeoutError("mock timeout")
         if mode == "invalid_json":
@@ -48,6 +56,15 @@ class MockProvider:
             return self._build_step_payload(step_ctx, 3, expected_type=expected_type)
         return self._build_payload(expected_type, step_ctx)
 
+    async def agenerate(self, step_ctx: Dict[str, Any]) -> str:
+        return self.generate(step_ctx)
+
+    async def astream(self, step_ctx: Dict[str, Any], on_delta: TextCallback) -> str:
+        raw_text = self.generate(step_ctx)
+        for start in range(0, len(raw_text), 16):
+            await on_delta(raw_text[start:start + 16])
+        return raw_text
+
     def _build_payload(self, expected_type: str | None, step_ctx: Dict[str, Any]) -> str:
         if expected_type == "story_final":
             text = "Финал истории. Спасибо за игру!"
@@ -94,6 +111,34 @@ class MockProvider:
         }
         return json.dumps(payload, ensure_ascii=False)
 
+    def _build_turn_payload(self, step_ctx: Dict[str, Any], mode: str) -> str:
+        story_request = step_ctx.get("story_request")
+        turn = story_request.get("turn") if isinstance(story_request, dict) else None
+        classifier_result = None
+        if isinstance(turn, dict) and turn.get("kind") == "free_text":
+            classifier_result = {
+                "intent_trait": "neutral",
+                "confidence": 0.5,
+                "safety": "ok",
+                "deltas": [],
+                "tags": [],
+            }
+        payload: Dict[str, Any] = {
+            "expected_type": "story_turn",
+            "classifier_result": classifier_result,
+        }
+        if mode != "turn_partial":
+            count = 3
+            if mode.startswith("ok_step_"):
+                try:
+                    count = int(mode.removeprefix("ok_step_"))
+                except ValueError:
+                    count = 3
+            payload["next_step"] = json.loads(
+                self._build_step_payload(step_ctx, max(count, 0), expected_type="story_step")
+            )
+        return json.dumps(payload, ensure_ascii=False)
+
     def _build_schema_invalid(self, step_ctx: Dict[str, Any]) -> str:
         payload = {
             "text": "Неверный шаг.",
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import logging
+import os
+import random
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MIN_SUCCESS_SHARE = 0.05
+
+
+def _resolve_float_env(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        return default
+    return value if value >= 0 else default
+
+
+def routing_mode() -> str:
+    raw = os.getenv("OPENROUTER_ROUTING", "latency").strip().lower()
+    return raw if raw in {"latency", "static"} else "latency"
+
+
+@dataclass
+class ModelStats:
+    samples: int = 0
+    latency_ewma_s: float = 0.0
+    failure_ewma: float = 0.0
+
+    def update(self, latency_s: float, ok: bool, alpha: float) -> None:
+        failure = 0.0 if ok else 1.0
+        if self.samples == 0:
+            self.latency_ewma_s = latency_s
+            self.failure_ewma = failure
+        else:
+            self.latency_ewma_s = alpha * latency_s + (1 - alpha) * self.latency_ewma_s
+            self.failure_ewma = alpha * failure + (1 - alpha) * self.failure_ewma
+        self.samples += 1
+
+    def expected_time_to_valid_s(self) -> float:
+        return self.latency_ewma_s / max(1.0 - self.failure_ewma, _MIN_SUCCESS_SHARE)
+
+
+_stats: Dict[Tuple[str, str], ModelStats] = {}
+_lock = threading.Lock()
+
+
+def record(expected_type: str, model: str, latency_s: float, *, ok: bool) -> None:
+    alpha = min(_resolve_float_env("OPENROUTER_ROUTING_EWMA_ALPHA", 0.3), 1.0) or 0.3
+    with _lock:
+        stats = _stats.setdefault((expected_type, model), ModelStats())
+        stats.update(latency_s, ok, alpha)
+
+
+def rank(expected_type: str, models: List[str]) -> Tuple[List[str], Dict[str, Any]]:
+    mode = routing_mode()
+    with _lock:
+        scores = {
+            model: round(_stats[(expected_type, model)].expected_time_to_valid_s(), 3)
+            for model in models
+            if (expected_type, model) in _stats
+        }
+    decision: Dict[str, Any] = {"mode": mode, "pool": list(models), "scores": scores, "explored": False}
+    if mode == "static" or len(models) < 2:
+        decision["order"] = list(models)
+        return list(models), decision
+    untried = [model for model in models if model not in scores]
+    measured = sorted((model for model in models if model in scores), key=lambda model: scores[model])
+    ordered = untried + measured
+    explore_rate = _resolve_float_env("OPENROUTER_ROUTING_EXPLORE", 0.05)
+    if not untried and len(ordered) > 1 and random.random() < explore_rate:
+        explored = random.choice(ordered[1:])
+        ordered.remove(explored)
+        ordered.insert(0, explored)
+        decision["explored"] = True
+    decision["order"] = list(ordered)
+    if ordered[0] != models[0]:
+        logger.info(
+            "llm.router expected=%s model=%s outcome=rerouted preferred=%s",
+            expected_type,
+            ordered[0],
+            models[0],
+        )
+    return ordered, decision
+
+
+def router_stats() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        return {
+            f"{expected_type}:{model}": {
+                "samples": stats.samples,
+                "latency_ewma_s": round(stats.latency_ewma_s, 3),
+                "failure_ewma": round(stats.failure_ewma, 3),
+                "expected_time_to_valid_s": round(stats.expected_time_to_valid_s(), 3),
+            }
+            for (expected_type, model), stats in _stats.items()
+        }
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
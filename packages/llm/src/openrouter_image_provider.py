@@ -1,11 +1,12 @@
 from __future__ import annotations
 
+import asyncio
 import base64
 import hashlib
 import os
 from typing import Any, Dict, Tuple
 
-import requests
+from packages.llm.src import http_client
 
 
 class MissingOpenRouterKeyError(ValueError):
@@ -13,9 +14,13 @@ class MissingOpenRouterKeyError(ValueError):
 
 
 _SIM_FAIL_USED = False
+_ENDPOINT = "https://openrouter.ai/api/v1/chat/completions"
 
 
-def generate_t2i(prompt: str) -> Tuple[bytes, str, int | None, int | None, str]:
+ImageResult = Tuple[bytes, str, int | None, int | None, str]
+
+
+def generate_t2i(prompt: str) -> ImageResult:
     return _generate_image(prompt=prompt, reference_bytes=None, reference_mime=None)
 
 
@@ -23,28 +28,50 @@ def generate_i2i(
     prompt: str,
     reference_bytes: bytes,
     reference_mime: str,
-) -> Tuple[bytes, str, int | None, int | None, str]:
+    *,
+    reference_data_url: str | None = None,
+) -> ImageResult:
     return _generate_image(
         prompt=prompt,
         reference_bytes=reference_bytes,
         reference_mime=reference_mime,
+        reference_data_url=reference_data_url,
     )
 
 
-def _generate_image(
+async def agenerate_t2i(prompt: str) -> ImageResult:
+    return await _agenerate_image(prompt=prompt, reference_bytes=None, reference_mime=None)
+
+
+async def agenerate_i2i(
+    prompt: str,
+    reference_bytes: bytes,
+    reference_mime: str,
+    *,
+    reference_data_url: str | None = None,
+) -> ImageResult:
+    return await _agenerate_image(
+        prompt=prompt,
+        reference_bytes=reference_bytes,
+        reference_mime=reference_mime,
+        reference_data_url=reference_data_url,
+    )
+
+
+def _build_request(
     *,
     prompt: str,
     reference_bytes: bytes | None,
     reference_mime: str | None,
-) -> Tuple[bytes, str, int | None, int | None, str]:
+    reference_data_url: str | None = None,
+) -> Tuple[Dict[str, Any], Dict[str, str], float]:
     api_key = _get_api_key()
-    endpoint = "https://openrouter.ai/api/v1/chat/completions"
     model = os.getenv("OPENROUTER_MODEL_IMAGE", "black-forest-labs/flux.2-pro").strip()
     timeout_s = _resolve_timeout()
     prompt = _clamp_prompt(prompt)
     _maybe_simulate_failure()
 
-    messages = [_build_prompt_message(prompt, reference_bytes, reference_mime)]
+    messages = [_build_prompt_message(prompt, reference_bytes, reference_mime, reference_data_url)]
     payload: Dict[str, Any] = {
         "model": model,
         "messages": messages,
@@ -62,15 +89,61 @@ def _generate_image(
     app_title = os.getenv("OPENROUTER_APP_TITLE", "").strip()
     if app_title:
         headers["X-Title"] = app_title
+    return payload, headers, timeout_s
+
 
-    response = requests.post(
-        endpoint,
+def _generate_image(
+    *,
+    prompt: str,
+    reference_bytes: bytes | None,
+    reference_mime: str | None,
+    reference_data_url: str | None = None,
+) -> ImageResult:
+    payload, headers, timeout_s = _build_request(
+        prompt=prompt,
+        reference_bytes=reference_bytes,
+        reference_mime=reference_mime,
+        reference_data_url=reference_data_url,
+    )
+    response = http_client.post(
+        _ENDPOINT,
         headers=headers,
         json=payload,
-        timeout=timeout_s,
+        timeout_s=timeout_s,
     )
     response.raise_for_status()
-    payload = response.json()
+    return _image_result(response.json())
+
+
+async def _agenerate_image(
+    *,
+    prompt: str,
+    reference_bytes: bytes | None,
+    reference_mime: str | None,
+    reference_data_url: str | None = None,
+) -> ImageResult:
+    payload, headers, timeout_s = _build_request(
+        prompt=prompt,
+        reference_bytes=reference_bytes,
+        reference_mime=reference_mime,
+        reference_data_url=reference_data_url,
+    )
+    session = http_client.get_async_session()
+    try:
+        async with session.post(
+            _ENDPOINT,
+            headers=headers,
+            json=payload,
+            timeout=http_client.async_timeout(timeout_s),
+        ) as response:
+            response.raise_for_status()
+            response_payload = await response.json(content_type=None)
+    except asyncio.TimeoutError as exc:
+        raise TimeoutError("openrouter image timeout") from exc
+    return await asyncio.to_thread(_image_result, response_payload)
+
+
+def _image_result(payload: Dict[str, Any]) -> ImageResult:
     image_bytes, mime = _extract_image(payload)
     width, height = _extract_dimensions(image_bytes, mime)
     sha256 = hashlib.sha256(image_bytes).hexdigest()
@@ -117,12 +190,13 @@ def _build_prompt_message(
     prompt: str,
     reference_bytes: bytes | None,
     reference_mime: str | None,
+    reference_data_url: str | None = None,
 ) -> Dict[str, Any]:
     if reference_bytes is None:
         return {"role": "user", "content": prompt}
     if reference_mime is None:
         reference_mime = "image/png"
-    data_url = _to_data_url(reference_bytes, reference_mime)
+    data_url = reference_data_url or _to_data_url(reference_bytes, reference_mime)
     return {
         "role": "user",
         "content": [
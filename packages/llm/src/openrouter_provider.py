@@ -1,13 +1,46 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
+import aiohttp
 import requests
 
+from packages.llm.src import http_client, model_router
 from packages.llm.src.prompt_loader import PromptNotFoundError, load_system_prompt_with_source
+from packages.llm.src.streaming import TextCallback
+
+classifier_result_schema: Dict[str, Any] = {
+    "anyOf": [
+        {
+            "type": "object",
+            "properties": {
+                "intent_trait": {"type": "string"},
+                "confidence": {"type": "number"},
+                "safety": {"type": "string"},
+                "deltas": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "trait": {"type": "string"},
+                            "delta": {"type": "integer"},
+                        },
+                        "required": ["trait", "delta"],
+                        "additionalProperties": False,
+                    },
+                },
+                "tags": {"type": "array", "items": {"type": "string"}},
+            },
+            "required": ["intent_trait", "confidence", "safety", "deltas"],
+            "additionalProperties": False,
+        },
+        {"type": "null"},
+    ]
+}
 
 class MissingOpenRouterKeyError(ValueError):
     pass
@@ -23,6 +56,7 @@ class OpenRouterProvider:
         self._model_final = os.getenv("OPENROUTER_MODEL_FINAL", "").strip()
         self.last_prompt_source: str | None = None
         self.last_prompt_path: str | None = None
+        self.last_routing: Dict[str, Any] | None = None
 
     @classmethod
     def from_env(cls) -> "OpenRouterProvider":
@@ -32,10 +66,105 @@ class OpenRouterProvider:
         return cls(api_key)
 
     def generate(self, step_ctx: Dict[str, Any]) -> str:
+        payload, headers, timeout_s = self._build_request(step_ctx)
+        try:
+            response = http_client.post(
+                self._endpoint,
+                headers=headers,
+                json=payload,
+                timeout_s=timeout_s,
+            )
+            response.raise_for_status()
+        except requests.exceptions.Timeout as exc:
+            raise TimeoutError("openrouter timeout") from exc
+        except requests.exceptions.HTTPError:
+            raise
+
+        return self._parse_response(response.json())
+
+    async def agenerate(self, step_ctx: Dict[str, Any]) -> str:
+        payload, headers, timeout_s = self._build_request(step_ctx)
+        session = http_client.get_async_session()
+        try:
+            async with session.post(
+                self._endpoint,
+                headers=headers,
+                json=payload,
+                timeout=http_client.async_timeout(timeout_s),
+            ) as response:
+                response.raise_for_status()
+                response_payload = await response.json(content_type=None)
+        except asyncio.TimeoutError as exc:
+            raise TimeoutError("openrouter timeout") from exc
+        except aiohttp.ClientResponseError:
+            raise
+
+        return self._parse_response(response_payload)
+
+    async def astream(self, step_ctx: Dict[str, Any], on_delta: TextCallback) -> str:
+        payload, headers, timeout_s = self._build_request(step_ctx)
+        payload = {**payload, "stream": True, "usage": {"include": True}}
+        self.last_request_payload = payload
+        session = http_client.get_async_session()
+        parts: List[str] = []
+        usage: Dict[str, Any] | None = None
+        finish_reason: str | None = None
+        native_finish_reason: str | None = None
+        try:
+            async with session.post(
+                self._endpoint,
+                headers=headers,
+                json=payload,
+                timeout=http_client.async_timeout(timeout_s),
+            ) as response:
+                response.raise_for_status()
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8", errors="replace").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(chunk.get("error"), dict):
+                        raise ValueError(f"openrouter stream error: {chunk['error'].get('message')}")
+                    if isinstance(chunk.get("usage"), dict):
+                        usage = chunk["usage"]
+                    choice = (chunk.get("choices") or [{}])[0]
+                    finish_reason = choice.get("finish_reason") or finish_reason
+                    native_finish_reason = choice.get("native_finish_reason") or native_finish_reason
+                    delta = (choice.get("delta") or {}).get("content")
+                    if isinstance(delta, str) and delta:
+                        parts.append(delta)
+                        await on_delta(delta)
+        except asyncio.TimeoutError as exc:
+            raise TimeoutError("openrouter timeout") from exc
+        except aiohttp.ClientResponseError:
+            raise
+
+        return self._parse_response(
+            {
+                "choices": [
+                    {
+                        "message": {"content": "".join(parts)},
+                        "finish_reason": finish_reason,
+                        "native_finish_reason": native_finish_reason,
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    def _build_request(
+        self, step_ctx: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Dict[str, str], float]:
         expected_type = step_ctx.get("expected_type")
         theme_id = step_ctx.get("theme_id")
         max_tokens = self._resolve_max_tokens(expected_type)
-        timeout_s = self._resolve_timeout()
+        timeout_s = self._resolve_timeout(step_ctx.get("timeout_s"))
         theme_config = self._resolve_theme_config(theme_id)
         if theme_config.max_tokens_step is not None or theme_config.max_tokens_final is not None:
             max_tokens = self._resolve_theme_max_tokens(expected_type, theme_config, max_tokens)
@@ -47,7 +176,7 @@ class OpenRouterProvider:
         reasoning = self._resolve_reasoning()
 
         payload = {
-            "model": self._resolve_model(expected_type),
+            "model": step_ctx.get("model") or self._resolve_model(expected_type),
             "messages": messages,
             "response_format": response_format,
             "temperature": temperature,
@@ -72,21 +201,9 @@ class OpenRouterProvider:
         app_title = os.getenv("OPENROUTER_APP_TITLE", "").strip()
         if app_title:
             headers["X-Title"] = app_title
+        return payload, headers, timeout_s
 
-        try:
-            response = requests.post(
-                self._endpoint,
-                headers=headers,
-                json=payload,
-                timeout=timeout_s,
-            )
-            response.raise_for_status()
-        except requests.exceptions.Timeout as exc:
-            raise TimeoutError("openrouter timeout") from exc
-        except requests.exceptions.HTTPError:
-            raise
-
-        response_payload = response.json()
+    def _parse_response(self, response_payload: Dict[str, Any]) -> str:
         self.last_response_payload = response_payload
         self.last_usage = response_payload.get("usage")
         self.last_finish_reason = (
@@ -147,7 +264,7 @@ class OpenRouterProvider:
         ]
 
     def _resolve_max_tokens(self, expected_type: Any) -> int | None:
-        if expected_type == "story_step":
+        if expected_type in {"story_step", "story_turn"}:
             raw = os.getenv("OPENROUTER_MAX_TOKENS_STEP", "")
         else:
             raw = os.getenv("OPENROUTER_MAX_TOKENS_FINAL", "")
@@ -177,20 +294,45 @@ class OpenRouterProvider:
         except ValueError:
             return 0.5
 
-    def _resolve_timeout(self) -> float:
+    def _resolve_timeout(self, budget_s: Any = None) -> float:
         raw = os.getenv("OPENROUTER_TIMEOUT_S", "30").strip()
-        if not raw:
-            return 30.0
         try:
-            return float(raw)
+            timeout_s = float(raw) if raw else 30.0
         except ValueError:
-            return 30.0
+            timeout_s = 30.0
+        if isinstance(budget_s, (int, float)) and budget_s > 0:
+            return min(timeout_s, float(budget_s))
+        return timeout_s
 
     def _resolve_model(self, expected_type: Any) -> str:
         if expected_type == "story_final" and self._model_final:
             return self._model_final
         return self._model
 
+    def model_candidates(self, expected_type: Any) -> List[str]:
+        models, self.last_routing = model_router.rank(
+            str(expected_type or ""), self._resolve_model_pool(expected_type)
+        )
+        if expected_type == "story_final":
+            secondary = os.getenv("OPENROUTER_MODEL_FINAL_FALLBACK", "").strip()
+        else:
+            secondary = os.getenv("OPENROUTER_MODEL_TEXT_FALLBACK", "").strip()
+        if secondary and secondary not in models:
+            models.append(secondary)
+        return models
+
+    def _resolve_model_pool(self, expected_type: Any) -> List[str]:
+        if expected_type == "story_final":
+            raw = os.getenv("OPENROUTER_MODEL_POOL_FINAL", "")
+        else:
+            raw = os.getenv("OPENROUTER_MODEL_POOL_TEXT", "")
+        pool: List[str] = []
+        for model in raw.split(","):
+            model = model.strip()
+            if model and model not in pool:
+                pool.append(model)
+        return pool or [self._resolve_model(expected_type)]
+
     def _build_response_format(self, expected_type: Any) -> Dict[str, Any]:
         format_mode = os.getenv("OPENROUTER_RESPONSE_FORMAT", "json_object").strip().lower()
         if format_mode != "json_schema":
@@ -230,32 +372,20 @@ class OpenRouterProvider:
             }
             name = "book_rewrite_v1"
         elif expected_type == "story_step":
+            schema = _story_step_schema()
+            schema["properties"]["classifier_result"] = classifier_result_schema
+            name = "story_step"
+        elif expected_type == "story_turn":
             schema = {
                 "type": "object",
                 "properties": {
-                    "text": {"type": "string"},
-                    "recap_short": {"type": "string"},
-                    "image_prompt": {"type": "string"},
-                    "choices": {
-                        "type": "array",
-                        "maxItems": 3,
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "choice_id": {"type": "string"},
-                                "label": {"type": "string"},
-                            },
-                            "required": ["choice_id", "label"],
-                            "additionalProperties": False,
-                        },
-                    },
-                    "memory": {"type": ["object", "null"]},
                     "classifier_result": classifier_result_schema,
+                    "next_step": _story_step_schema(),
                 },
-                "required": ["text", "recap_short", "choices"],
+                "required": ["classifier_result", "next_step"],
                 "additionalProperties": False,
             }
-            name = "story_step"
+            name = "story_turn"
         else:
             schema = {
                 "type": "object",
@@ -334,6 +464,33 @@ class OpenRouterProvider:
         return _ThemeConfig()
 
 
+def _story_step_schema() -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {
+            "text": {"type": "string"},
+            "recap_short": {"type": "string"},
+            "image_prompt": {"type": "string"},
+            "choices": {
+                "type": "array",
+                "maxItems": 3,
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "choice_id": {"type": "string"},
+                        "label": {"type": "string"},
+                    },
+                    "required": ["choice_id", "label"],
+                    "additionalProperties": False,
+                },
+            },
+            "memory": {"type": ["object", "null"]},
+        },
+        "required": ["text", "recap_short", "choices"],
+        "additionalProperties": False,
+    }
+
+
 class _ThemeConfig:
     def __init__(
         self,
@@ -27,7 +27,27 @@ def load_system_prompt(expected_type: str, theme_id: str | None) -> str:
 def load_system_prompt_with_source(
     expected_type: str, theme_id: str | None
 ) -> PromptLoadResult:
-    prompt_paths = _build_prompt_paths(expected_type, theme_id)
+    if expected_type == "story_turn":
+        return _load_story_turn_prompt(theme_id)
+    return _load_first(_build_prompt_paths(expected_type, theme_id))
+
+
+def _load_story_turn_prompt(theme_id: str | None) -> PromptLoadResult:
+    step_prompt = _load_first(_build_prompt_paths("story_step", theme_id))
+    base_dir = _resolve_prompt_base_dir()
+    turn_paths: list[Path] = []
+    if theme_id:
+        turn_paths.append(base_dir / "story_turn" / f"{theme_id}.txt")
+    turn_paths.append(base_dir / "story_turn" / "default.txt")
+    turn_prompt = _load_first(turn_paths)
+    return PromptLoadResult(
+        text=f"{step_prompt.text}\n\n{turn_prompt.text}",
+        source=turn_prompt.source,
+        path=turn_prompt.path,
+    )
+
+
+def _load_first(prompt_paths: list[Path]) -> PromptLoadResult:
     for path in prompt_paths:
         try:
             if not path.exists():
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Literal
+
+logger = logging.getLogger(__name__)
+
+PriorityClass = Literal["interactive", "final", "background"]
+
+_PRIORITY_ORDER: Dict[str, int] = {"interactive": 0, "final": 1, "background": 2}
+_EXPECTED_TYPE_PRIORITY: Dict[str, PriorityClass] = {
+    "story_step": "interactive",
+    "story_turn": "interactive",
+    "story_final": "final",
+    "book_rewrite_v1": "background",
+}
+
+
+def _resolve_int_env(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def priority_for(step_ctx: Dict[str, Any]) -> PriorityClass:
+    explicit = step_ctx.get("priority")
+    if explicit in _PRIORITY_ORDER:
+        return explicit
+    return _EXPECTED_TYPE_PRIORITY.get(str(step_ctx.get("expected_type") or ""), "interactive")
+
+
+@dataclass
+class _ClassStats:
+    started: int = 0
+    queued: int = 0
+    inflight: int = 0
+    waiting: int = 0
+    total_wait_ms: float = 0.0
+    max_wait_ms: float = 0.0
+
+
+@dataclass(order=True)
+class _Waiter:
+    rank: int
+    seq: int
+    priority: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class PriorityHandle:
+    def __init__(self, priority: PriorityClass) -> None:
+        self.priority: PriorityClass = priority
+        self._waiters: List[_Waiter] = []
+
+
+_bound_handle: ContextVar[PriorityHandle | None] = ContextVar("llm_priority_handle", default=None)
+
+
+def bind_priority(handle: PriorityHandle) -> None:
+    _bound_handle.set(handle)
+
+
+class LLMScheduler:
+    def __init__(self) -> None:
+        self.max_inflight = _resolve_int_env("LLM_MAX_INFLIGHT", 8)
+        self.max_background = min(
+            _resolve_int_env("LLM_BACKGROUND_MAX_INFLIGHT", max(1, self.max_inflight // 2)),
+            self.max_inflight,
+        )
+        self.inflight = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._stats: Dict[str, _ClassStats] = {name: _ClassStats() for name in _PRIORITY_ORDER}
+
+    async def acquire(self, priority: PriorityClass) -> PriorityClass:
+        handle = _bound_handle.get()
+        if handle is not None and _PRIORITY_ORDER[handle.priority] < _PRIORITY_ORDER[priority]:
+            priority = handle.priority
+        queued_at = time.monotonic()
+        if self._can_start(priority):
+            self._start(priority, queued_at)
+            return priority
+        waiter = _Waiter(
+            rank=_PRIORITY_ORDER[priority],
+            seq=next(self._seq),
+            priority=priority,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._waiters, waiter)
+        self._stats[priority].queued += 1
+        self._stats[priority].waiting += 1
+        if handle is not None:
+            handle._waiters.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            self._stats[waiter.priority].waiting -= 1
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(waiter.priority)
+            else:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+            raise
+        finally:
+            if handle is not None:
+                handle._waiters.remove(waiter)
+        self._stats[waiter.priority].waiting -= 1
+        self._start(waiter.priority, queued_at, granted=True)
+        return waiter.priority
+
+    def promote(self, handle: PriorityHandle, priority: PriorityClass) -> None:
+        if _PRIORITY_ORDER[priority] >= _PRIORITY_ORDER[handle.priority]:
+            return
+        handle.priority = priority
+        promoted = 0
+        for waiter in handle._waiters:
+            if waiter.future.done():
+                continue
+            self._stats[waiter.priority].waiting -= 1
+            self._stats[priority].waiting += 1
+            waiter.priority = priority
+            waiter.rank = _PRIORITY_ORDER[priority]
+            promoted += 1
+        if promoted:
+            heapq.heapify(self._waiters)
+            self._wake()
+            logger.info("llm.scheduler priority=%s outcome=promoted waiters=%s", priority, promoted)
+
+    def release(self, priority: PriorityClass) -> None:
+        self.inflight -= 1
+        self._stats[priority].inflight -= 1
+        self._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_inflight": self.max_inflight,
+            "max_background": self.max_background,
+            "inflight": self.inflight,
+            "classes": {
+                name: {
+                    "started": stats.started,
+                    "queued": stats.queued,
+                    "waiting": stats.waiting,
+                    "inflight": stats.inflight,
+                    "avg_wait_ms": round(stats.total_wait_ms / stats.started, 1) if stats.started else 0.0,
+                    "max_wait_ms": round(stats.max_wait_ms, 1),
+                }
+                for name, stats in self._stats.items()
+            },
+        }
+
+    def _can_start(self, priority: str) -> bool:
+        if self.inflight >= self.max_inflight:
+            return False
+        if priority == "background":
+            return self._stats["background"].inflight < self.max_background
+        return True
+
+    def _start(self, priority: str, queued_at: float, *, granted: bool = False) -> None:
+        stats = self._stats[priority]
+        if not granted:
+            self.inflight += 1
+            stats.inflight += 1
+        wait_ms = (time.monotonic() - queued_at) * 1000
+        stats.started += 1
+        stats.total_wait_ms += wait_ms
+        stats.max_wait_ms = max(stats.max_wait_ms, wait_ms)
+        if granted:
+            logger.info("llm.scheduler priority=%s outcome=started wait_ms=%.0f", priority, wait_ms)
+
+    def _wake(self) -> None:
+        skipped: List[_Waiter] = []
+        while self._waiters and self.inflight < self.max_inflight:
+            waiter = heapq.heappop(self._waiters)
+            if waiter.future.done():
+                continue
+            if not self._can_start(waiter.priority):
+                skipped.append(waiter)
+                continue
+            self.inflight += 1
+            self._stats[waiter.priority].inflight += 1
+            waiter.future.set_result(None)
+        for waiter in skipped:
+            heapq.heappush(self._waiters, waiter)
+
+
+_schedulers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LLMScheduler]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_scheduler() -> LLMScheduler:
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = LLMScheduler()
+        _schedulers[loop] = scheduler
+    return scheduler
+
+
+@asynccontextmanager
+async def slot(priority: PriorityClass) -> AsyncIterator[None]:
+    scheduler = get_scheduler()
+    granted = await scheduler.acquire(priority)
+    try:
+        yield
+    finally:
+        scheduler.release(granted)
+
+
+def promote(handle: PriorityHandle, priority: PriorityClass) -> None:
+    get_scheduler().promote(handle, priority)
+
+
+def scheduler_stats() -> Dict[str, Any]:
+    try:
+        return get_scheduler().stats()
+    except RuntimeError:
+        return {}
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Awaitable, Callable, Optional
+
+TextCallback = Callable[[str], Awaitable[None]]
+
+_TEXT_KEY_RE = re.compile(r'"text"\s*:\s*"')
+_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+class StreamTextExtractor:
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._pos: Optional[int] = None
+        self._chars: list[str] = []
+        self._done = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chars)
+
+    def feed(self, delta: str) -> bool:
+        if self._done or not delta:
+            return False
+        self._buffer += delta
+        if self._pos is None:
+            match = _TEXT_KEY_RE.search(self._buffer)
+            if match is None:
+                return False
+            self._pos = match.end()
+        before = len(self._chars)
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char == '"':
+                self._done = True
+                break
+            if char != "\\":
+                self._chars.append(char)
+                pos += 1
+                continue
+            if pos + 1 >= len(buffer):
+                break
+            escape = buffer[pos + 1]
+            if escape == "u":
+                if pos + 6 > len(buffer):
+                    break
+                width = 12 if _is_high_surrogate(buffer[pos + 2:pos + 6]) else 6
+                if pos + width > len(buffer):
+                    break
+                try:
+                    self._chars.append(json.loads(f'"{buffer[pos:pos + width]}"'))
+                except json.JSONDecodeError:
+                    pass
+                pos += width
+                continue
+            self._chars.append(_ESCAPES.get(escape, escape))
+            pos += 2
+        self._pos = pos
+        return len(self._chars) != before
+
+
+def _is_high_surrogate(hex_digits: str) -> bool:
+    try:
+        return 0xD800 <= int(hex_digits, 16) <= 0xDBFF
+    except ValueError:
+        return False
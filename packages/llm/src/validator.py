@@ -32,6 +32,11 @@ def validate_response(
         if not ok:
             return None, reason, _build_validation_detail(expected_type, parsed, raw_text)
         return parsed, None, None
+    if expected_type == "story_turn":
+        ok, reason = _validate_story_turn(parsed)
+        if not ok:
+            return None, reason, _build_validation_detail(expected_type, parsed, raw_text)
+        return parsed, None, None
     if expected_type == "book_rewrite_v1":
         ok, reason = _validate_book_rewrite_v1(parsed)
         if not ok:
@@ -67,6 +72,20 @@ def _validate_story_step(parsed: Dict[str, Any]) -> Tuple[bool, str]:
     return True, ""
 
 
+def _validate_story_turn(parsed: Dict[str, Any]) -> Tuple[bool, str]:
+    if "classifier_result" not in parsed:
+        return False, "missing_required_fields"
+    classifier_result = parsed.get("classifier_result")
+    if classifier_result is not None and not isinstance(classifier_result, dict):
+        return False, "schema_invalid"
+    next_step = parsed.get("next_step")
+    if next_step is None:
+        return False, "missing_required_fields"
+    if not isinstance(next_step, dict):
+        return False, "schema_invalid"
+    return _validate_story_step(next_step)
+
+
 def _validate_story_final(parsed: Dict[str, Any]) -> Tuple[bool, str]:
     text = parsed.get("text")
     if not isinstance(text, str) or not text.strip():
@@ -135,6 +154,21 @@ def _build_validation_detail(
                 invalid_fields.append("choices:type")
             if isinstance(choices, list) and len(choices) > 0:
                 invalid_fields.append("choices:length")
+    elif expected_type == "story_turn":
+        if "classifier_result" not in parsed:
+            missing_fields.append("classifier_result")
+        classifier_result = parsed.get("classifier_result")
+        if classifier_result is not None and not isinstance(classifier_result, dict):
+            invalid_fields.append("classifier_result:type")
+        next_step = parsed.get("next_step")
+        if next_step is None:
+            missing_fields.append("next_step")
+        elif not isinstance(next_step, dict):
+            invalid_fields.append("next_step:type")
+        else:
+            step_detail = _build_validation_detail("story_step", next_step, raw_text)
+            missing_fields.extend(f"next_step.{field}" for field in step_detail.get("missing_fields", []))
+            invalid_fields.extend(f"next_step.{field}" for field in step_detail.get("invalid_fields", []))
     if missing_fields:
         detail["missing_fields"] = missing_fields
     if invalid_fields:
@@ -1,4 +1,9 @@
-from packages.llm.src.adapter import generate
+import asyncio
+import time
+
+from packages.llm.src import adapter
+from packages.llm.src.adapter import agenerate, agenerate_story_turn, generate
+from packages.llm.src.mock_provider import MockProvider
 
 
 def test_generate_ok(monkeypatch):
@@ -51,3 +56,188 @@ def test_provider_off_skips(monkeypatch):
     assert result.used_fallback is False
     assert result.skipped is True
     assert result.parsed_json is None
+
+
+def test_agenerate_ok(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "mock")
+    monkeypatch.setenv("LLM_MOCK_MODE", "ok")
+    result = asyncio.run(agenerate({"expected_type": "story_step", "req_id": "req-6"}))
+    assert result.used_fallback is False
+    assert result.skipped is False
+    assert len(result.parsed_json["choices"]) == 3
+
+
+def test_agenerate_timeout_retry_fallback(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "mock")
+    monkeypatch.setenv("LLM_MOCK_MODE", "timeout_always")
+    result = asyncio.run(agenerate({"expected_type": "story_step", "req_id": "req-7"}))
+    assert result.used_fallback is True
+    assert result.error_reason == "timeout"
+
+
+def test_agenerate_recovers_on_second_attempt(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "mock")
+    monkeypatch.setenv("LLM_MOCK_MODE", "invalid_json_once")
+    result = asyncio.run(agenerate({"expected_type": "story_step", "req_id": "req-8"}))
+    assert result.used_fallback is False
+    assert result.parsed_json["text"]
+
+
+def test_agenerate_provider_off_skips(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "off")
+    result = asyncio.run(agenerate({"expected_type": "story_step", "req_id": "req-9"}))
+    assert result.skipped is True
+    assert result.parsed_json is None
+
+
+def _turn_ctx(kind="free_text"):
+    return {
+        "expected_type": "story_turn",
+        "req_id": "req-turn",
+        "story_request": {"turn": {"kind": kind, "text": "иду к реке"}},
+    }
+
+
+def test_agenerate_story_turn_single_call(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "mock")
+    monkeypatch.setenv("LLM_MOCK_MODE", "ok")
+
+    def fail_build_step_ctx(_classifier_result):
+        raise AssertionError("merged response should not need a second call")
+
+    result = asyncio.run(
+        agenerate_story_turn(
+            _turn_ctx(),
+            {"expected_type": "story_step", "req_id": "req-classify"},
+            fail_build_step_ctx,
+        )
+    )
+    assert result.merged is True
+    assert result.classifier_result["intent_trait"] == "neutral"
+    assert result.step_result.expected_type == "story_step"
+    assert len(result.step_result.parsed_json["choices"]) == 3
+
+
+def test_agenerate_story_turn_partial_falls_back_to_step_call(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "mock")
+    monkeypatch.setenv("LLM_MOCK_MODE", "turn_partial")
+    seen = []
+
+    def build_step_ctx(classifier_result):
+        seen.append(classifier_result)
+        return {"expected_type": "story_step", "req_id": "req-step"}
+
+    result = asyncio.run(
+        agenerate_story_turn(
+            _turn_ctx(),
+            {"expected_type": "story_step", "req_id": "req-classify"},
+            build_step_ctx,
+        )
+    )
+    assert result.merged is False
+    assert seen == [result.classifier_result]
+    assert result.classifier_result["intent_trait"] == "neutral"
+    assert result.step_result.used_fallback is False
+    assert result.step_result.parsed_json["text"]
+
+
+def test_agenerate_streams_text_prefixes(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "mock")
+    monkeypatch.setenv("LLM_MOCK_MODE", "ok")
+    seen = []
+
+    async def on_text(text):
+        seen.append(text)
+
+    result = asyncio.run(
+        agenerate({"expected_type": "story_step", "req_id": "req-stream"}, on_text=on_text)
+    )
+    assert result.used_fallback is False
+    assert len(seen) > 1
+    assert seen[-1] == result.parsed_json["text"]
+    assert all(result.parsed_json["text"].startswith(text) for text in seen)
+
+
+class _SlowFirstProvider:
+    def __init__(self, delays):
+        self._delays = delays
+        self.started = []
+
+    async def agenerate(self, step_ctx):
+        delay = self._delays[min(len(self.started), len(self._delays) - 1)]
+        self.started.append(delay)
+        await asyncio.sleep(delay)
+        return MockProvider(mode="ok").generate(step_ctx)
+
+
+def test_agenerate_deadline_is_shared_across_attempts(monkeypatch):
+    monkeypatch.setenv("LLM_DEADLINE_S", "0.2")
+    monkeypatch.setattr(adapter, "_MIN_ATTEMPT_S", 0.05)
+    provider = _SlowFirstProvider([5])
+    started = time.monotonic()
+    result = asyncio.run(
+        adapter._agenerate_with_provider(
+            provider_name="slow",
+            provider=provider,
+            expected_type="story_step",
+            step_ctx={"expected_type": "story_step", "req_id": "req-deadline"},
+        )
+    )
+    assert time.monotonic() - started < 1
+    assert result.used_fallback is True
+    assert result.error_reason == "timeout"
+    assert provider.started == [5]
+    assert [entry["outcome"] for entry in result.attempts] == ["timeout", "deadline_exceeded"]
+
+
+def test_agenerate_hedged_request_wins_and_cancels_primary(monkeypatch):
+    monkeypatch.setenv("LLM_HEDGE_ENABLED", "1")
+    monkeypatch.setenv("LLM_HEDGE_DELAY_S", "0.05")
+    provider = _SlowFirstProvider([5, 0])
+    result = asyncio.run(
+        adapter._agenerate_with_provider(
+            provider_name="slow",
+            provider=provider,
+            expected_type="story_step",
+            step_ctx={"expected_type": "story_step", "req_id": "req-hedge"},
+        )
+    )
+    assert result.used_fallback is False
+    assert provider.started == [5, 0]
+    outcomes = {(entry["hedge"], entry["outcome"]) for entry in result.attempts}
+    assert outcomes == {(True, "ok"), (False, "cancelled")}
+
+
+def test_agenerate_leaves_caller_step_ctx_untouched(monkeypatch):
+    monkeypatch.setenv("LLM_HEDGE_ENABLED", "1")
+    monkeypatch.setenv("LLM_HEDGE_DELAY_S", "0.05")
+    provider = _SlowFirstProvider([5, 0])
+    seen = []
+    original = _SlowFirstProvider.agenerate
+
+    async def recording_agenerate(self, step_ctx):
+        seen.append(step_ctx)
+        return await original(self, step_ctx)
+
+    monkeypatch.setattr(_SlowFirstProvider, "agenerate", recording_agenerate)
+    step_ctx = {"expected_type": "story_step", "req_id": "req-ctx"}
+    asyncio.run(
+        adapter._agenerate_with_provider(
+            provider_name="slow",
+            provider=provider,
+            expected_type="story_step",
+            step_ctx=step_ctx,
+        )
+    )
+    assert step_ctx == {"expected_type": "story_step", "req_id": "req-ctx"}
+    assert len(seen) == 2
+    assert seen[0] is not seen[1]
+    assert seen[1]["timeout_s"] < seen[0]["timeout_s"]
+
+
+def test_agenerate_records_attempt_timings(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "mock")
+    monkeypatch.setenv("LLM_MOCK_MODE", "invalid_json_once")
+    result = asyncio.run(agenerate({"expected_type": "story_step", "req_id": "req-timing"}))
+    assert [entry["outcome"] for entry in result.attempts] == ["invalid_json", "ok"]
+    assert all(entry["elapsed_ms"] >= 0 for entry in result.attempts)
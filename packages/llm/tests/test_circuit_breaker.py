@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+import pytest
+
+from packages.llm.src import adapter, circuit_breaker
+from packages.llm.src.mock_provider import MockProvider
+
+
+class FlakyProvider:
+    def __init__(self, failing_models):
+        self.failing_models = set(failing_models)
+        self.models = []
+
+    def model_candidates(self, expected_type):
+        return ["primary", "secondary"]
+
+    async def agenerate(self, step_ctx):
+        self.models.append(step_ctx.get("model"))
+        if step_ctx.get("model") in self.failing_models:
+            raise TimeoutError("flaky timeout")
+        return MockProvider(mode="ok").generate(step_ctx)
+
+
+@pytest.fixture(autouse=True)
+def _breaker_env(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("OPENROUTER_BREAKER_MIN_REQUESTS", "2")
+    monkeypatch.setenv("OPENROUTER_BREAKER_FAILURE_RATE", "0.5")
+    monkeypatch.setenv("OPENROUTER_BREAKER_OPEN_S", "30")
+    circuit_breaker.reset()
+    yield
+    circuit_breaker.reset()
+
+
+def _run(provider):
+    return asyncio.run(
+        adapter._agenerate_with_provider(
+            provider_name="flaky",
+            provider=provider,
+            expected_type="story_step",
+            step_ctx={"expected_type": "story_step", "req_id": "req-breaker"},
+        )
+    )
+
+
+def test_breaker_opens_and_short_circuits_to_fallback(monkeypatch):
+    monkeypatch.setattr(FlakyProvider, "model_candidates", lambda self, _expected: ["primary"])
+    provider = FlakyProvider({"primary"})
+
+    first = _run(provider)
+    second = _run(provider)
+
+    assert first.used_fallback is True
+    assert [entry["outcome"] for entry in first.attempts] == ["timeout", "timeout"]
+    assert second.used_fallback is True
+    assert second.error_reason == "circuit_open"
+    assert len(provider.models) == 2
+    assert circuit_breaker.breaker_states()["flaky:primary"]["state"] == "open"
+
+
+def test_open_breaker_routes_to_secondary_model():
+    provider = FlakyProvider({"primary"})
+
+    _run(provider)
+    result = _run(provider)
+
+    assert result.used_fallback is False
+    assert provider.models == ["primary", "primary", "secondary"]
+
+
+def test_half_open_probe_closes_breaker(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_BREAKER_OPEN_S", "0.01")
+    breaker = circuit_breaker.get_breaker("flaky", "primary")
+    breaker.record_failure("timeout")
+    breaker.record_failure("timeout")
+    assert breaker.snapshot()["state"] == "open"
+
+    time.sleep(0.02)
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_success(0.1)
+
+    assert breaker.snapshot()["state"] == "closed"
+
+
+def test_hedge_is_admitted_through_the_breaker(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_BREAKER_OPEN_S", "0.01")
+    monkeypatch.setenv("LLM_HEDGE_ENABLED", "1")
+    monkeypatch.setenv("LLM_HEDGE_DELAY_S", "0.05")
+    monkeypatch.setattr(FlakyProvider, "model_candidates", lambda self, _expected: ["primary"])
+    breaker = circuit_breaker.get_breaker("flaky", "primary")
+    breaker.record_failure("timeout")
+    breaker.record_failure("timeout")
+    time.sleep(0.02)
+
+    class SlowProbeProvider(FlakyProvider):
+        async def agenerate(self, step_ctx):
+            await asyncio.sleep(0.2)
+            return await super().agenerate(step_ctx)
+
+    provider = SlowProbeProvider(set())
+    result = _run(provider)
+
+    assert result.used_fallback is False
+    assert provider.models == ["primary"]
+    outcomes = [(entry["hedge"], entry["outcome"]) for entry in result.attempts]
+    assert outcomes == [(True, "circuit_open"), (False, "ok")]
+    assert breaker.snapshot()["state"] == "closed"
@@ -0,0 +1,56 @@
+import asyncio
+
+from packages.llm.src import http_client
+
+
+def test_sync_session_is_shared_and_pooled(monkeypatch):
+    monkeypatch.setenv("LLM_HTTP_POOL_SIZE", "7")
+    http_client.close()
+
+    first = http_client.get_sync_session()
+    second = http_client.get_sync_session()
+
+    assert first is second
+    assert first.get_adapter("https://openrouter.ai")._pool_maxsize == 7
+    http_client.close()
+    assert http_client.get_sync_session() is not first
+    http_client.close()
+
+
+def test_timeouts_split_connect_and_total(monkeypatch):
+    monkeypatch.setenv("LLM_HTTP_CONNECT_TIMEOUT_S", "3")
+
+    assert http_client.sync_timeout(30.0) == (3.0, 30.0)
+    assert http_client.sync_timeout(2.0) == (2.0, 2.0)
+    timeout = http_client.async_timeout(30.0)
+    assert timeout.total == 30.0
+    assert timeout.sock_connect == 3.0
+
+
+def test_post_uses_shared_session_with_endpoint_timeout(monkeypatch):
+    captured = {}
+
+    class DummySession:
+        def post(self, url, **kwargs):
+            captured["url"] = url
+            captured.update(kwargs)
+            return "response"
+
+    monkeypatch.setenv("LLM_HTTP_CONNECT_TIMEOUT_S", "4")
+    monkeypatch.setattr(http_client, "get_sync_session", lambda: DummySession())
+
+    assert http_client.post("https://example.test", json={"a": 1}, timeout_s=90.0) == "response"
+    assert captured["timeout"] == (4.0, 90.0)
+    assert captured["json"] == {"a": 1}
+
+
+def test_aclose_closes_loop_session():
+    async def scenario():
+        session = http_client.get_async_session()
+        assert http_client.get_async_session() is session
+        await http_client.aclose()
+        return session
+
+    session = asyncio.run(scenario())
+
+    assert session.closed is True
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+
+from packages.llm.src import adapter, circuit_breaker, model_router
+from packages.llm.src.mock_provider import MockProvider
+from packages.llm.src.openrouter_provider import OpenRouterProvider
+
+
+@pytest.fixture(autouse=True)
+def _router_env(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("OPENROUTER_ROUTING_EXPLORE", "0")
+    model_router.reset()
+    circuit_breaker.reset()
+    yield
+    model_router.reset()
+    circuit_breaker.reset()
+
+
+def test_rank_prefers_lowest_expected_time_to_valid():
+    model_router.record("story_step", "slow", 9.0, ok=True)
+    model_router.record("story_step", "fast", 2.0, ok=True)
+
+    ordered, decision = model_router.rank("story_step", ["slow", "fast"])
+
+    assert ordered == ["fast", "slow"]
+    assert decision["scores"] == {"slow": 9.0, "fast": 2.0}
+
+
+def test_validation_failures_demote_fast_model():
+    for _ in range(3):
+        model_router.record("story_step", "fast", 2.0, ok=False)
+    model_router.record("story_step", "steady", 5.0, ok=True)
+
+    ordered, _ = model_router.rank("story_step", ["fast", "steady"])
+
+    assert ordered == ["steady", "fast"]
+
+
+def test_untried_models_are_probed_first():
+    model_router.record("story_step", "a", 1.0, ok=True)
+
+    ordered, _ = model_router.rank("story_step", ["a", "b"])
+
+    assert ordered == ["b", "a"]
+
+
+def test_static_routing_keeps_pool_order(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_ROUTING", "static")
+    model_router.record("story_step", "a", 9.0, ok=False)
+    model_router.record("story_step", "b", 1.0, ok=True)
+
+    ordered, decision = model_router.rank("story_step", ["a", "b"])
+
+    assert ordered == ["a", "b"]
+    assert decision["mode"] == "static"
+
+
+def test_openrouter_pool_routes_and_keeps_fallback_last(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_MODEL_POOL_TEXT", "model-a, model-b")
+    monkeypatch.setenv("OPENROUTER_MODEL_TEXT_FALLBACK", "model-z")
+    model_router.record("story_step", "model-a", 8.0, ok=True)
+    model_router.record("story_step", "model-b", 3.0, ok=True)
+
+    provider = OpenRouterProvider("key")
+
+    assert provider.model_candidates("story_step") == ["model-b", "model-a", "model-z"]
+    assert provider.last_routing["order"] == ["model-b", "model-a"]
+
+
+class PooledProvider:
+    def __init__(self):
+        self.last_routing = None
+
+    def model_candidates(self, expected_type):
+        ordered, self.last_routing = model_router.rank(expected_type, ["m1", "m2"])
+        return ordered
+
+    async def agenerate(self, step_ctx):
+        return MockProvider(mode="ok").generate(step_ctx)
+
+
+def test_routing_decision_is_recorded_and_dumped(monkeypatch, tmp_path):
+    monkeypatch.setenv("LLM_DEBUG_DUMP_DIR", str(tmp_path))
+    model_router.record("story_step", "m1", 6.0, ok=True)
+    model_router.record("story_step", "m2", 1.0, ok=True)
+
+    result = asyncio.run(
+        adapter._agenerate_with_provider(
+            provider_name="pooled",
+            provider=PooledProvider(),
+            expected_type="story_step",
+            step_ctx={"expected_type": "story_step", "req_id": "req-route"},
+        )
+    )
+
+    assert result.used_fallback is False
+    dump = json.loads(next(tmp_path.iterdir()).read_text(encoding="utf-8"))
+    assert dump["routing"]["chosen"] == "m2"
+    assert dump["routing"]["order"] == ["m2", "m1"]
+    assert model_router.router_stats()["story_step:m2"]["samples"] == 2
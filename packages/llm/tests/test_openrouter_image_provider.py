@@ -12,3 +12,16 @@ def test_image_provider_sim_fail_always_raises(monkeypatch):
 
     with pytest.raises(RuntimeError, match="simulated image provider failure"):
         openrouter_image_provider.generate_t2i("scene two")
+
+
+def test_prompt_message_reuses_precomputed_data_url(monkeypatch):
+    def fail_encode(*_args):
+        raise AssertionError("reference must not be re-encoded")
+
+    monkeypatch.setattr(openrouter_image_provider, "_to_data_url", fail_encode)
+
+    message = openrouter_image_provider._build_prompt_message(
+        "scene", b"ref", "image/png", "data:image/png;base64,cmVm"
+    )
+
+    assert message["content"][1]["image_url"]["url"] == "data:image/png;base64,cmVm"
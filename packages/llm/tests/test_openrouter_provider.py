@@ -1,3 +1,4 @@
+import asyncio
 import json
 from pathlib import Path
 
@@ -18,14 +19,37 @@ class DummyResponse:
         return self._payload
 
 
+class DummyAsyncResponse(DummyResponse):
+    async def json(self, content_type=None):
+        return self._payload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_exc):
+        return False
+
+
+class DummyAsyncSession:
+    def __init__(self, payload, captured):
+        self._payload = payload
+        self._captured = captured
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self._captured["url"] = url
+        self._captured["json"] = json
+        self._captured["timeout"] = timeout
+        return DummyAsyncResponse(self._payload)
+
+
 def test_openrouter_payload_schema(monkeypatch):
     captured = {}
 
-    def fake_post(url, headers=None, json=None, timeout=None):
+    def fake_post(url, headers=None, json=None, timeout_s=None):
         captured["url"] = url
         captured["headers"] = headers
         captured["json"] = json
-        captured["timeout"] = timeout
+        captured["timeout"] = timeout_s
         return DummyResponse(
             {"choices": [{"message": {"content": {"text": "ok", "recap_short": "recap", "choices": []}}}]}
         )
@@ -37,7 +61,7 @@ def test_openrouter_payload_schema(monkeypatch):
     monkeypatch.setenv("OPENROUTER_RESPONSE_HEALING", "1")
     repo_root = Path(__file__).resolve().parents[3]
     monkeypatch.setenv("SKAZKA_CONTENT_DIR", str(repo_root / "content"))
-    monkeypatch.setattr("packages.llm.src.openrouter_provider.requests.post", fake_post)
+    monkeypatch.setattr("packages.llm.src.openrouter_provider.http_client.post", fake_post)
 
     provider = OpenRouterProvider("key")
     provider.generate({"expected_type": "story_step", "story_request": {"text": "hi"}})
@@ -63,7 +87,7 @@ def test_openrouter_content_dict(monkeypatch):
 
     repo_root = Path(__file__).resolve().parents[3]
     monkeypatch.setenv("SKAZKA_CONTENT_DIR", str(repo_root / "content"))
-    monkeypatch.setattr("packages.llm.src.openrouter_provider.requests.post", fake_post)
+    monkeypatch.setattr("packages.llm.src.openrouter_provider.http_client.post", fake_post)
     provider = OpenRouterProvider("key")
     result = provider.generate({"expected_type": "story_step"})
     assert json.loads(result)["text"] == "step"
@@ -77,7 +101,7 @@ def test_openrouter_content_string_json(monkeypatch):
 
     repo_root = Path(__file__).resolve().parents[3]
     monkeypatch.setenv("SKAZKA_CONTENT_DIR", str(repo_root / "content"))
-    monkeypatch.setattr("packages.llm.src.openrouter_provider.requests.post", fake_post)
+    monkeypatch.setattr("packages.llm.src.openrouter_provider.http_client.post", fake_post)
     provider = OpenRouterProvider("key")
     result = provider.generate({"expected_type": "story_final"})
     assert json.loads(result)["text"] == "final"
@@ -91,7 +115,7 @@ def test_openrouter_content_string_invalid(monkeypatch):
 
     repo_root = Path(__file__).resolve().parents[3]
     monkeypatch.setenv("SKAZKA_CONTENT_DIR", str(repo_root / "content"))
-    monkeypatch.setattr("packages.llm.src.openrouter_provider.requests.post", fake_post)
+    monkeypatch.setattr("packages.llm.src.openrouter_provider.http_client.post", fake_post)
     provider = OpenRouterProvider("key")
     result = provider.generate({"expected_type": "story_final"})
     assert result == "not-json"
@@ -100,13 +124,13 @@ def test_openrouter_content_string_invalid(monkeypatch):
 def test_openrouter_story_final_prompt_load(monkeypatch):
     captured = {}
 
-    def fake_post(url, headers=None, json=None, timeout=None):
+    def fake_post(url, headers=None, json=None, timeout_s=None):
         captured["json"] = json
         return DummyResponse({"choices": [{"message": {"content": {"text": "ok"}}}]})
 
     repo_root = Path(__file__).resolve().parents[3]
     monkeypatch.setenv("SKAZKA_CONTENT_DIR", str(repo_root / "content"))
-    monkeypatch.setattr("packages.llm.src.openrouter_provider.requests.post", fake_post)
+    monkeypatch.setattr("packages.llm.src.openrouter_provider.http_client.post", fake_post)
 
     provider = OpenRouterProvider("key")
     provider.generate({"expected_type": "story_final", "story_request": {"text": "hi"}})
@@ -119,13 +143,13 @@ def test_openrouter_story_final_prompt_load(monkeypatch):
 def test_openrouter_theme_prompt_fallback(monkeypatch):
     captured = {}
 
-    def fake_post(url, headers=None, json=None, timeout=None):
+    def fake_post(url, headers=None, json=None, timeout_s=None):
         captured["json"] = json
         return DummyResponse({"choices": [{"message": {"content": {"text": "ok", "choices": []}}}]})
 
     repo_root = Path(__file__).resolve().parents[3]
     monkeypatch.setenv("SKAZKA_CONTENT_DIR", str(repo_root / "content"))
-    monkeypatch.setattr("packages.llm.src.openrouter_provider.requests.post", fake_post)
+    monkeypatch.setattr("packages.llm.src.openrouter_provider.http_client.post", fake_post)
 
     provider = OpenRouterProvider("key")
     provider.generate(
@@ -147,7 +171,7 @@ def test_openrouter_missing_prompts(monkeypatch, tmp_path):
 
     monkeypatch.setenv("SKAZKA_CONTENT_DIR", str(tmp_path / "content"))
     monkeypatch.chdir(tmp_path)
-    monkeypatch.setattr("packages.llm.src.openrouter_provider.requests.post", fake_post)
+    monkeypatch.setattr("packages.llm.src.openrouter_provider.http_client.post", fake_post)
 
     provider = OpenRouterProvider("key")
     with pytest.raises(FileNotFoundError) as excinfo:
@@ -156,3 +180,103 @@ def test_openrouter_missing_prompts(monkeypatch, tmp_path):
     message = str(excinfo.value)
     assert "prompt files not found" in message
     assert "story_step" in message
+
+
+def test_openrouter_agenerate_uses_shared_session(monkeypatch):
+    captured = {}
+    payload = {
+        "choices": [{"message": {"content": {"text": "step", "choices": []}}}],
+        "usage": {"total_tokens": 7},
+    }
+    session = DummyAsyncSession(payload, captured)
+
+    def fake_post(*_args, **_kwargs):
+        raise AssertionError("sync transport should not be used")
+
+    repo_root = Path(__file__).resolve().parents[3]
+    monkeypatch.setenv("SKAZKA_CONTENT_DIR", str(repo_root / "content"))
+    monkeypatch.setenv("OPENROUTER_TIMEOUT_S", "12")
+    monkeypatch.setattr("packages.llm.src.openrouter_provider.http_client.post", fake_post)
+    monkeypatch.setattr(
+        "packages.llm.src.openrouter_provider.http_client.get_async_session",
+        lambda: session,
+    )
+
+    provider = OpenRouterProvider("key")
+    result = asyncio.run(
+        provider.agenerate({"expected_type": "story_step", "story_request": {"text": "hi"}})
+    )
+
+    assert json.loads(result)["text"] == "step"
+    assert captured["url"] == "https://openrouter.ai/api/v1/chat/completions"
+    assert captured["timeout"].total == 12.0
+    assert captured["json"]["messages"][0]["role"] == "system"
+    assert provider.last_usage == {"total_tokens": 7}
+
+
+class DummyStreamContent:
+    def __init__(self, lines):
+        self._lines = lines
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for line in self._lines:
+            yield line.encode("utf-8")
+
+
+class DummyStreamResponse(DummyAsyncResponse):
+    def __init__(self, lines):
+        super().__init__(None)
+        self.content = DummyStreamContent(lines)
+
+
+class DummyStreamSession:
+    def __init__(self, lines, captured):
+        self._lines = lines
+        self._captured = captured
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self._captured["json"] = json
+        return DummyStreamResponse(self._lines)
+
+
+def test_openrouter_astream_collects_sse_deltas(monkeypatch):
+    captured = {}
+    content = json.dumps({"text": "Жили-были", "recap_short": "r", "choices": []}, ensure_ascii=False)
+    chunks = [content[:7], content[7:19], content[19:]]
+    lines = [": OPENROUTER PROCESSING\n", "\n"]
+    for chunk in chunks:
+        lines.append("data: " + json.dumps({"choices": [{"delta": {"content": chunk}}]}) + "\n")
+    lines.append(
+        "data: "
+        + json.dumps(
+            {"choices": [{"delta": {}, "finish_reason": "stop"}], "usage": {"total_tokens": 9}}
+        )
+        + "\n"
+    )
+    lines.append("data: [DONE]\n")
+    session = DummyStreamSession(lines, captured)
+
+    repo_root = Path(__file__).resolve().parents[3]
+    monkeypatch.setenv("SKAZKA_CONTENT_DIR", str(repo_root / "content"))
+    monkeypatch.setattr(
+        "packages.llm.src.openrouter_provider.http_client.get_async_session",
+        lambda: session,
+    )
+    deltas = []
+
+    async def on_delta(delta):
+        deltas.append(delta)
+
+    provider = OpenRouterProvider("key")
+    result = asyncio.run(
+        provider.astream({"expected_type": "story_step", "story_request": {"text": "hi"}}, on_delta)
+    )
+
+    assert deltas == chunks
+    assert json.loads(result)["text"] == "Жили-были"
+    assert captured["json"]["stream"] is True
+    assert provider.last_usage == {"total_tokens": 9}
+    assert provider.last_finish_reason == "stop"
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from packages.llm.src import scheduler
+
+
+@pytest.fixture(autouse=True)
+def _scheduler_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("LLM_MAX_INFLIGHT", "2")
+    monkeypatch.setenv("LLM_BACKGROUND_MAX_INFLIGHT", "1")
+
+
+def test_priority_for_maps_expected_types():
+    assert scheduler.priority_for({"expected_type": "story_turn"}) == "interactive"
+    assert scheduler.priority_for({"expected_type": "story_final"}) == "final"
+    assert scheduler.priority_for({"expected_type": "book_rewrite_v1"}) == "background"
+    assert scheduler.priority_for({"expected_type": "story_step", "priority": "background"}) == "background"
+
+
+def test_interactive_is_served_before_queued_background():
+    order = []
+
+    async def job(name, priority, hold):
+        async with scheduler.slot(priority):
+            order.append(name)
+            await hold.wait()
+
+    async def scenario():
+        hold = asyncio.Event()
+        tasks = [
+            asyncio.create_task(job("book-1", "background", hold)),
+            asyncio.create_task(job("book-2", "background", hold)),
+            asyncio.create_task(job("book-3", "background", hold)),
+        ]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job("final", "final", hold)))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job("step", "interactive", hold)))
+        await asyncio.sleep(0)
+        started = list(order)
+        hold.set()
+        await asyncio.gather(*tasks)
+        return started, scheduler.scheduler_stats()
+
+    started, stats = asyncio.run(scenario())
+
+    assert started == ["book-1", "final"]
+    assert order == ["book-1", "final", "step", "book-2", "book-3"]
+    assert stats["inflight"] == 0
+    assert stats["classes"]["interactive"]["queued"] == 1
+    assert stats["classes"]["background"]["queued"] == 2
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        hold = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("interactive"):
+                await hold.wait()
+
+        holders = [asyncio.create_task(holder()) for _ in range(2)]
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(scheduler.get_scheduler().acquire("interactive"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        hold.set()
+        await asyncio.gather(*holders)
+        return scheduler.scheduler_stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats["inflight"] == 0
+    assert stats["classes"]["interactive"]["waiting"] == 0
+
+
+def test_promoted_waiter_jumps_background_cap():
+    order = []
+
+    async def job(name, priority, hold, handle=None):
+        if handle is not None:
+            scheduler.bind_priority(handle)
+        async with scheduler.slot(priority):
+            order.append(name)
+            await hold.wait()
+
+    async def scenario():
+        hold = asyncio.Event()
+        handle = scheduler.PriorityHandle("background")
+        tasks = [asyncio.create_task(job("book", "background", hold))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job("prefetch", "background", hold, handle)))
+        await asyncio.sleep(0)
+        before = list(order)
+        scheduler.promote(handle, "interactive")
+        await asyncio.sleep(0)
+        during = scheduler.scheduler_stats()
+        hold.set()
+        await asyncio.gather(*tasks)
+        return before, list(order), during, scheduler.scheduler_stats()
+
+    before, after, during, stats = asyncio.run(scenario())
+
+    assert before == ["book"]
+    assert after == ["book", "prefetch"]
+    assert during["classes"]["interactive"]["inflight"] == 1
+    assert during["classes"]["background"]["waiting"] == 0
+    assert stats["inflight"] == 0
+    assert stats["classes"]["interactive"]["inflight"] == 0
@@ -48,3 +48,21 @@ def test_validator_story_final_allows_empty_choices():
     assert parsed is not None
     assert reason is None
     assert detail is None
+
+
+def test_validator_story_turn_ok():
+    raw = (
+        '{"classifier_result": null, "next_step": {"text": "t", "recap_short": "r",'
+        ' "choices": [{"choice_id": "A", "label": "Go"}]}}'
+    )
+    parsed, reason, detail = validate_response(raw, "story_turn")
+    assert reason is None
+    assert parsed["next_step"]["choices"][0]["choice_id"] == "A"
+
+
+def test_validator_story_turn_missing_next_step():
+    raw = '{"classifier_result": {"intent_trait": "t1", "confidence": 0.9}}'
+    parsed, reason, detail = validate_response(raw, "story_turn")
+    assert parsed is None
+    assert reason == "missing_required_fields"
+    assert detail["missing_fields"] == ["next_step"]